@@ -8,7 +8,7 @@ from logging.handlers import RotatingFileHandler
 from flask_jwt_extended import JWTManager
 
 from app.models.db_config import get_sqlalchemy_config
-from app.models.db_maintenance import check_db_version, start_weekly_integrity_check
+from app.models.db_maintenance import check_db_version
 
 # Initialize extensions
 login_manager = LoginManager()
@@ -23,6 +23,29 @@ def create_app(config=None):
     # Additional configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
     app.config['TEACHER_ACCESS_CODE'] = os.environ.get('TEACHER_ACCESS_CODE', 'default-secure-code-for-dev')
+    # Analytics implementation: 'sql' (grouped queries) or 'pandas' (vectorized)
+    app.config['ANALYTICS_BACKEND'] = os.environ.get('ANALYTICS_BACKEND', 'sql')
+    # Analytics result cache: max entries (0 disables) and TTL in seconds
+    app.config['ANALYTICS_CACHE_SIZE'] = int(os.environ.get('ANALYTICS_CACHE_SIZE', 256))
+    app.config['ANALYTICS_CACHE_TTL'] = int(os.environ.get('ANALYTICS_CACHE_TTL', 300))
+    # Background job runner (heavy teacher reports)
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    # Audit retention: raw audit_log rows older than this are archived (see flask archive-audit-logs)
+    app.config['AUDIT_RETENTION_DAYS'] = int(os.environ.get('AUDIT_RETENTION_DAYS', 365))
+    app.config['AUDIT_ARCHIVE_DIR'] = os.environ.get('AUDIT_ARCHIVE_DIR')
+    # Clan history tiers: raw rows, then weekly buckets, then monthly buckets (see flask compact-clan-history)
+    app.config['CLAN_HISTORY_RAW_DAYS'] = int(os.environ.get('CLAN_HISTORY_RAW_DAYS', 90))
+    app.config['CLAN_HISTORY_WEEKLY_DAYS'] = int(os.environ.get('CLAN_HISTORY_WEEKLY_DAYS', 730))
+    # Custom clan metrics: pool size (0 runs them inline) and default per-metric timeout in seconds
+    app.config['CLAN_CUSTOM_METRIC_WORKERS'] = int(os.environ.get('CLAN_CUSTOM_METRIC_WORKERS', 4))
+    app.config['CLAN_CUSTOM_METRIC_TIMEOUT'] = float(os.environ.get('CLAN_CUSTOM_METRIC_TIMEOUT', 5.0))
+    # Live leaderboard index: rebuilt from the database when older than this many seconds (0: never)
+    app.config['LEADERBOARD_INDEX_MAX_AGE'] = int(os.environ.get('LEADERBOARD_INDEX_MAX_AGE', 300))
+    # In-memory item catalog: seconds between checks of the catalog version row
+    app.config['ITEM_CATALOG_CHECK_SECONDS'] = float(os.environ.get('ITEM_CATALOG_CHECK_SECONDS', 5))
+    # Built-in scheduler for the periodic jobs (see flask run-scheduler); safe to enable in every worker
+    app.config['SCHEDULER_ENABLED'] = os.environ.get('SCHEDULER_ENABLED', 'False').lower() == 'true'
+    app.config['SCHEDULER_POLL_SECONDS'] = int(os.environ.get('SCHEDULER_POLL_SECONDS', 30))
     
     # Session and cookie security settings
     app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour in seconds
@@ -53,6 +76,18 @@ def create_app(config=None):
     # Initialize extensions
     # db.init_app(app) # Moved to init_db
     init_db(app) # Register models and init db
+    from app.services.analytics_cache import init_analytics_cache
+    init_analytics_cache(app)
+    from app.services.job_runner import init_job_runner
+    init_job_runner(app)
+    from app.services.custom_metrics import init_custom_metrics
+    init_custom_metrics(app)
+    from app.services.leaderboard_index import init_leaderboard_index
+    init_leaderboard_index(app)
+    from app.services.item_catalog import init_item_catalog
+    init_item_catalog(app)
+    from app.services.student_context import init_student_context
+    init_student_context(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
     jwt = JWTManager(app)
@@ -77,9 +112,11 @@ def create_app(config=None):
     from app.routes import init_app
     init_app(app)
 
-    # --- DB maintenance: version check and weekly integrity check ---
+    # --- DB maintenance: version check ---
     # check_db_version(app)
-    # start_weekly_integrity_check(app)
+    # The weekly integrity check and other periodic jobs run on the built-in scheduler
+    from app.services.scheduler import init_scheduler
+    init_scheduler(app)
     # --------------------------------------------------------------
 
     # Configure logging
@@ -109,8 +146,20 @@ def create_app(config=None):
     logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
 
     # Register CLI commands
-    from app.commands import seed_db_command
+    from app.commands import (
+        seed_db_command,
+        backfill_audit_rollup_command,
+        run_jobs_command,
+        archive_audit_logs_command,
+        compact_clan_history_command,
+        run_scheduler_command
+    )
     app.cli.add_command(seed_db_command)
+    app.cli.add_command(backfill_audit_rollup_command)
+    app.cli.add_command(run_jobs_command)
+    app.cli.add_command(archive_audit_logs_command)
+    app.cli.add_command(compact_clan_history_command)
+    app.cli.add_command(run_scheduler_command)
 
     # --- Populate Equipment Table from Hardcoded Data (if empty) ---
     from app.models.equipment_data import EQUIPMENT_DATA
@@ -41,3 +41,100 @@ def seed_db_command():
             print("Equipment table does not exist. Run migrations first.")
     except Exception as e:
         print(f"Error seeding database: {e}")
+
+
+@click.command('backfill-audit-rollup')
+@click.option('--days', type=int, default=None, help='Only rebuild the last N days (default: every day with unarchived events).')
+@with_appcontext
+def backfill_audit_rollup_command(days):
+    """Rebuild audit_daily_rollup from the raw audit_log table."""
+    from datetime import datetime, timedelta
+    from app.models.audit import AuditDailyRollup
+    try:
+        since = (datetime.utcnow() - timedelta(days=days)).date() if days else None
+        rows = AuditDailyRollup.rebuild(since=since)
+        db.session.commit()
+        scope = f"since {since}" if since else "for all history"
+        print(f"Audit rollup rebuilt {scope}: {rows} rows written.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error rebuilding audit rollup: {e}")
+
+
+@click.command('run-jobs')
+@with_appcontext
+def run_jobs_command():
+    """Run queued background jobs, including ones orphaned by a stopped worker."""
+    from app.services.job_runner import requeue_stale_jobs
+    try:
+        count = requeue_stale_jobs(inline=True)
+        print(f"Ran {count} background jobs.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error running background jobs: {e}")
+
+
+@click.command('archive-audit-logs')
+@click.option('--days', type=int, default=None, help='Keep this many days of raw events (default: AUDIT_RETENTION_DAYS).')
+@click.option('--archive-dir', type=click.Path(file_okay=False), default=None, help='Archive directory (default: AUDIT_ARCHIVE_DIR).')
+@click.option('--no-compact', is_flag=True, help='Skip ANALYZE/VACUUM after archiving.')
+@with_appcontext
+def archive_audit_logs_command(days, archive_dir, no_compact):
+    """Move old audit_log events into monthly .jsonl.gz archives."""
+    from app.services.audit_archive import archive_audit_logs
+    try:
+        result = archive_audit_logs(retention_days=days, archive_dir=archive_dir, compact=not no_compact)
+        print(f"Archived {result['archived']} audit events older than {result['horizon']}.")
+        for path in result['files']:
+            print(f"  {path}")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error archiving audit logs: {e}")
+
+
+@click.command('compact-clan-history')
+@click.option('--raw-days', type=int, default=None, help='Keep raw history rows this many days (default: CLAN_HISTORY_RAW_DAYS).')
+@click.option('--weekly-days', type=int, default=None, help='Keep weekly buckets this many days (default: CLAN_HISTORY_WEEKLY_DAYS).')
+@with_appcontext
+def compact_clan_history_command(raw_days, weekly_days):
+    """Roll old clan progress history into weekly and monthly buckets."""
+    from app.services.clan_history import compact_clan_history
+    try:
+        result = compact_clan_history(raw_days=raw_days, weekly_days=weekly_days)
+        db.session.commit()
+        print(f"Compacted {result['raw_rows']} raw rows older than {result['raw_horizon']} and "
+              f"{result['weekly_buckets']} weekly buckets older than {result['weekly_horizon']} "
+              f"into {result['buckets_written']} buckets.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error compacting clan history: {e}")
+
+
+@click.command('run-scheduler')
+@click.option('--loop', is_flag=True, help='Keep running and check for due jobs every SCHEDULER_POLL_SECONDS.')
+@click.option('--status', is_flag=True, help='Only print the state of every scheduled job.')
+@with_appcontext
+def run_scheduler_command(loop, status):
+    """Run the periodic jobs that are due (safe to start on several hosts at once)."""
+    import time
+    from flask import current_app
+    from app.services.scheduler import run_due_jobs, scheduler_status, sync_schedules
+    if status:
+        sync_schedules()
+        for job in scheduler_status():
+            print(f"{job['name']}: next {job['next_run_at']}, last {job['last_status'] or 'never'} "
+                  f"({job['run_count']} runs, {job['failure_count']} failed, last took {job['last_duration'] or 0:.1f}s)")
+        return
+    while True:
+        try:
+            results = run_due_jobs()
+            for name, outcome in results.items():
+                print(f"{name}: {outcome}")
+            if not loop:
+                print(f"Ran {len(results)} scheduled jobs.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error running scheduled jobs: {e}")
+        if not loop:
+            return
+        time.sleep(current_app.config.get('SCHEDULER_POLL_SECONDS', 30))
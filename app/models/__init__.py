@@ -3,7 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from app.models.base import Base  # <-- Re-export Base
 from .db_config import db
 from app.models.achievement_badge import AchievementBadge
-from app.models.clan_progress import ClanProgressHistory
+from app.models.clan_progress import ClanProgressHistory, ClanMetricTotals
 # from app.models.item import Item  # Remove legacy Item model import
 
 __all__ = [
@@ -20,7 +20,7 @@ def init_db(app):
     from app.models.classroom import Classroom, class_students
     from app.models.character import Character
     from app.models.clan import Clan
-    from app.models.equipment import Equipment, EquipmentType, EquipmentSlot, Inventory
+    from app.models.equipment import Equipment, EquipmentType, EquipmentSlot, Inventory, CatalogVersion
     from app.models.ability import Ability, AbilityType, CharacterAbility
     from app.models.student import Student
     from app.models.teacher import Teacher
@@ -28,6 +28,9 @@ def init_db(app):
     from app.models.education import QuestionSet, Question
     from app.models.battle import Monster, Battle
     from app.models.shop_config import ShopItemOverride
+    from app.models.audit import AuditLog, AuditDailyRollup
+    from app.models.job import BackgroundJob, ScheduledJob
+    from app.models.clan_leaderboard import ClanLeaderboardEntry
     # from app.models.clan_progress import ClanProgressHistory  # Already imported at top level
     
     # Create tables
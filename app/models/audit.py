@@ -1,9 +1,12 @@
+from collections import defaultdict
 from datetime import datetime
+from sqlalchemy import event, func, case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.types import JSON
 from app.models import db
 from app.models.base import Base
 from enum import Enum
-from sqlalchemy.orm import validates
+from sqlalchemy.orm import Session, validates
 
 class EventType(Enum):
     LOGIN = 'LOGIN'
@@ -43,6 +46,13 @@ class AuditLog(Base):
     """
     
     __tablename__ = 'audit_log'
+    __table_args__ = (
+        # Composite indexes matching the hot access paths: owner -> event type -> time range.
+        # The character index also covers amount so per-character SUM(amount) never touches the table.
+        db.Index('idx_audit_character_type_time_amount', 'character_id', 'event_type', 'event_timestamp', 'amount'),
+        db.Index('idx_audit_character_time', 'character_id', 'event_timestamp'),
+        db.Index('idx_audit_user_type_time', 'user_id', 'event_type', 'event_timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     event_type = db.Column(db.String(50), nullable=False, index=True)
@@ -52,6 +62,11 @@ class AuditLog(Base):
     ip_address = db.Column(db.String(45), nullable=True)  # IPv4/IPv6 address
     event_timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     
+    # Typed numeric fields for XP/gold/level events so totals can be summed in SQL
+    amount = db.Column(db.Integer, nullable=True)
+    old_value = db.Column(db.Integer, nullable=True)
+    new_value = db.Column(db.Integer, nullable=True)
+    
     # Relationships
     user = db.relationship('User', back_populates='audit_logs')
     character = db.relationship('Character', backref=db.backref('audit_logs', lazy='dynamic'))
@@ -78,9 +93,29 @@ class AuditLog(Base):
         'XP_TRANSACTION': 'XP transaction'
     }
     
+    def __init__(self, **kwargs):
+        # Keep the typed column in step with event_data for direct AuditLog(...) inserts
+        if kwargs.get('amount') is None:
+            kwargs['amount'] = self.amount_from_event_data(kwargs.get('event_data'))
+        super().__init__(**kwargs)
+    
+    @staticmethod
+    def amount_from_event_data(event_data):
+        """Integer ``amount`` stored in event_data, or None if missing/invalid."""
+        if not isinstance(event_data, dict) or event_data.get('amount') is None:
+            return None
+        try:
+            return int(event_data['amount'])
+        except (TypeError, ValueError):
+            return None
+    
     @classmethod
-    def log_event(cls, event_type, event_data, user_id=None, character_id=None, ip_address=None):
-        """Create a new audit log entry."""
+    def log_event(cls, event_type, event_data, user_id=None, character_id=None, ip_address=None,
+                  amount=None, old_value=None, new_value=None):
+        """Create a new audit log entry.
+        
+        ``amount`` defaults to ``event_data['amount']`` when not given.
+        """
         if isinstance(event_type, EventType):
             event_type = event_type.value
         if event_type not in cls.EVENT_TYPES:
@@ -91,7 +126,10 @@ class AuditLog(Base):
             user_id=user_id,
             character_id=character_id,
             event_data=event_data,
-            ip_address=ip_address
+            ip_address=ip_address,
+            amount=amount,
+            old_value=old_value,
+            new_value=new_value
         )
         log.save()
         return log
@@ -134,8 +172,193 @@ class AuditLog(Base):
             
         return query.order_by(cls.event_timestamp.desc()).limit(limit).all()
 
+    @classmethod
+    def character_activity_query(cls, character_ids, event_types=None, since=None):
+        """Newest-first query for events of one or more characters.
+
+        ``character_ids`` may be a single id, a list, or a subquery of ids.
+        """
+        if isinstance(character_ids, int):
+            query = cls.query.filter(cls.character_id == character_ids)
+        else:
+            query = cls.query.filter(cls.character_id.in_(character_ids))
+        if event_types:
+            query = query.filter(cls.event_type.in_(event_types))
+        if since:
+            query = query.filter(cls.event_timestamp >= since)
+        return query.order_by(cls.event_timestamp.desc())
+    
+    @classmethod
+    def teacher_activity_query(cls, teacher_id, event_types=None, since=None):
+        """Newest-first query for events of characters in a teacher's classes."""
+        from app.models.character import Character
+        from app.models.classroom import Classroom
+        from app.models.student import Student
+        character_ids = (
+            db.session.query(Character.id)
+            .join(Student, Student.id == Character.student_id)
+            .join(Classroom, Classroom.id == Student.class_id)
+            .filter(Classroom.teacher_id == teacher_id)
+        )
+        return cls.character_activity_query(character_ids, event_types, since)
+    
+    @classmethod
+    def clan_activity_query(cls, clan_id, event_types=None, since=None):
+        """Newest-first query for events of characters in a clan."""
+        from app.models.character import Character
+        character_ids = db.session.query(Character.id).filter(Character.clan_id == clan_id)
+        return cls.character_activity_query(character_ids, event_types, since)
+    
+    @classmethod
+    def level_history_query(cls, character_id):
+        """Query of (day, highest level reached that day) for a character's LEVEL_UP events."""
+        day = func.date(cls.event_timestamp)
+        return (
+            db.session.query(day, func.max(cls.new_value))
+            .filter(
+                cls.character_id == character_id,
+                cls.event_type == EventType.LEVEL_UP.value,
+                cls.new_value.isnot(None)
+            )
+            .group_by(day)
+        )
+
     @validates('event_type')
     def validate_event_type(self, key, value):
         if value not in self.EVENT_TYPES:
             raise ValueError(f"Invalid event type: {value}")
-        return value 
\ No newline at end of file
+        return value
+
+
+class AuditDailyRollup(db.Model):
+    """Per-day totals of AuditLog events, kept up to date as events are written.
+
+    One row per (character_id, user_id, event_type, day). ``total_amount`` and
+    ``positive_amount`` sum ``AuditLog.amount`` (all values / positive values
+    only) and ``event_count`` counts the events. Charts read these rows
+    instead of re-scanning and re-parsing raw audit_log rows.
+
+    A missing character_id or user_id is stored as 0 so the unique key also
+    holds for events that have no character or user (SQLite treats NULLs as
+    distinct in unique constraints).
+    """
+
+    __tablename__ = 'audit_daily_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('character_id', 'event_type', 'day', 'user_id', name='uq_audit_daily_rollup_key'),
+        db.Index('idx_audit_rollup_user_day', 'user_id', 'event_type', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    character_id = db.Column(db.Integer, nullable=False, default=0)
+    user_id = db.Column(db.Integer, nullable=False, default=0)
+    event_type = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    total_amount = db.Column(db.Integer, nullable=False, default=0)
+    positive_amount = db.Column(db.Integer, nullable=False, default=0)
+    event_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AuditDailyRollup {self.event_type} character={self.character_id} user={self.user_id} day={self.day}>'
+
+    @classmethod
+    def daily_totals_query(cls, character_id, event_type, since_day, column='total_amount'):
+        """Query of (day, summed ``column``) for one character and event type, oldest first."""
+        return (
+            db.session.query(cls.day, func.sum(getattr(cls, column)))
+            .filter(
+                cls.character_id == character_id,
+                cls.event_type == event_type,
+                cls.day >= since_day
+            )
+            .group_by(cls.day)
+            .order_by(cls.day.asc())
+        )
+
+    @classmethod
+    def apply(cls, connection, logs):
+        """Add the given AuditLog rows to the rollup using ``connection``."""
+        totals = defaultdict(lambda: [0, 0, 0])
+        for log in logs:
+            timestamp = log.event_timestamp or datetime.utcnow()
+            key = (log.character_id or 0, log.user_id or 0, log.event_type, timestamp.date())
+            amount = log.amount or 0
+            totals[key][0] += amount
+            totals[key][1] += max(amount, 0)
+            totals[key][2] += 1
+        if not totals:
+            return
+        table = cls.__table__
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['character_id', 'event_type', 'day', 'user_id'],
+            set_={
+                'total_amount': table.c.total_amount + stmt.excluded.total_amount,
+                'positive_amount': table.c.positive_amount + stmt.excluded.positive_amount,
+                'event_count': table.c.event_count + stmt.excluded.event_count,
+            }
+        )
+        connection.execute(stmt, [
+            {
+                'character_id': character_id,
+                'user_id': user_id,
+                'event_type': event_type,
+                'day': day,
+                'total_amount': total,
+                'positive_amount': positive,
+                'event_count': count,
+            }
+            for (character_id, user_id, event_type, day), (total, positive, count) in totals.items()
+        ])
+
+    @classmethod
+    def rebuild(cls, since=None):
+        """Recompute rollup rows from audit_log (all days, or days >= ``since``).
+
+        Days older than the oldest raw event are left alone: their events have
+        been archived (see app.services.audit_archive) and the rollup is the
+        only remaining summary of them.
+
+        Returns the number of rollup rows written. The caller commits.
+        """
+        oldest = db.session.query(func.min(AuditLog.event_timestamp)).scalar()
+        if oldest is None:
+            return 0
+        since = max(since, oldest.date()) if since is not None else oldest.date()
+        amount = func.coalesce(AuditLog.amount, 0)
+        day = func.date(AuditLog.event_timestamp)
+        source = (
+            db.select(
+                func.coalesce(AuditLog.character_id, 0),
+                func.coalesce(AuditLog.user_id, 0),
+                AuditLog.event_type,
+                day,
+                func.sum(amount),
+                func.sum(case((amount > 0, amount), else_=0)),
+                func.count(AuditLog.id)
+            )
+            .group_by(AuditLog.character_id, AuditLog.user_id, AuditLog.event_type, day)
+        )
+        source = source.where(AuditLog.event_timestamp >= datetime.combine(since, datetime.min.time()))
+        db.session.execute(cls.__table__.delete().where(cls.day >= since))
+        result = db.session.execute(
+            cls.__table__.insert().from_select(
+                ['character_id', 'user_id', 'event_type', 'day',
+                 'total_amount', 'positive_amount', 'event_count'],
+                source
+            )
+        )
+        return result.rowcount
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_audit_rollup(session, flush_context):
+    """Fold newly inserted AuditLog rows into audit_daily_rollup.
+
+    Runs inside the flush, so the rollup is written in the same transaction as
+    the events themselves (AuditLog.log_event, Reward.distribute, or any other
+    ``session.add(AuditLog(...))``).
+    """
+    logs = [obj for obj in session.new if isinstance(obj, AuditLog)]
+    if logs:
+        AuditDailyRollup.apply(session.connection(), logs)
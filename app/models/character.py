@@ -129,54 +129,24 @@ class Character(Base):
             Equipment.type == 'accessory'
         ).first()
 
+    def stat_snapshot(self):
+        """Base stats plus equipment and status-effect bonuses (cached, see app.services.character_stats)."""
+        from app.services.character_stats import character_stat_cache
+        return character_stat_cache.snapshot(self)
+
+    # Totals include ALL equipped items (all slots: MAIN_HAND, OFF_HAND, HEAD, CHEST, LEGS, FEET, NECK, RING)
+    # and active status effects
     @property
     def total_health(self):
-        bonus = 0
-        # Sum bonuses from ALL equipped items (all slots: MAIN_HAND, OFF_HAND, HEAD, CHEST, LEGS, FEET, NECK, RING)
-        for item in self.inventory_items.filter_by(is_equipped=True):
-            if item and item.equipment and hasattr(item.equipment, 'health_bonus'):
-                bonus += item.equipment.health_bonus
-        # Add active status effects
-        now = datetime.now(timezone.utc).replace(tzinfo=None)
-        effect_bonus = sum(
-            effect.amount for effect in self.status_effects.filter(
-                StatusEffect.stat_affected == 'health',
-                StatusEffect.expires_at > now
-            )
-        )
-        return self.health + bonus + effect_bonus
+        return self.stat_snapshot().total_health
 
     @property
     def total_power(self):
-        bonus = 0
-        # Sum bonuses from ALL equipped items (all slots: MAIN_HAND, OFF_HAND, HEAD, CHEST, LEGS, FEET, NECK, RING)
-        for item in self.inventory_items.filter_by(is_equipped=True):
-            if item and item.equipment and hasattr(item.equipment, 'power_bonus'):
-                bonus += item.equipment.power_bonus
-        now = datetime.now(timezone.utc).replace(tzinfo=None)
-        effect_bonus = sum(
-            effect.amount for effect in self.status_effects.filter(
-                StatusEffect.stat_affected == 'power',
-                StatusEffect.expires_at > now
-            )
-        )
-        return self.power + bonus + effect_bonus
+        return self.stat_snapshot().total_power
 
     @property
     def total_defense(self):
-        bonus = 0
-        # Sum bonuses from ALL equipped items (all slots: MAIN_HAND, OFF_HAND, HEAD, CHEST, LEGS, FEET, NECK, RING)
-        for item in self.inventory_items.filter_by(is_equipped=True):
-            if item and item.equipment and hasattr(item.equipment, 'defense_bonus'):
-                bonus += item.equipment.defense_bonus
-        now = datetime.now(timezone.utc).replace(tzinfo=None)
-        effect_bonus = sum(
-            effect.amount for effect in self.status_effects.filter(
-                StatusEffect.stat_affected == 'defense',
-                StatusEffect.expires_at > now
-            )
-        )
-        return self.defense + bonus + effect_bonus
+        return self.stat_snapshot().total_defense
 
     def to_dict(self):
         return {
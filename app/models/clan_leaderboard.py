@@ -0,0 +1,27 @@
+from app.models.base import Base
+from app.models import db
+
+
+class ClanLeaderboardEntry(Base):
+    """Materialized clan leaderboard: one ranked row per clan, grouped by class.
+
+    Rows are written by app.services.clan_leaderboard (the clan metrics job
+    and XP changes), so reading a class leaderboard is a single indexed query
+    instead of recomputing every clan's metrics.
+    """
+    __tablename__ = 'clan_leaderboard'
+
+    id = db.Column(db.Integer, primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('classrooms.id', ondelete='CASCADE'), nullable=False)
+    clan_id = db.Column(db.Integer, db.ForeignKey('clans.id', ondelete='CASCADE'), nullable=False, unique=True)
+    rank = db.Column(db.Integer, nullable=False)
+    total_points = db.Column(db.Integer, nullable=False, default=0)
+    avg_completion_rate = db.Column(db.Float, nullable=False, default=0.0)
+    percentile_rank = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('idx_clan_leaderboard_class_rank', 'class_id', 'rank'),
+    )
+
+    def __repr__(self):
+        return f'<ClanLeaderboardEntry class_id={self.class_id} clan_id={self.clan_id} rank={self.rank}>'
@@ -4,6 +4,9 @@ from datetime import datetime
 
 class ClanProgressHistory(Base):
     __tablename__ = 'clan_progress_history'
+    __table_args__ = (
+        db.Index('idx_clan_progress_clan_time', 'clan_id', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     clan_id = db.Column(db.Integer, db.ForeignKey('clans.id', ondelete='CASCADE'), nullable=False)
@@ -36,4 +39,77 @@ class ClanProgressHistory(Base):
             "quest_completion_rate": self.quest_completion_rate,
             "avg_member_level": self.avg_member_level,
             "percentile_rank": self.percentile_rank,
-        } 
\ No newline at end of file
+        }
+
+
+class ClanMetricTotals(db.Model):
+    """Running per-clan sums behind the clan metrics.
+
+    Kept up to date by app.services.clan_metrics as member XP, levels,
+    characters and quest logs change, and reconciled from scratch by the
+    daily metrics job. Averages and rates are derived on read:
+    avg_member_level = level_sum / character_count,
+    quest_completion_rate = quests_completed / quests_assigned and
+    avg_completion_rate = completion_rate_sum / rated_members (the mean of
+    the completion rates of members that have quests).
+    """
+    __tablename__ = 'clan_metric_totals'
+
+    clan_id = db.Column(db.Integer, db.ForeignKey('clans.id', ondelete='CASCADE'), primary_key=True)
+    total_points = db.Column(db.Integer, nullable=False, default=0)
+    level_sum = db.Column(db.Integer, nullable=False, default=0)
+    character_count = db.Column(db.Integer, nullable=False, default=0)
+    quests_assigned = db.Column(db.Integer, nullable=False, default=0)
+    quests_completed = db.Column(db.Integer, nullable=False, default=0)
+    completion_rate_sum = db.Column(db.Float, nullable=False, default=0.0)
+    rated_members = db.Column(db.Integer, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ClanMetricTotals clan_id={self.clan_id} total_points={self.total_points}>'
+
+
+class ClanProgressRollup(db.Model):
+    """Downsampled ClanProgressHistory: min/max/avg per clan and week or month.
+
+    Raw history rows are kept for recent days only; app.services.clan_history
+    rolls older rows into weekly buckets and old weekly buckets into monthly
+    ones. ``bucket_start`` is the Monday (week) or first day (month) of the
+    bucket and ``samples`` the number of raw rows folded into it.
+    """
+    __tablename__ = 'clan_progress_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('clan_id', 'resolution', 'bucket_start', name='uq_clan_progress_rollup_bucket'),
+        db.Index('idx_clan_progress_rollup_clan', 'clan_id', 'bucket_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    clan_id = db.Column(db.Integer, db.ForeignKey('clans.id', ondelete='CASCADE'), nullable=False)
+    resolution = db.Column(db.String(8), nullable=False)  # 'week' or 'month'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+
+    avg_completion_rate_min = db.Column(db.Float, nullable=True)
+    avg_completion_rate_max = db.Column(db.Float, nullable=True)
+    avg_completion_rate_avg = db.Column(db.Float, nullable=True)
+    total_points_min = db.Column(db.Float, nullable=True)
+    total_points_max = db.Column(db.Float, nullable=True)
+    total_points_avg = db.Column(db.Float, nullable=True)
+    active_members_min = db.Column(db.Float, nullable=True)
+    active_members_max = db.Column(db.Float, nullable=True)
+    active_members_avg = db.Column(db.Float, nullable=True)
+    avg_daily_points_min = db.Column(db.Float, nullable=True)
+    avg_daily_points_max = db.Column(db.Float, nullable=True)
+    avg_daily_points_avg = db.Column(db.Float, nullable=True)
+    quest_completion_rate_min = db.Column(db.Float, nullable=True)
+    quest_completion_rate_max = db.Column(db.Float, nullable=True)
+    quest_completion_rate_avg = db.Column(db.Float, nullable=True)
+    avg_member_level_min = db.Column(db.Float, nullable=True)
+    avg_member_level_max = db.Column(db.Float, nullable=True)
+    avg_member_level_avg = db.Column(db.Float, nullable=True)
+    percentile_rank_min = db.Column(db.Float, nullable=True)
+    percentile_rank_max = db.Column(db.Float, nullable=True)
+    percentile_rank_avg = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<ClanProgressRollup clan_id={self.clan_id} {self.resolution} {self.bucket_start}>'
@@ -1,6 +1,4 @@
 import sqlite3
-import threading
-import time
 import os
 from flask import current_app
 
@@ -29,9 +27,13 @@ def check_db_version(app):
         print(f'[DB Version Check] Error: {e}')
 
 
-def run_integrity_check():
+def run_integrity_check(db_path=None):
+    """
+    Run PRAGMA integrity_check on a SQLite database file (default: DB_PATH).
+    Returns the first result row ('ok' when intact), or None if the check could not run.
+    """
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with sqlite3.connect(db_path or DB_PATH) as conn:
             cur = conn.cursor()
             cur.execute('PRAGMA integrity_check')
             result = cur.fetchone()
@@ -39,17 +41,7 @@ def run_integrity_check():
                 print(f'[DB Integrity Check] WARNING: Integrity check failed: {result[0]}')
             else:
                 print('[DB Integrity Check] Database integrity OK.')
+            return result[0] if result else None
     except Exception as e:
         print(f'[DB Integrity Check] Error: {e}')
-
-
-def start_weekly_integrity_check(app):
-    """
-    Start a background thread that runs PRAGMA integrity_check every 7 days.
-    """
-    def loop():
-        while True:
-            run_integrity_check()
-            time.sleep(7 * 24 * 60 * 60)  # 7 days
-    t = threading.Thread(target=loop, daemon=True)
-    t.start() 
\ No newline at end of file
+        return None
@@ -1,6 +1,7 @@
 from app.models.base import Base
 from datetime import datetime
 from enum import Enum
+from sqlalchemy import event, inspect
 
 class EquipmentType(Enum):
     WEAPON = 'weapon'
@@ -72,6 +73,7 @@ class Inventory(Base):
     __table_args__ = (
         db.Index('idx_inventory_character', 'character_id'),  # For looking up character's inventory
         db.Index('idx_inventory_equipped', 'character_id', 'is_equipped'),  # For equipped items
+        db.Index('uq_inventory_character_item', 'character_id', 'item_id', unique=True),  # Can't own the same item twice
     )
     
     def __init__(self, character_id, item_id, **kwargs):
@@ -116,4 +118,77 @@ class Inventory(Base):
 # Default image filenames for test items
 TEST_ARMOR_IMAGE = '/static/images/test_armor.png'
 TEST_RING_IMAGE = '/static/images/test_ring.png'
-TEST_SWORD_IMAGE = '/static/images/test_sword.png' 
\ No newline at end of file
+TEST_SWORD_IMAGE = '/static/images/test_sword.png' 
+
+class CatalogVersion(Base):
+    """Change marker for the item catalog (equipment and abilities).
+
+    On SQLite and PostgreSQL, triggers on the equipment and abilities
+    tables bump the version in the same transaction as every write,
+    whichever path made it (ORM flushes, bulk and raw SQL statements,
+    seeding scripts, other processes; also TRUNCATE on PostgreSQL). On
+    other databases the item catalog service bumps it for writes made
+    through the ORM session. ``token`` is random per database, so a
+    snapshot loaded from one database never matches another's version.
+    """
+
+    __tablename__ = 'catalog_versions'
+
+    from app.models import db
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    token = db.Column(db.String(32), nullable=True)
+
+
+CATALOG_NAME = 'items'
+CATALOG_TABLES = ('equipment', 'abilities')
+CATALOG_TRIGGER_DIALECTS = ('sqlite', 'postgresql')
+
+
+def catalog_trigger_statements(dialect_name):
+    """DDL creating the triggers that bump the catalog version (empty if unsupported)."""
+    if dialect_name == 'sqlite':
+        return [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_catalog_{operation.lower()} AFTER {operation} ON {table}
+            BEGIN
+                INSERT INTO catalog_versions (name, version, token, created_at, updated_at)
+                VALUES ('{CATALOG_NAME}', 1, lower(hex(randomblob(16))), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            END
+            """
+            for table in CATALOG_TABLES
+            for operation in ('INSERT', 'UPDATE', 'DELETE')
+        ]
+    if dialect_name == 'postgresql':
+        return [
+            f"""
+            CREATE OR REPLACE FUNCTION bump_item_catalog_version() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO catalog_versions (name, version, token, created_at, updated_at)
+                VALUES ('{CATALOG_NAME}', 1, md5(random()::text || clock_timestamp()::text), now(), now())
+                ON CONFLICT (name) DO UPDATE SET version = catalog_versions.version + 1, updated_at = now();
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            *(
+                f"""
+                DROP TRIGGER IF EXISTS {table}_catalog_changed ON {table};
+                CREATE TRIGGER {table}_catalog_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_item_catalog_version()
+                """
+                for table in CATALOG_TABLES
+            ),
+        ]
+    return []
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def _create_catalog_triggers(target, connection, **kw):
+    # After every table exists; migrations create the same triggers
+    inspector = inspect(connection)
+    if not all(inspector.has_table(name) for name in (*CATALOG_TABLES, CatalogVersion.__tablename__)):
+        return
+    for statement in catalog_trigger_statements(connection.dialect.name):
+        connection.exec_driver_sql(statement)
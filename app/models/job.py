@@ -0,0 +1,108 @@
+from app.models.base import Base
+from app.models import db
+from enum import Enum
+
+
+class JobStatus(str, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+
+class BackgroundJob(Base):
+    """A unit of work run by app.services.job_runner.
+
+    The table doubles as the queue: workers claim a job by atomically moving
+    it from ``queued`` to ``running``, so several processes on one box can
+    share it without a broker.
+    """
+    __tablename__ = 'background_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(16), nullable=False, default=JobStatus.QUEUED.value)
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    progress_message = db.Column(db.String(255), nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_background_jobs_status', 'status', 'id'),
+        db.Index('idx_background_jobs_user', 'user_id', 'created_at'),
+    )
+
+    @property
+    def is_finished(self):
+        return self.status in (JobStatus.SUCCEEDED.value, JobStatus.FAILED.value)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.job_type} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress': self.progress,
+            'progress_message': self.progress_message,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class ScheduledJob(Base):
+    """A periodic job run by app.services.scheduler.
+
+    One row per registered schedule. ``next_run_at`` survives restarts, so a
+    run missed while no worker was up happens as soon as one starts. A
+    worker claims a due run by atomically taking the lease (``lease_owner``
+    / ``lease_expires_at``) and moving ``next_run_at`` on, so exactly one
+    process runs it even when every gunicorn worker runs the scheduler; a
+    lease left by a crashed worker expires after ``lease_seconds``.
+    """
+    __tablename__ = 'scheduled_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False, unique=True)
+    interval_seconds = db.Column(db.Integer, nullable=False)
+    lease_seconds = db.Column(db.Integer, nullable=False, default=3600)
+    next_run_at = db.Column(db.DateTime, nullable=False)
+    lease_owner = db.Column(db.String(128), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_finished_at = db.Column(db.DateTime, nullable=True)
+    last_status = db.Column(db.String(16), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    last_duration = db.Column(db.Float, nullable=True)
+    max_duration = db.Column(db.Float, nullable=True)
+    total_duration = db.Column(db.Float, nullable=False, default=0.0)
+    run_count = db.Column(db.Integer, nullable=False, default=0)
+    failure_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ScheduledJob {self.name} next={self.next_run_at}>'
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'interval_seconds': self.interval_seconds,
+            'next_run_at': self.next_run_at.isoformat() if self.next_run_at else None,
+            'running': self.lease_owner is not None,
+            'lease_owner': self.lease_owner,
+            'last_started_at': self.last_started_at.isoformat() if self.last_started_at else None,
+            'last_finished_at': self.last_finished_at.isoformat() if self.last_finished_at else None,
+            'last_status': self.last_status,
+            'last_error': self.last_error,
+            'last_duration': self.last_duration,
+            'avg_duration': self.total_duration / self.run_count if self.run_count else None,
+            'max_duration': self.max_duration,
+            'run_count': self.run_count,
+            'failure_count': self.failure_count,
+        }
@@ -378,7 +378,10 @@ class Reward(Base):
                         'quest_id': self.quest_id
                     },
                     user_id=user_id,
-                    character_id=character.id
+                    character_id=character.id,
+                    amount=self.amount,
+                    old_value=old_experience,
+                    new_value=character.experience
                 )
                 session.add(audit_log)
             except Exception as e:
@@ -411,7 +414,10 @@ class Reward(Base):
                             'quest_id': self.quest_id
                         },
                         user_id=user_id,
-                        character_id=character.id
+                        character_id=character.id,
+                        amount=levels_gained,
+                        old_value=old_level,
+                        new_value=character.level
                     )
                     session.add(audit_log)
                 except Exception as e:
@@ -437,19 +443,26 @@ class Reward(Base):
                         'quest_id': self.quest_id
                     },
                     user_id=user_id,
-                    character_id=character.id
+                    character_id=character.id,
+                    amount=self.amount,
+                    old_value=old_gold,
+                    new_value=character.gold
                 )
                 session.add(audit_log)
             except Exception as e:
                 logger.warning(f"Failed to log gold transaction to AuditLog: {str(e)}", exc_info=True)
         elif self.type == RewardType.EQUIPMENT and self.item_id:
             from app.models.equipment import Inventory
-            inventory = Inventory(
-                character_id=character.id,
-                item_id=self.item_id
-            )
-            session.add(inventory)
-            logger.debug(f"Added equipment {self.item_id} to character {character.id} inventory")
+            # Inventory rows are unique per (character, item); an item already owned is not granted again
+            if session.query(Inventory.id).filter_by(character_id=character.id, item_id=self.item_id).first():
+                logger.debug(f"Character {character.id} already owns equipment {self.item_id}")
+            else:
+                inventory = Inventory(
+                    character_id=character.id,
+                    item_id=self.item_id
+                )
+                session.add(inventory)
+                logger.debug(f"Added equipment {self.item_id} to character {character.id} inventory")
         elif self.type == RewardType.ABILITY and self.ability_id:
             from app.models.ability import CharacterAbility
             char_ability = CharacterAbility(
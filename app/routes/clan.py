@@ -1,8 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, current_user
-from app.models.clan import Clan
-from app.models.clan_progress import ClanProgressHistory
-from app.services.clan_metrics import calculate_clan_metrics, calculate_percentile_rankings
+from app.services.clan_metrics import calculate_clan_metrics
+from app.services.clan_leaderboard import get_clan_leaderboard
+from app.services.clan_history import HISTORY_METRICS, load_clan_history, parse_history_args
+from app.services.leaderboard_index import leaderboard_index
 from app import db
 from datetime import datetime, timedelta
 
@@ -20,63 +21,85 @@ def get_clan_metrics(clan_id):
 @jwt_required()
 def get_clan_history(clan_id):
     days = request.args.get('days', 30, type=int)
+    try:
+        resolution, max_points = parse_history_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     cutoff = datetime.utcnow() - timedelta(days=days)
-    history = ClanProgressHistory.query.filter(
-        ClanProgressHistory.clan_id == clan_id,
-        ClanProgressHistory.timestamp >= cutoff
-    ).order_by(ClanProgressHistory.timestamp).all()
-    return jsonify([
-        {
-            'timestamp': h.timestamp.isoformat(),
-            'avg_completion_rate': h.avg_completion_rate,
-            'total_points': h.total_points,
-            'active_members': h.active_members,
-            'avg_daily_points': h.avg_daily_points,
-            'quest_completion_rate': h.quest_completion_rate,
-            'avg_member_level': h.avg_member_level,
-            'percentile_rank': h.percentile_rank
-        } for h in history
-    ])
+    return jsonify(load_clan_history([clan_id], cutoff, resolution, max_points)[clan_id])
 
 @clan_api.route('/classes/<int:class_id>/clan-leaderboard', methods=['GET'])
 @jwt_required()
 def get_clan_leaderboard_for_class(class_id):
     # Optionally: check current_user has access to this class
-    percentiles = calculate_percentile_rankings(class_id=class_id)
-    clans = Clan.query.filter_by(class_id=class_id).all()
-    leaderboard = []
-    for clan in clans:
-        metrics = calculate_clan_metrics(clan.id)
-        latest = ClanProgressHistory.query.filter_by(clan_id=clan.id).order_by(ClanProgressHistory.timestamp.desc()).first()
-        leaderboard.append({
-            'id': clan.id,
-            'name': clan.name,
-            'total_points': metrics['total_points'] if metrics else 0,
-            'avg_completion_rate': metrics['avg_completion_rate'] if metrics else 0,
-            'percentile_rank': percentiles.get(clan.id, 0),
-            'rank': None  # Will be set after sorting
-        })
-    # Sort by total_points descending
-    leaderboard.sort(key=lambda x: x['total_points'], reverse=True)
-    for idx, entry in enumerate(leaderboard):
-        entry['rank'] = idx + 1
-    return jsonify({'clans': leaderboard})
+    response = jsonify({'clans': get_clan_leaderboard(class_id)})
+    # Polling clients revalidate with If-None-Match and get a 304 until the ranking changes
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @clan_api.route('/clans/<int:clan_id>/trend-data', methods=['GET'])
 @jwt_required()
 def get_clan_trend_data(clan_id):
     days = request.args.get('days', 30, type=int)
     metric = request.args.get('metric', 'total_points')
+    if metric not in HISTORY_METRICS:
+        return jsonify({'error': f'Unknown metric: {metric}'}), 400
+    try:
+        resolution, max_points = parse_history_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     cutoff = datetime.utcnow() - timedelta(days=days)
-    history = ClanProgressHistory.query.filter(
-        ClanProgressHistory.clan_id == clan_id,
-        ClanProgressHistory.timestamp >= cutoff
-    ).order_by(ClanProgressHistory.timestamp).all()
+    history = load_clan_history([clan_id], cutoff, resolution, max_points)[clan_id]
     return jsonify({
-        'labels': [h.timestamp.strftime('%Y-%m-%d') for h in history],
-        'data': [getattr(h, metric, None) for h in history]
+        'labels': [h['timestamp'][:10] for h in history],
+        'data': [h[metric] for h in history],
+        'min': [h['min'][metric] if 'min' in h else h[metric] for h in history],
+        'max': [h['max'][metric] if 'max' in h else h[metric] for h in history]
     })
 
+MAX_LEADERBOARD_LIMIT = 100
+
+def _leaderboard_limit():
+    limit = request.args.get('limit', 10, type=int)
+    if limit is None or not 1 <= limit <= MAX_LEADERBOARD_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LEADERBOARD_LIMIT}")
+    return limit
+
+@clan_api.route('/classes/<int:class_id>/leaderboard', methods=['GET'])
+@jwt_required()
+def get_class_live_leaderboard(class_id):
+    """Top characters and clans of a class from the live leaderboard index."""
+    try:
+        limit = _leaderboard_limit()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'characters': leaderboard_index.top_characters(class_id=class_id, limit=limit),
+        'clans': leaderboard_index.top_clans(class_id, limit=limit)
+    })
+
+@clan_api.route('/clans/<int:clan_id>/leaderboard', methods=['GET'])
+@jwt_required()
+def get_clan_live_leaderboard(clan_id):
+    """Top characters of a clan and the clan's rank in its class."""
+    try:
+        limit = _leaderboard_limit()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    clan = leaderboard_index.clan_rank(clan_id)
+    if clan is None:
+        return jsonify({'error': 'Clan not found'}), 404
+    return jsonify({'clan': clan, 'characters': leaderboard_index.top_characters(clan_id=clan_id, limit=limit)})
+
+@clan_api.route('/characters/<int:character_id>/rank', methods=['GET'])
+@jwt_required()
+def get_character_rank(character_id):
+    rank = leaderboard_index.character_rank(character_id)
+    if rank is None:
+        return jsonify({'error': 'Character not found'}), 404
+    return jsonify(rank)
+
 # To use: register clan_api blueprint in your app factory or main app
 # from app.routes.clan import clan_api
 # app.register_blueprint(clan_api) 
\ No newline at end of file
@@ -7,6 +7,7 @@ from app.models.user import User
 from app.models.audit import AuditLog
 from app.routes.teacher.blueprint import student_required
 from app.services.abilities import apply_ability_usage
+from app.services.student_context import get_student_context
 
 bp = Blueprint('student_abilities', __name__, url_prefix='/student/abilities')
 
@@ -20,8 +21,7 @@ def use_ability():
     context = data.get('context', 'general')
 
     # Get the student's active character
-    student = current_user.student_profile
-    character = Character.query.filter_by(student_id=student.id, is_active=True).first()
+    character = get_student_context().character
     if not character:
         return jsonify({'success': False, 'message': 'No active character found.'}), 400
 
@@ -66,11 +66,11 @@ def ability_history():
     """Get ability usage history for the current student's character."""
     from datetime import datetime, timedelta
     
-    student = current_user.student_profile
-    if not student:
+    context = get_student_context()
+    if not context.student:
         return jsonify({'success': False, 'message': 'No student profile found.'}), 400
     
-    character = Character.query.filter_by(student_id=student.id, is_active=True).first()
+    character = context.character
     if not character:
         return jsonify({'success': False, 'message': 'No active character found.'}), 400
     
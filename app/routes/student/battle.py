@@ -1,11 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from flask_login import login_required, current_user
+from flask_login import login_required
 from app.models import db
 from app.models.battle import Monster, Battle, BattleStatus
 from app.models.education import QuestionSet, Question
-from app.models.student import Student
 from app.models.character import Character
 from app.routes.student_main import student_required
+from app.services.item_catalog import item_catalog
+from app.services.student_context import get_student_context
 import random
 import json
 import time
@@ -17,12 +18,13 @@ student_battle_bp = Blueprint('student_battle', __name__, url_prefix='/student/b
 @student_required
 def arena():
     """Battle arena dashboard - select monster and question set."""
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
+    context = get_student_context()
+    student_profile = context.student
     if not student_profile:
         flash('Student profile not found.', 'danger')
         return redirect(url_for('student.dashboard'))
     
-    character = student_profile.characters.filter_by(is_active=True).first()
+    character = context.character
     if not character:
         flash('You need to create a character first.', 'warning')
         return redirect(url_for('student.character_create'))
@@ -51,12 +53,13 @@ def arena():
 @student_required
 def start_battle():
     """Initialize a new battle."""
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
+    context = get_student_context()
+    student_profile = context.student
     if not student_profile:
         flash('Student profile not found.', 'danger')
         return redirect(url_for('student.dashboard'))
     
-    character = student_profile.characters.filter_by(is_active=True).first()
+    character = context.character
     if not character:
         flash('You need to create a character first.', 'warning')
         return redirect(url_for('student.character_create'))
@@ -99,11 +102,13 @@ def start_battle():
 @student_required
 def fight(battle_id):
     """Battle interface - show current battle state and question."""
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
+    context = get_student_context()
+    student_profile = context.student
     if not student_profile:
         flash('Student profile not found.', 'danger')
         return redirect(url_for('student.dashboard'))
     
+    character = context.character
     battle = Battle.query.filter_by(id=battle_id, student_id=student_profile.id).first_or_404()
     
     # If battle is over, redirect to results
@@ -121,20 +126,19 @@ def fight(battle_id):
     # Get equipped abilities for battle context
     equipped_abilities = []
     if character:
-        from app.models.ability import CharacterAbility
-        equipped_abilities = [
-            {
-                'id': ca.ability.id,
-                'name': ca.ability.name,
-                'type': ca.ability.type,
-                'description': ca.ability.description,
-                'power': ca.ability.power,
-                'cooldown': ca.ability.cooldown,
-                'duration': ca.ability.duration,
+        catalog = item_catalog.snapshot()
+        for ca in character.abilities.filter_by(is_equipped=True).all():
+            ability = catalog.get_ability(ca.ability_id) or ca.ability
+            equipped_abilities.append({
+                'id': ability.id,
+                'name': ability.name,
+                'type': ability.type,
+                'description': ability.description,
+                'power': ability.power,
+                'cooldown': ability.cooldown,
+                'duration': ability.duration,
                 'last_used_at': ca.last_used_at.isoformat() if ca.last_used_at else None,
-            }
-            for ca in character.abilities.filter_by(is_equipped=True).all()
-        ]
+            })
     
     now = int(time.time())
     return render_template('student/battle/fight.html',
@@ -150,11 +154,12 @@ def fight(battle_id):
 @student_required
 def attack(battle_id):
     """Process answer and calculate damage."""
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
+    context = get_student_context()
+    student_profile = context.student
     if not student_profile:
         return jsonify({'success': False, 'message': 'Student profile not found'}), 400
     
-    character = student_profile.characters.filter_by(is_active=True).first()
+    character = context.character
     battle = Battle.query.filter_by(id=battle_id, student_id=student_profile.id).first_or_404()
     
     if battle.status != BattleStatus.ACTIVE:
@@ -243,7 +248,7 @@ def attack(battle_id):
 @student_required
 def flee(battle_id):
     """Flee from battle."""
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
+    student_profile = get_student_context().student
     battle = Battle.query.filter_by(id=battle_id, student_id=student_profile.id).first_or_404()
     
     if battle.status == BattleStatus.ACTIVE:
@@ -258,7 +263,7 @@ def flee(battle_id):
 @student_required
 def results(battle_id):
     """Show battle results."""
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
+    student_profile = get_student_context().student
     battle = Battle.query.filter_by(id=battle_id, student_id=student_profile.id).first_or_404()
     
     return render_template('student/battle/results.html',
@@ -3,16 +3,17 @@ from flask_login import login_required, current_user
 from .teacher import student_required
 from app.models import db
 from app.models.character import Character
-from app.models.equipment import Inventory, Equipment, EquipmentType, EquipmentSlot, TEST_ARMOR_IMAGE, TEST_RING_IMAGE, TEST_SWORD_IMAGE
-from app.models.student import Student
-from app.models.ability import Ability, CharacterAbility
-from app.models.shop import ShopPurchase, PurchaseType
+from app.models.equipment import Inventory, EquipmentType, EquipmentSlot, TEST_ARMOR_IMAGE, TEST_RING_IMAGE, TEST_SWORD_IMAGE
+from app.models.ability import CharacterAbility
+from app.models.shop import PurchaseType
 from app.models.quest import Quest, QuestLog, QuestStatus
-from app.models.audit import AuditLog, EventType
+from app.models.audit import AuditLog
 from app.models.achievement_badge import AchievementBadge
-from app.models.shop_config import ShopItemOverride
-from datetime import datetime, timedelta
-from collections import defaultdict
+from app.services.item_catalog import item_catalog
+from app.services.shop_catalog import classroom_shop_cache
+from app.services.shop_purchase import PurchaseError, purchase_item
+from app.services.progress_timeline import progress_timeline_service
+from app.services.student_context import get_student_context, invalidate_student_context
 import time
 import logging
 
@@ -25,12 +26,11 @@ student_bp = Blueprint('student', __name__, url_prefix='/student')
 @student_required
 def dashboard():
     """Student dashboard main view."""
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
+    context = get_student_context()
+    student_profile = context.student
     classes = list(getattr(current_user, 'classes', []))
-    main_character = None
-    if student_profile:
-        main_character = student_profile.characters.filter_by(is_active=True).first()
-    clan = main_character.clan if main_character and main_character.clan else None
+    main_character = context.character
+    clan = context.clan
     active_quests = main_character.quest_logs.filter_by(status='in_progress').all() if main_character else []
     try:
         recent_activities = list(current_user.audit_logs.order_by(db.desc('event_timestamp')).limit(10))
@@ -65,8 +65,7 @@ def profile():
 @student_required
 def quests():
     try:
-        student_profile = Student.query.filter_by(user_id=current_user.id).first()
-        main_char = student_profile.characters.filter_by(is_active=True).first() if student_profile else None
+        main_char = get_student_context().character
         assigned_quests = []
         equipped_abilities = []
         ability_targets = []
@@ -82,19 +81,20 @@ def quests():
                     'log': log
                 })
             # Get equipped abilities for quest context
-            equipped_abilities = [
-                {
-                    'id': ca.ability.id,
-                    'name': ca.ability.name,
-                    'type': ca.ability.type,
-                    'description': ca.ability.description,
-                    'power': ca.ability.power,
-                    'cooldown': ca.ability.cooldown,
-                    'duration': ca.ability.duration,
+            catalog = item_catalog.snapshot()
+            equipped_abilities = []
+            for ca in main_char.abilities.filter_by(is_equipped=True).all():
+                ability = catalog.get_ability(ca.ability_id) or ca.ability
+                equipped_abilities.append({
+                    'id': ability.id,
+                    'name': ability.name,
+                    'type': ability.type,
+                    'description': ability.description,
+                    'power': ability.power,
+                    'cooldown': ability.cooldown,
+                    'duration': ability.duration,
                     'last_used_at': ca.last_used_at.isoformat() if ca.last_used_at else None,
-                }
-                for ca in main_char.abilities.filter_by(is_equipped=True).all()
-            ]
+                })
             # Get ability targets (clanmates)
             if main_char.clan:
                 ability_targets = [
@@ -113,8 +113,7 @@ def quests():
 @student_required
 def start_quest(quest_id):
     try:
-        student_profile = Student.query.filter_by(user_id=current_user.id).first()
-        main_char = student_profile.characters.filter_by(is_active=True).first() if student_profile else None
+        main_char = get_student_context().character
         quest = Quest.query.get_or_404(quest_id)
         if not main_char:
             flash('No active character found.', 'danger')
@@ -150,8 +149,7 @@ def start_quest(quest_id):
 @login_required
 @student_required
 def complete_quest(quest_id):
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    main_char = student_profile.characters.filter_by(is_active=True).first() if student_profile else None
+    main_char = get_student_context().character
     if not main_char:
         flash('No active character found.', 'danger')
         return redirect(url_for('student.quests'))
@@ -194,41 +192,38 @@ def character():
         from datetime import datetime, timezone
         from app.models.character import StatusEffect
         
-        student_profile = Student.query.filter_by(user_id=current_user.id).first()
-        main_character = None
+        main_character = get_student_context().character
         equipped_abilities = []
         active_status_effects = []
-        if student_profile:
-            main_character = student_profile.characters.filter_by(is_active=True).first()
-            if main_character:
-                equipped_abilities = [
-                    {
-                        'id': ca.ability.id,
-                        'name': ca.ability.name,
-                        'type': ca.ability.type,
-                        'description': ca.ability.description,
-                        'power': ca.ability.power,
-                        'cooldown': ca.ability.cooldown,
-                        'duration': ca.ability.duration,
-                        'last_used_at': ca.last_used_at.isoformat() if ca.last_used_at else None,
-                        'is_equipped': ca.is_equipped
-                    }
-                    for ca in main_character.abilities.filter_by(is_equipped=True).all()
-                ]
-                # Get active status effects
-                now = datetime.now(timezone.utc).replace(tzinfo=None)
-                active_effects = main_character.status_effects.filter(StatusEffect.expires_at > now).all()
-                active_status_effects = [
-                    {
-                        'effect_type': effect.effect_type,
-                        'stat_affected': effect.stat_affected,
-                        'amount': effect.amount,
-                        'source': effect.source,
-                        'expires_at': effect.expires_at,
-                        'remaining_minutes': max(0, int((effect.expires_at - now).total_seconds() / 60))
-                    }
-                    for effect in active_effects
-                ]
+        if main_character:
+            catalog = item_catalog.snapshot()
+            for ca in main_character.abilities.filter_by(is_equipped=True).all():
+                ability = catalog.get_ability(ca.ability_id) or ca.ability
+                equipped_abilities.append({
+                    'id': ability.id,
+                    'name': ability.name,
+                    'type': ability.type,
+                    'description': ability.description,
+                    'power': ability.power,
+                    'cooldown': ability.cooldown,
+                    'duration': ability.duration,
+                    'last_used_at': ca.last_used_at.isoformat() if ca.last_used_at else None,
+                    'is_equipped': ca.is_equipped
+                })
+            # Get active status effects
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            active_effects = main_character.status_effects.filter(StatusEffect.expires_at > now).all()
+            active_status_effects = [
+                {
+                    'effect_type': effect.effect_type,
+                    'stat_affected': effect.stat_affected,
+                    'amount': effect.amount,
+                    'source': effect.source,
+                    'expires_at': effect.expires_at,
+                    'remaining_minutes': max(0, int((effect.expires_at - now).total_seconds() / 60))
+                }
+                for effect in active_effects
+            ]
         now = int(time.time())
         ability_targets = []
         if main_character and main_character.clan:
@@ -247,110 +242,41 @@ def character():
 @student_required
 def shop():
     try:
-        student_profile = Student.query.filter_by(user_id=current_user.id).first()
-        main_character = None
+        context = get_student_context()
+        main_character = context.character
         owned_item_ids = set()
         owned_ability_ids = set()
-        if student_profile:
-            main_character = student_profile.characters.filter_by(is_active=True).first()
-            if main_character:
-                # Get owned item IDs
-                owned_item_ids = set(inv.item_id for inv in main_character.inventory_items)
-                # Get owned ability IDs
-                if hasattr(main_character, 'abilities'):
-                    owned_ability_ids = set(a.ability_id for a in main_character.abilities)
-        # Always define these, even if main_character is None
-        char_gold = main_character.gold if main_character else 0
-        char_level = main_character.level if main_character else 1
-        char_class = main_character.character_class if main_character else ''
-        # Query all items and abilities for the shop
-        items = Equipment.query.all()
-        ability_items = Ability.query.all()
-        logger.debug(f"Shop route: Equipment count={len(items)}, Ability count={len(ability_items)}")
-        # Query overrides for the student's active classroom
-        overrides_map = {}
-        if main_character and student_profile:
-            # Student has a direct relationship to one classroom via class_id
-            # Use student_profile.classroom (singular) instead of classes
-            active_class = student_profile.classroom
+        if main_character:
+            owned_item_ids = {
+                item_id for (item_id,) in
+                db.session.query(Inventory.item_id).filter(Inventory.character_id == main_character.id)
+            }
+            owned_ability_ids = {
+                ability_id for (ability_id,) in
+                db.session.query(CharacterAbility.ability_id).filter(CharacterAbility.character_id == main_character.id)
+            }
+        # Overrides apply to the student's active classroom (a student has one classroom via class_id)
+        classroom_id = None
+        if main_character:
+            active_class = context.classroom
             if active_class and active_class.is_active:
-                try:
-                    overrides = ShopItemOverride.query.filter_by(classroom_id=active_class.id).all()
-                    for ov in overrides:
-                        overrides_map[(ov.item_type, ov.item_id)] = ov
-                except Exception as e:
-                    # Handle case where shop_item_overrides table doesn't exist yet
-                    # This can happen if migrations haven't been run
-                    logger.warning(f"Could not query shop item overrides: {e}")
-                    overrides_map = {}
-
-        items_list = []
-        logger.debug(f"Shop route: Processing {len(items)} equipment items")
-        for eq in items:
-            # Apply Overrides
-            override = overrides_map.get(('equipment', eq.id))
-            effective_cost = override.override_cost if override and override.override_cost is not None else eq.cost
-            effective_level = override.override_level_req if override and override.override_level_req is not None else getattr(eq, 'level_requirement', 1)
-            visible = override.is_visible if override else True
-            
-            if not visible:
-                continue
-
-            owned = eq.id in owned_item_ids
-            can_afford = char_gold >= effective_cost
-            unlocked = (char_level >= effective_level) and (not eq.class_restriction or eq.class_restriction.lower() == char_class.lower())
-            can_buy = (not owned) and can_afford and unlocked
-            
-            items_list.append({
-                'id': eq.id,
-                'name': eq.name,
-                'price': effective_cost,
-                'original_price': eq.cost if effective_cost != eq.cost else None,
-                'image': eq.image_url or '/static/images/default_item.png',
-                'category': 'equipment',
-                'tier': getattr(eq, 'rarity', 1),
-                'description': eq.description or '',
-                'level_requirement': effective_level,
-                'original_level_requirement': getattr(eq, 'level_requirement', 1) if effective_level != getattr(eq, 'level_requirement', 1) else None,
-                'class_restriction': getattr(eq, 'class_restriction', None),
-                'owned': owned,
-                'can_afford': can_afford,
-                'unlocked': unlocked,
-                'can_buy': can_buy,
-            })
-        
-        for ab in ability_items:
-            # Apply Overrides
-            override = overrides_map.get(('ability', ab.id))
-            effective_cost = override.override_cost if override and override.override_cost is not None else ab.cost
-            effective_level = override.override_level_req if override and override.override_level_req is not None else getattr(ab, 'level_requirement', 1)
-            visible = override.is_visible if override else True
-            
-            if not visible:
-                continue
-
-            owned = ab.id in owned_ability_ids
-            can_afford = char_gold >= effective_cost
-            unlocked = (char_level >= effective_level)
-            can_buy = (not owned) and can_afford and unlocked
-            
-            items_list.append({
-                'id': ab.id,
-                'name': ab.name,
-                'price': effective_cost,
-                'original_price': ab.cost if effective_cost != ab.cost else None,
-                'image': '/static/images/default_item.png',
-                'category': 'ability',
-                'tier': getattr(ab, 'tier', 1),
-                'description': ab.description or '',
-                'level_requirement': effective_level,
-                'original_level_requirement': getattr(ab, 'level_requirement', 1) if effective_level != getattr(ab, 'level_requirement', 1) else None,
-                'class_restriction': None,
-                'owned': owned,
-                'can_afford': can_afford,
-                'unlocked': unlocked,
-                'can_buy': can_buy,
-            })
+                classroom_id = active_class.id
+        try:
+            classroom_shop = classroom_shop_cache.get(classroom_id)
+        except Exception as e:
+            # Handle case where shop_item_overrides table doesn't exist yet
+            # This can happen if migrations haven't been run
+            logger.warning(f"Could not load shop item overrides: {e}")
+            db.session.rollback()
+            classroom_shop = classroom_shop_cache.get(None)
+        logger.debug(f"Shop route: {len(classroom_shop.entries)} visible items for classroom {classroom_id}")
+        items_list = classroom_shop.items_for(
+            owned_item_ids,
+            owned_ability_ids,
+            gold=main_character.gold if main_character else 0,
+            level=main_character.level if main_character else 1,
+            character_class=main_character.character_class if main_character else ''
+        )
         
         return render_template('student/shop.html', student=current_user, main_character=main_character, items=items_list)
     except Exception as e:
@@ -363,10 +289,7 @@ def shop():
 @student_required
 def progress():
     """Student progress page with charts and statistics."""
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    main_character = None
-    if student_profile:
-        main_character = student_profile.characters.filter_by(is_active=True).first()
+    main_character = get_student_context().character
     
     # If no character, return empty data
     if not main_character:
@@ -383,192 +306,38 @@ def progress():
             recent_activities=[]
         )
     
-    # Get date range (last 90 days)
-    since = datetime.utcnow() - timedelta(days=90)
+    # XP, level, gold and quest series (one query, memoized per character)
+    try:
+        timeline = progress_timeline_service.get_timeline(main_character)
+    except Exception as e:
+        logger.error(f"Error building progress timeline: {str(e)}", exc_info=True)
+        timeline = {
+            'xp_chart_data': {'dates': [], 'xp': []},
+            'level_chart_data': {'dates': [], 'levels': []},
+            'gold_chart_data': {'dates': [], 'earned': [], 'spent': []},
+            'quest_stats': {
+                'total_completed': 0,
+                'total_quests': 0,
+                'completion_rate': 0,
+                'completion_timeline': {
+                    'dates': [],
+                    'counts': []
+                }
+            }
+        }
+    xp_chart_data = timeline['xp_chart_data']
+    level_chart_data = timeline['level_chart_data']
+    gold_chart_data = timeline['gold_chart_data']
+    quest_stats = timeline['quest_stats']
     
     # Summary statistics
     summary_stats = {
         'current_level': main_character.level,
         'total_xp': main_character.experience,
         'current_gold': main_character.gold,
-        'total_quests_completed': main_character.quest_logs.filter_by(status=QuestStatus.COMPLETED).count()
+        'total_quests_completed': quest_stats['total_completed']
     }
     
-    # XP Progression Chart Data
-    try:
-        xp_events = AuditLog.query.filter(
-            AuditLog.character_id == main_character.id,
-            AuditLog.event_type == EventType.XP_GAIN.value,
-            AuditLog.event_timestamp >= since
-        ).order_by(AuditLog.event_timestamp.asc()).all()
-        
-        xp_by_date = defaultdict(int)
-        cumulative_xp = 0
-        for event in xp_events:
-            try:
-                event_date = event.event_timestamp.date() if event.event_timestamp else datetime.utcnow().date()
-                amount = event.event_data.get('amount', 0) if isinstance(event.event_data, dict) else 0
-                cumulative_xp += amount
-                xp_by_date[event_date] = cumulative_xp
-            except (AttributeError, TypeError):
-                continue
-        
-        # Ensure we have initial state
-        if main_character.created_at:
-            try:
-                initial_date = main_character.created_at.date()
-                if initial_date not in xp_by_date:
-                    xp_by_date[initial_date] = 0
-            except (AttributeError, TypeError):
-                pass
-        
-        # Add current XP if not in history
-        today = datetime.utcnow().date()
-        if today not in xp_by_date:
-            xp_by_date[today] = main_character.experience
-        
-        xp_dates = sorted(xp_by_date.keys())
-        xp_values = [xp_by_date[d] for d in xp_dates]
-        
-        xp_chart_data = {
-            'dates': [d.strftime('%Y-%m-%d') for d in xp_dates],
-            'xp': xp_values
-        }
-    except Exception as e:
-        logger.error(f"Error processing XP chart data: {str(e)}", exc_info=True)
-        xp_chart_data = {'dates': [], 'xp': []}
-    
-    # Level Progression Timeline
-    try:
-        level_events = AuditLog.query.filter(
-            AuditLog.character_id == main_character.id,
-            AuditLog.event_type == EventType.LEVEL_UP.value
-        ).order_by(AuditLog.event_timestamp.asc()).all()
-        
-        level_by_date = {}
-        # Add initial level at character creation
-        if main_character.created_at:
-            try:
-                level_by_date[main_character.created_at.date()] = 1
-            except (AttributeError, TypeError):
-                pass
-        
-        for event in level_events:
-            try:
-                event_date = event.event_timestamp.date() if event.event_timestamp else datetime.utcnow().date()
-                level = event.event_data.get('level', main_character.level) if isinstance(event.event_data, dict) else main_character.level
-                level_by_date[event_date] = level
-            except (AttributeError, TypeError):
-                continue
-        
-        # Add current level
-        today = datetime.utcnow().date()
-        if today not in level_by_date:
-            level_by_date[today] = main_character.level
-        
-        level_dates = sorted(level_by_date.keys())
-        level_values = [level_by_date[d] for d in level_dates]
-        
-        level_chart_data = {
-            'dates': [d.strftime('%Y-%m-%d') for d in level_dates],
-            'levels': level_values
-        }
-    except Exception as e:
-        logger.error(f"Error processing level chart data: {str(e)}", exc_info=True)
-        level_chart_data = {'dates': [], 'levels': []}
-    
-    # Gold Earned/Spent Chart Data
-    try:
-        gold_earned_events = AuditLog.query.filter(
-            AuditLog.character_id == main_character.id,
-            AuditLog.event_type == EventType.GOLD_TRANSACTION.value,
-            AuditLog.event_timestamp >= since
-        ).order_by(AuditLog.event_timestamp.asc()).all()
-        
-        gold_earned_by_date = defaultdict(int)
-        for event in gold_earned_events:
-            try:
-                event_date = event.event_timestamp.date() if event.event_timestamp else datetime.utcnow().date()
-                amount = event.event_data.get('amount', 0) if isinstance(event.event_data, dict) else 0
-                if amount > 0:  # Only count positive amounts as earned
-                    gold_earned_by_date[event_date] += amount
-            except (AttributeError, TypeError):
-                continue
-        
-        # Gold spent from ShopPurchase
-        purchases = ShopPurchase.query.filter(
-            ShopPurchase.character_id == main_character.id,
-            ShopPurchase.purchase_date >= since
-        ).order_by(ShopPurchase.purchase_date.asc()).all()
-        
-        gold_spent_by_date = defaultdict(int)
-        for purchase in purchases:
-            try:
-                purchase_date = purchase.purchase_date.date() if purchase.purchase_date else datetime.utcnow().date()
-                gold_spent_by_date[purchase_date] += purchase.gold_spent
-            except (AttributeError, TypeError):
-                continue
-        
-        # Combine all dates for gold chart
-        all_gold_dates = set(gold_earned_by_date.keys()) | set(gold_spent_by_date.keys())
-        if all_gold_dates:
-            gold_dates = sorted(all_gold_dates)
-            gold_earned_values = [gold_earned_by_date.get(d, 0) for d in gold_dates]
-            gold_spent_values = [gold_spent_by_date.get(d, 0) for d in gold_dates]
-        else:
-            gold_dates = []
-            gold_earned_values = []
-            gold_spent_values = []
-        
-        gold_chart_data = {
-            'dates': [d.strftime('%Y-%m-%d') for d in gold_dates],
-            'earned': gold_earned_values,
-            'spent': gold_spent_values
-        }
-    except Exception as e:
-        logger.error(f"Error processing gold chart data: {str(e)}", exc_info=True)
-        gold_chart_data = {'dates': [], 'earned': [], 'spent': []}
-    
-    # Quest Completion Statistics
-    try:
-        completed_quests = main_character.quest_logs.filter_by(status=QuestStatus.COMPLETED).all()
-        total_quests = main_character.quest_logs.count()
-        quest_completion_rate = (len(completed_quests) / total_quests * 100) if total_quests > 0 else 0
-        
-        # Quest completion timeline
-        quest_completion_by_date = defaultdict(int)
-        for quest_log in completed_quests:
-            if quest_log.completed_at:
-                try:
-                    completion_date = quest_log.completed_at.date()
-                    quest_completion_by_date[completion_date] += 1
-                except (AttributeError, TypeError):
-                    continue
-        
-        quest_dates = sorted(quest_completion_by_date.keys())
-        quest_counts = [quest_completion_by_date[d] for d in quest_dates]
-        
-        quest_stats = {
-            'total_completed': len(completed_quests),
-            'total_quests': total_quests,
-            'completion_rate': round(quest_completion_rate, 1),
-            'completion_timeline': {
-                'dates': [d.strftime('%Y-%m-%d') for d in quest_dates] if quest_dates else [],
-                'counts': quest_counts if quest_dates else []
-            }
-        }
-    except Exception as e:
-        logger.error(f"Error processing quest stats: {str(e)}", exc_info=True)
-        quest_stats = {
-            'total_completed': 0,
-            'total_quests': 0,
-            'completion_rate': 0,
-            'completion_timeline': {
-                'dates': [],
-                'counts': []
-            }
-        }
-    
     # Achievement Badges
     try:
         badges = list(main_character.badges) if hasattr(main_character, 'badges') and main_character.badges else []
@@ -578,9 +347,7 @@ def progress():
     
     # Recent Activity Feed
     try:
-        recent_activities = AuditLog.query.filter(
-            AuditLog.character_id == main_character.id
-        ).order_by(AuditLog.event_timestamp.desc()).limit(15).all()
+        recent_activities = AuditLog.character_activity_query(main_character.id).limit(15).all()
         
         activity_feed = []
         for activity in recent_activities:
@@ -623,8 +390,9 @@ def character_create():
         "Druid":     {"health": 100, "max_health": 100, "power": 12, "defense": 12, "gold": 0},
     }
     # Get the correct student_id from the Student table
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    if student_profile and student_profile.characters.filter_by(is_active=True).first():
+    context = get_student_context()
+    student_profile = context.student
+    if context.character:
         flash('You already have a character.', 'info')
         return redirect(url_for('student.character'))
 
@@ -657,6 +425,7 @@ def character_create():
         )
         db.session.add(new_character)
         db.session.commit()
+        invalidate_student_context()
         flash('Character created successfully!', 'success')
         return redirect(url_for('student.character'))
     # GET: Render form
@@ -678,11 +447,11 @@ def character_create():
 def gain_xp():
     from flask import redirect, url_for, flash
     from app.models.character import Character
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    if not student_profile:
+    context = get_student_context()
+    if not context.student:
         flash('No student profile found.', 'danger')
         return redirect(url_for('student.dashboard'))
-    main_character = student_profile.characters.filter_by(is_active=True).first()
+    main_character = context.character
     if not main_character:
         flash('No character found.', 'danger')
         return redirect(url_for('student.character'))
@@ -698,11 +467,11 @@ def unequip_weapon():
     from flask import redirect, url_for, flash
     from app.models.character import Character
     from app.models.equipment import EquipmentType
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    if not student_profile:
+    context = get_student_context()
+    if not context.student:
         flash('No student profile found.', 'warning')
         return redirect(url_for('student.character'))
-    main_character = student_profile.characters.filter_by(is_active=True).first()
+    main_character = context.character
     if not main_character:
         flash('No character found.', 'warning')
         return redirect(url_for('student.character'))
@@ -722,11 +491,11 @@ def unequip_armor():
     from flask import redirect, url_for, flash
     from app.models.character import Character
     from app.models.equipment import EquipmentType
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    if not student_profile:
+    context = get_student_context()
+    if not context.student:
         flash('No student profile found.', 'warning')
         return redirect(url_for('student.character'))
-    main_character = student_profile.characters.filter_by(is_active=True).first()
+    main_character = context.character
     if not main_character:
         flash('No character found.', 'warning')
         return redirect(url_for('student.character'))
@@ -746,11 +515,11 @@ def unequip_accessory():
     from flask import redirect, url_for, flash
     from app.models.character import Character
     from app.models.equipment import EquipmentType
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    if not student_profile:
+    context = get_student_context()
+    if not context.student:
         flash('No student profile found.', 'warning')
         return redirect(url_for('student.character'))
-    main_character = student_profile.characters.filter_by(is_active=True).first()
+    main_character = context.character
     if not main_character:
         flash('No character found.', 'warning')
         return redirect(url_for('student.character'))
@@ -770,10 +539,10 @@ def api_equip_item():
     data = request.get_json()
     inventory_id = data.get('inventory_id')
     slot = data.get('slot')
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    if not student_profile:
+    context = get_student_context()
+    if not context.student:
         return jsonify({'success': False, 'message': 'No student profile found.'}), 404
-    main_character = student_profile.characters.filter_by(is_active=True).first()
+    main_character = context.character
     if not main_character:
         return jsonify({'success': False, 'message': 'No character found.'}), 404
     item = Inventory.query.filter_by(id=inventory_id, character_id=main_character.id).first()
@@ -796,10 +565,10 @@ def api_equip_item():
 def api_unequip_item():
     data = request.get_json()
     inventory_id = data.get('inventory_id')
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    if not student_profile:
+    context = get_student_context()
+    if not context.student:
         return jsonify({'success': False, 'message': 'No student profile found.'}), 404
-    main_character = student_profile.characters.filter_by(is_active=True).first()
+    main_character = context.character
     if not main_character:
         return jsonify({'success': False, 'message': 'No character found.'}), 404
     item = Inventory.query.filter_by(id=inventory_id, character_id=main_character.id).first()
@@ -813,13 +582,9 @@ def api_unequip_item():
 @login_required
 @student_required
 def api_get_student_clan():
-    student_profile = Student.query.filter_by(user_id=current_user.id).first()
-    if not student_profile:
+    clan = get_student_context().clan
+    if not clan:
         return jsonify({"clan": None}), 200
-    main_character = student_profile.characters.filter_by(is_active=True).first()
-    if not main_character or not main_character.clan:
-        return jsonify({"clan": None}), 200
-    clan = main_character.clan
     clan_data = clan.to_dict(include_members=True, include_metrics=True)
     clan_data["badges"] = [
         {"id": b.id, "name": b.name, "description": b.description, "icon": b.icon}
@@ -832,10 +597,6 @@ def api_get_student_clan():
 @student_required
 def shop_buy():
     from flask import request
-    from app.models.equipment import Equipment, Inventory
-    from app.models.ability import Ability, CharacterAbility
-    from app.models.shop import ShopPurchase, PurchaseType
-    from app.models.shop_config import ShopItemOverride
     item_id = None  # Initialize before try block to avoid UnboundLocalError
     try:
         data = request.get_json()
@@ -846,101 +607,29 @@ def shop_buy():
         if not item_id:
             return jsonify({'success': False, 'message': 'Missing item_id.'}), 400
         # Get current student's active character
-        student_profile = Student.query.filter_by(user_id=current_user.id).first()
+        context = get_student_context()
+        student_profile = context.student
         if not student_profile:
             return jsonify({'success': False, 'message': 'No student profile found.'}), 404
-        # characters relationship is lazy='dynamic', so we need to call filter_by on the query object
-        character = student_profile.characters.filter_by(is_active=True).first()
+        character = context.character
         if not character:
             return jsonify({'success': False, 'message': 'No active character found.'}), 404
         logger.info(f"Character found: id={character.id}, name={character.name}, gold={character.gold}, level={character.level}")
-        # Determine item type and fetch item
-        item = None
-        purchase_type = None
-        if item_type == 'equipment' or item_type is None:
-            item = Equipment.query.filter_by(id=item_id).first()
-            if item:
-                purchase_type = PurchaseType.EQUIPMENT.value
-        if not item and (item_type == 'ability' or item_type is None):
-            item = Ability.query.filter_by(id=item_id).first()
-            if item:
-                purchase_type = PurchaseType.ABILITY.value
-        if not item:
-            return jsonify({'success': False, 'message': 'Item not found.'}), 404
-        if not purchase_type:
-            return jsonify({'success': False, 'message': 'Could not determine item type.'}), 400
-        # Check ownership
-        if purchase_type == PurchaseType.EQUIPMENT.value:
-            already_owned = Inventory.query.filter_by(character_id=character.id, item_id=item.id).first()
-        else:
-            already_owned = CharacterAbility.query.filter_by(character_id=character.id, ability_id=item.id).first()
-        if already_owned:
-            return jsonify({'success': False, 'message': 'Item already owned.'}), 400
-        # Check for overrides
-        # Student has a direct classroom relationship (singular), not classes
-        active_class = student_profile.classroom
-        effective_cost = getattr(item, 'cost', 0)
-        effective_level_req = getattr(item, 'level_requirement', 1)
-        
-        if active_class:
-            try:
-                override = ShopItemOverride.query.filter_by(
-                    classroom_id=active_class.id,
-                    item_type='equipment' if purchase_type == PurchaseType.EQUIPMENT.value else 'ability',
-                    item_id=item.id
-                ).first()
-                if override:
-                    if not override.is_visible:
-                        return jsonify({'success': False, 'message': 'Item is not available.'}), 400
-                    if override.override_cost is not None:
-                        effective_cost = override.override_cost
-                    if override.override_level_req is not None:
-                        effective_level_req = override.override_level_req
-            except Exception as e:
-                # Handle case where shop_item_overrides table doesn't exist yet
-                # This can happen if migrations haven't been run
-                logger.warning(f"Could not query shop item overrides: {e}")
-                # Continue with default values
-
-        # Validate gold
-        if character.gold < effective_cost:
-            return jsonify({'success': False, 'message': 'Not enough gold.'}), 400
-        # Validate level
-        if character.level < effective_level_req:
-            return jsonify({'success': False, 'message': f'Level {effective_level_req} required.'}), 400
-        # Validate class restriction (equipment only)
-        class_restr = getattr(item, 'class_restriction', None)
-        if purchase_type == PurchaseType.EQUIPMENT.value and class_restr and class_restr.lower() != character.character_class.lower():
-            return jsonify({'success': False, 'message': f'Class restriction: {class_restr}.'}), 400
-        # Deduct gold
-        character.gold -= effective_cost
-        # Convert and validate gold_spent before creating ShopPurchase
+        # Price, requirements, gold and ownership are checked atomically by the purchase engine
+        active_class = context.classroom
         try:
-            gold_spent = int(effective_cost)
-        except (TypeError, ValueError):
-            return jsonify({'success': False, 'message': 'Invalid item cost. Please contact your teacher/admin.'}), 400
-
-        if gold_spent <= 0:
-            return jsonify({'success': False, 'message': 'Item has no cost set. Please contact your teacher/admin.'}), 400
-        # Add to inventory or abilities
-        if purchase_type == PurchaseType.EQUIPMENT.value:
-            new_inv = Inventory(character_id=character.id, item_id=item.id, is_equipped=False)
-            db.session.add(new_inv)
-        else:
-            new_ability = CharacterAbility(character_id=character.id, ability_id=item.id)
-            db.session.add(new_ability)
-        # Log purchase
-        purchase = ShopPurchase(
-            character_id=character.id,
-            item_id=item.id,
-            gold_spent=gold_spent,
-            purchase_type=purchase_type,
-            student_id=student_profile.id,
-        )
-        db.session.add(purchase)
-        db.session.commit()
-        # Refresh character to get updated gold after commit
-        db.session.refresh(character)
+            purchase = purchase_item(
+                character,
+                student_profile.id,
+                item_id,
+                item_type=item_type,
+                classroom_id=active_class.id if active_class else None
+            )
+        except PurchaseError as e:
+            return jsonify({'success': False, 'message': e.message}), e.status_code
+        item = purchase['entry']
+        purchase_type = purchase['purchase_type']
+        gold_spent = purchase['gold_spent']
         logger.info(f"Shop purchase successful: character={character.id}, item={item_id}, gold_spent={gold_spent}, remaining_gold={character.gold}")
         
         # Prepare updated info
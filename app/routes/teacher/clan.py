@@ -7,12 +7,15 @@ from app.models.clan import Clan
 from app.models.character import Character
 from app.models.audit import AuditLog, EventType
 from app.models.user import User
-from app.models.clan_progress import ClanProgressHistory
 from app.models.student import Student
 import os
 from flask_jwt_extended import jwt_required
 from datetime import datetime, timedelta
 from app.models.achievement_badge import AchievementBadge
+from app.services.clan_dashboard import load_clan_dashboard
+from app.services.clan_history import load_clan_history, parse_history_args
+
+DASHBOARD_HISTORY_POINTS = 60
 
 @teacher_bp.route('/clans')
 @login_required
@@ -240,23 +243,12 @@ def api_get_clan_metrics(clan_id):
 @jwt_required
 def api_get_clan_history(clan_id):
     days = request.args.get('days', 30, type=int)
+    try:
+        resolution, max_points = parse_history_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     cutoff = datetime.utcnow() - timedelta(days=days)
-    history = ClanProgressHistory.query.filter(
-        ClanProgressHistory.clan_id == clan_id,
-        ClanProgressHistory.timestamp >= cutoff
-    ).order_by(ClanProgressHistory.timestamp).all()
-    return jsonify([
-        {
-            'timestamp': h.timestamp.isoformat(),
-            'avg_completion_rate': h.avg_completion_rate,
-            'total_points': h.total_points,
-            'active_members': h.active_members,
-            'avg_daily_points': h.avg_daily_points,
-            'quest_completion_rate': h.quest_completion_rate,
-            'avg_member_level': h.avg_member_level,
-            'percentile_rank': h.percentile_rank
-        } for h in history
-    ])
+    return jsonify(load_clan_history([clan_id], cutoff, resolution, max_points)[clan_id])
 
 @teacher_bp.route('/clans/dashboard')
 @login_required
@@ -264,9 +256,7 @@ def api_get_clan_history(clan_id):
 def clan_dashboard():
     from app.models.classroom import Classroom
     from app.models.clan import Clan
-    from app.models.clan_progress import ClanProgressHistory
     from app.models.audit import AuditLog
-    from app.models.character import Character
     from datetime import datetime, timedelta
     from flask import request, render_template
     # Filters
@@ -288,6 +278,8 @@ def clan_dashboard():
     if class_id:
         clans_query = clans_query.filter(Clan.class_id == class_id)
     clans = clans_query.all()
+    # Downsampled so long periods keep the per-clan charts small
+    dashboard = load_clan_dashboard([clan.id for clan in clans], since, max_points=DASHBOARD_HISTORY_POINTS)
 
     # Aggregate data for each clan
     clan_data = []
@@ -298,37 +290,30 @@ def clan_dashboard():
         "avg_completion_rate": [],
     }
     for clan in clans:
+        data = dashboard[clan.id]
         # Latest progress metrics
-        latest_progress = clan.progress_history.order_by(ClanProgressHistory.timestamp.desc()).first()
-        # Time series for chart (last 30 days)
-        progress_history = clan.progress_history
-        if since:
-            progress_history = progress_history.filter(ClanProgressHistory.timestamp >= since)
-        progress_history = progress_history.order_by(ClanProgressHistory.timestamp.asc()).all()
+        latest_progress = data['latest_progress']
+        # Time series for chart (selected period)
+        progress_history = data['history']
         # Prepare chart data
-        dates = [ph.timestamp.strftime('%Y-%m-%d') for ph in progress_history]
-        points = [ph.total_points for ph in progress_history]
-        members = [ph.active_members for ph in progress_history]
-        completion = [ph.avg_completion_rate for ph in progress_history]
+        dates = [ph['timestamp'][:10] for ph in progress_history]
+        points = [ph['total_points'] for ph in progress_history]
+        members = [ph['active_members'] for ph in progress_history]
+        completion = [ph['avg_completion_rate'] for ph in progress_history]
         # Recent activity (last 10 events)
-        recent_activities = AuditLog.query \
-            .filter(AuditLog.event_type.in_(['CLAN_JOIN', 'CLAN_LEAVE', 'QUEST_COMPLETE', 'QUEST_FAIL']),
-                    AuditLog.character.has(Character.clan_id == clan.id)) \
-            .order_by(AuditLog.event_timestamp.desc()) \
-            .limit(10).all()
         activity_log = [{
             "type": AuditLog.EVENT_TYPES.get(a.event_type, a.event_type),
             "timestamp": a.event_timestamp,
             "description": a.event_data.get('description', '')
-        } for a in recent_activities]
+        } for a in data['recent_activity']]
 
         clan_data.append({
             "id": clan.id,
             "name": clan.name,
             "level": clan.level,
             "experience": clan.experience,
-            "member_count": clan.get_member_count(),
-            "leader": clan.leader.name if clan.leader else None,
+            "member_count": data['member_count'],
+            "leader": data['leader'],
             "emblem": clan.emblem,
             "created_at": clan.created_at,
             "latest_metrics": latest_progress.to_dict() if latest_progress else {},
@@ -375,6 +360,14 @@ def clan_dashboard():
         active_page='clans_dashboard'
     )
 
+@teacher_bp.route('/clans/custom-metric-stats')
+@login_required
+@teacher_required
+def custom_metric_stats():
+    """Duration histograms and timeout/error counters of the custom clan metrics."""
+    from app.services.custom_metrics import custom_metric_executor
+    return jsonify(custom_metric_executor.stats())
+
 @teacher_bp.route('/api/badges', methods=['GET'])
 @login_required
 @teacher_required
@@ -0,0 +1,109 @@
+from .blueprint import teacher_bp, teacher_required
+from flask_login import login_required, current_user
+from flask import request, jsonify, url_for
+from app.models import db
+from app.models.classroom import Classroom
+from app.models.job import BackgroundJob, JobStatus
+from app.services.job_runner import submit_job, JobError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Job types a teacher may submit and the params each one needs
+TEACHER_JOB_TYPES = ('analytics_report', 'analytics_export', 'clan_metrics')
+
+
+def _owned_class_ids(class_ids):
+    """Return class_ids if they all belong to the current teacher, else None."""
+    owned = {
+        class_id for (class_id,) in
+        db.session.query(Classroom.id).filter(
+            Classroom.id.in_(class_ids),
+            Classroom.teacher_id == current_user.id
+        )
+    }
+    return class_ids if class_ids and owned == set(class_ids) else None
+
+
+def _job_params(job_type, data):
+    """Validate the submitted params for a job type; raises JobError if invalid."""
+    days = data.get('days', 90)
+    if not isinstance(days, int) or days <= 0:
+        raise JobError('days must be a positive integer')
+    if job_type == 'analytics_export':
+        class_ids = data.get('class_ids')
+        if class_ids is None:
+            class_ids = [
+                class_id for (class_id,) in
+                db.session.query(Classroom.id)
+                .filter_by(teacher_id=current_user.id, is_active=True)
+                .order_by(Classroom.id)
+            ]
+        if not isinstance(class_ids, list) or not _owned_class_ids(class_ids):
+            raise JobError('Class not found or not authorized', 404)
+        return {'class_ids': class_ids, 'days': days}
+    class_id = data.get('class_id')
+    if not isinstance(class_id, int) or not _owned_class_ids([class_id]):
+        raise JobError('Class not found or not authorized', 404)
+    return {'class_id': class_id, 'days': days}
+
+
+def _get_own_job(job_id):
+    return BackgroundJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+
+
+@teacher_bp.route('/jobs', methods=['POST'])
+@login_required
+@teacher_required
+def submit_report_job():
+    """Queue a heavy report and return its id immediately (202)."""
+    data = request.get_json(silent=True) or {}
+    job_type = data.get('job_type')
+    if job_type not in TEACHER_JOB_TYPES:
+        return jsonify({'error': 'Unknown job type'}), 400
+    try:
+        job = submit_job(job_type, _job_params(job_type, data), user_id=current_user.id)
+    except JobError as e:
+        return jsonify({'error': e.message}), e.status_code
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = url_for('teacher.get_report_job', job_id=job.id)
+    return response
+
+
+@teacher_bp.route('/jobs', methods=['GET'])
+@login_required
+@teacher_required
+def list_report_jobs():
+    jobs = (
+        BackgroundJob.query.filter_by(user_id=current_user.id)
+        .order_by(BackgroundJob.id.desc())
+        .limit(50)
+        .all()
+    )
+    return jsonify({'jobs': [job.to_dict() for job in jobs]})
+
+
+@teacher_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+@teacher_required
+def get_report_job(job_id):
+    """Poll a job's status and progress."""
+    job = _get_own_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@teacher_bp.route('/jobs/<int:job_id>/result', methods=['GET'])
+@login_required
+@teacher_required
+def get_report_job_result(job_id):
+    job = _get_own_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == JobStatus.FAILED.value:
+        return jsonify({'error': job.error or 'Job failed', 'status': job.status}), 500
+    if not job.is_finished:
+        return jsonify(job.to_dict()), 202
+    return jsonify({'id': job.id, 'status': job.status, 'result': job.result})
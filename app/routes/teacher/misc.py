@@ -1,17 +1,15 @@
 from .blueprint import teacher_bp, teacher_required
 from flask_login import login_required, current_user
-from flask import render_template, request, jsonify, flash, send_file, abort
+from flask import render_template, request, jsonify, flash, send_file, abort, Response, stream_with_context
 from app.models import db
 from app.models.classroom import Classroom
 from app.models.clan import Clan
 from app.models.quest import Quest
 from app.models.audit import AuditLog
 from app.models.user import User
-from app.models.character import Character
 from app.models.shop import ShopPurchase
 from app.models.student import Student
-from app.models.equipment import Equipment
-from app.models.ability import Ability
+from app.services.item_catalog import item_catalog
 from app.services.backup_service import (
     create_database_backup,
     get_available_tables,
@@ -70,20 +68,15 @@ def dashboard():
     inactive_students = total_students - active_students
     seven_days_ago = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=7)
     recent_activities = []
-    audit_logs = AuditLog.query.\
-        join(Character, AuditLog.character_id == Character.id).\
-        join(Classroom, Classroom.id == Character.student_id).\
-        filter(
-            Classroom.teacher_id == current_user.id,
-            AuditLog.event_timestamp >= seven_days_ago,
-            AuditLog.event_type.in_([
-                'QUEST_START', 'QUEST_COMPLETE', 'QUEST_FAIL',
-                'CLAN_JOIN', 'CLAN_LEAVE', 'LEVEL_UP',
-                'ABILITY_LEARN', 'EQUIPMENT_CHANGE'
-            ])
-        ).\
-        order_by(AuditLog.event_timestamp.desc()).\
-        limit(10).all()
+    audit_logs = AuditLog.teacher_activity_query(
+        current_user.id,
+        event_types=[
+            'QUEST_START', 'QUEST_COMPLETE', 'QUEST_FAIL',
+            'CLAN_JOIN', 'CLAN_LEAVE', 'LEVEL_UP',
+            'ABILITY_LEARN', 'EQUIPMENT_CHANGE'
+        ],
+        since=seven_days_ago
+    ).limit(10).all()
     for log in audit_logs:
         activity = {
             'title': AuditLog.EVENT_TYPES.get(log.event_type, log.event_type),
@@ -141,9 +134,10 @@ def shop():
     items_data = []
     
     if selected_class:
-        # Fetch all base items
-        equipment = Equipment.query.all()
-        abilities = Ability.query.all()
+        # All base items (in-memory catalog)
+        catalog = item_catalog.snapshot()
+        equipment = catalog.equipment
+        abilities = catalog.abilities
         
         # Fetch overrides
         overrides = ShopItemOverride.query.filter_by(classroom_id=selected_class.id).all()
@@ -275,15 +269,25 @@ def analytics_data():
         days = request.args.get('days', type=int, default=90)
         if not class_id:
             return jsonify({'error': 'Missing class_id'}), 400
+        from app.services.analytics_service import ANALYTICS_BACKENDS, get_analytics_backend
+        backend = request.args.get('backend')
+        if backend is not None and backend not in ANALYTICS_BACKENDS:
+            return jsonify({'error': f"backend must be one of {', '.join(ANALYTICS_BACKENDS)}"}), 400
         selected_class = Classroom.query.filter_by(id=class_id, teacher_id=current_user.id).first()
         if not selected_class:
             return jsonify({'error': 'Class not found or not authorized'}), 404
         
-        from app.services.analytics_service import (
-            get_student_performance_data,
-            get_engagement_metrics,
-            get_quest_completion_analytics
-        )
+        if request.args.get('async', '').lower() in ('1', 'true'):
+            # Compute in the background; poll /teacher/jobs/<id> for the result
+            from app.services.job_runner import submit_job
+            params = {'class_id': class_id, 'days': days}
+            if backend is not None:
+                params['backend'] = backend
+            job = submit_job('analytics_report', params, user_id=current_user.id)
+            return jsonify(job.to_dict()), 202
+        
+        from app.services.analytics_cache import cached_analytics
+        analytics = get_analytics_backend(backend)
         
         # Basic class composition
         class_labels = [selected_class.name]
@@ -295,9 +299,9 @@ def analytics_data():
         inactive_counts = [inactive]
         
         # Enhanced analytics
-        performance_data = get_student_performance_data(class_id, days=days)
-        engagement_data = get_engagement_metrics(class_id, days=min(days, 30))
-        quest_data = get_quest_completion_analytics(class_id, days=days)
+        performance_data = cached_analytics(analytics, 'get_student_performance_data', class_id, days)
+        engagement_data = cached_analytics(analytics, 'get_engagement_metrics', class_id, min(days, 30))
+        quest_data = cached_analytics(analytics, 'get_quest_completion_analytics', class_id, days)
         
         return jsonify({
             'class_labels': class_labels,
@@ -330,8 +334,9 @@ def export_analytics():
         if not selected_class:
             return jsonify({'error': 'Class not found or not authorized'}), 404
         
-        from app.services.analytics_service import get_student_performance_data
-        performance_data = get_student_performance_data(class_id, days=days)
+        from app.services.analytics_service import get_analytics_backend
+        from app.services.analytics_cache import cached_analytics
+        performance_data = cached_analytics(get_analytics_backend(), 'get_student_performance_data', class_id, days)
         
         if format_type == 'csv':
             # Create CSV
@@ -388,6 +393,96 @@ def export_analytics():
         logger.error(f"Error exporting analytics: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred while exporting analytics data'}), 500
 
+
+ANALYTICS_CSV_HEADER = [
+    'Class ID', 'Student ID', 'Character Name', 'Level', 'Experience', 'Gold',
+    'Quests Completed', 'Total Quests', 'Completion Rate %',
+    'Gold Earned', 'Gold Spent', 'Login Count'
+]
+
+
+@teacher_bp.route('/analytics/export/stream')
+@login_required
+@teacher_required
+def export_analytics_stream():
+    """Stream analytics as CSV or NDJSON while students are computed.
+
+    Without ``class_id`` every active class of the teacher is exported. Rows
+    are produced by analytics_service.iter_student_performance in roster
+    batches, so memory stays flat and the first bytes go out immediately.
+    """
+    class_id = request.args.get('class_id', type=int)
+    format_type = request.args.get('format', 'csv').lower()  # 'csv' or 'ndjson'
+    days = request.args.get('days', type=int, default=90)
+    if format_type not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Unsupported format'}), 400
+
+    classes = Classroom.query.filter_by(teacher_id=current_user.id)
+    if class_id:
+        classes = classes.filter_by(id=class_id)
+    else:
+        classes = classes.filter_by(is_active=True)
+    class_ids = [c.id for c in classes.with_entities(Classroom.id).order_by(Classroom.id)]
+    if class_id and not class_ids:
+        return jsonify({'error': 'Class not found or not authorized'}), 404
+
+    from app.services.analytics_service import iter_student_performance
+    import csv
+    import io
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(ANALYTICS_CSV_HEADER)
+        yield buffer.getvalue()
+        for student in iter_student_performance(class_ids, days=days):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow([
+                student['class_id'],
+                student['student_id'],
+                student['name'],
+                student['level'],
+                student['experience'],
+                student['gold'],
+                student['quests_completed'],
+                student['quests_total'],
+                round(student['quest_completion_rate'], 2),
+                student['gold_earned'],
+                student['gold_spent'],
+                student['login_count']
+            ])
+            yield buffer.getvalue()
+
+    def generate_ndjson():
+        for student in iter_student_performance(class_ids, days=days):
+            yield json.dumps(student, default=str) + '\n'
+
+    scope = f"class_{class_ids[0]}" if class_id else 'all_classes'
+    extension = 'csv' if format_type == 'csv' else 'ndjson'
+    filename = f"analytics_{scope}_{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+    return Response(
+        stream_with_context(generate_csv() if format_type == 'csv' else generate_ndjson()),
+        mimetype='text/csv' if format_type == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@teacher_bp.route('/analytics/cache-stats')
+@login_required
+@teacher_required
+def analytics_cache_stats():
+    """Hit/miss counters of the analytics result cache, for sizing it."""
+    from app.services.analytics_cache import analytics_cache
+    return jsonify(analytics_cache.stats())
+
+@teacher_bp.route('/leaderboard-index/check', methods=['GET', 'POST'])
+@login_required
+@teacher_required
+def leaderboard_index_check():
+    """Compare the live leaderboard index with the database; POST also rebuilds it on drift."""
+    from app.services.leaderboard_index import leaderboard_index
+    return jsonify(leaderboard_index.check_consistency(repair=request.method == 'POST'))
+
 @teacher_bp.route('/backup')
 @login_required
 @teacher_required
@@ -549,15 +644,16 @@ def backup_export_table():
 def purchase_log():
     purchases = ShopPurchase.query.order_by(ShopPurchase.purchase_date.desc()).limit(100).all()
     purchase_data = []
+    catalog = item_catalog.snapshot()
     for p in purchases:
         student = Student.query.get(p.student_id)
         user = User.query.get(student.user_id) if student else None
         item_name = None
         if p.purchase_type == 'equipment':
-            item = Equipment.query.get(p.item_id)
+            item = catalog.get_equipment(p.item_id)
             item_name = item.name if item else 'Unknown Equipment'
         elif p.purchase_type == 'ability':
-            item = Ability.query.get(p.item_id)
+            item = catalog.get_ability(p.item_id)
             item_name = item.name if item else 'Unknown Ability'
         else:
             item_name = 'Unknown'
@@ -11,6 +11,7 @@ from app.models.user import User
 from app.models.audit import AuditLog, EventType
 from app.models.equipment import Inventory
 from app.models.ability import CharacterAbility
+from app.services.item_catalog import item_catalog
 from app.services.quest_map_utils import find_available_coordinates
 from app.routes.teacher.blueprint import teacher_required
 from datetime import datetime
@@ -576,10 +577,6 @@ def complete_quest_for_student(quest_log_id):
                 'error': f'Quest must be IN_PROGRESS to complete. Current status: {quest_log.status.value}'
             }), 400
         
-        # Import models needed for reward tracking
-        from app.models.equipment import Equipment
-        from app.models.ability import Ability
-        
         # Capture character state before completion
         old_gold = character.gold
         old_experience = character.experience
@@ -613,9 +610,10 @@ def complete_quest_for_student(quest_log_id):
         equipment_awarded_ids = list(new_equipment_ids - old_equipment_ids)
         
         # Get equipment names for awarded items
+        catalog = item_catalog.snapshot()
         equipment_awarded = []
         for item_id in equipment_awarded_ids:
-            item = Equipment.query.get(item_id)
+            item = catalog.get_equipment(item_id)
             if item:
                 equipment_awarded.append({'id': item_id, 'name': item.name})
         
@@ -628,7 +626,7 @@ def complete_quest_for_student(quest_log_id):
         # Get ability names for awarded abilities
         abilities_awarded = []
         for ability_id in abilities_awarded_ids:
-            ability = Ability.query.get(ability_id)
+            ability = catalog.get_ability(ability_id)
             if ability:
                 abilities_awarded.append({'id': ability_id, 'name': ability.name})
         
@@ -640,12 +638,12 @@ def complete_quest_for_student(quest_log_id):
                 'amount': reward.amount
             }
             if reward.type == RewardType.EQUIPMENT and reward.item_id:
-                item = Equipment.query.get(reward.item_id)
+                item = catalog.get_equipment(reward.item_id)
                 if item:
                     reward_info['item_id'] = reward.item_id
                     reward_info['item_name'] = item.name
             elif reward.type == RewardType.ABILITY and reward.ability_id:
-                ability = Ability.query.get(reward.ability_id)
+                ability = catalog.get_ability(reward.ability_id)
                 if ability:
                     reward_info['ability_id'] = reward.ability_id
                     reward_info['ability_name'] = ability.name
@@ -10,10 +10,11 @@ from app.models.classroom import Classroom
 from app.models.user import User, UserRole
 from app.models.student import Student
 from app.models.character import Character
-from app.models.equipment import Equipment, Inventory
+from app.models.equipment import Inventory
 from app.models.audit import AuditLog, EventType
 from app.models.quest import Quest, QuestLog, QuestStatus
 from app.models.clan import Clan
+from app.services.item_catalog import item_catalog
 from app.services.quest_map_utils import find_available_coordinates
 from sqlalchemy.exc import IntegrityError
 
@@ -118,7 +119,7 @@ def batch_character_action():
             if not item_id:
                 results.append({'student_id': student_id, 'status': 'missing_item_id'})
                 continue
-            equipment = Equipment.query.filter_by(id=item_id).first()
+            equipment = item_catalog.snapshot().get_equipment(item_id)
             if not equipment:
                 results.append({'student_id': student_id, 'status': 'item_not_found'})
                 continue
@@ -163,6 +164,7 @@ def api_award_gold(student_id):
     character = Character.query.filter_by(student_id=student.id, is_active=True).first()
     if not character:
         return jsonify({'success': False, 'message': 'No active character found'}), 404
+    old_gold = character.gold
     character.gold += amount
     db.session.commit()
     # Audit log
@@ -174,7 +176,10 @@ def api_award_gold(student_id):
             'amount': amount,
             'reason': reason,
             'teacher_id': current_user.id
-        }
+        },
+        amount=amount,
+        old_value=old_gold,
+        new_value=character.gold
     )
     db.session.add(audit)
     db.session.commit()
@@ -195,6 +200,7 @@ def api_award_xp(student_id):
     character = Character.query.filter_by(student_id=student.id, is_active=True).first()
     if not character:
         return jsonify({'success': False, 'message': 'No active character found'}), 404
+    old_experience = character.experience
     character.gain_experience(amount)
     db.session.commit()
     # Audit log
@@ -206,7 +212,10 @@ def api_award_xp(student_id):
             'amount': amount,
             'reason': reason,
             'teacher_id': current_user.id
-        }
+        },
+        amount=amount,
+        old_value=old_experience,
+        new_value=character.experience
     )
     db.session.add(audit)
     db.session.commit()
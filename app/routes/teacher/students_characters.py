@@ -10,7 +10,7 @@ from app.models.classroom import Classroom
 from app.models.user import User
 from app.models.student import Student
 from app.models.character import Character
-from app.models.equipment import Equipment
+from app.services.item_catalog import item_catalog
 
 @teacher_bp.route('/students/<int:class_id>/characters', methods=['GET'])
 @login_required
@@ -42,7 +42,7 @@ def student_characters(class_id):
         })
 
     # Fetch all equipment for dropdown
-    all_equipment = Equipment.query.order_by(Equipment.name.asc()).all()
+    all_equipment = sorted(item_catalog.snapshot().equipment, key=lambda item: item.name)
 
     return render_template(
         'teacher/student_characters.html',
@@ -0,0 +1,224 @@
+"""Result cache for the teacher analytics endpoints.
+
+Caches the payloads of ``get_student_performance_data``,
+``get_engagement_metrics`` and ``get_quest_completion_analytics`` per
+(function, class_id, days, student_id) with LRU + TTL eviction.
+
+Entries for a class are dropped as soon as a transaction that wrote AuditLog,
+QuestLog or ShopPurchase rows for one of its characters/users commits. The
+affected classes are collected in ``after_flush`` and invalidated in
+``after_commit``. Each invalidation also bumps the class's generation;
+``cached_analytics`` reads it before computing and drops its result if it
+changed meanwhile, so a request that started before the commit does not
+re-cache pre-commit data. The cache is per-process; the TTL bounds
+staleness for writes made by other processes.
+"""
+
+from app.models import db
+from app.models.student import Student
+from app.models.character import Character
+from app.models.audit import AuditLog
+from app.models.quest import QuestLog
+from app.models.shop import ShopPurchase
+from collections import OrderedDict
+from app.utils.commit_hooks import Generations, register_commit_hook
+from sqlalchemy import select
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL_SECONDS = 300
+
+_PENDING_KEY = 'analytics_cache_pending_classes'
+
+
+class AnalyticsCache:
+    """Thread-safe LRU cache with per-entry TTL and a per-class key index."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._keys_by_class = {}
+        self._generations = Generations()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+
+    def configure(self, max_entries=None, ttl=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if ttl is not None:
+                self.ttl = ttl
+            self._entries.clear()
+            self._keys_by_class.clear()
+            self._generations.bump_all()
+
+    def get(self, key):
+        """Return (found, value) for a key, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def generation(self, class_id):
+        """Token to pass to ``set`` for a value about to be computed for a class."""
+        with self._lock:
+            return self._generations.get(class_id)
+
+    def set(self, key, value, generation=None):
+        """Store a value, unless its class was invalidated since ``generation`` was read."""
+        if self.max_entries <= 0:
+            return
+        class_id = key[1]
+        with self._lock:
+            if generation is not None and generation != self._generations.get(class_id):
+                self.stale_sets += 1
+                return
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._keys_by_class.setdefault(class_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_class(self, class_id):
+        """Drop every entry computed for a class."""
+        with self._lock:
+            self._generations.bump(class_id)
+            keys = self._keys_by_class.pop(class_id, ())
+            for key in keys:
+                self._entries.pop(key, None)
+            if keys:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_class.clear()
+            self._generations.bump_all()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'stale_sets': self.stale_sets
+            }
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        class_keys = self._keys_by_class.get(key[1])
+        if class_keys is not None:
+            class_keys.discard(key)
+            if not class_keys:
+                del self._keys_by_class[key[1]]
+
+
+analytics_cache = AnalyticsCache()
+
+
+def init_analytics_cache(app):
+    """Size the shared cache from ANALYTICS_CACHE_SIZE / ANALYTICS_CACHE_TTL."""
+    analytics_cache.configure(
+        max_entries=app.config.get('ANALYTICS_CACHE_SIZE', DEFAULT_MAX_ENTRIES),
+        ttl=app.config.get('ANALYTICS_CACHE_TTL', DEFAULT_TTL_SECONDS)
+    )
+
+
+def cached_analytics(backend, name, class_id, days, student_id=None):
+    """Return ``backend.<name>(class_id, days=days[, student_id])`` through the cache.
+
+    Cached payloads are shared between requests and must not be mutated.
+    """
+    key = (name, class_id, days, student_id)
+    found, value = analytics_cache.get(key)
+    if found:
+        return value
+    generation = analytics_cache.generation(class_id)
+    kwargs = {'days': days}
+    if student_id is not None:
+        kwargs['student_id'] = student_id
+    value = getattr(backend, name)(class_id, **kwargs)
+    analytics_cache.set(key, value, generation)
+    return value
+
+
+def _affected_class_ids(session, objects):
+    """Resolve the classes whose analytics depend on the given rows."""
+    character_ids = set()
+    user_ids = set()
+    student_ids = set()
+    for obj in objects:
+        if isinstance(obj, AuditLog):
+            if obj.character_id:
+                character_ids.add(obj.character_id)
+            if obj.user_id:
+                user_ids.add(obj.user_id)
+        elif isinstance(obj, QuestLog):
+            character_ids.add(obj.character_id)
+        elif isinstance(obj, ShopPurchase):
+            character_ids.add(obj.character_id)
+            student_ids.add(obj.student_id)
+
+    character_ids.discard(None)
+    student_ids.discard(None)
+    conditions = []
+    if character_ids:
+        conditions.append(Student.id.in_(
+            select(Character.student_id).where(Character.id.in_(character_ids))
+        ))
+    if user_ids:
+        conditions.append(Student.user_id.in_(user_ids))
+    if student_ids:
+        conditions.append(Student.id.in_(student_ids))
+    if not conditions:
+        return set()
+    rows = session.connection().execute(
+        select(Student.class_id).where(db.or_(*conditions)).distinct()
+    )
+    return {class_id for (class_id,) in rows if class_id is not None}
+
+
+def _collect_analytics_writes(session):
+    """Classes touched by this flush."""
+    objects = [
+        obj for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, (AuditLog, QuestLog, ShopPurchase))
+    ]
+    if objects:
+        return _affected_class_ids(session, objects)
+
+
+def _invalidate_analytics_cache(class_ids):
+    for class_id in class_ids:
+        analytics_cache.invalidate_class(class_id)
+
+
+register_commit_hook(_PENDING_KEY, _invalidate_analytics_cache, _collect_analytics_writes)
@@ -0,0 +1,263 @@
+"""Vectorized (pandas/NumPy) implementation of the analytics service.
+
+Provides the same functions and return shapes as ``analytics_service`` but
+loads each source table with a single ``pandas.read_sql`` call and does the
+per-day bucketing, per-student pivots and class averages as DataFrame
+operations. Select it with ``ANALYTICS_BACKEND = 'pandas'``; see
+``analytics_service.get_analytics_backend``.
+"""
+
+from app.models import db
+from app.models.student import Student
+from app.models.character import Character
+from app.models.quest import QuestLog, QuestStatus
+from app.models.audit import AuditDailyRollup, EventType
+from app.models.shop import ShopPurchase
+from app.services.analytics_service import _active_characters
+from datetime import datetime, timedelta
+from sqlalchemy import case
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+XP_EVENTS = [EventType.XP_GAIN.value, EventType.XP_TRANSACTION.value]
+GOLD_EVENTS = [EventType.GOLD_TRANSACTION.value]
+LOGIN_EVENTS = [EventType.LOGIN.value, EventType.USER_LOGIN.value]
+
+
+def _read(query):
+    """Run a SQLAlchemy query through pandas on the session's connection."""
+    return pd.read_sql(query.statement, db.session.connection())
+
+
+def _python(value):
+    """Convert NumPy scalars to plain Python so the payload stays JSON serializable."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def get_student_performance_data(classroom_id, student_id=None, days=90):
+    """Get performance data for students in a classroom (vectorized).
+
+    Args:
+        classroom_id: ID of the classroom
+        student_id: Optional specific student ID, otherwise all students
+        days: Number of days to look back
+
+    Returns:
+        dict: Same shape as analytics_service.get_student_performance_data
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    roster = _active_characters(classroom_id, student_id)
+    character_ids = db.session.query(roster.c.character_id)
+
+    students = _read(
+        db.session.query(
+            roster.c.student_id,
+            roster.c.user_id,
+            Character.id.label('character_id'),
+            Character.name,
+            Character.level,
+            Character.experience,
+            Character.gold
+        )
+        .join(Character, Character.id == roster.c.character_id)
+        .order_by(roster.c.student_id)
+    )
+    if students.empty:
+        return {'students': [], 'class_average': {}}
+
+    events = _read(
+        db.session.query(
+            AuditDailyRollup.character_id,
+            AuditDailyRollup.user_id,
+            AuditDailyRollup.event_type,
+            AuditDailyRollup.day,
+            AuditDailyRollup.total_amount,
+            AuditDailyRollup.positive_amount,
+            AuditDailyRollup.event_count
+        )
+        .filter(
+            db.or_(
+                AuditDailyRollup.character_id.in_(character_ids),
+                AuditDailyRollup.user_id.in_(db.session.query(roster.c.user_id))
+            ),
+            AuditDailyRollup.event_type.in_(XP_EVENTS + GOLD_EVENTS + LOGIN_EVENTS),
+            AuditDailyRollup.day >= since.date()
+        )
+    )
+    quests = _read(
+        db.session.query(
+            QuestLog.character_id,
+            case((QuestLog.status == QuestStatus.COMPLETED, 1), else_=0).label('completed')
+        )
+        .filter(QuestLog.character_id.in_(character_ids))
+    )
+    purchases = _read(
+        db.session.query(ShopPurchase.character_id, ShopPurchase.gold_spent)
+        .filter(
+            ShopPurchase.character_id.in_(character_ids),
+            ShopPurchase.purchase_date >= since
+        )
+    )
+
+    by_character = events[events['character_id'].isin(students['character_id'])]
+
+    # XP progression: one list of (day, xp) per character, days ascending
+    xp = (
+        by_character[by_character['event_type'].isin(XP_EVENTS)]
+        .groupby(['character_id', 'day'], sort=True)['total_amount'].sum()
+        .reset_index()
+    )
+    xp_progression = {
+        character_id: (group['day'].tolist(), [int(v) for v in group['total_amount']])
+        for character_id, group in xp.groupby('character_id', sort=False)
+    }
+
+    # Per-character / per-user totals aligned onto the roster
+    gold_earned = (
+        by_character[by_character['event_type'].isin(GOLD_EVENTS)]
+        .groupby('character_id')['positive_amount'].sum()
+    )
+    logins = (
+        events[events['event_type'].isin(LOGIN_EVENTS) & events['user_id'].isin(students['user_id'])]
+        .groupby('user_id')['event_count'].sum()
+    )
+    quest_counts = quests.groupby('character_id').agg(
+        quests_total=('completed', 'size'),
+        quests_completed=('completed', 'sum')
+    )
+    gold_spent = purchases.groupby('character_id')['gold_spent'].sum()
+
+    students['gold_earned'] = students['character_id'].map(gold_earned).fillna(0).astype(int)
+    students['gold_spent'] = students['character_id'].map(gold_spent).fillna(0).astype(int)
+    students['login_count'] = students['user_id'].map(logins).fillna(0).astype(int)
+    students['quests_total'] = students['character_id'].map(quest_counts['quests_total']).fillna(0).astype(int)
+    students['quests_completed'] = students['character_id'].map(quest_counts['quests_completed']).fillna(0).astype(int)
+    students['quest_completion_rate'] = np.where(
+        students['quests_total'] > 0,
+        students['quests_completed'] / students['quests_total'].where(students['quests_total'] > 0, 1) * 100,
+        0
+    )
+
+    student_data = []
+    for row in students.itertuples(index=False):
+        dates, xp_values = xp_progression.get(row.character_id, ([], []))
+        student_data.append({
+            'student_id': _python(row.student_id),
+            'user_id': _python(row.user_id),
+            'character_id': _python(row.character_id),
+            'name': row.name if row.name else f"Student {row.student_id}",
+            'level': _python(row.level),
+            'experience': _python(row.experience),
+            'gold': _python(row.gold),
+            'quests_completed': _python(row.quests_completed),
+            'quests_total': _python(row.quests_total),
+            'quest_completion_rate': _python(row.quest_completion_rate) if row.quests_total > 0 else 0,
+            'gold_earned': _python(row.gold_earned),
+            'gold_spent': _python(row.gold_spent),
+            'login_count': _python(row.login_count),
+            'xp_progression': {
+                'dates': dates,
+                'xp_values': xp_values
+            }
+        })
+
+    num_students = len(students)
+    total_xp = int(students['experience'].sum())
+    total_quests_completed = int(students['quests_completed'].sum())
+    total_quests_assigned = int(students['quests_total'].sum())
+
+    class_average = {
+        'avg_level': total_xp / num_students / 1000 + 1 if total_xp > 0 else 1,  # Approximate level from XP
+        'avg_quest_completion_rate': (total_quests_completed / total_quests_assigned * 100) if total_quests_assigned > 0 else 0,
+        'avg_gold_earned': int(students['gold_earned'].sum()) / num_students,
+        'avg_gold_spent': int(students['gold_spent'].sum()) / num_students,
+        'avg_logins': int(students['login_count'].sum()) / num_students,
+        'total_students': num_students
+    }
+
+    return {
+        'students': student_data,
+        'class_average': class_average
+    }
+
+
+def get_engagement_metrics(classroom_id, days=30):
+    """Get engagement metrics for a classroom (vectorized).
+
+    Args:
+        classroom_id: ID of the classroom
+        days: Number of days to analyze
+
+    Returns:
+        dict: Same shape as analytics_service.get_engagement_metrics
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+
+    user_ids = db.session.query(Student.user_id).filter(Student.class_id == classroom_id)
+    if not user_ids.first():
+        return {'daily_activity': [], 'event_types': {}}
+    roster = _active_characters(classroom_id)
+
+    events = _read(
+        db.session.query(
+            AuditDailyRollup.day,
+            AuditDailyRollup.event_type,
+            AuditDailyRollup.event_count
+        )
+        .filter(
+            db.or_(
+                AuditDailyRollup.user_id.in_(user_ids),
+                AuditDailyRollup.character_id.in_(db.session.query(roster.c.character_id))
+            ),
+            AuditDailyRollup.day >= since.date()
+        )
+    )
+    daily_activity = events.groupby('day', sort=True)['event_count'].sum()
+    event_types = events.groupby('event_type', sort=False)['event_count'].sum()
+
+    return {
+        'daily_activity': [
+            {'date': str(day), 'count': int(count)}
+            for day, count in daily_activity.items()
+        ],
+        'event_types': {event_type: int(count) for event_type, count in event_types.items()}
+    }
+
+
+def get_quest_completion_analytics(classroom_id, days=90):
+    """Get quest completion analytics for a classroom (vectorized).
+
+    Args:
+        classroom_id: ID of the classroom
+        days: Number of days to look back
+
+    Returns:
+        dict: Same shape as analytics_service.get_quest_completion_analytics
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+
+    roster = _active_characters(classroom_id)
+    if not db.session.query(roster.c.character_id).first():
+        return {'quest_stats': [], 'completion_timeline': []}
+
+    completed = _read(
+        db.session.query(QuestLog.completed_at)
+        .filter(
+            QuestLog.character_id.in_(db.session.query(roster.c.character_id)),
+            QuestLog.status == QuestStatus.COMPLETED,
+            QuestLog.completed_at >= since
+        )
+    )
+    timeline = pd.to_datetime(completed['completed_at']).dt.date.value_counts().sort_index()
+
+    return {
+        'completion_timeline': [
+            {'date': str(day), 'count': int(count)}
+            for day, count in timeline.items()
+        ],
+        'total_completed': int(timeline.sum())
+    }
@@ -5,130 +5,225 @@ from app.models.classroom import Classroom
 from app.models.student import Student
 from app.models.character import Character
 from app.models.quest import QuestLog, QuestStatus
-from app.models.audit import AuditLog, EventType
+from app.models.audit import AuditDailyRollup, EventType
 from app.models.shop import ShopPurchase
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from collections import defaultdict
+from sqlalchemy import case, func
+from flask import current_app
 import logging
+import sys
 
 logger = logging.getLogger(__name__)
 
+ANALYTICS_BACKENDS = ('sql', 'pandas')
 
-def get_student_performance_data(classroom_id, student_id=None, days=90):
-    """Get performance data for students in a classroom.
+
+def get_analytics_backend(name=None):
+    """Return the module implementing the analytics functions.
+
+    ``name`` (one of ANALYTICS_BACKENDS) defaults to the ``ANALYTICS_BACKEND``
+    config value: ``'sql'`` (this module, grouped SQL queries) or
+    ``'pandas'`` (analytics_pandas, vectorized DataFrame operations). Both
+    expose the same functions and return the same shapes. Unknown names and
+    a missing pandas install fall back to SQL.
+    """
+    name = name or current_app.config.get('ANALYTICS_BACKEND', 'sql')
+    if name not in ANALYTICS_BACKENDS:
+        logger.warning(f"Unknown ANALYTICS_BACKEND {name!r} (expected one of {', '.join(ANALYTICS_BACKENDS)}); using the SQL backend")
+    elif name == 'pandas':
+        try:
+            from app.services import analytics_pandas
+            return analytics_pandas
+        except ImportError:
+            logger.warning("ANALYTICS_BACKEND=pandas but pandas is not installed; using the SQL backend")
+    return sys.modules[__name__]
+
+
+def _active_characters(classroom_id, student_id=None):
+    """Build a subquery of (student_id, user_id, character_id) for a classroom.
+
+    Each student is paired with their first active character, matching the
+    ``student.characters.filter_by(is_active=True).first()`` lookup the
+    routes use.
+    """
+    first_active = (
+        db.session.query(
+            Character.student_id.label('student_id'),
+            func.min(Character.id).label('character_id')
+        )
+        .filter(Character.is_active == True)
+        .group_by(Character.student_id)
+        .subquery()
+    )
+    query = (
+        db.session.query(
+            Student.id.label('student_id'),
+            Student.user_id.label('user_id'),
+            first_active.c.character_id.label('character_id')
+        )
+        .join(first_active, first_active.c.student_id == Student.id)
+        .filter(Student.class_id == classroom_id)
+    )
+    if student_id:
+        query = query.filter(Student.id == student_id)
+    return query.subquery()
+
+
+def _student_records(roster, since):
+    """Compute the per-student performance records for a roster subquery.
     
-    Args:
-        classroom_id: ID of the classroom
-        student_id: Optional specific student ID, otherwise all students
-        days: Number of days to look back
-        
-    Returns:
-        dict: Performance data including XP progression, quest completion, etc.
+    Issues one roster query plus five grouped queries, whatever the roster
+    size.
     """
-    since = datetime.utcnow() - timedelta(days=days)
+    rows = (
+        db.session.query(
+            roster.c.student_id,
+            roster.c.user_id,
+            Character.id,
+            Character.name,
+            Character.level,
+            Character.experience,
+            Character.gold
+        )
+        .join(Character, Character.id == roster.c.character_id)
+        .order_by(roster.c.student_id)
+        .all()
+    )
+    if not rows:
+        return []
     
-    # Get students
-    if student_id:
-        students = Student.query.filter_by(id=student_id, class_id=classroom_id).all()
-    else:
-        students = Student.query.filter_by(class_id=classroom_id).all()
+    # XP progression over time
+    xp_by_character = defaultdict(dict)
+    xp_rows = (
+        db.session.query(
+            AuditDailyRollup.character_id,
+            AuditDailyRollup.day,
+            func.sum(AuditDailyRollup.total_amount)
+        )
+        .filter(
+            AuditDailyRollup.character_id.in_(db.session.query(roster.c.character_id)),
+            AuditDailyRollup.event_type.in_([EventType.XP_GAIN.value, EventType.XP_TRANSACTION.value]),
+            AuditDailyRollup.day >= since.date()
+        )
+        .group_by(AuditDailyRollup.character_id, AuditDailyRollup.day)
+        .all()
+    )
+    for character_id, day, amount in xp_rows:
+        xp_by_character[character_id][day] = amount or 0
     
-    if not students:
-        return {'students': [], 'class_average': {}}
+    # Gold earned (positive transactions only)
+    gold_earned_by_character = dict(
+        db.session.query(AuditDailyRollup.character_id, func.sum(AuditDailyRollup.positive_amount))
+        .filter(
+            AuditDailyRollup.character_id.in_(db.session.query(roster.c.character_id)),
+            AuditDailyRollup.event_type == EventType.GOLD_TRANSACTION.value,
+            AuditDailyRollup.day >= since.date()
+        )
+        .group_by(AuditDailyRollup.character_id)
+        .all()
+    )
     
-    student_data = []
-    total_xp = 0
-    total_quests_completed = 0
-    total_quests_assigned = 0
-    total_gold_earned = 0
-    total_gold_spent = 0
-    total_logins = 0
-    
-    for student in students:
-        character = student.characters.filter_by(is_active=True).first()
-        if not character:
-            continue
-        
-        # XP progression over time
-        xp_events = AuditLog.query.filter(
-            AuditLog.character_id == character.id,
-            AuditLog.event_type.in_([EventType.XP_GAIN.value, EventType.XP_TRANSACTION.value]),
-            AuditLog.event_timestamp >= since
-        ).order_by(AuditLog.event_timestamp.asc()).all()
-        
-        xp_by_date = defaultdict(int)
-        for event in xp_events:
-            event_date = event.event_timestamp.date()
-            amount = event.event_data.get('amount', 0) if isinstance(event.event_data, dict) else 0
-            xp_by_date[event_date] += amount
-        
-        # Quest completion stats
-        quest_logs = character.quest_logs.all()
-        completed_quests = [q for q in quest_logs if q.status == QuestStatus.COMPLETED]
-        total_quests = len(quest_logs)
-        
-        # Gold transactions
-        gold_earned_events = AuditLog.query.filter(
-            AuditLog.character_id == character.id,
-            AuditLog.event_type == EventType.GOLD_TRANSACTION.value,
-            AuditLog.event_timestamp >= since
-        ).all()
-        
-        gold_earned = sum(
-            event.event_data.get('amount', 0) 
-            for event in gold_earned_events 
-            if isinstance(event.event_data, dict) and event.event_data.get('amount', 0) > 0
+    # Quest completion stats
+    quest_counts = {
+        character_id: (total, completed or 0)
+        for character_id, total, completed in (
+            db.session.query(
+                QuestLog.character_id,
+                func.count(QuestLog.id),
+                func.sum(case((QuestLog.status == QuestStatus.COMPLETED, 1), else_=0))
+            )
+            .filter(QuestLog.character_id.in_(db.session.query(roster.c.character_id)))
+            .group_by(QuestLog.character_id)
+            .all()
         )
-        
-        gold_spent = ShopPurchase.query.filter(
-            ShopPurchase.character_id == character.id,
+    }
+    
+    # Gold spent in the shop
+    gold_spent_by_character = dict(
+        db.session.query(ShopPurchase.character_id, func.sum(ShopPurchase.gold_spent))
+        .filter(
+            ShopPurchase.character_id.in_(db.session.query(roster.c.character_id)),
             ShopPurchase.purchase_date >= since
-        ).with_entities(db.func.sum(ShopPurchase.gold_spent)).scalar() or 0
-        
-        # Login frequency
-        login_events = AuditLog.query.filter(
-            AuditLog.user_id == student.user_id,
-            AuditLog.event_type.in_([EventType.LOGIN.value, EventType.USER_LOGIN.value]),
-            AuditLog.event_timestamp >= since
-        ).count()
+        )
+        .group_by(ShopPurchase.character_id)
+        .all()
+    )
+    
+    # Login frequency
+    logins_by_user = dict(
+        db.session.query(AuditDailyRollup.user_id, func.sum(AuditDailyRollup.event_count))
+        .filter(
+            AuditDailyRollup.user_id.in_(db.session.query(roster.c.user_id)),
+            AuditDailyRollup.event_type.in_([EventType.LOGIN.value, EventType.USER_LOGIN.value]),
+            AuditDailyRollup.day >= since.date()
+        )
+        .group_by(AuditDailyRollup.user_id)
+        .all()
+    )
+    
+    student_data = []
+    for student_pk, user_id, character_id, name, level, experience, gold in rows:
+        xp_by_date = xp_by_character.get(character_id, {})
+        xp_dates = sorted(xp_by_date.keys())
+        total_quests, completed_quests = quest_counts.get(character_id, (0, 0))
         
         student_data.append({
-            'student_id': student.id,
-            'user_id': student.user_id,
-            'character_id': character.id,
-            'name': character.name if character else f"Student {student.id}",
-            'level': character.level,
-            'experience': character.experience,
-            'gold': character.gold,
-            'quests_completed': len(completed_quests),
+            'student_id': student_pk,
+            'user_id': user_id,
+            'character_id': character_id,
+            'name': name if name else f"Student {student_pk}",
+            'level': level,
+            'experience': experience,
+            'gold': gold,
+            'quests_completed': completed_quests,
             'quests_total': total_quests,
-            'quest_completion_rate': (len(completed_quests) / total_quests * 100) if total_quests > 0 else 0,
-            'gold_earned': gold_earned,
-            'gold_spent': gold_spent,
-            'login_count': login_events,
+            'quest_completion_rate': (completed_quests / total_quests * 100) if total_quests > 0 else 0,
+            'gold_earned': gold_earned_by_character.get(character_id) or 0,
+            'gold_spent': gold_spent_by_character.get(character_id) or 0,
+            'login_count': logins_by_user.get(user_id, 0),
             'xp_progression': {
-                'dates': sorted(xp_by_date.keys()),
-                'xp_values': [xp_by_date[d] for d in sorted(xp_by_date.keys())]
+                'dates': xp_dates,
+                'xp_values': [xp_by_date[d] for d in xp_dates]
             }
         })
+    
+    return student_data
+
+
+def get_student_performance_data(classroom_id, student_id=None, days=90):
+    """Get performance data for students in a classroom.
+    
+    All per-student figures are computed with a fixed number of grouped
+    queries (GROUP BY character_id / user_id / date), so the cost of a call
+    does not grow with the number of students in the class. XP, gold and
+    login figures come from audit_daily_rollup, so the look-back window is
+    day-aligned and costs one row per character per active day.
+    
+    Args:
+        classroom_id: ID of the classroom
+        student_id: Optional specific student ID, otherwise all students
+        days: Number of days to look back
         
-        total_xp += character.experience
-        total_quests_completed += len(completed_quests)
-        total_quests_assigned += total_quests
-        total_gold_earned += gold_earned
-        total_gold_spent += gold_spent
-        total_logins += login_events
+    Returns:
+        dict: Performance data including XP progression, quest completion, etc.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    student_data = _student_records(_active_characters(classroom_id, student_id), since)
+    if not student_data:
+        return {'students': [], 'class_average': {}}
     
     num_students = len(student_data)
-    if num_students == 0:
-        return {'students': [], 'class_average': {}}
+    total_xp = sum(s['experience'] for s in student_data)
+    total_quests_completed = sum(s['quests_completed'] for s in student_data)
+    total_quests_assigned = sum(s['quests_total'] for s in student_data)
     
     class_average = {
         'avg_level': total_xp / num_students / 1000 + 1 if total_xp > 0 else 1,  # Approximate level from XP
         'avg_quest_completion_rate': (total_quests_completed / total_quests_assigned * 100) if total_quests_assigned > 0 else 0,
-        'avg_gold_earned': total_gold_earned / num_students,
-        'avg_gold_spent': total_gold_spent / num_students,
-        'avg_logins': total_logins / num_students,
+        'avg_gold_earned': sum(s['gold_earned'] for s in student_data) / num_students,
+        'avg_gold_spent': sum(s['gold_spent'] for s in student_data) / num_students,
+        'avg_logins': sum(s['login_count'] for s in student_data) / num_students,
         'total_students': num_students
     }
     
@@ -138,6 +233,42 @@ def get_student_performance_data(classroom_id, student_id=None, days=90):
     }
 
 
+def iter_student_performance(classroom_ids, days=90, batch_size=500):
+    """Yield per-student performance records for one or more classrooms.
+    
+    The roster of each classroom is paged by student id (keyset pagination)
+    and each page is computed with the same grouped queries as
+    get_student_performance_data, so memory stays bounded by ``batch_size``
+    and the first records are available before the whole school is read.
+    Records have the shape of ``get_student_performance_data()['students']``
+    items plus ``class_id``.
+    
+    Args:
+        classroom_ids: Iterable of classroom IDs
+        days: Number of days to look back
+        batch_size: Students computed per round of queries
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    for classroom_id in classroom_ids:
+        roster = _active_characters(classroom_id)
+        last_student_id = 0
+        while True:
+            page = (
+                db.session.query(roster.c.student_id, roster.c.user_id, roster.c.character_id)
+                .filter(roster.c.student_id > last_student_id)
+                .order_by(roster.c.student_id)
+                .limit(batch_size)
+                .subquery()
+            )
+            records = _student_records(page, since)
+            for record in records:
+                record['class_id'] = classroom_id
+                yield record
+            if len(records) < batch_size:
+                break
+            last_student_id = records[-1]['student_id']
+
+
 def get_engagement_metrics(classroom_id, days=30):
     """Get engagement metrics for a classroom.
     
@@ -150,39 +281,40 @@ def get_engagement_metrics(classroom_id, days=30):
     """
     since = datetime.utcnow() - timedelta(days=days)
     
-    students = Student.query.filter_by(class_id=classroom_id).all()
-    if not students:
+    user_ids = db.session.query(Student.user_id).filter(Student.class_id == classroom_id)
+    if not user_ids.first():
         return {'daily_activity': [], 'event_types': {}}
-    
-    # Get all audit logs for students in this class
-    user_ids = [s.user_id for s in students]
-    character_ids = []
-    for student in students:
-        character = student.characters.filter_by(is_active=True).first()
-        if character:
-            character_ids.append(character.id)
+    roster = _active_characters(classroom_id)
     
     # Daily activity
     daily_activity = defaultdict(int)
     event_types = defaultdict(int)
     
-    audit_logs = AuditLog.query.filter(
-        db.or_(
-            AuditLog.user_id.in_(user_ids),
-            AuditLog.character_id.in_(character_ids)
-        ),
-        AuditLog.event_timestamp >= since
-    ).all()
+    rows = (
+        db.session.query(
+            AuditDailyRollup.day,
+            AuditDailyRollup.event_type,
+            func.sum(AuditDailyRollup.event_count)
+        )
+        .filter(
+            db.or_(
+                AuditDailyRollup.user_id.in_(user_ids),
+                AuditDailyRollup.character_id.in_(db.session.query(roster.c.character_id))
+            ),
+            AuditDailyRollup.day >= since.date()
+        )
+        .group_by(AuditDailyRollup.day, AuditDailyRollup.event_type)
+        .all()
+    )
     
-    for log in audit_logs:
-        event_date = log.event_timestamp.date()
-        daily_activity[event_date] += 1
-        event_types[log.event_type] += 1
+    for day, event_type, count in rows:
+        daily_activity[day] += count
+        event_types[event_type] += count
     
     return {
         'daily_activity': [
-            {'date': str(date), 'count': count}
-            for date, count in sorted(daily_activity.items())
+            {'date': str(day), 'count': count}
+            for day, count in sorted(daily_activity.items())
         ],
         'event_types': dict(event_types)
     }
@@ -200,37 +332,31 @@ def get_quest_completion_analytics(classroom_id, days=90):
     """
     since = datetime.utcnow() - timedelta(days=days)
     
-    students = Student.query.filter_by(class_id=classroom_id).all()
-    if not students:
-        return {'quest_stats': [], 'completion_timeline': []}
-    
-    character_ids = []
-    for student in students:
-        character = student.characters.filter_by(is_active=True).first()
-        if character:
-            character_ids.append(character.id)
-    
-    if not character_ids:
+    roster = _active_characters(classroom_id)
+    if not db.session.query(roster.c.character_id).first():
         return {'quest_stats': [], 'completion_timeline': []}
     
     # Quest completion timeline
-    completed_quests = QuestLog.query.filter(
-        QuestLog.character_id.in_(character_ids),
-        QuestLog.status == QuestStatus.COMPLETED,
-        QuestLog.completed_at >= since
-    ).all()
-    
-    completion_by_date = defaultdict(int)
-    for quest_log in completed_quests:
-        if quest_log.completed_at:
-            completion_date = quest_log.completed_at.date()
-            completion_by_date[completion_date] += 1
+    rows = (
+        db.session.query(func.date(QuestLog.completed_at), func.count(QuestLog.id))
+        .filter(
+            QuestLog.character_id.in_(db.session.query(roster.c.character_id)),
+            QuestLog.status == QuestStatus.COMPLETED,
+            QuestLog.completed_at >= since
+        )
+        .group_by(func.date(QuestLog.completed_at))
+        .all()
+    )
+    
+    completion_by_date = {
+        date.fromisoformat(completion_date): count
+        for completion_date, count in rows
+    }
     
     return {
         'completion_timeline': [
-            {'date': str(date), 'count': count}
-            for date, count in sorted(completion_by_date.items())
+            {'date': str(day), 'count': count}
+            for day, count in sorted(completion_by_date.items())
         ],
-        'total_completed': len(completed_quests)
+        'total_completed': sum(completion_by_date.values())
     }
-
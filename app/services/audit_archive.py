@@ -0,0 +1,136 @@
+"""Audit log retention: archive old events, keep rollups, compact the table.
+
+Events older than the retention horizon are copied to per-month gzip JSON
+Lines files (``audit_log_YYYY-MM.jsonl.gz``) and then deleted from the hot
+audit_log table in batches. audit_daily_rollup rows are kept, so XP, gold and
+login charts keep their full history; AuditDailyRollup.rebuild never touches
+days that are older than the oldest remaining raw event.
+
+The horizon is aligned to midnight so a day is either fully archived or fully
+hot. Each batch is written and fsynced before its rows are deleted; if a run
+is interrupted between the two, the next run appends the same rows again, so
+readers should de-duplicate on ``id``.
+"""
+
+from app.models import db
+from app.models.audit import AuditLog
+from datetime import datetime, timedelta
+from sqlalchemy import text
+import gzip
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_DAYS = 365
+DEFAULT_BATCH_SIZE = 5000
+
+ARCHIVE_COLUMNS = (
+    'id', 'event_type', 'user_id', 'character_id', 'event_data', 'ip_address',
+    'event_timestamp', 'amount', 'old_value', 'new_value'
+)
+
+
+def archive_path(archive_dir, month):
+    """Path of the archive file for a 'YYYY-MM' month."""
+    return os.path.join(archive_dir, f"audit_log_{month}.jsonl.gz")
+
+
+def get_retention_settings():
+    """Return (retention_days, archive_dir) from the app config."""
+    from flask import current_app
+    retention_days = current_app.config.get('AUDIT_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    archive_dir = current_app.config.get('AUDIT_ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'audit_archive')
+    return retention_days, archive_dir
+
+
+def _to_record(row):
+    record = dict(row._mapping)
+    record['event_timestamp'] = row.event_timestamp.isoformat() if row.event_timestamp else None
+    return record
+
+
+def archive_audit_logs(retention_days=None, archive_dir=None, batch_size=DEFAULT_BATCH_SIZE, compact=True):
+    """Move audit_log rows older than the retention horizon into monthly archives.
+
+    Args:
+        retention_days: keep this many days of raw events (config AUDIT_RETENTION_DAYS)
+        archive_dir: directory for the .jsonl.gz files (config AUDIT_ARCHIVE_DIR)
+        batch_size: rows written and deleted per transaction
+        compact: run ANALYZE and VACUUM afterwards
+
+    Returns:
+        dict: archived row count, horizon and the archive files written to
+    """
+    default_days, default_dir = get_retention_settings()
+    retention_days = default_days if retention_days is None else retention_days
+    archive_dir = archive_dir or default_dir
+    horizon = datetime.combine((datetime.utcnow() - timedelta(days=retention_days)).date(), datetime.min.time())
+    os.makedirs(archive_dir, exist_ok=True)
+
+    archived = 0
+    months = set()
+    last_id = 0
+    columns = [getattr(AuditLog, column) for column in ARCHIVE_COLUMNS]
+    while True:
+        # Plain rows, not ORM objects, so archiving does not fill the identity map
+        rows = (
+            db.session.query(*columns)
+            .filter(AuditLog.event_timestamp < horizon, AuditLog.id > last_id)
+            .order_by(AuditLog.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row.event_timestamp.strftime('%Y-%m'), []).append(_to_record(row))
+        for month, records in by_month.items():
+            # Appending adds a new gzip member; readers see one continuous stream
+            with gzip.open(archive_path(archive_dir, month), 'at', encoding='utf-8') as archive:
+                for record in records:
+                    archive.write(json.dumps(record, default=str) + '\n')
+                archive.flush()
+                os.fsync(archive.fileno())
+            months.add(month)
+
+        ids = [row.id for row in rows]
+        last_id = ids[-1]
+        db.session.execute(AuditLog.__table__.delete().where(AuditLog.id.in_(ids)))
+        db.session.commit()
+        archived += len(ids)
+        logger.info(f"Archived {archived} audit_log rows older than {horizon.date()}")
+
+    if compact and archived:
+        compact_audit_log()
+
+    return {
+        'archived': archived,
+        'horizon': horizon.date().isoformat(),
+        'files': [archive_path(archive_dir, month) for month in sorted(months)]
+    }
+
+
+def compact_audit_log():
+    """Refresh planner statistics and reclaim the space freed by archiving."""
+    db.session.commit()
+    db.session.execute(text('ANALYZE audit_log'))
+    db.session.commit()
+    if db.engine.dialect.name == 'sqlite':
+        # VACUUM cannot run inside a transaction
+        try:
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                connection.exec_driver_sql('VACUUM')
+        except Exception as e:
+            logger.warning(f"VACUUM skipped: {str(e)}")
+
+
+def read_archive(path):
+    """Yield the archived event dicts from one archive file."""
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            if line.strip():
+                yield json.loads(line)
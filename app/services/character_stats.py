@@ -0,0 +1,200 @@
+"""Cached combat-stat snapshots for characters.
+
+``Character.total_health``, ``total_power`` and ``total_defense`` used to
+query the equipped items, lazy-load each item's equipment row and query the
+active status effects separately for every stat, so a character card cost
+3 x (items + 2) queries. The bonuses are now read with one UNION ALL query
+(equipped items joined to their equipment, plus active status effects) and
+kept per character:
+
+- an entry is dropped when the character's inventory or status effects
+  change, or when the character levels up (after_flush for this session,
+  again after_commit/rollback so other requests never keep stale rows);
+  bonuses loaded while such a drop happened are used but not cached;
+- an entry expires on its own when the earliest active status effect runs
+  out, and after ``max_age`` seconds as a bound for writes made by other
+  processes;
+- base stats are read from the character itself, so damage and healing
+  never invalidate anything.
+"""
+
+from app.models import db
+from app.models.character import Character, StatusEffect
+from app.models.equipment import Equipment, Inventory
+from app.utils.commit_hooks import Generations, register_commit_hook
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import case, inspect, literal, null, union_all
+import threading
+
+STATS = ('health', 'power', 'defense')
+
+_PENDING_KEY = 'character_stats_changed'
+
+
+class CharacterStatSnapshot:
+    """Base stats, equipment and status-effect bonuses of one character."""
+
+    def __init__(self, character, bonuses):
+        self.character_id = character.id
+        self.base = {stat: getattr(character, stat) for stat in STATS}
+        self.slots = bonuses['slots']
+        self.equipment_bonus = bonuses['equipment']
+        self.effect_bonus = bonuses['effects']
+
+    def total(self, stat):
+        return self.base[stat] + self.equipment_bonus[stat] + self.effect_bonus[stat]
+
+    @property
+    def total_health(self):
+        return self.total('health')
+
+    @property
+    def total_power(self):
+        return self.total('power')
+
+    @property
+    def total_defense(self):
+        return self.total('defense')
+
+    def to_dict(self):
+        return {
+            'character_id': self.character_id,
+            'base': dict(self.base),
+            'equipment_bonus': dict(self.equipment_bonus),
+            'effect_bonus': dict(self.effect_bonus),
+            'totals': {stat: self.total(stat) for stat in STATS},
+            'slots': {slot: dict(item) for slot, item in self.slots.items()}
+        }
+
+
+class CharacterStatCache:
+    """Per-character bonus cache (LRU) behind ``CharacterStatSnapshot``."""
+
+    def __init__(self, max_entries=2048, max_age=300):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._generations = Generations()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def snapshot(self, character):
+        """Return the ``CharacterStatSnapshot`` of ``character``."""
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(character.id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(character.id)
+                self.hits += 1
+                return CharacterStatSnapshot(character, entry[1])
+            self.misses += 1
+            generation = self._generations.get(character.id)
+
+        bonuses, valid_until = self.load_bonuses(character.id, now)
+        with self._lock:
+            if generation != self._generations.get(character.id):
+                return CharacterStatSnapshot(character, bonuses)
+            self._entries[character.id] = (min(valid_until, now + timedelta(seconds=self.max_age)), bonuses)
+            self._entries.move_to_end(character.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return CharacterStatSnapshot(character, bonuses)
+
+    def invalidate(self, character_id):
+        with self._lock:
+            self._generations.bump(character_id)
+            self._entries.pop(character_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generations.bump_all()
+            self._entries.clear()
+
+    def _bonus_query(self, character_id, now):
+        """UNION ALL of equipped items and active effects as (kind, key, name, health, power, defense, expires_at)."""
+        items = (
+            db.session.query(
+                literal('item').label('kind'),
+                Equipment.slot.label('key'),
+                Equipment.name.label('name'),
+                Equipment.health_bonus.label('health'),
+                Equipment.power_bonus.label('power'),
+                Equipment.defense_bonus.label('defense'),
+                null().label('expires_at')
+            )
+            .join(Inventory, Inventory.item_id == Equipment.id)
+            .filter(Inventory.character_id == character_id, Inventory.is_equipped == True)
+        )
+        effects = (
+            db.session.query(
+                literal('effect'),
+                StatusEffect.stat_affected,
+                StatusEffect.source,
+                *(case((StatusEffect.stat_affected == stat, StatusEffect.amount), else_=0) for stat in STATS),
+                StatusEffect.expires_at
+            )
+            .filter(StatusEffect.character_id == character_id, StatusEffect.expires_at > now)
+        )
+        rows = union_all(items.statement, effects.statement).subquery()
+        return db.session.query(rows)
+
+    def load_bonuses(self, character_id, now=None):
+        """Read the bonuses of one character.
+
+        Returns:
+            tuple: (bonuses dict, time the earliest active effect expires)
+        """
+        now = now or datetime.utcnow()
+        bonuses = {
+            'slots': {},
+            'equipment': dict.fromkeys(STATS, 0),
+            'effects': dict.fromkeys(STATS, 0)
+        }
+        valid_until = datetime.max
+        for kind, key, name, *amounts, expires_at in self._bonus_query(character_id, now):
+            amounts = dict(zip(STATS, (amount or 0 for amount in amounts)))
+            if kind == 'item':
+                slot = bonuses['slots'].setdefault(key, {'items': [], **dict.fromkeys(STATS, 0)})
+                slot['items'].append(name)
+                target = bonuses['equipment']
+            else:
+                target = bonuses['effects']
+                if isinstance(expires_at, str):
+                    # SQLite loses the column type across the UNION
+                    expires_at = datetime.fromisoformat(expires_at)
+                valid_until = min(valid_until, expires_at)
+            for stat, amount in amounts.items():
+                target[stat] += amount
+                if kind == 'item':
+                    slot[stat] += amount
+        return bonuses, valid_until
+
+
+character_stat_cache = CharacterStatCache()
+
+
+def _collect_stat_changes(session):
+    """Drop the snapshots of characters whose equipment, effects or level changed."""
+    character_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Inventory, StatusEffect)) and obj.character_id:
+            character_ids.add(obj.character_id)
+            history = inspect(obj).attrs.character_id.history
+            character_ids.update(cid for cid in history.deleted if cid)
+        elif isinstance(obj, Character) and obj.id:
+            if obj in session.deleted or inspect(obj).attrs.level.history.has_changes():
+                character_ids.add(obj.id)
+    _invalidate_stat_snapshots(character_ids)
+    return character_ids
+
+
+def _invalidate_stat_snapshots(character_ids):
+    for character_id in character_ids:
+        character_stat_cache.invalidate(character_id)
+
+
+# Snapshots taken inside a rolled back transaction may hold its writes
+register_commit_hook(_PENDING_KEY, _invalidate_stat_snapshots, _collect_stat_changes,
+                     on_rollback=_invalidate_stat_snapshots)
@@ -0,0 +1,120 @@
+"""Batched data loading for the teacher clan dashboard.
+
+The dashboard used to run, for every clan, a latest-progress query, a
+history query, a recent-activity query, a member count and a lazy leader
+load. ``load_clan_dashboard`` fetches the same data for all clans of the
+page with a fixed number of queries:
+
+- latest ClanProgressHistory row per clan (ROW_NUMBER window);
+- history series via load_clan_history (raw rows + stored buckets);
+- member counts and leader names (one grouped query);
+- the newest ``activity_limit`` clan events per clan (ROW_NUMBER window over
+  audit_log joined to the members' characters).
+"""
+
+from app.models import db
+from app.models.audit import AuditLog
+from app.models.character import Character
+from app.models.clan import Clan
+from app.models.clan_progress import ClanProgressHistory
+from app.services.clan_history import load_clan_history
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+DASHBOARD_EVENT_TYPES = ('CLAN_JOIN', 'CLAN_LEAVE', 'QUEST_COMPLETE', 'QUEST_FAIL')
+
+
+def _latest_progress(clan_ids):
+    """clan_id -> newest ClanProgressHistory row."""
+    position = func.row_number().over(
+        partition_by=ClanProgressHistory.clan_id,
+        order_by=(ClanProgressHistory.timestamp.desc(), ClanProgressHistory.id.desc())
+    ).label('position')
+    ranked = (
+        db.session.query(ClanProgressHistory.id, position)
+        .filter(ClanProgressHistory.clan_id.in_(clan_ids))
+        .subquery()
+    )
+    rows = (
+        ClanProgressHistory.query
+        .join(ranked, ranked.c.id == ClanProgressHistory.id)
+        .filter(ranked.c.position == 1)
+    )
+    return {row.clan_id: row for row in rows}
+
+
+def _member_summary(clan_ids):
+    """clan_id -> (member_count, leader name or None)."""
+    leader = aliased(Character)
+    member_count = (
+        db.session.query(Character.clan_id, func.count(Character.id).label('member_count'))
+        .filter(Character.clan_id.in_(clan_ids))
+        .group_by(Character.clan_id)
+        .subquery()
+    )
+    rows = (
+        db.session.query(Clan.id, member_count.c.member_count, leader.name)
+        .outerjoin(member_count, member_count.c.clan_id == Clan.id)
+        .outerjoin(leader, leader.id == Clan.leader_id)
+        .filter(Clan.id.in_(clan_ids))
+    )
+    return {clan_id: (count or 0, leader_name) for clan_id, count, leader_name in rows}
+
+
+def _recent_activity(clan_ids, event_types, limit):
+    """clan_id -> newest ``limit`` AuditLog events of the clan's characters."""
+    position = func.row_number().over(
+        partition_by=Character.clan_id,
+        order_by=(AuditLog.event_timestamp.desc(), AuditLog.id.desc())
+    ).label('position')
+    ranked = (
+        db.session.query(AuditLog.id, Character.clan_id.label('clan_id'), position)
+        .join(Character, Character.id == AuditLog.character_id)
+        .filter(Character.clan_id.in_(clan_ids), AuditLog.event_type.in_(event_types))
+        .subquery()
+    )
+    rows = (
+        db.session.query(ranked.c.clan_id, AuditLog)
+        .join(ranked, ranked.c.id == AuditLog.id)
+        .filter(ranked.c.position <= limit)
+        .order_by(ranked.c.clan_id, ranked.c.position)
+    )
+    activity = {clan_id: [] for clan_id in clan_ids}
+    for clan_id, log in rows:
+        activity[clan_id].append(log)
+    return activity
+
+
+def load_clan_dashboard(clan_ids, since=None, max_points=None, activity_limit=10,
+                        event_types=DASHBOARD_EVENT_TYPES):
+    """Dashboard data for many clans with a constant number of queries.
+
+    Args:
+        clan_ids: clans to load
+        since: start of the history window (default: all history)
+        max_points: history point budget per clan (see load_clan_history)
+        activity_limit: recent events kept per clan
+        event_types: AuditLog event types shown as clan activity
+
+    Returns:
+        dict: clan_id -> {'latest_progress': ClanProgressHistory or None,
+            'history': list of point dicts, 'member_count': int,
+            'leader': leader name or None, 'recent_activity': list of AuditLog}
+    """
+    clan_ids = list(clan_ids)
+    if not clan_ids:
+        return {}
+    latest = _latest_progress(clan_ids)
+    histories = load_clan_history(clan_ids, since, max_points=max_points)
+    members = _member_summary(clan_ids)
+    activity = _recent_activity(clan_ids, list(event_types), activity_limit)
+    return {
+        clan_id: {
+            'latest_progress': latest.get(clan_id),
+            'history': histories[clan_id],
+            'member_count': members.get(clan_id, (0, None))[0],
+            'leader': members.get(clan_id, (0, None))[1],
+            'recent_activity': activity[clan_id],
+        }
+        for clan_id in clan_ids
+    }
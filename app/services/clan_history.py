@@ -0,0 +1,321 @@
+"""Multi-resolution clan progress history.
+
+The metrics job adds a ClanProgressHistory row per clan on every run, so
+charts over long ranges used to load every row. History is now kept in
+tiers:
+
+- raw rows for the last CLAN_HISTORY_RAW_DAYS days (default 90);
+- weekly min/max/avg buckets (ClanProgressRollup) up to
+  CLAN_HISTORY_WEEKLY_DAYS days (default 730);
+- monthly buckets beyond that.
+
+``compact_clan_history`` moves data down the tiers (``flask
+compact-clan-history`` or the weekly ``compact_clan_history`` job of the
+built-in scheduler, app.services.scheduler). Horizons are aligned to
+the start of a week/month, so a bucket never mixes tiers; raw rows that
+arrive late for an already compacted bucket are merged into it.
+
+``load_clan_history`` reads the raw rows and buckets of a window for many
+clans at once and downsamples them on the fly to a requested resolution
+and/or point budget, so the size of a chart does not depend on how much
+history is stored.
+"""
+
+from app.models import db
+from app.models.clan_progress import ClanProgressHistory, ClanProgressRollup
+from datetime import datetime, timedelta
+import math
+
+HISTORY_METRICS = (
+    'avg_completion_rate', 'total_points', 'active_members', 'avg_daily_points',
+    'quest_completion_rate', 'avg_member_level', 'percentile_rank'
+)
+RESOLUTIONS = ('raw', 'day', 'week', 'month')
+
+DEFAULT_RAW_DAYS = 90
+DEFAULT_WEEKLY_DAYS = 730
+
+
+def bucket_start(timestamp, resolution):
+    """Start of the ``resolution`` bucket holding ``timestamp`` (weeks start on Monday)."""
+    if resolution == 'raw':
+        return timestamp
+    day = datetime.combine(timestamp.date(), datetime.min.time())
+    if resolution == 'day':
+        return day
+    if resolution == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def bucket_end(start, resolution):
+    if resolution == 'week':
+        return start + timedelta(days=7)
+    if resolution == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def get_history_settings():
+    """Return (raw_days, weekly_days) from the app config."""
+    from flask import current_app
+    return (
+        current_app.config.get('CLAN_HISTORY_RAW_DAYS', DEFAULT_RAW_DAYS),
+        current_app.config.get('CLAN_HISTORY_WEEKLY_DAYS', DEFAULT_WEEKLY_DAYS)
+    )
+
+
+# A point is {'clan_id', 'timestamp', 'resolution', 'samples', 'stats'} where
+# stats maps each metric to [min, max, total, count] over its non-null samples.
+
+def _raw_point(row):
+    stats = {}
+    for metric in HISTORY_METRICS:
+        value = getattr(row, metric)
+        stats[metric] = [value, value, value, 1] if value is not None else [None, None, 0, 0]
+    return {'clan_id': row.clan_id, 'timestamp': row.timestamp, 'resolution': 'raw', 'samples': 1, 'stats': stats}
+
+
+def _rollup_point(row):
+    stats = {}
+    for metric in HISTORY_METRICS:
+        average = getattr(row, f'{metric}_avg')
+        stats[metric] = [
+            getattr(row, f'{metric}_min'),
+            getattr(row, f'{metric}_max'),
+            average * row.samples if average is not None else 0,
+            row.samples if average is not None else 0
+        ]
+    return {'clan_id': row.clan_id, 'timestamp': row.bucket_start, 'resolution': row.resolution,
+            'samples': row.samples, 'stats': stats}
+
+
+def _merge(target, point):
+    target['samples'] += point['samples']
+    for metric, (low, high, total, count) in point['stats'].items():
+        current = target['stats'][metric]
+        if count:
+            current[0] = low if current[0] is None else min(current[0], low)
+            current[1] = high if current[1] is None else max(current[1], high)
+            current[2] += total
+            current[3] += count
+
+
+def _empty_point(clan_id, timestamp, resolution):
+    return {'clan_id': clan_id, 'timestamp': timestamp, 'resolution': resolution, 'samples': 0,
+            'stats': {metric: [None, None, 0, 0] for metric in HISTORY_METRICS}}
+
+
+def _rollup_values(point):
+    values = {'samples': point['samples']}
+    for metric, (low, high, total, count) in point['stats'].items():
+        values[f'{metric}_min'] = low
+        values[f'{metric}_max'] = high
+        values[f'{metric}_avg'] = total / count if count else None
+    return values
+
+
+def compact_clan_history(raw_days=None, weekly_days=None, now=None):
+    """Roll old raw history into weekly buckets and old weekly buckets into monthly ones.
+
+    Args:
+        raw_days: keep raw rows this many days (config CLAN_HISTORY_RAW_DAYS)
+        weekly_days: keep weekly buckets this many days (config CLAN_HISTORY_WEEKLY_DAYS)
+        now: reference time (default: utcnow)
+
+    Returns:
+        dict: raw rows and weekly buckets compacted, buckets written, horizons.
+            The caller commits.
+    """
+    default_raw, default_weekly = get_history_settings()
+    raw_days = default_raw if raw_days is None else raw_days
+    weekly_days = default_weekly if weekly_days is None else weekly_days
+    now = now or datetime.utcnow()
+    raw_horizon = bucket_start(now - timedelta(days=raw_days), 'week')
+    weekly_horizon = bucket_start(now - timedelta(days=max(weekly_days, raw_days)), 'month')
+
+    def target(timestamp):
+        week = bucket_start(timestamp, 'week')
+        if week < weekly_horizon:
+            return 'month', bucket_start(week, 'month')
+        return 'week', week
+
+    buckets = {}
+
+    def add(point, resolution, start):
+        key = (point['clan_id'], resolution, start)
+        if key not in buckets:
+            buckets[key] = _empty_point(point['clan_id'], start, resolution)
+        _merge(buckets[key], point)
+
+    columns = [ClanProgressHistory.clan_id, ClanProgressHistory.timestamp,
+               *(getattr(ClanProgressHistory, metric) for metric in HISTORY_METRICS)]
+    raw_rows = 0
+    for row in db.session.query(*columns).filter(ClanProgressHistory.timestamp < raw_horizon).yield_per(1000):
+        add(_raw_point(row), *target(row.timestamp))
+        raw_rows += 1
+
+    old_weeks = (
+        ClanProgressRollup.query
+        .filter(ClanProgressRollup.resolution == 'week', ClanProgressRollup.bucket_start < weekly_horizon)
+        .all()
+    )
+    for row in old_weeks:
+        add(_rollup_point(row), 'month', bucket_start(row.bucket_start, 'month'))
+    for row in old_weeks:
+        db.session.delete(row)
+    db.session.flush()
+
+    if buckets:
+        clan_ids = {clan_id for clan_id, _, _ in buckets}
+        starts = {start for _, _, start in buckets}
+        existing = {
+            (row.clan_id, row.resolution, row.bucket_start): row
+            for row in ClanProgressRollup.query.filter(
+                ClanProgressRollup.clan_id.in_(clan_ids),
+                ClanProgressRollup.bucket_start.in_(starts)
+            )
+        }
+        for key, point in buckets.items():
+            row = existing.get(key)
+            if row is not None:
+                _merge(point, _rollup_point(row))
+            else:
+                row = ClanProgressRollup(clan_id=key[0], resolution=key[1], bucket_start=key[2])
+                db.session.add(row)
+            for column, value in _rollup_values(point).items():
+                setattr(row, column, value)
+
+    if raw_rows:
+        db.session.execute(
+            ClanProgressHistory.__table__.delete().where(ClanProgressHistory.timestamp < raw_horizon)
+        )
+    return {
+        'raw_rows': raw_rows,
+        'weekly_buckets': len(old_weeks),
+        'buckets_written': len(buckets),
+        'raw_horizon': raw_horizon.date().isoformat(),
+        'weekly_horizon': weekly_horizon.date().isoformat()
+    }
+
+
+def _downsample(points, resolution):
+    """Group points finer than ``resolution`` into ``resolution`` buckets."""
+    rank = RESOLUTIONS.index(resolution)
+    result = []
+    current = None
+    for point in points:
+        if RESOLUTIONS.index(point['resolution']) >= rank:
+            result.append(point)
+            current = None
+            continue
+        start = bucket_start(point['timestamp'], resolution)
+        if current is None or current['timestamp'] != start:
+            current = _empty_point(point['clan_id'], start, resolution)
+            result.append(current)
+        _merge(current, point)
+    return result
+
+
+def _fit(points, resolution, max_points):
+    """Coarsen ``points`` until there are at most ``max_points`` of them."""
+    points = _downsample(points, resolution)
+    while max_points and len(points) > max_points and resolution != 'month':
+        resolution = RESOLUTIONS[RESOLUTIONS.index(resolution) + 1]
+        points = _downsample(points, resolution)
+    if max_points and len(points) > max_points:
+        # Even monthly buckets are too many: merge runs of consecutive buckets
+        size = math.ceil(len(points) / max_points)
+        merged = []
+        for index in range(0, len(points), size):
+            group = points[index:index + size]
+            point = _empty_point(group[0]['clan_id'], group[0]['timestamp'], 'month')
+            for member in group:
+                _merge(point, member)
+            merged.append(point)
+        points = merged
+    return points
+
+
+def _serialize(point):
+    if point['resolution'] == 'raw':
+        data = {metric: point['stats'][metric][0] for metric in HISTORY_METRICS}
+    else:
+        data = {
+            metric: (total / count if count else None)
+            for metric, (_, _, total, count) in point['stats'].items()
+        }
+        data['min'] = {metric: stats[0] for metric, stats in point['stats'].items()}
+        data['max'] = {metric: stats[1] for metric, stats in point['stats'].items()}
+    data['timestamp'] = point['timestamp'].isoformat()
+    data['resolution'] = point['resolution']
+    data['samples'] = point['samples']
+    return data
+
+
+def load_clan_history(clan_ids, since=None, resolution='raw', max_points=None):
+    """Clan progress series for many clans, downsampled to fit.
+
+    Reads the raw rows and stored buckets of the window with two queries.
+    Points finer than ``resolution`` are grouped into ``resolution`` buckets
+    (stored buckets coarser than it are returned as they are); if a clan
+    still has more than ``max_points`` points, the resolution is coarsened
+    step by step until it fits.
+
+    Args:
+        clan_ids: clans to load
+        since: start of the window (default: all history)
+        resolution: 'raw', 'day', 'week' or 'month'
+        max_points: point budget per clan (default: unlimited)
+
+    Returns:
+        dict: clan_id -> list of point dicts, oldest first. Each point has the
+            metric values (the averages for buckets), ``timestamp``,
+            ``resolution`` and ``samples``; buckets also have ``min`` and
+            ``max`` dicts of the metric values.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    clan_ids = list(clan_ids)
+    series = {clan_id: [] for clan_id in clan_ids}
+    if not clan_ids:
+        return series
+
+    rollups = ClanProgressRollup.query.filter(ClanProgressRollup.clan_id.in_(clan_ids))
+    raw = db.session.query(
+        ClanProgressHistory.clan_id, ClanProgressHistory.timestamp,
+        *(getattr(ClanProgressHistory, metric) for metric in HISTORY_METRICS)
+    ).filter(ClanProgressHistory.clan_id.in_(clan_ids))
+    if since is not None:
+        # A bucket overlaps the window if it ends after ``since``; months are at most 31 days
+        rollups = rollups.filter(ClanProgressRollup.bucket_start > since - timedelta(days=31))
+        raw = raw.filter(ClanProgressHistory.timestamp >= since)
+
+    for row in rollups:
+        if since is None or bucket_end(row.bucket_start, row.resolution) > since:
+            series[row.clan_id].append(_rollup_point(row))
+    for row in raw:
+        series[row.clan_id].append(_raw_point(row))
+
+    return {
+        clan_id: [
+            _serialize(point)
+            for point in _fit(sorted(points, key=lambda point: point['timestamp']), resolution, max_points)
+        ]
+        for clan_id, points in series.items()
+    }
+
+
+def parse_history_args(args, default_max_points=None):
+    """Read ``resolution`` and ``max_points`` from request args.
+
+    Raises:
+        ValueError: for an unknown resolution or a non-positive point budget
+    """
+    resolution = args.get('resolution', 'raw')
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    max_points = args.get('max_points', default_max_points, type=int)
+    if max_points is not None and max_points < 1:
+        raise ValueError("max_points must be a positive integer")
+    return resolution, max_points
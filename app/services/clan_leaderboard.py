@@ -0,0 +1,287 @@
+"""Materialized clan leaderboard (the clan_leaderboard table).
+
+Each class's leaderboard is stored ranked, one row per clan, so
+``GET /classes/<id>/clan-leaderboard`` is a single indexed read. Rows are
+rewritten:
+
+- by ``refresh_clan_leaderboard``, called from the clan metrics job
+  (update_clan_metrics and the ``clan_metrics`` background job) with the full
+  metrics;
+- inside any flush that changes a character's experience, clan membership or
+  the clans of a class. That refresh recomputes the total points of the
+  changed clans only, adds or drops the rows of created or deleted clans,
+  and re-ranks the affected classes with one window-function UPDATE, all in
+  the same transaction; completion rates stay those of the last metrics run.
+
+Clans are ranked by total points (ties by clan id) and the percentile uses
+the same formula as app.services.clan_ranking with ``ties='ordered'``:
+``100 - int(position / clan_count * 100)``. The same flush listener tells
+clan_ranking which classes to drop from its cache.
+"""
+
+from app.models import db
+from app.models.character import Character
+from app.models.clan import Clan
+from app.models.clan_leaderboard import ClanLeaderboardEntry
+from app.models.student import Student
+from app.services.clan_ranking import mark_classes_changed
+from collections import defaultdict
+from sqlalchemy import Float, Integer, bindparam, cast, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+
+def _rank_rows(clans, values):
+    """Leaderboard rows for ``clans``, ranked within each class.
+
+    Args:
+        clans: (clan_id, class_id) pairs of every clan in the classes to rank
+        values: clan_id -> (total_points, avg_completion_rate)
+    """
+    by_class = defaultdict(list)
+    for clan_id, class_id in clans:
+        by_class[class_id].append(clan_id)
+
+    rows = []
+    for class_id, clan_ids in by_class.items():
+        ordered = sorted(clan_ids, key=lambda clan_id: (-values.get(clan_id, (0, 0.0))[0], clan_id))
+        for position, clan_id in enumerate(ordered):
+            total_points, avg_completion_rate = values.get(clan_id, (0, 0.0))
+            rows.append({
+                'class_id': class_id,
+                'clan_id': clan_id,
+                'rank': position + 1,
+                'total_points': total_points,
+                'avg_completion_rate': avg_completion_rate,
+                'percentile_rank': 100 - int((position / len(ordered)) * 100),
+            })
+    return rows
+
+
+def _leaderboard_values(clan_ids, metrics=None):
+    """clan_id -> (total_points, avg_completion_rate), from ``metrics`` or computed here."""
+    from app.services.clan_metrics import current_clan_metrics
+
+    if metrics is None:
+        metrics = current_clan_metrics(list(clan_ids), include_custom=False)
+    return {
+        clan_id: (clan_metrics['total_points'], clan_metrics['avg_completion_rate'])
+        for clan_id, clan_metrics in metrics.items()
+    }
+
+
+def _store_leaderboard(connection, clans, values, class_ids):
+    """Replace the leaderboard rows of ``class_ids``.
+
+    Args:
+        connection: connection of the current transaction
+        clans: (clan_id, class_id) pairs of every clan in those classes
+        values: clan_id -> (total_points, avg_completion_rate)
+        class_ids: classes being rewritten (classes without clans end up empty)
+    """
+    rows = _rank_rows(clans, values)
+    table = ClanLeaderboardEntry.__table__
+    connection.execute(table.delete().where(table.c.class_id.in_(list(class_ids))))
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def refresh_clan_leaderboard(class_ids=None, metrics=None):
+    """Rebuild the materialized leaderboard from clan metrics.
+
+    Args:
+        class_ids: Classes to rebuild (default: every class)
+        metrics: clan_id -> metrics dict as returned by calculate_all_clan_metrics;
+            computed here when not given
+
+    Returns:
+        int: number of clans ranked. The caller commits.
+    """
+    clan_query = db.session.query(Clan.id, Clan.class_id)
+    if class_ids is not None:
+        clan_query = clan_query.filter(Clan.class_id.in_(class_ids))
+    clans = clan_query.all()
+    values = _leaderboard_values([clan_id for clan_id, _ in clans], metrics)
+    if class_ids is None:
+        # Full rebuild: also drops rows of classes that no longer have clans
+        class_ids = {class_id for (class_id,) in db.session.query(ClanLeaderboardEntry.class_id).distinct()}
+        class_ids |= {class_id for _, class_id in clans}
+    _store_leaderboard(db.session.connection(), clans, values, class_ids)
+    return len(clans)
+
+
+def get_clan_leaderboard(class_id):
+    """Return the ranked leaderboard of a class as a list of dicts.
+
+    One query against clan_leaderboard. Clans get their rows when they are
+    created; a class whose clans predate the table is ranked on the fly here,
+    without writing, until the next clan metrics job stores it.
+    """
+    entries = _read_leaderboard(class_id)
+    if entries:
+        return entries
+    clans = db.session.query(Clan.id, Clan.name).filter(Clan.class_id == class_id).all()
+    if not clans:
+        return []
+    names = dict(clans)
+    rows = _rank_rows([(clan_id, class_id) for clan_id in names], _leaderboard_values(names))
+    return [
+        {
+            'id': row['clan_id'],
+            'name': names[row['clan_id']],
+            'total_points': row['total_points'],
+            'avg_completion_rate': row['avg_completion_rate'],
+            'percentile_rank': row['percentile_rank'],
+            'rank': row['rank']
+        }
+        for row in rows
+    ]
+
+
+def _read_leaderboard(class_id):
+    rows = (
+        db.session.query(
+            ClanLeaderboardEntry.clan_id,
+            Clan.name,
+            ClanLeaderboardEntry.total_points,
+            ClanLeaderboardEntry.avg_completion_rate,
+            ClanLeaderboardEntry.percentile_rank,
+            ClanLeaderboardEntry.rank
+        )
+        .join(Clan, Clan.id == ClanLeaderboardEntry.clan_id)
+        .filter(ClanLeaderboardEntry.class_id == class_id)
+        .order_by(ClanLeaderboardEntry.rank)
+        .all()
+    )
+    return [
+        {
+            'id': clan_id,
+            'name': name,
+            'total_points': total_points,
+            'avg_completion_rate': avg_completion_rate,
+            'percentile_rank': percentile_rank,
+            'rank': rank
+        }
+        for clan_id, name, total_points, avg_completion_rate, percentile_rank, rank in rows
+    ]
+
+
+def _changed(obj, *attributes):
+    state = inspect(obj)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+def _affected_clans(session):
+    """Clans whose points change in the current flush and the classes to re-rank.
+
+    Returns:
+        tuple: (clan_ids, class_ids)
+    """
+    student_ids, clan_ids, class_ids, moved_clan_ids = set(), set(), set(), set()
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, Character) and obj.experience and obj.student_id:
+            student_ids.add(obj.student_id)
+        elif isinstance(obj, Student) and obj.clan_id:
+            clan_ids.add(obj.clan_id)
+        elif isinstance(obj, Clan) and obj.class_id:
+            class_ids.add(obj.class_id)
+    for obj in session.dirty:
+        if isinstance(obj, Character) and _changed(obj, 'experience', 'student_id'):
+            history = inspect(obj).attrs.student_id.history
+            student_ids.update(student_id for student_id in (obj.student_id, *history.deleted) if student_id)
+        elif isinstance(obj, Student) and _changed(obj, 'clan_id'):
+            history = inspect(obj).attrs.clan_id.history
+            clan_ids.update(clan_id for clan_id in (*history.added, *history.deleted) if clan_id)
+        elif isinstance(obj, Clan) and _changed(obj, 'class_id'):
+            # A moved clan leaves its old class's leaderboard and joins the new one
+            history = inspect(obj).attrs.class_id.history
+            class_ids.update(class_id for class_id in (obj.class_id, *history.deleted) if class_id)
+            moved_clan_ids.add(obj.id)
+    if not (student_ids or clan_ids or moved_clan_ids):
+        return clan_ids, class_ids
+
+    connection = session.connection()
+    if moved_clan_ids:
+        # The old class is missing from the history when class_id was set while
+        # expired; the clan's stored row still names it
+        table = ClanLeaderboardEntry.__table__
+        class_ids.update(connection.execute(
+            select(table.c.class_id).where(table.c.clan_id.in_(moved_clan_ids)).distinct()
+        ).scalars())
+    if student_ids:
+        clan_ids.update(connection.execute(
+            select(Student.clan_id).where(Student.id.in_(student_ids), Student.clan_id.isnot(None)).distinct()
+        ).scalars())
+    if clan_ids:
+        class_ids.update(connection.execute(
+            select(Clan.class_id).where(Clan.id.in_(clan_ids)).distinct()
+        ).scalars())
+    return clan_ids, class_ids
+
+
+def _rerank(class_ids, dialect_name):
+    """One UPDATE ... FROM re-ranking the stored rows of ``class_ids`` by points."""
+    table = ClanLeaderboardEntry.__table__
+    partition = {'partition_by': table.c.class_id}
+    ranked = select(
+        table.c.id,
+        func.row_number().over(order_by=(table.c.total_points.desc(), table.c.clan_id), **partition).label('new_rank'),
+        func.count().over(**partition).label('clan_count')
+    ).where(table.c.class_id.in_(class_ids)).subquery()
+    # The float arithmetic of the Python formula, truncated like int() (CAST rounds outside SQLite)
+    share = cast(ranked.c.new_rank - 1, Float) / cast(ranked.c.clan_count, Float) * 100
+    if dialect_name != 'sqlite':
+        share = func.floor(share)
+    return (
+        table.update()
+        .where(table.c.id == ranked.c.id)
+        .values(rank=ranked.c.new_rank, percentile_rank=100 - cast(share, Integer))
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_leaderboard_points(session, flush_context):
+    """Update the points of the changed clans and re-rank their classes, inside the flush."""
+    clan_ids, class_ids = _affected_clans(session)
+    if not class_ids:
+        return
+    mark_classes_changed(session, class_ids)
+    connection = session.connection()
+    table = ClanLeaderboardEntry.__table__
+    # Rows of clans that were deleted from these classes
+    connection.execute(table.delete().where(
+        table.c.class_id.in_(class_ids),
+        ~select(Clan.id).where(Clan.id == table.c.clan_id, Clan.class_id == table.c.class_id).exists()
+    ))
+    # Clans without a row yet: new clans, or a class that was never materialized
+    missing = dict(connection.execute(
+        select(Clan.id, Clan.class_id).where(
+            Clan.class_id.in_(class_ids),
+            ~select(table.c.id).where(table.c.clan_id == Clan.id).exists()
+        )
+    ).all())
+    refreshed = clan_ids | set(missing)
+    if refreshed:
+        points = dict(connection.execute(
+            select(Student.clan_id, func.sum(Character.experience))
+            .join_from(Character, Student, Student.id == Character.student_id)
+            .where(Student.clan_id.in_(refreshed))
+            .group_by(Student.clan_id)
+        ).all())
+        updated = [
+            {'b_clan_id': clan_id, 'b_total_points': points.get(clan_id) or 0}
+            for clan_id in clan_ids if clan_id not in missing
+        ]
+        if updated:
+            connection.execute(
+                table.update()
+                .where(table.c.clan_id == bindparam('b_clan_id'))
+                .values(total_points=bindparam('b_total_points')),
+                updated
+            )
+        if missing:
+            connection.execute(table.insert(), [
+                {'class_id': class_id, 'clan_id': clan_id, 'rank': 0, 'total_points': points.get(clan_id) or 0,
+                 'avg_completion_rate': 0.0, 'percentile_rank': 0}
+                for clan_id, class_id in missing.items()
+            ])
+    connection.execute(_rerank(class_ids, connection.dialect.name))
@@ -3,42 +3,68 @@ from sqlalchemy import func
 from app.models.clan import Clan
 from app.models.student import Student
 from app.models.character import Character
-from app.models.clan_progress import ClanProgressHistory
+from app.models.clan_progress import ClanProgressHistory, ClanMetricTotals
 # If QuestAssignment is not available, replace with QuestLog or similar
 try:
     from app.models.quest_assignment import QuestAssignment
 except ImportError:
     from app.models.quest import QuestLog as QuestAssignment
 from app.models import db
-from app.models.audit import AuditLog
-from sqlalchemy import and_
+from app.models.audit import AuditDailyRollup
+from app.models.quest import QuestStatus
+from app.services.custom_metrics import custom_metric_executor
+from sqlalchemy import and_, bindparam, case, event, inspect, select
+from sqlalchemy.orm import Session
+from collections import defaultdict
+import logging
+import math
+
+logger = logging.getLogger(__name__)
 
 # Registry for custom metrics
 CUSTOM_METRICS = {}
 
-def register_custom_metric(name, calculation_func, description=None):
-    """Register a custom clan metric"""
+def register_custom_metric(name, calculation_func, description=None, ttl=0, timeout=None):
+    """Register a custom clan metric
+
+    Args:
+        name: Key of the metric in the clan metrics dict
+        calculation_func: Called with a clan id; runs on the custom metric pool
+            (see app.services.custom_metrics) and sees committed data only
+        description: Human readable description
+        ttl: Seconds a computed value is reused for the same clan (0: never)
+        timeout: Seconds to wait for a value (default CLAN_CUSTOM_METRIC_TIMEOUT);
+            a late or failing metric reports its last cached value or None
+    """
     CUSTOM_METRICS[name] = {
         'func': calculation_func,
-        'description': description or f"Custom metric: {name}"
+        'description': description or f"Custom metric: {name}",
+        'ttl': ttl,
+        'timeout': timeout
     }
 
+def _completed_flag():
+    return case((QuestAssignment.status == QuestStatus.COMPLETED, 1), else_=0)
+
+def _member_quest_counts(clan_ids, session=None):
+    """Rows of (clan_id, assigned, completed) for every clan member with quests.
+
+    One aggregate query over quest_logs, grouped per member (Student.clan_id),
+    with the completed count taken as a conditional SUM on the status.
+    """
+    return (
+        (session or db.session).query(Student.clan_id, func.count(QuestAssignment.id), func.sum(_completed_flag()))
+        .join(Character, Character.student_id == Student.id)
+        .join(QuestAssignment, QuestAssignment.character_id == Character.id)
+        .filter(Student.clan_id.in_(clan_ids))
+        .group_by(Student.clan_id, Student.id)
+        .all()
+    )
+
 def calculate_avg_completion_rate(clan):
     """Calculate the average quest completion rate for clan members"""
-    members = Student.query.filter_by(clan_id=clan.id).all()
-    if not members:
-        return 0.0
-    completion_rates = []
-    for member in members:
-        characters = Character.query.filter_by(student_id=member.id).all()
-        if not characters:
-            continue
-        assigned = sum(QuestAssignment.query.filter_by(character_id=char.id).count() for char in characters)
-        if assigned == 0:
-            continue
-        completed = sum(QuestAssignment.query.filter_by(character_id=char.id, status='completed').count() for char in characters)
-        completion_rates.append(completed / assigned if assigned > 0 else 0)
-    return sum(completion_rates) / len(completion_rates) if completion_rates else 0.0
+    rates = [(completed or 0) / assigned for _, assigned, completed in _member_quest_counts([clan.id])]
+    return sum(rates) / len(rates) if rates else 0.0
 
 def calculate_total_points(clan):
     """Calculate total points earned by all clan members"""
@@ -55,45 +81,36 @@ def calculate_active_members(clan, days=7):
         .scalar() or 0)
 
 def calculate_avg_daily_points(clan, days=7):
-    """Calculate average daily points earned by clan in the last N days using AuditLog XP_GAIN events."""
+    """Calculate average daily points earned by clan in the last N days using XP_GAIN rollup rows."""
     cutoff = datetime.utcnow() - timedelta(days=days)
     # Get all character IDs in the clan
     character_ids = [char.id for char in clan.members]
     if not character_ids:
         return 0.0
-    # Query all XP_GAIN events for these characters in the time window
-    logs = (
-        AuditLog.query
+    # Sum the per-day XP_GAIN totals for these characters in the time window
+    total_xp = (
+        db.session.query(func.sum(AuditDailyRollup.total_amount))
         .filter(
-            AuditLog.event_type == 'XP_GAIN',
-            AuditLog.character_id.in_(character_ids),
-            AuditLog.event_timestamp >= cutoff
+            AuditDailyRollup.event_type == 'XP_GAIN',
+            AuditDailyRollup.character_id.in_(character_ids),
+            AuditDailyRollup.day >= cutoff.date()
         )
-        .all()
+        .scalar() or 0
     )
-    # Sum XP gained from event_data (assume event_data['amount'] or event_data['xp'])
-    total_xp = 0
-    for log in logs:
-        data = log.event_data
-        if isinstance(data, dict):
-            if 'amount' in data:
-                total_xp += data['amount']
-            elif 'xp' in data:
-                total_xp += data['xp']
     return total_xp / days if days > 0 else 0.0
 
 def calculate_quest_completion_rate(clan):
     """Calculate the ratio of completed quests to assigned quests"""
-    members = Student.query.filter_by(clan_id=clan.id).all()
-    assignments = []
-    for member in members:
-        characters = Character.query.filter_by(student_id=member.id).all()
-        for char in characters:
-            assignments.extend(QuestAssignment.query.filter_by(character_id=char.id).all())
-    if not assignments:
+    assigned, completed = (
+        db.session.query(func.count(QuestAssignment.id), func.sum(_completed_flag()))
+        .join(Character, Character.id == QuestAssignment.character_id)
+        .join(Student, Student.id == Character.student_id)
+        .filter(Student.clan_id == clan.id)
+        .one()
+    )
+    if not assigned:
         return 0.0
-    completed = sum(1 for a in assignments if a.status == 'completed')
-    return completed / len(assignments)
+    return (completed or 0) / assigned
 
 def calculate_avg_member_level(clan):
     """Calculate average level of clan members"""
@@ -104,41 +121,424 @@ def calculate_avg_member_level(clan):
         return 0.0
     return sum(level[0] for level in levels) / len(levels)
 
+TOTAL_FIELDS = (
+    'total_points', 'level_sum', 'character_count', 'quests_assigned',
+    'quests_completed', 'completion_rate_sum', 'rated_members'
+)
+
+def calculate_clan_aggregates(clan_ids, session=None):
+    """Compute the ClanMetricTotals sums of the given clans from scratch.
+
+    Two GROUP BY queries: quest assignments per member and points/levels of
+    member characters. Every requested clan gets an entry.
+
+    Returns:
+        dict: clan_id -> {field: value} for TOTAL_FIELDS
+    """
+    session = session or db.session
+    aggregates = {clan_id: dict.fromkeys(TOTAL_FIELDS, 0) for clan_id in clan_ids}
+    if not aggregates:
+        return aggregates
+
+    # Quest assignments per member: feeds both completion metrics
+    for clan_id, assigned, done in _member_quest_counts(clan_ids, session):
+        totals = aggregates[clan_id]
+        totals['quests_assigned'] += assigned
+        totals['quests_completed'] += done or 0
+        totals['completion_rate_sum'] += (done or 0) / assigned
+        totals['rated_members'] += 1
+
+    # Points and levels of member characters
+    for clan_id, total_points, level_sum, character_count in (
+        session.query(
+            Student.clan_id,
+            func.sum(Character.experience),
+            func.sum(Character.level),
+            func.count(Character.id)
+        )
+        .join(Student, Student.id == Character.student_id)
+        .filter(Student.clan_id.in_(clan_ids))
+        .group_by(Student.clan_id)
+    ):
+        aggregates[clan_id].update(
+            total_points=total_points or 0,
+            level_sum=level_sum or 0,
+            character_count=character_count
+        )
+    return aggregates
+
+def _clan_ids(clan_ids):
+    clan_query = db.session.query(Clan.id)
+    if clan_ids is not None:
+        clan_query = clan_query.filter(Clan.id.in_(clan_ids))
+    return [clan_id for (clan_id,) in clan_query.order_by(Clan.id)]
+
+def _build_metrics(ids, aggregates, include_custom, days):
+    """Turn per-clan sums into metrics, adding the time-window metrics."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    active_members = dict(
+        db.session.query(Student.clan_id, func.count(Student.id))
+        .filter(Student.clan_id.in_(ids), Student.last_activity >= cutoff)
+        .group_by(Student.clan_id)
+        .all()
+    )
+
+    # Daily points use the clan's characters (Character.clan_id), like calculate_avg_daily_points
+    xp_by_clan = dict(
+        db.session.query(Character.clan_id, func.sum(AuditDailyRollup.total_amount))
+        .join(AuditDailyRollup, AuditDailyRollup.character_id == Character.id)
+        .filter(
+            Character.clan_id.in_(ids),
+            AuditDailyRollup.event_type == 'XP_GAIN',
+            AuditDailyRollup.day >= cutoff.date()
+        )
+        .group_by(Character.clan_id)
+        .all()
+    )
+
+    results = {}
+    for clan_id in ids:
+        totals = aggregates[clan_id]
+        rated_members = totals['rated_members']
+        assigned = totals['quests_assigned']
+        character_count = totals['character_count']
+        results[clan_id] = {
+            'avg_completion_rate': totals['completion_rate_sum'] / rated_members if rated_members else 0.0,
+            'total_points': totals['total_points'],
+            'active_members': active_members.get(clan_id, 0),
+            'avg_daily_points': (xp_by_clan.get(clan_id) or 0) / days if days > 0 else 0.0,
+            'quest_completion_rate': totals['quests_completed'] / assigned if assigned else 0.0,
+            'avg_member_level': totals['level_sum'] / character_count if character_count else 0.0
+        }
+    if include_custom and CUSTOM_METRICS:
+        for clan_id, custom in custom_metric_executor.evaluate(dict(CUSTOM_METRICS), ids).items():
+            results[clan_id].update(custom)
+    return results
+
+def calculate_all_clan_metrics(clan_ids=None, include_custom=True, days=7):
+    """Calculate the standard metrics for many clans with grouped queries.
+
+    Produces the same values as calculate_clan_metrics for each clan, but
+    with one GROUP BY query per family of metrics instead of per-clan and
+    per-member loops, so the cost is a fixed number of queries however many
+    clans, members and characters there are.
+
+    Args:
+        clan_ids: Clans to compute (default: every clan)
+        include_custom: Also run the registered custom metrics (concurrently, time-boxed)
+        days: Look-back window for active members and daily points
+
+    Returns:
+        dict: clan_id -> metrics dict
+    """
+    ids = _clan_ids(clan_ids)
+    if not ids:
+        return {}
+    return _build_metrics(ids, calculate_clan_aggregates(ids), include_custom, days)
+
+def current_clan_metrics(clan_ids=None, include_custom=True, days=7):
+    """Clan metrics read from the running ClanMetricTotals.
+
+    Same result shape as calculate_all_clan_metrics, without rescanning
+    quest logs and characters. Active members and daily points are sliding
+    windows and are still read live (two grouped, indexed queries). Clans
+    without a totals row yet are computed from scratch.
+    """
+    ids = _clan_ids(clan_ids)
+    if not ids:
+        return {}
+    aggregates = {
+        row.clan_id: {field: getattr(row, field) for field in TOTAL_FIELDS}
+        for row in ClanMetricTotals.query.filter(ClanMetricTotals.clan_id.in_(ids))
+    }
+    missing = [clan_id for clan_id in ids if clan_id not in aggregates]
+    if missing:
+        aggregates.update(calculate_clan_aggregates(missing))
+    return _build_metrics(ids, aggregates, include_custom, days)
+
 def calculate_clan_metrics(clan_id, include_custom=True):
     """Calculate all metrics for a specific clan"""
-    clan = Clan.query.get(clan_id)
-    if not clan:
-        return None
-    metrics = {
-        'avg_completion_rate': calculate_avg_completion_rate(clan),
-        'total_points': calculate_total_points(clan),
-        'active_members': calculate_active_members(clan),
-        'avg_daily_points': calculate_avg_daily_points(clan),
-        'quest_completion_rate': calculate_quest_completion_rate(clan),
-        'avg_member_level': calculate_avg_member_level(clan)
+    return current_clan_metrics([clan_id], include_custom=include_custom).get(clan_id)
+
+def _store_totals(connection, aggregates):
+    """Replace the ClanMetricTotals rows of the clans in ``aggregates``."""
+    if not aggregates:
+        return
+    table = ClanMetricTotals.__table__
+    now = datetime.utcnow()
+    connection.execute(table.delete().where(table.c.clan_id.in_(list(aggregates))))
+    connection.execute(table.insert(), [
+        {'clan_id': clan_id, 'reconciled_at': now, **totals}
+        for clan_id, totals in aggregates.items()
+    ])
+
+def reconcile_clan_totals(clan_ids=None):
+    """Recompute the running totals from scratch and store them.
+
+    Run by the daily metrics job to correct any drift in the incrementally
+    maintained rows (e.g. changes made outside the ORM).
+
+    Returns:
+        int: number of clans whose stored totals were missing or wrong.
+            The caller commits.
+    """
+    ids = _clan_ids(clan_ids)
+    aggregates = calculate_clan_aggregates(ids)
+    stored = {
+        row.clan_id: row
+        for row in ClanMetricTotals.query.filter(ClanMetricTotals.clan_id.in_(ids))
     }
-    if include_custom:
-        for name, metric_info in CUSTOM_METRICS.items():
-            metrics[name] = metric_info['func'](clan_id)
-    return metrics
+    drifted = [
+        clan_id for clan_id, totals in aggregates.items()
+        if clan_id not in stored or any(
+            not math.isclose(getattr(stored[clan_id], field), value, abs_tol=1e-9)
+            for field, value in totals.items()
+        )
+    ]
+    if drifted:
+        logger.info(f"Reconciled clan metric totals, {len(drifted)} of {len(ids)} clans had drifted")
+    _store_totals(db.session.connection(), aggregates)
+    # The rows were rewritten through Core; reload them on next access
+    for row in stored.values():
+        db.session.expire(row)
+    return len(drifted)
 
 def calculate_percentile_rankings(class_id=None, school_id=None):
-    """Calculate percentile rankings for clans within a class or school"""
-    query = db.session.query(
-        Clan.id,
-        func.sum(Character.experience).label('total_points')
-    ).join(Student, Student.id == Character.student_id).group_by(Clan.id)
-    if class_id:
-        query = query.filter(Student.class_id == class_id)
-    elif school_id:
-        query = query.filter(Student.school_id == school_id)
-    results = query.all()
-    sorted_clans = sorted(results, key=lambda x: x.total_points or 0, reverse=True)
-    total_clans = len(sorted_clans)
-    if total_clans == 0:
-        return {}
-    percentiles = {}
-    for i, clan_data in enumerate(sorted_clans):
-        percentile = 100 - int((i / total_clans) * 100)
-        percentiles[clan_data.id] = percentile
-    return percentiles 
\ No newline at end of file
+    """Calculate percentile rankings for clans within their class
+
+    One window-function query over every clan (see app.services.clan_ranking);
+    each clan is ranked among the clans of its own class, tied clans sharing
+    a percentile.
+
+    Args:
+        class_id: Only rank this class (default: every class)
+        school_id: Not supported; there is no school model and clans are ranked per class
+
+    Returns:
+        dict: clan_id -> percentile (100 for the top clan of a class)
+    """
+    from app.services.clan_ranking import percentile_rankings
+    if school_id is not None:
+        raise ValueError("Clans are ranked per class; school rankings are not supported")
+    return percentile_rankings([class_id] if class_id else None)
+
+_STORED_VALUES_KEY = 'clan_metric_stored_values'
+# Attributes whose changes are folded into clan_metric_totals
+_TRACKED_ATTRIBUTES = (
+    (Character, ('experience', 'level', 'student_id')),
+    (Student, ('clan_id',)),
+    (QuestAssignment, ('status', 'character_id')),
+)
+
+
+def _is_completed(status):
+    return status == QuestStatus.COMPLETED
+
+
+def _old_and_new(obj, attribute, stored_values):
+    """(old, new) values of a changed attribute, None if unchanged.
+
+    ``old`` comes from the attribute history or, when the attribute was set
+    without being loaded, from ``stored_values``; it is None if neither has it.
+    """
+    state = inspect(obj)
+    history = state.attrs[attribute].history
+    if not history.has_changes():
+        return None
+    if history.deleted:
+        old = history.deleted[0]
+    else:
+        old = stored_values.get(state.key, {}).get(attribute)
+    return old, history.added[0] if history.added else None
+
+
+def _collect_deltas(session):
+    """Read the clan metric changes made by the current flush off the session.
+
+    Returns (character_deltas, quest_deltas, rebuild_students, rebuild_clans):
+    [points, levels, characters] per student_id, [assigned, completed] per
+    character_id, and the members/clans whose change cannot be expressed as
+    a delta (moved between clans, or old value unknown).
+    """
+    character_deltas = defaultdict(lambda: [0, 0, 0])
+    quest_deltas = defaultdict(lambda: [0, 0])
+    rebuild_students, rebuild_clans = set(), set()
+    stored_values = session.info.pop(_STORED_VALUES_KEY, {})
+
+    for obj in session.new:
+        if isinstance(obj, Character) and obj.student_id:
+            delta = character_deltas[obj.student_id]
+            delta[0] += obj.experience or 0
+            delta[1] += obj.level or 0
+            delta[2] += 1
+        elif isinstance(obj, QuestAssignment) and obj.character_id:
+            delta = quest_deltas[obj.character_id]
+            delta[0] += 1
+            delta[1] += _is_completed(obj.status)
+        elif isinstance(obj, Student) and obj.clan_id:
+            rebuild_clans.add(obj.clan_id)
+
+    # Deleted rows are gone, so only use values that were already loaded
+    for obj in session.deleted:
+        loaded = inspect(obj).dict
+        if isinstance(obj, Character) and loaded.get('student_id'):
+            rebuild_students.add(loaded['student_id'])
+        elif isinstance(obj, QuestAssignment) and loaded.get('character_id') and 'status' in loaded:
+            delta = quest_deltas[loaded['character_id']]
+            delta[0] -= 1
+            delta[1] -= _is_completed(loaded['status'])
+        elif isinstance(obj, Student) and loaded.get('clan_id'):
+            rebuild_clans.add(loaded['clan_id'])
+
+    for obj in session.dirty:
+        if isinstance(obj, Character) and obj.student_id:
+            moved = _old_and_new(obj, 'student_id', stored_values)
+            if moved:
+                rebuild_students.update(student_id for student_id in moved if student_id)
+                continue
+            for index, attribute in ((0, 'experience'), (1, 'level')):
+                change = _old_and_new(obj, attribute, stored_values)
+                if change is None:
+                    continue
+                old, new = change
+                if old is None:
+                    rebuild_students.add(obj.student_id)
+                else:
+                    character_deltas[obj.student_id][index] += (new or 0) - old
+        elif isinstance(obj, QuestAssignment) and obj.character_id:
+            change = _old_and_new(obj, 'status', stored_values)
+            if change and _old_and_new(obj, 'character_id', stored_values) is None:
+                old, new = change
+                quest_deltas[obj.character_id][1] += _is_completed(new) - _is_completed(old)
+        elif isinstance(obj, Student):
+            change = _old_and_new(obj, 'clan_id', stored_values)
+            if change:
+                rebuild_clans.update(clan_id for clan_id in change if clan_id)
+    return character_deltas, quest_deltas, rebuild_students, rebuild_clans
+
+
+@event.listens_for(Session, 'before_flush')
+def _load_stored_values(session, flush_context, instances):
+    """Read the stored values of tracked attributes that were set without being loaded.
+
+    An attribute assigned on an expired instance (e.g. after a commit) has
+    no old value in its history. Those rows are read here, one query per
+    model and only when needed, before the flush overwrites them, so the
+    change can still be applied as a delta in ``_update_clan_totals``.
+    """
+    session.info.pop(_STORED_VALUES_KEY, None)
+    stored_values = {}
+    connection = None
+    for model, attributes in _TRACKED_ATTRIBUTES:
+        keys = {}
+        for obj in session.dirty:
+            if not isinstance(obj, model):
+                continue
+            state = inspect(obj)
+            if state.key is not None and any(
+                state.attrs[attribute].history.added and not state.attrs[attribute].history.deleted
+                for attribute in attributes
+            ):
+                keys[state.identity[0]] = state.key
+        if not keys:
+            continue
+        connection = connection or session.connection()
+        rows = connection.execute(
+            select(model.id, *(getattr(model, attribute) for attribute in attributes)).where(model.id.in_(list(keys)))
+        )
+        for row_id, *values in rows:
+            stored_values[keys[row_id]] = dict(zip(attributes, values))
+    if stored_values:
+        session.info[_STORED_VALUES_KEY] = stored_values
+
+
+def _member_rate(assigned, completed):
+    return completed / assigned if assigned else 0.0
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_clan_totals(session, flush_context):
+    """Apply the flush's XP, level, character and quest changes to clan_metric_totals.
+
+    Each change is folded in as a delta on its clan's row, in the same
+    transaction, with a fixed number of statements per flush. Clans without
+    a totals row yet, and changes that cannot be expressed as a delta, get
+    their row recomputed from scratch instead.
+    """
+    character_deltas, quest_deltas, rebuild_students, rebuild_clans = _collect_deltas(session)
+    character_deltas = {key: value for key, value in character_deltas.items() if any(value)}
+    quest_deltas = {key: value for key, value in quest_deltas.items() if any(value)}
+    if not (character_deltas or quest_deltas or rebuild_students or rebuild_clans):
+        return
+
+    connection = session.connection()
+    student_of = {}
+    if quest_deltas:
+        student_of = dict(connection.execute(
+            select(Character.id, Character.student_id).where(Character.id.in_(list(quest_deltas)))
+        ).all())
+    quest_by_student = defaultdict(lambda: [0, 0])
+    for character_id, (assigned, completed) in quest_deltas.items():
+        student_id = student_of.get(character_id)
+        if student_id:
+            quest_by_student[student_id][0] += assigned
+            quest_by_student[student_id][1] += completed
+
+    student_ids = set(character_deltas) | set(quest_by_student) | rebuild_students
+    clan_of = dict(connection.execute(
+        select(Student.id, Student.clan_id).where(Student.id.in_(student_ids), Student.clan_id.isnot(None))
+    ).all()) if student_ids else {}
+    rebuild_clans |= {clan_of[student_id] for student_id in rebuild_students if student_id in clan_of}
+
+    clan_deltas = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, 0))
+    for student_id, (points, levels, characters) in character_deltas.items():
+        if student_id in clan_of:
+            delta = clan_deltas[clan_of[student_id]]
+            delta['total_points'] += points
+            delta['level_sum'] += levels
+            delta['character_count'] += characters
+
+    members = [student_id for student_id in quest_by_student if student_id in clan_of]
+    if members:
+        # Member counts after this flush; before = after - delta
+        current = {
+            student_id: (assigned, completed or 0)
+            for student_id, assigned, completed in connection.execute(
+                select(Student.id, func.count(QuestAssignment.id), func.sum(_completed_flag()))
+                .join(Character, Character.student_id == Student.id)
+                .join(QuestAssignment, QuestAssignment.character_id == Character.id)
+                .where(Student.id.in_(members))
+                .group_by(Student.id)
+            )
+        }
+        for student_id in members:
+            assigned, completed = current.get(student_id, (0, 0))
+            assigned_delta, completed_delta = quest_by_student[student_id]
+            old_assigned, old_completed = assigned - assigned_delta, completed - completed_delta
+            delta = clan_deltas[clan_of[student_id]]
+            delta['quests_assigned'] += assigned_delta
+            delta['quests_completed'] += completed_delta
+            delta['completion_rate_sum'] += _member_rate(assigned, completed) - _member_rate(old_assigned, old_completed)
+            delta['rated_members'] += (assigned > 0) - (old_assigned > 0)
+
+    table = ClanMetricTotals.__table__
+    pending = [clan_id for clan_id in clan_deltas if clan_id not in rebuild_clans]
+    if pending:
+        stored = set(connection.execute(select(table.c.clan_id).where(table.c.clan_id.in_(pending))).scalars())
+        rebuild_clans.update(clan_id for clan_id in pending if clan_id not in stored)
+        updates = [
+            {'b_clan_id': clan_id, **{f'b_{field}': value for field, value in clan_deltas[clan_id].items()}}
+            for clan_id in pending if clan_id in stored
+        ]
+        if updates:
+            connection.execute(
+                table.update()
+                .where(table.c.clan_id == bindparam('b_clan_id'))
+                .values({field: table.c[field] + bindparam(f'b_{field}') for field in TOTAL_FIELDS}),
+                updates
+            )
+
+    if rebuild_clans:
+        existing = list(connection.execute(select(Clan.id).where(Clan.id.in_(rebuild_clans))).scalars())
+        _store_totals(connection, calculate_clan_aggregates(existing, session))
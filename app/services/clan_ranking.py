@@ -0,0 +1,162 @@
+"""Per-class clan ranking with SQL window functions.
+
+``rank_clans`` ranks the clans of a class by total member XP (members are
+students with ``Student.clan_id``, as in the clan metrics) with one query:
+the points are summed per clan and ``RANK()`` / ``ROW_NUMBER()`` /
+``PERCENT_RANK()`` / ``COUNT(*)`` run over the result partitioned by class,
+so ranking every class at once costs the same single query. A top-K
+request filters on the window rank inside the database and only returns
+those rows.
+
+Ties: with ``ties='shared'`` (default) clans with equal points share a rank
+and a percentile; with ``ties='ordered'`` they are ordered by clan id, like
+the materialized clan leaderboard. The percentile uses the formula of the
+clan history and leaderboard: ``100 - int((rank - 1) / clan_count * 100)``;
+``percent_rank`` is the SQL PERCENT_RANK() value, (rank - 1) / (clan_count - 1).
+
+Rankings are cached per class, for both ``rank_clans`` and
+``percentile_rankings`` (the clan metrics job's percentiles); classes missing
+from the cache are ranked together in one query. The clan leaderboard's
+flush listener reports the classes whose clan points changed
+(``mark_classes_changed``); their entries are dropped when the transaction
+commits, and a ranking computed while such a commit happened is not cached
+(see ``AnalyticsCache.set``). The TTL bounds staleness for writes made by
+other processes.
+"""
+
+from app.models import db
+from app.models.character import Character
+from app.models.clan import Clan
+from app.models.student import Student
+from app.services.analytics_cache import AnalyticsCache
+from app.utils.commit_hooks import register_commit_hook
+from sqlalchemy import func, select
+
+TIE_MODES = ('shared', 'ordered')
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 300
+
+_PENDING_KEY = 'clan_ranking_pending_classes'
+
+# Keys are ('clan_ranking', class_id, ties, top_k)
+ranking_cache = AnalyticsCache(max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS)
+
+
+def _ranking_query(class_ids=None, top_k=None, ties='shared'):
+    """One SELECT ranking the clans of ``class_ids`` (default: all classes)."""
+    points_query = (
+        select(
+            Clan.id.label('clan_id'),
+            Clan.class_id.label('class_id'),
+            func.coalesce(func.sum(Character.experience), 0).label('total_points')
+        )
+        .select_from(Clan)
+        .outerjoin(Student, Student.clan_id == Clan.id)
+        .outerjoin(Character, Character.student_id == Student.id)
+        .group_by(Clan.id, Clan.class_id)
+    )
+    if class_ids is not None:
+        points_query = points_query.where(Clan.class_id.in_(class_ids))
+    points = points_query.subquery()
+
+    by_points = points.c.total_points.desc()
+    partition = {'partition_by': points.c.class_id}
+    if ties == 'shared':
+        rank = func.rank().over(order_by=by_points, **partition)
+    else:
+        rank = func.row_number().over(order_by=(by_points, points.c.clan_id), **partition)
+    ranked = select(
+        points.c.clan_id,
+        points.c.class_id,
+        points.c.total_points,
+        rank.label('rank'),
+        func.percent_rank().over(order_by=by_points, **partition).label('percent_rank'),
+        func.count().over(**partition).label('clan_count')
+    ).subquery()
+
+    query = select(ranked)
+    if top_k is not None:
+        query = query.where(ranked.c.rank <= top_k)
+    return query.order_by(ranked.c.class_id, ranked.c.rank, ranked.c.clan_id)
+
+
+def _ranked_rows(class_ids=None, top_k=None, ties='shared'):
+    if ties not in TIE_MODES:
+        raise ValueError(f"ties must be one of {', '.join(TIE_MODES)}")
+    if top_k is not None and top_k < 1:
+        raise ValueError("top_k must be a positive integer")
+    return [
+        {
+            'id': row.clan_id,
+            'class_id': row.class_id,
+            'total_points': row.total_points,
+            'rank': row.rank,
+            'percent_rank': row.percent_rank,
+            'percentile_rank': 100 - int(((row.rank - 1) / row.clan_count) * 100),
+            'clan_count': row.clan_count
+        }
+        for row in db.session.execute(_ranking_query(class_ids, top_k, ties))
+    ]
+
+
+def rank_clans(class_id, top_k=None, ties='shared'):
+    """Ranked clans of a class, best first (cached per class).
+
+    Args:
+        class_id: Class to rank
+        top_k: Only return clans ranked 1..top_k (tied clans at the cut included
+            with ``ties='shared'``)
+        ties: 'shared' or 'ordered' (see module docstring)
+
+    Returns:
+        list: dicts with id, class_id, total_points, rank, percent_rank,
+            percentile_rank and clan_count. Cached lists are shared and must
+            not be mutated.
+    """
+    return _class_rankings([class_id], top_k, ties)[class_id]
+
+
+def percentile_rankings(class_ids=None, ties='shared'):
+    """clan_id -> percentile within its class, for every clan of ``class_ids`` (default: all classes)."""
+    if class_ids is None:
+        class_ids = [
+            class_id for (class_id,) in db.session.query(Clan.class_id).filter(Clan.class_id.isnot(None)).distinct()
+        ]
+    return {
+        row['id']: row['percentile_rank']
+        for rows in _class_rankings(class_ids, ties=ties).values()
+        for row in rows
+    }
+
+
+def _class_rankings(class_ids, top_k=None, ties='shared'):
+    """class_id -> ranked rows, through the cache; the misses are ranked in one query."""
+    rankings, generations = {}, {}
+    for class_id in class_ids:
+        found, value = ranking_cache.get(('clan_ranking', class_id, ties, top_k))
+        if found:
+            rankings[class_id] = value
+        else:
+            generations[class_id] = ranking_cache.generation(class_id)
+    if generations:
+        fresh = {class_id: [] for class_id in generations}
+        for row in _ranked_rows(list(generations), top_k, ties):
+            fresh[row['class_id']].append(row)
+        for class_id, rows in fresh.items():
+            ranking_cache.set(('clan_ranking', class_id, ties, top_k), rows, generations[class_id])
+        rankings.update(fresh)
+    return rankings
+
+
+def _invalidate_rankings(class_ids):
+    for class_id in class_ids:
+        ranking_cache.invalidate_class(class_id)
+
+
+_ranking_changes = register_commit_hook(_PENDING_KEY, _invalidate_rankings)
+
+
+def mark_classes_changed(session, class_ids):
+    """Drop the cached rankings of ``class_ids`` once the session's transaction commits."""
+    _ranking_changes.mark(session, class_ids)
@@ -0,0 +1,221 @@
+"""Concurrent, time-boxed evaluation of registered custom clan metrics.
+
+Custom metrics (``register_custom_metric`` in app.services.clan_metrics) are
+plugin code: one slow metric used to stall the whole metrics job and every
+endpoint showing clan metrics, because they ran one after another in the
+request. ``CustomMetricExecutor`` runs them on thread pools instead:
+
+- each metric gets its own pool of CLAN_CUSTOM_METRIC_WORKERS threads, so a
+  slow metric only queues its own calls and never delays the others;
+- every (metric, clan) call gets its own deadline (the metric's ``timeout``
+  or CLAN_CUSTOM_METRIC_TIMEOUT), counted from when the call starts, so time
+  spent queued behind the metric's other calls does not count against it;
+  a call that misses it yields the last cached value, or None, and keeps
+  running in the background — it is not resubmitted while still in flight,
+  so a stuck metric holds at most its own pool. Once every worker of a
+  metric is held by an overdue call, its still-queued calls give up too;
+- a metric that raises yields None instead of failing the other metrics;
+- results are cached per (metric, clan) for the metric's declared ``ttl``
+  (0, the default, means always recompute);
+- each metric keeps a duration histogram plus call/error/timeout/cache
+  counters (``stats()``, served at /teacher/clans/custom-metric-stats).
+
+Calls run in their own app context and session, so they see committed
+data only. With CLAN_CUSTOM_METRIC_WORKERS = 0 they run inline in the
+caller (no timeout), which tests and the CLI can use.
+"""
+
+from app.models import db
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT_SECONDS = 5.0
+# Upper bounds (seconds) of the duration histogram buckets; slower calls land in '+Inf'
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Longest wait between checks for queued calls that have started or stalled
+POLL_SECONDS = 0.05
+
+
+class CustomMetricExecutor:
+    """Per-metric thread pools, result cache and timing stats for custom clan metrics."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT_SECONDS, clock=time.monotonic):
+        self.workers = workers
+        self.timeout = timeout
+        self._clock = clock
+        self._pools = {}  # name -> ThreadPoolExecutor
+        self._cache = {}  # (name, clan_id) -> (expires_at, value)
+        self._in_flight = {}  # (name, clan_id) -> Future
+        self._deadlines = {}  # (name, clan_id) -> deadline of the running call
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def configure(self, workers=None, timeout=None):
+        with self._lock:
+            if workers is not None and workers != self.workers:
+                self.workers = workers
+                for pool in self._pools.values():
+                    pool.shutdown(wait=False)
+                self._pools.clear()
+            if timeout is not None:
+                self.timeout = timeout
+
+    def evaluate(self, metrics, clan_ids):
+        """Run ``metrics`` for every clan; returns clan_id -> {name: value}.
+
+        Args:
+            metrics: name -> registry entry ({'func', 'ttl', 'timeout', ...})
+            clan_ids: clans to evaluate
+        """
+        results = {clan_id: {} for clan_id in clan_ids}
+        if not metrics or not clan_ids:
+            return results
+        from flask import current_app
+        app = current_app._get_current_object()
+
+        pending = {}  # Future -> (name, clan_id)
+        now = self._clock()
+        for name, info in metrics.items():
+            for clan_id in clan_ids:
+                key = (name, clan_id)
+                cached = self._cached(key, now)
+                if cached is not None:
+                    results[clan_id][name] = cached[1]
+                    continue
+                if self.workers <= 0:
+                    results[clan_id][name] = self._call(None, key, info)
+                    continue
+                pending[self._submit(app, key, info)] = key
+
+        while pending:
+            now = self._clock()
+            with self._lock:
+                deadlines = dict(self._deadlines)
+            overdue = Counter(name for (name, _), deadline in deadlines.items() if deadline <= now)
+            for future, (name, clan_id) in list(pending.items()):
+                deadline = deadlines.get((name, clan_id))
+                if future.done():
+                    results[clan_id][name] = future.result()
+                elif (deadline <= now) if deadline is not None else overdue[name] >= self.workers:
+                    results[clan_id][name] = self._timed_out(name, clan_id)
+                else:
+                    continue
+                del pending[future]
+            if pending:
+                upcoming = [deadline - now for deadline in deadlines.values() if deadline > now]
+                wait(list(pending), timeout=min(upcoming + [POLL_SECONDS]), return_when=FIRST_COMPLETED)
+        return results
+
+    def stats(self):
+        """Per-metric counters and duration histogram."""
+        with self._lock:
+            return {
+                name: {
+                    **{field: value for field, value in entry.items() if field != 'buckets'},
+                    'avg_seconds': entry['total_seconds'] / entry['calls'] if entry['calls'] else 0.0,
+                    'buckets': dict(entry['buckets'])
+                }
+                for name, entry in self._stats.items()
+            }
+
+    def clear(self):
+        """Drop cached results and stats (calls still in flight keep running)."""
+        with self._lock:
+            self._cache.clear()
+            self._stats.clear()
+
+    def _cached(self, key, now):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or entry[0] <= now:
+                return None
+        self._record(key[0], cache_hits=1)
+        return entry
+
+    def _timed_out(self, name, clan_id):
+        """Record a missed deadline and return the last cached value, or None."""
+        self._record(name, timeouts=1)
+        logger.warning(f"Custom metric {name} timed out for clan {clan_id}")
+        with self._lock:
+            stale = self._cache.get((name, clan_id))
+        return stale[1] if stale else None
+
+    def _submit(self, app, key, info):
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            pool = self._pools.get(key[0])
+            if pool is None:
+                pool = self._pools[key[0]] = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=f'custom-metric-{key[0]}'
+                )
+            future = pool.submit(self._call, app, key, info)
+            self._in_flight[key] = future
+            return future
+
+    def _call(self, app, key, info):
+        """Run one metric for one clan (in a pool thread when ``app`` is given)."""
+        name, clan_id = key
+        started = self._clock()
+        if app is not None:
+            with self._lock:
+                self._deadlines[key] = started + (info.get('timeout') or self.timeout)
+        try:
+            if app is None:
+                value = info['func'](clan_id)
+            else:
+                with app.app_context():
+                    try:
+                        value = info['func'](clan_id)
+                    finally:
+                        db.session.remove()
+        except Exception as e:
+            logger.error(f"Custom metric {name} failed for clan {clan_id}: {str(e)}", exc_info=True)
+            value = None
+            self._record(name, errors=1)
+        else:
+            if info.get('ttl'):
+                with self._lock:
+                    self._cache[key] = (self._clock() + info['ttl'], value)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+                self._deadlines.pop(key, None)
+        self._record(name, duration=self._clock() - started)
+        return value
+
+    def _record(self, name, duration=None, **counters):
+        with self._lock:
+            entry = self._stats.get(name)
+            if entry is None:
+                entry = self._stats[name] = {
+                    'calls': 0, 'errors': 0, 'timeouts': 0, 'cache_hits': 0,
+                    'total_seconds': 0.0, 'max_seconds': 0.0,
+                    'buckets': {**{str(bound): 0 for bound in DURATION_BUCKETS}, '+Inf': 0}
+                }
+            for counter, amount in counters.items():
+                entry[counter] += amount
+            if duration is not None:
+                entry['calls'] += 1
+                entry['total_seconds'] += duration
+                entry['max_seconds'] = max(entry['max_seconds'], duration)
+                bucket = next((str(bound) for bound in DURATION_BUCKETS if duration <= bound), '+Inf')
+                entry['buckets'][bucket] += 1
+
+
+custom_metric_executor = CustomMetricExecutor()
+
+
+def init_custom_metrics(app):
+    """Size the shared executor from CLAN_CUSTOM_METRIC_WORKERS / CLAN_CUSTOM_METRIC_TIMEOUT."""
+    custom_metric_executor.configure(
+        workers=app.config.get('CLAN_CUSTOM_METRIC_WORKERS', DEFAULT_WORKERS),
+        timeout=app.config.get('CLAN_CUSTOM_METRIC_TIMEOUT', DEFAULT_TIMEOUT_SECONDS)
+    )
@@ -0,0 +1,221 @@
+"""Process-local, versioned snapshot of the item catalog.
+
+The shop pages, the shop purchase path, quest reward summaries and the
+battle screen used to run ``Equipment.query.all()`` / ``Ability.query.all()``
+(or one lookup per item) on every request, although the catalog only
+changes when it is seeded or edited. ``item_catalog.snapshot()`` returns an
+immutable ``CatalogSnapshot`` instead:
+
+- equipment and abilities are loaded lazily as namedtuples with the model's
+  columns as attributes, indexed by id, slot, type and level requirement;
+- every write to the equipment or abilities tables bumps the version row in
+  ``catalog_versions`` in the same transaction (see ``CatalogVersion``); a
+  process compares that row's (token, version) with its snapshot at most
+  every ``check_interval`` seconds (ITEM_CATALOG_CHECK_SECONDS) and reloads
+  only when it changed. The token is random per database, so a snapshot
+  never matches a different database's version;
+- the writing process drops its snapshot on commit, and a session holding
+  uncommitted catalog writes reads a private snapshot so the shared one
+  never contains rows that may be rolled back.
+
+Covered write paths: on SQLite and PostgreSQL database triggers bump the
+version for every statement, including bulk ``update()``/``delete()``, raw
+SQL, seeding scripts, test fixtures deleting all rows and writes from other
+processes. The session hooks below (ORM flushes, and insert/update/delete
+statements on the catalog tables run through ``Session.execute``) give the
+writing session its private snapshot and drop the shared one on commit; on
+other databases they also bump the version, and writes made outside the
+session are only seen when the catalog is invalidated.
+"""
+
+from app.models import db
+from app.models.ability import Ability
+from app.models.equipment import (
+    CATALOG_NAME, CATALOG_TABLES, CATALOG_TRIGGER_DIALECTS, CatalogVersion, Equipment
+)
+from app.utils.commit_hooks import register_commit_hook
+from app.utils.date_utils import get_utc_now
+from bisect import bisect_right
+from collections import namedtuple
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from types import MappingProxyType
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_SECONDS = 5
+
+_PENDING_KEY = 'item_catalog_changed'
+
+EquipmentEntry = namedtuple('EquipmentEntry', [column.key for column in Equipment.__table__.columns])
+AbilityEntry = namedtuple('AbilityEntry', [column.key for column in Ability.__table__.columns])
+
+
+def _as_id(value):
+    # Ids often arrive as strings from JSON bodies and query args
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _group(entries, attribute):
+    groups = {}
+    for entry in entries:
+        groups.setdefault(getattr(entry, attribute), []).append(entry)
+    return MappingProxyType({key: tuple(values) for key, values in groups.items()})
+
+
+class CatalogSnapshot:
+    """Immutable view of all equipment and abilities at one catalog version."""
+
+    def __init__(self, version, equipment, abilities, token=None):
+        self.version = version
+        self.token = token
+        self.equipment = tuple(equipment)
+        self.abilities = tuple(abilities)
+        self.equipment_by_id = MappingProxyType({entry.id: entry for entry in self.equipment})
+        self.abilities_by_id = MappingProxyType({entry.id: entry for entry in self.abilities})
+        self.equipment_by_slot = _group(self.equipment, 'slot')
+        self.equipment_by_type = _group(self.equipment, 'type')
+        self.abilities_by_type = _group(self.abilities, 'type')
+        self._equipment_by_level = tuple(sorted(self.equipment, key=lambda entry: (entry.level_requirement, entry.id)))
+        self._abilities_by_level = tuple(sorted(self.abilities, key=lambda entry: (entry.level_requirement, entry.id)))
+
+    @property
+    def key(self):
+        """(token, version) of the catalog row this snapshot was loaded at; None if private."""
+        return None if self.version is None else (self.token, self.version)
+
+    def get_equipment(self, item_id):
+        return self.equipment_by_id.get(_as_id(item_id))
+
+    def get_ability(self, ability_id):
+        return self.abilities_by_id.get(_as_id(ability_id))
+
+    @staticmethod
+    def _up_to_level(entries, level):
+        cut = bisect_right([entry.level_requirement for entry in entries], level)
+        return entries[:cut]
+
+    def equipment_up_to_level(self, level):
+        """Equipment whose level requirement is at most ``level``, lowest first."""
+        return self._up_to_level(self._equipment_by_level, level)
+
+    def abilities_up_to_level(self, level):
+        """Abilities whose level requirement is at most ``level``, lowest first."""
+        return self._up_to_level(self._abilities_by_level, level)
+
+
+class ItemCatalog:
+    """Holds the current ``CatalogSnapshot`` of this process."""
+
+    def __init__(self, check_interval=DEFAULT_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _current_key(self):
+        row = db.session.query(CatalogVersion.token, CatalogVersion.version).filter_by(name=CATALOG_NAME).first()
+        return tuple(row) if row is not None else None
+
+    def _load(self, key):
+        equipment = [EquipmentEntry(**row._mapping) for row in db.session.execute(
+            select(Equipment.__table__).order_by(Equipment.id)
+        )]
+        abilities = [AbilityEntry(**row._mapping) for row in db.session.execute(
+            select(Ability.__table__).order_by(Ability.id)
+        )]
+        token, version = key or (None, None)
+        return CatalogSnapshot(version, equipment, abilities, token)
+
+    def snapshot(self):
+        """Return the current catalog, reloading it if another process changed it."""
+        if _catalog_changes.pending(db.session):
+            # This session wrote catalog rows that are not committed yet
+            return self._load(None)
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._snapshot
+            key = self._current_key()
+            if key is None:
+                # Nothing recorded a catalog write yet, so there is no version to compare with
+                self._snapshot = None
+                return self._load(None)
+            if self._snapshot is None or self._snapshot.key != key:
+                self._snapshot = self._load(key)
+                self.loads += 1
+                logger.debug(f"Item catalog loaded at version {key}")
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+item_catalog = ItemCatalog()
+
+
+def init_item_catalog(app):
+    """Configure how often the catalog version is checked (ITEM_CATALOG_CHECK_SECONDS)."""
+    item_catalog.check_interval = app.config.get('ITEM_CATALOG_CHECK_SECONDS', DEFAULT_CHECK_SECONDS)
+    item_catalog.invalidate()
+
+
+def _bump_catalog_version(connection):
+    """Bump the version from Python, for databases without the catalog triggers."""
+    if connection.dialect.name in CATALOG_TRIGGER_DIALECTS:
+        return
+    now = get_utc_now()
+    result = connection.execute(
+        update(CatalogVersion.__table__)
+        .where(CatalogVersion.name == CATALOG_NAME)
+        .values(version=CatalogVersion.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(
+            insert(CatalogVersion.__table__)
+            .values(name=CATALOG_NAME, version=1, token=uuid.uuid4().hex, created_at=now, updated_at=now)
+        )
+
+
+def _collect_catalog_writes(session):
+    """Mark the transaction that flushes Equipment or Ability rows."""
+    if _catalog_changes.pending(session):
+        return None
+    if not any(isinstance(obj, (Equipment, Ability)) for obj in (*session.new, *session.dirty, *session.deleted)):
+        return None
+    _bump_catalog_version(session.connection())
+    return {CATALOG_NAME}
+
+
+def _reload_catalog(names):
+    item_catalog.invalidate()
+
+
+# Snapshots are never shared while catalog writes are pending, so a rollback has nothing to drop
+_catalog_changes = register_commit_hook(_PENDING_KEY, _reload_catalog, _collect_catalog_writes)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_catalog_statements(orm_execute_state):
+    """Mark the transaction that runs insert/update/delete statements on the catalog tables."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is None or table.name not in CATALOG_TABLES:
+        return
+    session = orm_execute_state.session
+    if not _catalog_changes.pending(session):
+        _bump_catalog_version(session.connection())
+        _catalog_changes.mark(session, {CATALOG_NAME})
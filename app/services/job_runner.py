@@ -0,0 +1,258 @@
+"""In-process background job runner backed by the background_jobs table.
+
+Heavy teacher reports are submitted as BackgroundJob rows and executed on a
+thread pool inside the web process; the request returns the job id at once
+and the client polls for progress and the result. No broker is involved: the
+table is the queue and a job is claimed with a conditional UPDATE
+(queued -> running), so it is safe with several worker processes on one box.
+
+Job handlers are registered with ``@register_job('name')`` and receive the
+job params plus a ``progress(fraction, message=None)`` callback; whatever they
+return (JSON serializable) is stored as the job result.
+"""
+
+from app.models import db
+from app.models.job import BackgroundJob, JobStatus
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Registry for job handlers
+JOB_TYPES = {}
+
+DEFAULT_WORKERS = 2
+DEFAULT_STALE_SECONDS = 3600
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+class JobError(Exception):
+    """Unknown job type or invalid job parameters; ``status_code`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def register_job(name, description=None):
+    """Register a function as a background job handler."""
+    def decorator(func):
+        JOB_TYPES[name] = {
+            'func': func,
+            'description': description or func.__doc__ or f"Background job: {name}"
+        }
+        return func
+    return decorator
+
+
+def init_job_runner(app):
+    """Configure the runner for an app.
+
+    Jobs orphaned by a stopped process are picked up by requeue_stale_jobs,
+    which runs whenever a process starts its pool (the first job it runs
+    after a restart or fork) and from ``flask run-jobs``.
+
+    Config:
+        JOB_WORKERS: pool size (default 2)
+        JOB_RUNNER_SYNC: run jobs inline at submit time (tests, CLI)
+        JOB_STALE_SECONDS: a running job not updated for this long is requeued
+    """
+    app.extensions['job_runner'] = {
+        'workers': app.config.get('JOB_WORKERS', DEFAULT_WORKERS),
+        'sync': app.config.get('JOB_RUNNER_SYNC', False),
+        'stale_seconds': app.config.get('JOB_STALE_SECONDS', DEFAULT_STALE_SECONDS)
+    }
+
+
+def _get_executor(app):
+    global _executor, _executor_pid
+    with _executor_lock:
+        # A pool inherited through fork (gunicorn --preload) has no threads in this process
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=app.extensions['job_runner']['workers'],
+                thread_name_prefix='job-runner'
+            )
+            _executor_pid = os.getpid()
+            _executor.submit(_requeue_in_app_context, app)
+        return _executor
+
+
+def submit_job(job_type, params=None, user_id=None):
+    """Persist a job and hand it to the pool.
+
+    Returns:
+        BackgroundJob: the queued (or, in sync mode, finished) job
+    """
+    from flask import current_app
+
+    if job_type not in JOB_TYPES:
+        raise JobError(f"Unknown job type: {job_type}")
+    job = BackgroundJob(job_type=job_type, params=params or {}, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    if app.extensions['job_runner']['sync']:
+        run_job(job.id)
+        db.session.refresh(job)
+    else:
+        _get_executor(app).submit(_run_in_app_context, app, job.id)
+    return job
+
+
+def requeue_stale_jobs(inline=False):
+    """Resubmit queued jobs and running jobs whose worker stopped reporting.
+
+    Args:
+        inline: run the jobs in the calling thread instead of the pool
+
+    Returns:
+        int: number of jobs run or handed to the pool
+    """
+    from flask import current_app
+
+    app = current_app._get_current_object()
+    cutoff = datetime.utcnow() - timedelta(seconds=app.extensions['job_runner']['stale_seconds'])
+    db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.status == JobStatus.RUNNING.value, BackgroundJob.updated_at < cutoff)
+        .values(status=JobStatus.QUEUED.value, progress_message='Requeued after worker loss')
+    )
+    db.session.commit()
+    job_ids = [
+        job_id for (job_id,) in
+        db.session.query(BackgroundJob.id)
+        .filter(BackgroundJob.status == JobStatus.QUEUED.value)
+        .order_by(BackgroundJob.id)
+    ]
+    for job_id in job_ids:
+        if inline or app.extensions['job_runner']['sync']:
+            run_job(job_id)
+        else:
+            _get_executor(app).submit(_run_in_app_context, app, job_id)
+    return len(job_ids)
+
+
+def _run_in_app_context(app, job_id):
+    with app.app_context():
+        try:
+            run_job(job_id)
+        finally:
+            db.session.remove()
+
+
+def _requeue_in_app_context(app):
+    """Pick up the jobs a stopped process left behind when this one starts its pool."""
+    with app.app_context():
+        try:
+            count = requeue_stale_jobs()
+            if count:
+                logger.info(f"Requeued {count} background jobs at runner start")
+        except Exception as e:
+            logger.error(f"Requeueing stale background jobs failed: {str(e)}", exc_info=True)
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+
+def _claim(job_id):
+    """Atomically move a queued job to running; False if someone else has it."""
+    result = db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.id == job_id, BackgroundJob.status == JobStatus.QUEUED.value)
+        .values(status=JobStatus.RUNNING.value, started_at=datetime.utcnow(), updated_at=datetime.utcnow())
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _set_progress(job_id, fraction, message=None):
+    db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.id == job_id)
+        .values(
+            progress=max(0.0, min(1.0, float(fraction))),
+            progress_message=message,
+            updated_at=datetime.utcnow()
+        )
+    )
+    db.session.commit()
+
+
+def run_job(job_id):
+    """Claim and execute one job in the current app context."""
+    if not _claim(job_id):
+        return
+    job = db.session.get(BackgroundJob, job_id)
+    handler = JOB_TYPES.get(job.job_type)
+    params = dict(job.params or {})
+    try:
+        if handler is None:
+            raise JobError(f"Unknown job type: {job.job_type}")
+        result = handler['func'](params, lambda fraction, message=None: _set_progress(job_id, fraction, message))
+        # Round-trip through json so dates and other values are stored as strings
+        result = json.loads(json.dumps(result, default=str))
+        values = {'status': JobStatus.SUCCEEDED.value, 'progress': 1.0, 'result': result}
+    except Exception as e:
+        logger.error(f"Background job {job_id} ({job.job_type}) failed: {str(e)}", exc_info=True)
+        db.session.rollback()
+        values = {'status': JobStatus.FAILED.value, 'error': str(e)}
+    db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.id == job_id)
+        .values(finished_at=datetime.utcnow(), updated_at=datetime.utcnow(), **values)
+    )
+    db.session.commit()
+
+
+@register_job('analytics_report', 'Performance, engagement and quest analytics for a class')
+def analytics_report_job(params, progress):
+    from app.services.analytics_service import get_analytics_backend
+    from app.services.analytics_cache import cached_analytics
+
+    class_id = params['class_id']
+    days = params.get('days', 90)
+    analytics = get_analytics_backend(params.get('backend'))
+    performance = cached_analytics(analytics, 'get_student_performance_data', class_id, days)
+    progress(1 / 3, 'Performance computed')
+    engagement = cached_analytics(analytics, 'get_engagement_metrics', class_id, min(days, 30))
+    progress(2 / 3, 'Engagement computed')
+    quests = cached_analytics(analytics, 'get_quest_completion_analytics', class_id, days)
+    return {'performance': performance, 'engagement': engagement, 'quests': quests}
+
+
+@register_job('analytics_export', 'Per-student analytics rows for one or more classes')
+def analytics_export_job(params, progress):
+    from app.services.analytics_service import iter_student_performance
+
+    class_ids = params['class_ids']
+    students = []
+    for index, class_id in enumerate(class_ids):
+        students.extend(iter_student_performance([class_id], days=params.get('days', 90)))
+        progress((index + 1) / len(class_ids), f"Exported {index + 1} of {len(class_ids)} classes")
+    return {'students': students}
+
+
+@register_job('clan_metrics', 'Metrics for every clan of a class')
+def clan_metrics_job(params, progress):
+    from app.models.clan import Clan
+    from app.services.clan_metrics import calculate_all_clan_metrics
+    from app.services.clan_leaderboard import refresh_clan_leaderboard
+
+    clan_ids = [
+        clan_id for (clan_id,) in
+        db.session.query(Clan.id).filter(Clan.class_id == params['class_id'])
+    ]
+    metrics = calculate_all_clan_metrics(clan_ids)
+    refresh_clan_leaderboard([params['class_id']], metrics)
+    return {'clans': metrics}
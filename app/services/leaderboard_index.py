@@ -0,0 +1,406 @@
+"""In-process live leaderboard index of characters and clans.
+
+Any ranking used to be a SUM/ORDER BY over the characters table. The index
+keeps, per process, sorted lists of ``(-experience, character_id)`` per
+class (Student.class_id) and per clan, and of ``(-total_points, clan_id)``
+per class, where a clan's points are the XP of its members (Student.clan_id,
+as in the clan metrics). Rank lookups are a bisect, so rank-of-character is
+O(log n) and top-N is O(log n + N); ties share a rank (1, 2, 2, 4).
+
+The index is warmed from the database when the app starts and follows every
+committed change through session events: any flush that changes a
+character's experience, name or student, a student's class or clan, or
+adds/removes characters and clans reads the new values of the rows involved
+(one query), and they are applied once the transaction commits. That covers
+Reward.distribute, Character.gain_experience, battle rewards and teacher
+edits alike. Writes made by other processes are picked up by a rebuild
+once the index is older than LEADERBOARD_INDEX_MAX_AGE seconds; it runs in
+a background thread while lookups keep answering from the current index,
+and changes committed during the rebuild are replayed onto the new one.
+``check_consistency`` compares the index with the database and can repair it.
+"""
+
+from app.models import db
+from app.models.character import Character
+from app.models.clan import Clan
+from app.models.student import Student
+from app.utils.commit_hooks import register_commit_hook
+from bisect import bisect_left, insort
+from sqlalchemy import inspect, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE_SECONDS = 300
+
+_PENDING_KEY = 'leaderboard_index_pending'
+
+_CHARACTER_FIELDS = ('experience', 'name', 'student_id')
+_STUDENT_FIELDS = ('class_id', 'clan_id')
+_CLAN_FIELDS = ('name', 'class_id')
+
+
+def _character_rows(connection, character_ids=None, student_ids=None):
+    """(id, experience, name, class_id, clan_id) of characters, all of them when no ids are given."""
+    query = (
+        select(Character.id, Character.experience, Character.name, Student.class_id, Student.clan_id)
+        .outerjoin(Student, Student.id == Character.student_id)
+    )
+    conditions = []
+    if character_ids:
+        conditions.append(Character.id.in_(character_ids))
+    if student_ids:
+        conditions.append(Character.student_id.in_(student_ids))
+    if conditions:
+        query = query.where(or_(*conditions))
+    return connection.execute(query).all()
+
+
+def _clan_rows(connection, clan_ids=None):
+    query = select(Clan.id, Clan.name, Clan.class_id)
+    if clan_ids:
+        query = query.where(Clan.id.in_(clan_ids))
+    return connection.execute(query).all()
+
+
+class LeaderboardIndex:
+    """Sorted per-class and per-clan rankings, safe to share between threads."""
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE_SECONDS, clock=time.monotonic):
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._reset()
+        self.built_at = None
+        self._replay = None  # changes committed while a rebuild runs
+        self._refresh_thread = None
+
+    def _reset(self):
+        self._characters = {}  # id -> (experience, name, class_id, clan_id)
+        self._clans = {}  # id -> (name, class_id)
+        self._clan_points = {}
+        self._by_class = {}
+        self._by_clan = {}
+        self._clans_by_class = {}
+
+    @property
+    def is_warm(self):
+        return self.built_at is not None
+
+    # -- building -----------------------------------------------------------
+
+    def warm(self, connection=None):
+        """(Re)build the index from the database; returns the number of characters."""
+        connection = connection or db.session.connection()
+        characters = _character_rows(connection)
+        clans = _clan_rows(connection)
+        with self._lock:
+            self._reset()
+            for clan_id, name, class_id in clans:
+                self._apply_clan(clan_id, (name, class_id))
+            for character_id, *values in characters:
+                self._apply_character(character_id, tuple(values))
+            self.built_at = self._clock()
+            return len(self._characters)
+
+    def clear(self):
+        """Drop everything; the next lookup rebuilds the index."""
+        with self._lock:
+            self._reset()
+            self.built_at = None
+
+    def ensure_warm(self):
+        """Build the index if it is cold; refresh it in the background once older than ``max_age``."""
+        if self.built_at is None:
+            self.warm()
+        elif self.max_age and self._clock() - self.built_at > self.max_age:
+            self._refresh_in_background()
+
+    def refresh(self):
+        """Rebuild the index without blocking lookups, then swap the new one in."""
+        fresh = LeaderboardIndex(max_age=self.max_age, clock=self._clock)
+        with self._lock:
+            self._replay = []
+        try:
+            fresh.warm()
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            # The new index read the database before these commits were applied
+            for changes in self._replay:
+                fresh.apply(changes)
+            self._replay = None
+            self._adopt(fresh)
+        return len(fresh._characters)
+
+    def _refresh_in_background(self):
+        from flask import current_app
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_in_app_context,
+                args=(current_app._get_current_object(),),
+                name='leaderboard-index-refresh',
+                daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _refresh_in_app_context(self, app):
+        with app.app_context():
+            try:
+                count = self.refresh()
+                logger.debug(f"Leaderboard index refreshed with {count} characters")
+            except SQLAlchemyError as e:
+                logger.error(f"Leaderboard index refresh failed: {str(e)}", exc_info=True)
+            finally:
+                db.session.remove()
+
+    def _adopt(self, fresh):
+        for name in ('_characters', '_clans', '_clan_points', '_by_class', '_by_clan', '_clans_by_class'):
+            setattr(self, name, getattr(fresh, name))
+        self.built_at = fresh.built_at
+
+    def apply(self, changes):
+        """Apply committed changes: {('character' | 'clan', id): values or None if deleted}."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(changes)
+            if not self.is_warm:
+                return
+            for (kind, key), values in changes.items():
+                if kind == 'clan':
+                    self._apply_clan(key, values)
+            for (kind, key), values in changes.items():
+                if kind == 'character':
+                    self._apply_character(key, values)
+
+    def _apply_clan(self, clan_id, values):
+        old = self._clans.pop(clan_id, None)
+        points = self._clan_points.get(clan_id, 0)
+        if old is not None:
+            self._discard(self._clans_by_class, old[1], (-points, clan_id))
+        if values is None:
+            self._clan_points.pop(clan_id, None)
+            self._by_clan.pop(clan_id, None)
+            return
+        self._clans[clan_id] = values
+        self._clan_points.setdefault(clan_id, 0)
+        if values[1] is not None:
+            insort(self._clans_by_class.setdefault(values[1], []), (-points, clan_id))
+
+    def _apply_character(self, character_id, values):
+        old = self._characters.pop(character_id, None)
+        if old is not None:
+            experience, _, class_id, clan_id = old
+            self._discard(self._by_class, class_id, (-experience, character_id))
+            self._discard(self._by_clan, clan_id, (-experience, character_id))
+            self._add_clan_points(clan_id, -experience)
+        if values is None:
+            return
+        experience, _, class_id, clan_id = values
+        self._characters[character_id] = values
+        if class_id is not None:
+            insort(self._by_class.setdefault(class_id, []), (-experience, character_id))
+        if clan_id is not None:
+            insort(self._by_clan.setdefault(clan_id, []), (-experience, character_id))
+            self._add_clan_points(clan_id, experience)
+
+    def _add_clan_points(self, clan_id, amount):
+        if clan_id not in self._clan_points or not amount:
+            return
+        points = self._clan_points.get(clan_id, 0)
+        self._clan_points[clan_id] = points + amount
+        clan = self._clans.get(clan_id)
+        if clan is not None and clan[1] is not None:
+            self._discard(self._clans_by_class, clan[1], (-points, clan_id))
+            insort(self._clans_by_class.setdefault(clan[1], []), (-(points + amount), clan_id))
+
+    @staticmethod
+    def _discard(groups, group_id, key):
+        keys = groups.get(group_id)
+        if keys is None:
+            return
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
+        if not keys:
+            del groups[group_id]
+
+    # -- queries ------------------------------------------------------------
+
+    @staticmethod
+    def _rank(keys, score):
+        """1-based rank of ``score`` in ``keys``; ties share the best rank."""
+        return bisect_left(keys, (-score,)) + 1
+
+    def _top(self, keys, limit, describe):
+        entries = []
+        for position, (score, item_id) in enumerate(keys[:limit]):
+            rank = entries[-1]['rank'] if entries and -score == entries[-1]['score'] else position + 1
+            entries.append({**describe(item_id), 'score': -score, 'rank': rank})
+        return entries
+
+    def _describe_character(self, character_id):
+        experience, name, class_id, clan_id = self._characters[character_id]
+        return {'id': character_id, 'name': name, 'experience': experience, 'class_id': class_id, 'clan_id': clan_id}
+
+    def _describe_clan(self, clan_id):
+        name, class_id = self._clans[clan_id]
+        return {'id': clan_id, 'name': name, 'class_id': class_id, 'total_points': self._clan_points.get(clan_id, 0)}
+
+    def top_characters(self, class_id=None, clan_id=None, limit=10):
+        """Best ``limit`` characters of a class or a clan, as dicts with ``rank``."""
+        self.ensure_warm()
+        with self._lock:
+            keys = self._by_clan.get(clan_id, []) if clan_id is not None else self._by_class.get(class_id, [])
+            entries = self._top(keys, limit, self._describe_character)
+        for entry in entries:
+            del entry['score']
+        return entries
+
+    def top_clans(self, class_id, limit=10):
+        """Best ``limit`` clans of a class by member XP, as dicts with ``rank``."""
+        self.ensure_warm()
+        with self._lock:
+            entries = self._top(self._clans_by_class.get(class_id, []), limit, self._describe_clan)
+        for entry in entries:
+            del entry['score']
+        return entries
+
+    def character_rank(self, character_id):
+        """Rank of a character in its class and clan, or None if unknown."""
+        self.ensure_warm()
+        with self._lock:
+            if character_id not in self._characters:
+                return None
+            result = self._describe_character(character_id)
+            experience, class_id, clan_id = result['experience'], result['class_id'], result['clan_id']
+            class_keys = self._by_class.get(class_id, [])
+            clan_keys = self._by_clan.get(clan_id, [])
+            result.update({
+                'class_rank': self._rank(class_keys, experience) if class_id is not None else None,
+                'class_size': len(class_keys),
+                'clan_rank': self._rank(clan_keys, experience) if clan_id is not None else None,
+                'clan_size': len(clan_keys),
+            })
+            return result
+
+    def clan_rank(self, clan_id):
+        """Rank of a clan among the clans of its class, or None if unknown."""
+        self.ensure_warm()
+        with self._lock:
+            if clan_id not in self._clans:
+                return None
+            result = self._describe_clan(clan_id)
+            keys = self._clans_by_class.get(result['class_id'], [])
+            result.update({'rank': self._rank(keys, result['total_points']), 'clan_count': len(keys)})
+            return result
+
+    def check_consistency(self, repair=True):
+        """Compare the index with the database.
+
+        Returns:
+            dict: counts of characters and clans checked and mismatched, and
+                whether the index was rebuilt
+        """
+        fresh = LeaderboardIndex(max_age=self.max_age, clock=self._clock)
+        fresh.warm()
+        with self._lock:
+            character_ids = set(self._characters) | set(fresh._characters)
+            clan_ids = set(self._clans) | set(fresh._clans)
+            character_mismatches = sum(
+                1 for character_id in character_ids
+                if self._characters.get(character_id) != fresh._characters.get(character_id)
+            )
+            clan_mismatches = sum(
+                1 for clan_id in clan_ids
+                if (self._clans.get(clan_id), self._clan_points.get(clan_id))
+                != (fresh._clans.get(clan_id), fresh._clan_points.get(clan_id))
+            )
+            repaired = bool(repair and (character_mismatches or clan_mismatches or not self.is_warm))
+            if repaired:
+                self._adopt(fresh)
+        return {
+            'characters': len(fresh._characters),
+            'clans': len(fresh._clans),
+            'character_mismatches': character_mismatches,
+            'clan_mismatches': clan_mismatches,
+            'repaired': repaired
+        }
+
+
+leaderboard_index = LeaderboardIndex()
+
+
+def init_leaderboard_index(app):
+    """Configure the index from LEADERBOARD_INDEX_MAX_AGE and warm it (outside of tests)."""
+    leaderboard_index.max_age = app.config.get('LEADERBOARD_INDEX_MAX_AGE', DEFAULT_MAX_AGE_SECONDS)
+    if app.testing or not app.config.get('LEADERBOARD_INDEX_WARM', True):
+        return
+    with app.app_context():
+        try:
+            count = leaderboard_index.warm()
+            logger.info(f"Leaderboard index warmed with {count} characters")
+        except SQLAlchemyError as e:
+            # Tables may not exist yet (fresh database, migrations); the first lookup builds it
+            logger.warning(f"Leaderboard index not warmed: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+def _changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _collect_leaderboard_changes(session):
+    """Read the new ranking values of the characters and clans changed by this flush."""
+    if not leaderboard_index.is_warm:
+        return None
+    character_ids, student_ids, clan_ids = set(), set(), set()
+    deleted = {}
+    for obj in session.deleted:
+        if isinstance(obj, Character):
+            deleted[('character', obj.id)] = None
+        elif isinstance(obj, Student):
+            student_ids.add(obj.id)
+        elif isinstance(obj, Clan):
+            deleted[('clan', obj.id)] = None
+    for obj in session.new:
+        if isinstance(obj, Character):
+            character_ids.add(obj.id)
+        elif isinstance(obj, Clan):
+            clan_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Character) and _changed(obj, _CHARACTER_FIELDS):
+            character_ids.add(obj.id)
+        elif isinstance(obj, Student) and _changed(obj, _STUDENT_FIELDS):
+            student_ids.add(obj.id)
+        elif isinstance(obj, Clan) and _changed(obj, _CLAN_FIELDS):
+            clan_ids.add(obj.id)
+    if not (character_ids or student_ids or clan_ids or deleted):
+        return None
+
+    changes = {}
+    connection = session.connection()
+    if character_ids or student_ids:
+        # Characters whose student was deleted are looked up too, then dropped if gone
+        for character_id, *values in _character_rows(connection, character_ids, student_ids):
+            changes[('character', character_id)] = tuple(values)
+        changes.update({('character', character_id): None
+                        for character_id in character_ids if ('character', character_id) not in changes})
+    if clan_ids:
+        rows = {clan_id: (name, class_id) for clan_id, name, class_id in _clan_rows(connection, clan_ids)}
+        changes.update({('clan', clan_id): rows.get(clan_id) for clan_id in clan_ids})
+    changes.update(deleted)
+    return changes
+
+
+# The collected values are only published on commit; a rollback just drops them
+register_commit_hook(_PENDING_KEY, leaderboard_index.apply, _collect_leaderboard_changes, factory=dict)
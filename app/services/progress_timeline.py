@@ -0,0 +1,242 @@
+"""Student progress timeline (XP, level, gold and quest series) in one pass.
+
+The progress page used to issue one query per chart and walk each result in
+its own loop. ``ProgressTimelineService.get_timeline`` reads every series for
+a character with a single UNION ALL query ordered by day — XP and gold earned
+from audit_daily_rollup, levels from LEVEL_UP events, gold spent from
+shop_purchases and completions from quest_logs — and builds all charts in
+one loop over the rows.
+
+Timelines are memoized per character. An entry is dropped when a transaction
+that wrote AuditLog, QuestLog or ShopPurchase rows for the character commits,
+and is only reused for the same day and the same current level/XP/gold. It
+also expires after ``max_age`` seconds as a bound for writes made by other
+processes. A timeline built while such a commit happened is returned but not
+memoized.
+"""
+
+from app.models import db
+from app.models.audit import AuditLog, AuditDailyRollup, EventType
+from app.models.quest import QuestLog, QuestStatus
+from app.models.shop import ShopPurchase
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, date
+from app.utils.commit_hooks import Generations, register_commit_hook
+from sqlalchemy import func, literal, case, union_all, null
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = 'progress_timeline_pending_characters'
+
+
+class ProgressTimelineService:
+    """Builds and memoizes the progress page series for a character."""
+
+    def __init__(self, days=90, max_entries=1024, max_age=300, clock=time.monotonic):
+        self.days = days
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._clock = clock
+        self._memo = OrderedDict()  # character_id -> (fingerprint, expires_at, timeline)
+        self._generations = Generations()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_timeline(self, character):
+        """Return the chart data for ``character`` (memoized).
+
+        Returns:
+            dict: xp_chart_data, level_chart_data, gold_chart_data, quest_stats
+        """
+        today = datetime.utcnow().date()
+        fingerprint = (today, character.experience, character.level, character.gold)
+        with self._lock:
+            entry = self._memo.get(character.id)
+            if entry is not None and entry[0] == fingerprint and entry[1] > self._clock():
+                self._memo.move_to_end(character.id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            generation = self._generations.get(character.id)
+
+        timeline = self.build_timeline(character, today)
+        with self._lock:
+            if generation != self._generations.get(character.id):
+                return timeline
+            self._memo[character.id] = (fingerprint, self._clock() + self.max_age, timeline)
+            self._memo.move_to_end(character.id)
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return timeline
+
+    def invalidate(self, character_id):
+        with self._lock:
+            self._generations.bump(character_id)
+            self._memo.pop(character_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generations.bump_all()
+            self._memo.clear()
+
+    def _series_query(self, character_id, since):
+        """UNION ALL of (series, day, value) rows for every chart, oldest day first."""
+        xp = (
+            db.session.query(
+                literal('xp').label('series'),
+                AuditDailyRollup.day.label('day'),
+                func.sum(AuditDailyRollup.total_amount).label('value')
+            )
+            .filter(
+                AuditDailyRollup.character_id == character_id,
+                AuditDailyRollup.event_type == EventType.XP_GAIN.value,
+                AuditDailyRollup.day >= since.date()
+            )
+            .group_by(AuditDailyRollup.day)
+        )
+        gold_earned = (
+            db.session.query(literal('earned'), AuditDailyRollup.day, func.sum(AuditDailyRollup.positive_amount))
+            .filter(
+                AuditDailyRollup.character_id == character_id,
+                AuditDailyRollup.event_type == EventType.GOLD_TRANSACTION.value,
+                AuditDailyRollup.day >= since.date()
+            )
+            .group_by(AuditDailyRollup.day)
+        )
+        level_day = func.date(AuditLog.event_timestamp)
+        levels = (
+            db.session.query(literal('level'), level_day, func.max(AuditLog.new_value))
+            .filter(
+                AuditLog.character_id == character_id,
+                AuditLog.event_type == EventType.LEVEL_UP.value,
+                AuditLog.new_value.isnot(None)
+            )
+            .group_by(level_day)
+        )
+        purchase_day = func.date(ShopPurchase.purchase_date)
+        gold_spent = (
+            db.session.query(literal('spent'), purchase_day, func.sum(ShopPurchase.gold_spent))
+            .filter(ShopPurchase.character_id == character_id, ShopPurchase.purchase_date >= since)
+            .group_by(purchase_day)
+        )
+        completed = QuestLog.status == QuestStatus.COMPLETED
+        completion_day = func.date(QuestLog.completed_at)
+        completions = (
+            db.session.query(literal('completed'), completion_day, func.count(QuestLog.id))
+            .filter(QuestLog.character_id == character_id, completed, QuestLog.completed_at.isnot(None))
+            .group_by(completion_day)
+        )
+        quest_totals = (
+            db.session.query(literal('quests_total'), null(), func.count(QuestLog.id))
+            .filter(QuestLog.character_id == character_id)
+        )
+        quests_completed = (
+            db.session.query(literal('quests_completed'), null(), func.sum(case((completed, 1), else_=0)))
+            .filter(QuestLog.character_id == character_id)
+        )
+        series = union_all(
+            xp.statement, gold_earned.statement, levels.statement, gold_spent.statement,
+            completions.statement, quest_totals.statement, quests_completed.statement
+        ).subquery()
+        return db.session.query(series.c.series, series.c.day, series.c.value).order_by(series.c.day)
+
+    def build_timeline(self, character, today=None):
+        """Compute the timeline for ``character`` from a single ordered query."""
+        today = today or datetime.utcnow().date()
+        since = datetime.utcnow() - timedelta(days=self.days)
+
+        xp_by_date = {}
+        level_by_date = {}
+        gold_earned_by_date = defaultdict(int)
+        gold_spent_by_date = defaultdict(int)
+        quest_completion_by_date = {}
+        totals = {'quests_total': 0, 'quests_completed': 0}
+
+        created = character.created_at.date() if character.created_at else None
+        if created:
+            level_by_date[created] = 1
+
+        cumulative_xp = 0
+        for series, day, value in self._series_query(character.id, since):
+            if series in totals:
+                totals[series] = value or 0
+                continue
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            if series == 'xp':
+                cumulative_xp += value or 0
+                xp_by_date[day] = cumulative_xp
+            elif series == 'level':
+                level_by_date[day] = value
+            elif series == 'earned':
+                if value:
+                    gold_earned_by_date[day] += value
+            elif series == 'spent':
+                gold_spent_by_date[day] += value or 0
+            elif series == 'completed':
+                quest_completion_by_date[day] = value
+
+        # Ensure we have initial and current state
+        if created and created not in xp_by_date:
+            xp_by_date[created] = 0
+        if today not in xp_by_date:
+            xp_by_date[today] = character.experience
+        if today not in level_by_date:
+            level_by_date[today] = character.level
+
+        xp_dates = sorted(xp_by_date)
+        level_dates = sorted(level_by_date)
+        gold_dates = sorted(set(gold_earned_by_date) | set(gold_spent_by_date))
+        quest_dates = sorted(quest_completion_by_date)
+        total_quests = totals['quests_total']
+        total_completed = totals['quests_completed']
+        completion_rate = (total_completed / total_quests * 100) if total_quests > 0 else 0
+
+        return {
+            'xp_chart_data': {
+                'dates': [d.strftime('%Y-%m-%d') for d in xp_dates],
+                'xp': [xp_by_date[d] for d in xp_dates]
+            },
+            'level_chart_data': {
+                'dates': [d.strftime('%Y-%m-%d') for d in level_dates],
+                'levels': [level_by_date[d] for d in level_dates]
+            },
+            'gold_chart_data': {
+                'dates': [d.strftime('%Y-%m-%d') for d in gold_dates],
+                'earned': [gold_earned_by_date.get(d, 0) for d in gold_dates],
+                'spent': [gold_spent_by_date.get(d, 0) for d in gold_dates]
+            },
+            'quest_stats': {
+                'total_completed': total_completed,
+                'total_quests': total_quests,
+                'completion_rate': round(completion_rate, 1),
+                'completion_timeline': {
+                    'dates': [d.strftime('%Y-%m-%d') for d in quest_dates],
+                    'counts': [quest_completion_by_date[d] for d in quest_dates]
+                }
+            }
+        }
+
+
+progress_timeline_service = ProgressTimelineService()
+
+
+def _collect_timeline_writes(session):
+    """Characters that gained events in this flush."""
+    return {
+        obj.character_id
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, (AuditLog, QuestLog, ShopPurchase)) and obj.character_id
+    }
+
+
+def _invalidate_timelines(character_ids):
+    for character_id in character_ids:
+        progress_timeline_service.invalidate(character_id)
+
+
+register_commit_hook(_PENDING_KEY, _invalidate_timelines, _collect_timeline_writes)
@@ -14,54 +14,99 @@ except Exception:  # pragma: no cover - Celery may not be configured in tests
 
                 return wrapper
 
+            # Support both @celery.task and @celery.task(...)
+            if len(dargs) == 1 and callable(dargs[0]) and not dkwargs:
+                return decorator(dargs[0])
             return decorator
 
     celery = _DummyCelery()
-from app.models.clan import Clan
 from app.models.clan_progress import ClanProgressHistory
 from app.services.clan_metrics import (
-    calculate_clan_metrics,
     calculate_percentile_rankings,
+    current_clan_metrics,
+    reconcile_clan_totals,
 )
-from datetime import datetime
+from app.services.clan_leaderboard import refresh_clan_leaderboard
+from app.services.scheduler import register_schedule
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+import logging
 
+logger = logging.getLogger(__name__)
 
+
+@register_schedule('update_clan_metrics', timedelta(days=1))
 @celery.task
 def update_clan_metrics():
-    """Daily job to calculate and store clan metrics for all clans."""
-    clans = Clan.query.all()
-    for clan in clans:
-        metrics = calculate_clan_metrics(clan.id)
-        if not metrics:
-            continue
-        history = ClanProgressHistory(
-            clan_id=clan.id,
-            timestamp=datetime.utcnow(),
-            avg_completion_rate=metrics["avg_completion_rate"],
-            total_points=metrics["total_points"],
-            active_members=metrics["active_members"],
-            avg_daily_points=metrics["avg_daily_points"],
-            quest_completion_rate=metrics["quest_completion_rate"],
-            avg_member_level=metrics["avg_member_level"],
-        )
-        db.session.add(history)
-    # Update percentile rankings
+    """Daily job to calculate and store clan metrics for all clans.
+
+    The running clan totals are kept current as members gain XP and
+    complete quests; this job reconciles them from scratch (a fixed number
+    of grouped queries) to correct any drift, then reads every clan's
+    metrics from them. The history rows, percentile rank included, are
+    written with a single bulk insert and the materialized clan leaderboard
+    is rebuilt from the same metrics.
+    """
+    reconcile_clan_totals()
+    all_metrics = current_clan_metrics()
     class_percentiles = calculate_percentile_rankings()
-    for clan_id, percentile in class_percentiles.items():
-        latest_history = (
-            ClanProgressHistory.query.filter_by(clan_id=clan_id)
-            .order_by(ClanProgressHistory.timestamp.desc())
-            .first()
-        )
-        if latest_history:
-            latest_history.percentile_rank = percentile
+    now = datetime.utcnow()
+    rows = [
+        {
+            "clan_id": clan_id,
+            "timestamp": now,
+            "avg_completion_rate": metrics["avg_completion_rate"],
+            "total_points": metrics["total_points"],
+            "active_members": metrics["active_members"],
+            "avg_daily_points": metrics["avg_daily_points"],
+            "quest_completion_rate": metrics["quest_completion_rate"],
+            "avg_member_level": metrics["avg_member_level"],
+            "percentile_rank": class_percentiles.get(clan_id),
+        }
+        for clan_id, metrics in all_metrics.items()
+    ]
+    if rows:
+        db.session.execute(insert(ClanProgressHistory), rows)
+    refresh_clan_leaderboard(metrics=all_metrics)
     db.session.commit()
+    return len(rows)
+
+
+@register_schedule('archive_audit_logs', timedelta(days=7))
+@celery.task
+def archive_audit_logs_task():
+    """Weekly job to archive audit_log events past the retention horizon."""
+    from app.services.audit_archive import archive_audit_logs
+
+    return archive_audit_logs()
+
+
+@register_schedule('compact_clan_history', timedelta(days=7))
+@celery.task
+def compact_clan_history_task():
+    """Weekly job to roll old clan progress history into weekly/monthly buckets."""
+    from app.services.clan_history import compact_clan_history
+
+    result = compact_clan_history()
+    db.session.commit()
+    return result
+
+
+@register_schedule('db_integrity_check', timedelta(days=7))
+@celery.task
+def db_integrity_check_task():
+    """Weekly PRAGMA integrity_check of a SQLite database (db_maintenance.run_integrity_check)."""
+    from app.models.db_maintenance import run_integrity_check
+
+    if db.engine.dialect.name != 'sqlite' or db.engine.url.database in (None, '', ':memory:'):
+        return 'skipped'
+    result = run_integrity_check(db.engine.url.database)
+    if result != 'ok':
+        logger.warning(f"Database integrity check failed: {result}")
+    return result
 
 
-# To schedule this task daily, add to your Celery beat schedule (example):
-# CELERY_BEAT_SCHEDULE = {
-#     'update-clan-metrics-daily': {
-#         'task': 'app.services.scheduled_tasks.update_clan_metrics',
-#         'schedule': crontab(hour=0, minute=0),
-#     },
-# }
+# These tasks are registered with the built-in scheduler (app.services.scheduler):
+# set SCHEDULER_ENABLED=true to run it in every web worker, or run
+# `flask run-scheduler` from cron. A Celery beat schedule can still
+# call the tasks directly instead.
@@ -0,0 +1,252 @@
+"""Built-in periodic job scheduler backed by the scheduled_jobs table.
+
+The periodic maintenance tasks (clan metrics, audit archiving, clan history
+compaction, integrity check) used to assume a Celery beat schedule that
+was never configured. They are now registered here with
+``register_schedule`` and run by a small scheduler thread that every web
+worker may start on its first request (SCHEDULER_ENABLED), or by
+``flask run-scheduler`` from cron:
+
+- each schedule has a ScheduledJob row holding its next run time, lease and
+  run statistics, so state survives restarts and is shared by processes;
+- a worker claims a due run with a compare-and-set UPDATE on
+  ``next_run_at`` that also takes the lease; only one process wins, the
+  others see the new ``next_run_at`` and skip it;
+- runs missed while no worker was up are coalesced into one catch-up run,
+  and the schedule keeps its phase (a daily job stays at the same time);
+- a run that raises is recorded as failed and the job waits for its next
+  slot; a lease left by a crashed worker expires after ``lease_seconds``;
+- start/finish times, status, error and durations (last, max, total) are
+  stored on the row (``scheduler_status()``).
+"""
+
+from app.models import db
+from app.models.job import ScheduledJob
+from datetime import datetime, timedelta
+from sqlalchemy import case, or_, update
+from sqlalchemy.exc import IntegrityError
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Registry for periodic jobs
+SCHEDULES = {}
+
+DEFAULT_POLL_SECONDS = 30
+DEFAULT_LEASE_SECONDS = 3600
+
+_scheduler_thread = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def register_schedule(name, interval, description=None, lease=None):
+    """Register a function to run every ``interval`` (a timedelta)."""
+    def decorator(func):
+        SCHEDULES[name] = {
+            'func': func,
+            'interval': interval,
+            'lease': lease or timedelta(seconds=DEFAULT_LEASE_SECONDS),
+            'description': description or func.__doc__ or f"Scheduled job: {name}"
+        }
+        return func
+    return decorator
+
+
+def _load_schedules():
+    # The periodic tasks register themselves on import
+    import app.services.scheduled_tasks  # noqa: F401
+
+
+def _owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def sync_schedules(now=None):
+    """Create rows for newly registered schedules and apply interval changes.
+
+    Returns:
+        list: names of the schedules added (first run due at once)
+    """
+    _load_schedules()
+    now = now or datetime.utcnow()
+    existing = {job.name: job for job in ScheduledJob.query}
+    added = []
+    for name, schedule in SCHEDULES.items():
+        interval = int(schedule['interval'].total_seconds())
+        lease = int(schedule['lease'].total_seconds())
+        job = existing.get(name)
+        if job is None:
+            db.session.add(ScheduledJob(name=name, interval_seconds=interval, lease_seconds=lease, next_run_at=now))
+            added.append(name)
+        elif (job.interval_seconds, job.lease_seconds) != (interval, lease):
+            job.interval_seconds = interval
+            job.lease_seconds = lease
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker created the rows first
+        db.session.rollback()
+        added = []
+    return added
+
+
+def _next_run(scheduled, interval, now):
+    """First slot after ``now`` on the schedule's grid; missed slots are skipped."""
+    if scheduled > now:
+        return scheduled
+    missed = int((now - scheduled) / interval) + 1
+    return scheduled + missed * interval
+
+
+def _claim(job, now, owner):
+    """Take the lease of a due job; False if another worker got it first."""
+    result = db.session.execute(
+        update(ScheduledJob)
+        .where(
+            ScheduledJob.id == job.id,
+            ScheduledJob.next_run_at == job.next_run_at,
+            or_(ScheduledJob.lease_owner.is_(None), ScheduledJob.lease_expires_at < now)
+        )
+        .values(
+            next_run_at=_next_run(job.next_run_at, timedelta(seconds=job.interval_seconds), now),
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=job.lease_seconds),
+            last_started_at=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _run(job_id, name, owner):
+    """Run a claimed job and record the outcome; returns the status."""
+    started = time.perf_counter()
+    error = None
+    try:
+        SCHEDULES[name]['func']()
+        db.session.commit()
+        status = 'succeeded'
+    except Exception as e:
+        logger.error(f"Scheduled job {name} failed: {str(e)}", exc_info=True)
+        db.session.rollback()
+        status, error = 'failed', str(e)
+    duration = time.perf_counter() - started
+    db.session.execute(
+        update(ScheduledJob)
+        .where(ScheduledJob.id == job_id, ScheduledJob.lease_owner == owner)
+        .values(
+            lease_owner=None,
+            lease_expires_at=None,
+            last_finished_at=datetime.utcnow(),
+            last_status=status,
+            last_error=error,
+            last_duration=duration,
+            max_duration=case(
+                (or_(ScheduledJob.max_duration.is_(None), ScheduledJob.max_duration < duration), duration),
+                else_=ScheduledJob.max_duration
+            ),
+            total_duration=ScheduledJob.total_duration + duration,
+            run_count=ScheduledJob.run_count + 1,
+            failure_count=ScheduledJob.failure_count + (1 if error else 0)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return status
+
+
+def run_due_jobs(now=None, owner=None):
+    """Run every due job this worker manages to claim.
+
+    Returns:
+        dict: job name -> 'succeeded' or 'failed' for the jobs run here
+    """
+    sync_schedules(now)
+    started = now or datetime.utcnow()
+    owner = owner or _owner()
+    due = (
+        ScheduledJob.query
+        .filter(
+            ScheduledJob.next_run_at <= started,
+            or_(ScheduledJob.lease_owner.is_(None), ScheduledJob.lease_expires_at < started)
+        )
+        .order_by(ScheduledJob.next_run_at)
+        .all()
+    )
+    results = {}
+    for job in due:
+        if job.name not in SCHEDULES:
+            continue
+        job_id, name = job.id, job.name
+        # Earlier jobs of this pass may have run for a long time; lease and reschedule from the claim time
+        if _claim(job, now or datetime.utcnow(), owner):
+            results[name] = _run(job_id, name, owner)
+    return results
+
+
+def scheduler_status():
+    """State and run statistics of every schedule, as dicts."""
+    return [job.to_dict() for job in ScheduledJob.query.order_by(ScheduledJob.name)]
+
+
+def _scheduler_loop(app, poll_seconds, stop):
+    while True:
+        with app.app_context():
+            try:
+                run_due_jobs()
+            except Exception as e:
+                logger.error(f"Scheduler pass failed: {str(e)}", exc_info=True)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+        if stop.wait(poll_seconds):
+            return
+
+
+def start_scheduler(app):
+    """Start the scheduler thread of the current process unless it runs already.
+
+    Threads do not survive fork, so a thread started in another process
+    (e.g. a gunicorn master with --preload) does not count.
+    """
+    global _scheduler_thread, _scheduler_pid
+    with _scheduler_lock:
+        if _scheduler_pid == os.getpid():
+            return
+        stop = threading.Event()
+        _scheduler_thread = threading.Thread(
+            target=_scheduler_loop,
+            args=(app, app.config.get('SCHEDULER_POLL_SECONDS', DEFAULT_POLL_SECONDS), stop),
+            name='scheduler',
+            daemon=True
+        )
+        _scheduler_pid = os.getpid()
+        app.extensions['scheduler'] = {'thread': _scheduler_thread, 'stop': stop}
+        _scheduler_thread.start()
+
+
+def init_scheduler(app):
+    """Run the scheduler thread in every process serving requests when SCHEDULER_ENABLED is set.
+
+    The thread is started by the first request a process handles, not by
+    create_app, so with a preloading server (gunicorn --preload) it runs in
+    each forked worker rather than only in the master. Every worker may run
+    one; the database leases make sure each job still runs once per slot.
+
+    Config:
+        SCHEDULER_ENABLED: start the thread (never in tests)
+        SCHEDULER_POLL_SECONDS: how often due jobs are checked (default 30)
+    """
+    if app.testing or not app.config.get('SCHEDULER_ENABLED', False):
+        return
+
+    @app.before_request
+    def _start_scheduler():
+        if _scheduler_pid != os.getpid():
+            start_scheduler(app)
@@ -0,0 +1,196 @@
+"""Per-classroom effective shop catalog.
+
+The student shop used to merge the classroom's ShopItemOverride rows with
+every equipment and ability row in Python on each page load. The merged
+result only depends on the item catalog and the classroom's overrides, so
+it is materialized once per classroom as a ``ClassroomShop``:
+
+- one ``ShopEntry`` per visible item with its effective price and level
+  requirement (plus the originals when overridden), in catalog order;
+- rebuilt when the item catalog's (token, version) key changes or the
+  classroom's overrides change, which is detected with one aggregate query
+  over the classroom's override rows (count and latest update) so edits
+  made in other worker processes are picked up too; the catalog token is
+  random per database, so views built from another database never match;
+- dropped locally when ShopItemOverride rows are committed
+  (``save_shop_config``).
+
+``ClassroomShop.items_for`` then only adds the character's owned /
+affordable / unlocked flags.
+"""
+
+from app.models import db
+from app.models.shop_config import ShopItemOverride
+from app.services.item_catalog import item_catalog
+from app.utils.commit_hooks import register_commit_hook
+from collections import namedtuple
+from sqlalchemy import func
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMAGE = '/static/images/default_item.png'
+
+_PENDING_KEY = 'shop_overrides_changed'
+
+ShopEntry = namedtuple('ShopEntry', [
+    'id', 'name', 'category', 'price', 'original_price', 'image', 'tier', 'description',
+    'level_requirement', 'original_level_requirement', 'class_restriction'
+])
+
+
+class ShopItem:
+    """A ``ShopEntry`` seen by one character (attribute access for templates)."""
+
+    __slots__ = ('entry', 'owned', 'can_afford', 'unlocked')
+
+    def __init__(self, entry, owned, can_afford, unlocked):
+        self.entry = entry
+        self.owned = owned
+        self.can_afford = can_afford
+        self.unlocked = unlocked
+
+    @property
+    def can_buy(self):
+        return (not self.owned) and self.can_afford and self.unlocked
+
+    def __getattr__(self, name):
+        return getattr(self.entry, name)
+
+
+def _effective(override, base_cost, base_level):
+    cost = override.override_cost if override and override.override_cost is not None else base_cost
+    level = override.override_level_req if override and override.override_level_req is not None else base_level
+    return cost, level
+
+
+class ClassroomShop:
+    """Visible items of one classroom's shop with overrides applied."""
+
+    def __init__(self, classroom_id, catalog, overrides, fingerprint):
+        self.classroom_id = classroom_id
+        self.catalog_key = catalog.key
+        self.fingerprint = fingerprint
+        overrides_map = {(ov.item_type, ov.item_id): ov for ov in overrides}
+        entries = []
+        for eq in catalog.equipment:
+            override = overrides_map.get(('equipment', eq.id))
+            if override and not override.is_visible:
+                continue
+            cost, level = _effective(override, eq.cost, eq.level_requirement)
+            entries.append(ShopEntry(
+                id=eq.id,
+                name=eq.name,
+                category='equipment',
+                price=cost,
+                original_price=eq.cost if cost != eq.cost else None,
+                image=eq.image_url or DEFAULT_IMAGE,
+                tier=eq.rarity,
+                description=eq.description or '',
+                level_requirement=level,
+                original_level_requirement=eq.level_requirement if level != eq.level_requirement else None,
+                class_restriction=eq.class_restriction
+            ))
+        for ab in catalog.abilities:
+            override = overrides_map.get(('ability', ab.id))
+            if override and not override.is_visible:
+                continue
+            cost, level = _effective(override, ab.cost, ab.level_requirement)
+            entries.append(ShopEntry(
+                id=ab.id,
+                name=ab.name,
+                category='ability',
+                price=cost,
+                original_price=ab.cost if cost != ab.cost else None,
+                image=DEFAULT_IMAGE,
+                tier=getattr(ab, 'tier', 1),
+                description=ab.description or '',
+                level_requirement=level,
+                original_level_requirement=ab.level_requirement if level != ab.level_requirement else None,
+                class_restriction=None
+            ))
+        self.entries = tuple(entries)
+        self._by_key = {(entry.category, entry.id): entry for entry in self.entries}
+
+    def get(self, category, item_id):
+        """The visible entry for ('equipment' | 'ability', id), or None."""
+        return self._by_key.get((category, item_id))
+
+    def items_for(self, owned_item_ids=(), owned_ability_ids=(), gold=0, level=1, character_class=''):
+        """Every visible entry with the flags of one character."""
+        character_class = (character_class or '').lower()
+        items = []
+        for entry in self.entries:
+            owned_ids = owned_item_ids if entry.category == 'equipment' else owned_ability_ids
+            unlocked = level >= entry.level_requirement and (
+                not entry.class_restriction or entry.class_restriction.lower() == character_class
+            )
+            items.append(ShopItem(entry, entry.id in owned_ids, gold >= entry.price, unlocked))
+        return items
+
+
+class ClassroomShopCache:
+    """Materialized ``ClassroomShop`` per classroom (None: no overrides)."""
+
+    def __init__(self):
+        self._shops = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def _fingerprint(self, classroom_id):
+        if classroom_id is None:
+            return None
+        return tuple(
+            db.session.query(func.count(ShopItemOverride.id), func.max(ShopItemOverride.updated_at))
+            .filter(ShopItemOverride.classroom_id == classroom_id)
+            .one()
+        )
+
+    def get(self, classroom_id=None):
+        """Return the effective shop of ``classroom_id`` (base prices when None)."""
+        catalog = item_catalog.snapshot()
+        fingerprint = self._fingerprint(classroom_id)
+        with self._lock:
+            shop = self._shops.get(classroom_id)
+        if shop is not None and shop.catalog_key == catalog.key and shop.fingerprint == fingerprint:
+            return shop
+
+        overrides = []
+        if classroom_id is not None:
+            overrides = ShopItemOverride.query.filter_by(classroom_id=classroom_id).all()
+        shop = ClassroomShop(classroom_id, catalog, overrides, fingerprint)
+        if catalog.key is not None and not _override_changes.pending(db.session):
+            # Never share a view built from uncommitted rows
+            with self._lock:
+                self._shops[classroom_id] = shop
+                self.builds += 1
+        return shop
+
+    def invalidate(self, classroom_id):
+        with self._lock:
+            self._shops.pop(classroom_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._shops.clear()
+
+
+classroom_shop_cache = ClassroomShopCache()
+
+
+def _collect_override_changes(session):
+    return {
+        obj.classroom_id
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, ShopItemOverride)
+    }
+
+
+def _invalidate_classroom_shops(classroom_ids):
+    for classroom_id in classroom_ids:
+        classroom_shop_cache.invalidate(classroom_id)
+
+
+# Views are never cached while overrides are pending, so a rollback has nothing to drop
+_override_changes = register_commit_hook(_PENDING_KEY, _invalidate_classroom_shops, _collect_override_changes)
@@ -0,0 +1,128 @@
+"""Atomic shop purchases.
+
+``shop_buy`` used to read ``character.gold``, check it in Python, subtract
+and commit, so two parallel purchases (double clicks, several tabs) could
+both pass the check, and it looked up ownership, the item and the override
+with separate queries. ``purchase_item`` instead:
+
+- prices the item from the classroom's effective shop (app.services.
+  shop_catalog), so item, override and visibility need no extra queries;
+- takes the gold with one conditional ``UPDATE characters SET gold = gold -
+  :cost WHERE id = :id AND gold >= :cost``; a purchase that lost the race
+  for the gold updates no row and is refused;
+- leaves ownership to the unique constraints on inventories
+  (character_id, item_id) and character_abilities (character_id,
+  ability_id): the ownership row and the ShopPurchase row are inserted in
+  the same flush, and an IntegrityError rolls the gold back too.
+
+The Python checks on gold, level and class only give the usual error
+messages early; the UPDATE and the constraints are what hold under
+concurrency.
+"""
+
+from app.models import db
+from app.models.ability import CharacterAbility
+from app.models.character import Character
+from app.models.equipment import Inventory
+from app.models.shop import PurchaseType, ShopPurchase
+from app.services.item_catalog import item_catalog
+from app.services.shop_catalog import classroom_shop_cache
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PurchaseError(Exception):
+    """A refused purchase; ``status_code`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _find_entry(shop, item_id, item_type):
+    """Return (entry, purchase_type) of a visible item, or raise PurchaseError."""
+    for category in ('equipment', 'ability'):
+        if item_type not in (None, category):
+            continue
+        entry = shop.get(category, item_id)
+        if entry is not None:
+            return entry, category
+    catalog = item_catalog.snapshot()
+    exists = (
+        (item_type in (None, 'equipment') and catalog.get_equipment(item_id) is not None)
+        or (item_type in (None, 'ability') and catalog.get_ability(item_id) is not None)
+    )
+    if exists:
+        raise PurchaseError('Item is not available.')
+    raise PurchaseError('Item not found.', 404)
+
+
+def purchase_item(character, student_id, item_id, item_type=None, classroom_id=None):
+    """Buy one item for ``character`` and commit.
+
+    Args:
+        character: the buying Character
+        student_id: Student id recorded on the ShopPurchase row
+        item_id: equipment or ability id
+        item_type: 'equipment', 'ability' or None (equipment first)
+        classroom_id: classroom whose overrides apply (None: base prices)
+
+    Returns:
+        dict: entry (ShopEntry), purchase_type, gold_spent
+
+    Raises:
+        PurchaseError: item missing or hidden, requirements not met, not
+            enough gold or already owned; nothing is written
+    """
+    try:
+        item_id = int(item_id)
+    except (TypeError, ValueError):
+        raise PurchaseError('Item not found.', 404)
+    shop = classroom_shop_cache.get(classroom_id)
+    entry, purchase_type = _find_entry(shop, item_id, item_type)
+    cost = entry.price
+    if cost is None or cost <= 0:
+        raise PurchaseError('Item has no cost set. Please contact your teacher/admin.')
+    if character.gold < cost:
+        raise PurchaseError('Not enough gold.')
+    if character.level < entry.level_requirement:
+        raise PurchaseError(f'Level {entry.level_requirement} required.')
+    if entry.class_restriction and entry.class_restriction.lower() != (character.character_class or '').lower():
+        raise PurchaseError(f'Class restriction: {entry.class_restriction}.')
+
+    result = db.session.execute(
+        update(Character)
+        .where(Character.id == character.id, Character.gold >= cost)
+        .values(gold=Character.gold - cost)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        raise PurchaseError('Not enough gold.')
+
+    if purchase_type == PurchaseType.EQUIPMENT.value:
+        owned = Inventory(character_id=character.id, item_id=entry.id, is_equipped=False)
+    else:
+        owned = CharacterAbility(character_id=character.id, ability_id=entry.id)
+    db.session.add_all([
+        owned,
+        ShopPurchase(
+            character_id=character.id,
+            item_id=entry.id,
+            gold_spent=cost,
+            purchase_type=purchase_type,
+            student_id=student_id
+        )
+    ])
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Unique ownership constraint; the gold UPDATE is rolled back with it
+        db.session.rollback()
+        raise PurchaseError('Item already owned.')
+    logger.info(f"Shop purchase: character={character.id}, {purchase_type}={entry.id}, gold_spent={cost}")
+    return {'entry': entry, 'purchase_type': purchase_type, 'gold_spent': cost}
@@ -0,0 +1,89 @@
+"""Request-scoped context of the logged-in student.
+
+Almost every student view started with
+``Student.query.filter_by(user_id=current_user.id).first()`` followed by
+``student.characters.filter_by(is_active=True).first()``, and then lazy
+loaded the classroom or the character's clan: two to four queries before
+the view did any work. ``get_student_context`` loads the student, the
+active character, the classroom and the clan with one joined query and
+keeps the result on ``flask.g`` so every view and helper of the same
+request shares it; ``init_student_context`` drops it when the request
+ends.
+
+Views that create or switch the active character mid-request call
+``invalidate_student_context`` before reading the context again.
+"""
+
+from app.models import db
+from app.models.character import Character
+from app.models.clan import Clan
+from app.models.classroom import Classroom
+from app.models.student import Student
+from flask import g
+from flask_login import current_user
+from sqlalchemy import and_
+from sqlalchemy.orm import contains_eager
+
+_G_KEY = 'student_context'
+
+
+class StudentContext:
+    """The current student with their active character, classroom and clan.
+
+    Every attribute is None when the row does not exist (no student
+    profile, no active character, no classroom or no clan).
+    """
+
+    __slots__ = ('user_id', 'student', 'character', 'classroom', 'clan')
+
+    def __init__(self, user_id, student=None, character=None):
+        self.user_id = user_id
+        self.student = student
+        self.character = character
+        self.classroom = student.classroom if student is not None else None
+        self.clan = character.clan if character is not None else None
+
+    @property
+    def student_id(self):
+        return self.student.id if self.student is not None else None
+
+
+def load_student_context(user_id):
+    """Build a ``StudentContext`` for ``user_id`` with a single query."""
+    row = (
+        db.session.query(Student, Character)
+        .outerjoin(Character, and_(Character.student_id == Student.id, Character.is_active.is_(True)))
+        .outerjoin(Classroom, Student.class_id == Classroom.id)
+        .outerjoin(Clan, Character.clan_id == Clan.id)
+        .options(
+            contains_eager(Student.classroom),
+            contains_eager(Character.clan),
+        )
+        .filter(Student.user_id == user_id)
+        .order_by(Student.id, Character.id)
+        .first()
+    )
+    if row is None:
+        return StudentContext(user_id)
+    return StudentContext(user_id, row[0], row[1])
+
+
+def get_student_context():
+    """Return the current request's ``StudentContext``, loading it on first use."""
+    context = g.get(_G_KEY)
+    if context is None or context.user_id != current_user.id:
+        context = load_student_context(current_user.id)
+        setattr(g, _G_KEY, context)
+    return context
+
+
+def invalidate_student_context():
+    """Forget the cached context so the next ``get_student_context`` reloads it."""
+    g.pop(_G_KEY, None)
+
+
+def init_student_context(app):
+    """Forget the context at the end of every request."""
+    @app.teardown_request
+    def _drop_student_context(exc):
+        invalidate_student_context()
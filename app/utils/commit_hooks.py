@@ -0,0 +1,102 @@
+"""Apply cache changes when the transaction that caused them commits.
+
+The per-process caches in app.services (analytics, progress timelines, clan
+rankings, the leaderboard index, character stats, the item and shop
+catalogs) all follow the same rules, written once here:
+
+- what a flush changed is collected into ``session.info[key]``, either by
+  ``collect`` in ``after_flush`` or by calling ``CommitHook.mark``;
+- the collected items are handed to ``apply`` when the outermost
+  transaction commits; releasing a savepoint also fires ``after_commit``
+  but does not publish anything, so it is skipped;
+- when the outermost transaction rolls back the items are dropped, and
+  passed to ``on_rollback`` first if given (caches that may have stored
+  reads made inside the failed transaction invalidate them there); rolling
+  back a savepoint keeps them, since rows flushed before the savepoint may
+  still be committed.
+
+Invalidating on commit alone does not stop a request that missed the cache
+before the commit from storing what it computed from the older rows once
+the commit has dropped the entry. ``Generations`` closes that window: the
+cache reads a key's generation before computing, every invalidation bumps
+it, and a result is only stored if the generation is unchanged.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class CommitHook:
+    """Items pending in ``session.info[key]`` until the session commits."""
+
+    def __init__(self, key, apply, collect=None, on_rollback=None, factory=set):
+        self.key = key
+        self.apply = apply
+        self.collect = collect
+        self.on_rollback = on_rollback
+        self.factory = factory
+
+    def pending(self, session):
+        """The items collected so far in the session's transaction (None if nothing)."""
+        return session.info.get(self.key)
+
+    def mark(self, session, items):
+        """Add ``items`` (a set or a dict, like ``factory``) to the pending items."""
+        if items:
+            session.info.setdefault(self.key, self.factory()).update(items)
+
+    def _after_flush(self, session, flush_context):
+        self.mark(session, self.collect(session))
+
+    def _after_commit(self, session):
+        if session.in_nested_transaction():
+            return
+        items = session.info.pop(self.key, None)
+        if items:
+            self.apply(items)
+
+    def _after_soft_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is not None:
+            return
+        items = session.info.pop(self.key, None)
+        if items and self.on_rollback is not None:
+            self.on_rollback(items)
+
+
+def register_commit_hook(key, apply, collect=None, on_rollback=None, factory=set):
+    """Listen on every Session and return the ``CommitHook``.
+
+    Args:
+        key: ``session.info`` key holding the pending items
+        apply: called with the items once the outermost transaction commits
+        collect: optional ``collect(session)`` called after each flush,
+            returning the items to add (or None)
+        on_rollback: optional callable given the items of a rolled back
+            outermost transaction
+        factory: container type of the items (set or dict)
+    """
+    hook = CommitHook(key, apply, collect, on_rollback, factory)
+    if collect is not None:
+        event.listen(Session, 'after_flush', hook._after_flush)
+    event.listen(Session, 'after_commit', hook._after_commit)
+    event.listen(Session, 'after_soft_rollback', hook._after_soft_rollback)
+    return hook
+
+
+class Generations:
+    """Invalidation counters per cache key; callers hold the cache's lock."""
+
+    def __init__(self):
+        self._epoch = 0
+        self._counters = {}
+
+    def get(self, key):
+        """Token to read before computing a value for ``key``."""
+        return self._epoch, self._counters.get(key, 0)
+
+    def bump(self, key):
+        self._counters[key] = self._counters.get(key, 0) + 1
+
+    def bump_all(self):
+        self._epoch += 1
+        self._counters.clear()
@@ -15,7 +15,7 @@ from app.models.user import User
 from app.models.classroom import Classroom
 from app.models.character import Character
 from app.models.clan import Clan
-from app.models.equipment import Equipment
+from app.models.equipment import Equipment, CatalogVersion
 from app.models.ability import Ability
 from app.models.quest import Quest, QuestLog, Reward, Consequence
 from app.models.battle import Monster, Battle
@@ -24,7 +24,9 @@ from app.models.student import Student
 from app.models.teacher import Teacher
 from app.models.shop_config import ShopItemOverride
 from app.models.shop import ShopPurchase
-from app.models.audit import AuditLog
+from app.models.audit import AuditLog, AuditDailyRollup
+from app.models.job import BackgroundJob, ScheduledJob
+from app.models.clan_leaderboard import ClanLeaderboardEntry
 from app.models.assist_log import AssistLog
 
 # Interpret the config file for Python logging.
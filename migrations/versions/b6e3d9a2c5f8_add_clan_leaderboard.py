@@ -0,0 +1,42 @@
+"""add_clan_leaderboard
+
+Revision ID: b6e3d9a2c5f8
+Revises: a1f4c7e9b3d2
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e3d9a2c5f8'
+down_revision: Union[str, None] = 'a1f4c7e9b3d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('clan_leaderboard',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('class_id', sa.Integer(), nullable=False),
+    sa.Column('clan_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('total_points', sa.Integer(), nullable=False),
+    sa.Column('avg_completion_rate', sa.Float(), nullable=False),
+    sa.Column('percentile_rank', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['class_id'], ['classrooms.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['clan_id'], ['clans.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('clan_id')
+    )
+    op.create_index('idx_clan_leaderboard_class_rank', 'clan_leaderboard', ['class_id', 'rank'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_clan_leaderboard_class_rank', table_name='clan_leaderboard')
+    op.drop_table('clan_leaderboard')
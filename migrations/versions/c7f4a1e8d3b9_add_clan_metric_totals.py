@@ -0,0 +1,38 @@
+"""add_clan_metric_totals
+
+Revision ID: c7f4a1e8d3b9
+Revises: b6e3d9a2c5f8
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7f4a1e8d3b9'
+down_revision: Union[str, None] = 'b6e3d9a2c5f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('clan_metric_totals',
+    sa.Column('clan_id', sa.Integer(), nullable=False),
+    sa.Column('total_points', sa.Integer(), nullable=False),
+    sa.Column('level_sum', sa.Integer(), nullable=False),
+    sa.Column('character_count', sa.Integer(), nullable=False),
+    sa.Column('quests_assigned', sa.Integer(), nullable=False),
+    sa.Column('quests_completed', sa.Integer(), nullable=False),
+    sa.Column('completion_rate_sum', sa.Float(), nullable=False),
+    sa.Column('rated_members', sa.Integer(), nullable=False),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['clan_id'], ['clans.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('clan_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('clan_metric_totals')
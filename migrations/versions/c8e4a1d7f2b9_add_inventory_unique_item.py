@@ -0,0 +1,36 @@
+"""add_inventory_unique_item
+
+Revision ID: c8e4a1d7f2b9
+Revises: b6d3f9a2c8e4
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e4a1d7f2b9'
+down_revision: Union[str, None] = 'b6d3f9a2c8e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Drop duplicate inventory rows left by racing purchases; keep the equipped copy, else the oldest
+    op.execute("""
+        DELETE FROM inventories
+        WHERE EXISTS (
+            SELECT 1 FROM inventories AS keep
+            WHERE keep.character_id = inventories.character_id
+              AND keep.item_id = inventories.item_id
+              AND (keep.is_equipped > inventories.is_equipped
+                   OR (keep.is_equipped = inventories.is_equipped AND keep.id < inventories.id))
+        )
+    """)
+    op.create_index('uq_inventory_character_item', 'inventories', ['character_id', 'item_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_inventory_character_item', table_name='inventories')
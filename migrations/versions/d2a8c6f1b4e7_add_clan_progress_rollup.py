@@ -0,0 +1,46 @@
+"""add_clan_progress_rollup
+
+Revision ID: d2a8c6f1b4e7
+Revises: c7f4a1e8d3b9
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a8c6f1b4e7'
+down_revision: Union[str, None] = 'c7f4a1e8d3b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+METRICS = (
+    'avg_completion_rate', 'total_points', 'active_members', 'avg_daily_points',
+    'quest_completion_rate', 'avg_member_level', 'percentile_rank'
+)
+
+
+def upgrade() -> None:
+    op.create_table('clan_progress_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('clan_id', sa.Integer(), nullable=False),
+    sa.Column('resolution', sa.String(length=8), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    *[sa.Column(f'{metric}_{stat}', sa.Float(), nullable=True) for metric in METRICS for stat in ('min', 'max', 'avg')],
+    sa.ForeignKeyConstraint(['clan_id'], ['clans.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('clan_id', 'resolution', 'bucket_start', name='uq_clan_progress_rollup_bucket')
+    )
+    op.create_index('idx_clan_progress_rollup_clan', 'clan_progress_rollup', ['clan_id', 'bucket_start'], unique=False)
+    # Trend queries filter raw history by clan and time window
+    op.create_index('idx_clan_progress_clan_time', 'clan_progress_history', ['clan_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_clan_progress_clan_time', table_name='clan_progress_history')
+    op.drop_index('idx_clan_progress_rollup_clan', table_name='clan_progress_rollup')
+    op.drop_table('clan_progress_rollup')
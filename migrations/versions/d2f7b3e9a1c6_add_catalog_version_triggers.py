@@ -0,0 +1,82 @@
+"""add_catalog_version_triggers
+
+Revision ID: d2f7b3e9a1c6
+Revises: c8e4a1d7f2b9
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f7b3e9a1c6'
+down_revision: Union[str, None] = 'c8e4a1d7f2b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CATALOG_TABLES = ('equipment', 'abilities')
+
+
+def upgrade() -> None:
+    op.add_column('catalog_versions', sa.Column('token', sa.String(length=32), nullable=True))
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        random_token = "lower(hex(randomblob(16)))"
+    elif dialect == 'postgresql':
+        random_token = "md5(random()::text || clock_timestamp()::text)"
+    else:
+        return
+    # Give the marker row a token unique to this database, creating it if no write recorded one yet
+    op.execute(f"UPDATE catalog_versions SET token = {random_token} WHERE name = 'items'")
+    op.execute(f"""
+        INSERT INTO catalog_versions (name, version, token, created_at, updated_at)
+        SELECT 'items', 1, {random_token}, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        WHERE NOT EXISTS (SELECT 1 FROM catalog_versions WHERE name = 'items')
+    """)
+
+    # Bump the version on every write to the catalog tables, whatever issued it
+    if dialect == 'sqlite':
+        for table in CATALOG_TABLES:
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                op.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_catalog_{operation.lower()} AFTER {operation} ON {table}
+                    BEGIN
+                        INSERT INTO catalog_versions (name, version, token, created_at, updated_at)
+                        VALUES ('items', 1, lower(hex(randomblob(16))), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                        ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+                    END
+                """)
+    else:
+        op.execute("""
+            CREATE OR REPLACE FUNCTION bump_item_catalog_version() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO catalog_versions (name, version, token, created_at, updated_at)
+                VALUES ('items', 1, md5(random()::text || clock_timestamp()::text), now(), now())
+                ON CONFLICT (name) DO UPDATE SET version = catalog_versions.version + 1, updated_at = now();
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        for table in CATALOG_TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_catalog_changed ON {table}")
+            op.execute(f"""
+                CREATE TRIGGER {table}_catalog_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_item_catalog_version()
+            """)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table in CATALOG_TABLES:
+            for operation in ('insert', 'update', 'delete'):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_catalog_{operation}")
+    elif dialect == 'postgresql':
+        for table in CATALOG_TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_catalog_changed ON {table}")
+        op.execute("DROP FUNCTION IF EXISTS bump_item_catalog_version()")
+    with op.batch_alter_table('catalog_versions') as batch_op:
+        batch_op.drop_column('token')
@@ -0,0 +1,55 @@
+"""add_audit_daily_rollup
+
+Revision ID: d4e1a7b9c2f3
+Revises: c8d9e2f4a5b6
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e1a7b9c2f3'
+down_revision: Union[str, None] = 'c8d9e2f4a5b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('audit_daily_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('character_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.String(length=50), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('total_amount', sa.Integer(), nullable=False),
+    sa.Column('positive_amount', sa.Integer(), nullable=False),
+    sa.Column('event_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('character_id', 'event_type', 'day', 'user_id', name='uq_audit_daily_rollup_key')
+    )
+    op.create_index('idx_audit_rollup_user_day', 'audit_daily_rollup', ['user_id', 'event_type', 'day'], unique=False)
+
+    # Backfill from existing audit_log rows
+    op.execute("""
+        INSERT INTO audit_daily_rollup
+            (character_id, user_id, event_type, day, total_amount, positive_amount, event_count)
+        SELECT
+            COALESCE(character_id, 0),
+            COALESCE(user_id, 0),
+            event_type,
+            DATE(event_timestamp),
+            SUM(COALESCE(CAST(JSON_EXTRACT(event_data, '$.amount') AS INTEGER), 0)),
+            SUM(MAX(COALESCE(CAST(JSON_EXTRACT(event_data, '$.amount') AS INTEGER), 0), 0)),
+            COUNT(id)
+        FROM audit_log
+        GROUP BY character_id, user_id, event_type, DATE(event_timestamp)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_audit_rollup_user_day', table_name='audit_daily_rollup')
+    op.drop_table('audit_daily_rollup')
@@ -0,0 +1,76 @@
+"""add_audit_log_amount_columns
+
+Revision ID: e7b2c4d8f1a9
+Revises: d4e1a7b9c2f3
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2c4d8f1a9'
+down_revision: Union[str, None] = 'd4e1a7b9c2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('audit_log', sa.Column('amount', sa.Integer(), nullable=True))
+    op.add_column('audit_log', sa.Column('old_value', sa.Integer(), nullable=True))
+    op.add_column('audit_log', sa.Column('new_value', sa.Integer(), nullable=True))
+
+    # Backfill the typed columns from the JSON payload
+    op.execute("""
+        UPDATE audit_log SET
+            amount = CAST(JSON_EXTRACT(event_data, '$.amount') AS INTEGER)
+        WHERE JSON_EXTRACT(event_data, '$.amount') IS NOT NULL
+    """)
+    op.execute("""
+        UPDATE audit_log SET
+            amount = COALESCE(amount, CAST(JSON_EXTRACT(event_data, '$.levels_gained') AS INTEGER)),
+            old_value = CAST(COALESCE(
+                JSON_EXTRACT(event_data, '$.old_experience'),
+                JSON_EXTRACT(event_data, '$.old_gold'),
+                JSON_EXTRACT(event_data, '$.old_level')
+            ) AS INTEGER),
+            new_value = CAST(COALESCE(
+                JSON_EXTRACT(event_data, '$.new_experience'),
+                JSON_EXTRACT(event_data, '$.new_gold'),
+                JSON_EXTRACT(event_data, '$.new_level')
+            ) AS INTEGER)
+        WHERE event_type IN ('XP_GAIN', 'GOLD_TRANSACTION', 'LEVEL_UP')
+    """)
+
+    op.create_index(
+        'idx_audit_character_type_time_amount', 'audit_log',
+        ['character_id', 'event_type', 'event_timestamp', 'amount'], unique=False
+    )
+
+    # The daily rollup now sums the typed column; rebuild it from the backfilled values
+    op.execute("DELETE FROM audit_daily_rollup")
+    op.execute("""
+        INSERT INTO audit_daily_rollup
+            (character_id, user_id, event_type, day, total_amount, positive_amount, event_count)
+        SELECT
+            COALESCE(character_id, 0),
+            COALESCE(user_id, 0),
+            event_type,
+            DATE(event_timestamp),
+            SUM(COALESCE(amount, 0)),
+            SUM(MAX(COALESCE(amount, 0), 0)),
+            COUNT(id)
+        FROM audit_log
+        GROUP BY character_id, user_id, event_type, DATE(event_timestamp)
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_audit_character_type_time_amount', table_name='audit_log')
+    with op.batch_alter_table('audit_log') as batch_op:
+        batch_op.drop_column('new_value')
+        batch_op.drop_column('old_value')
+        batch_op.drop_column('amount')
@@ -0,0 +1,29 @@
+"""add_audit_log_composite_indexes
+
+Revision ID: f3c9d1e5a8b2
+Revises: e7b2c4d8f1a9
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c9d1e5a8b2'
+down_revision: Union[str, None] = 'e7b2c4d8f1a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_audit_character_time', 'audit_log', ['character_id', 'event_timestamp'], unique=False)
+    op.create_index('idx_audit_user_type_time', 'audit_log', ['user_id', 'event_type', 'event_timestamp'], unique=False)
+    # Refresh planner statistics so the new indexes are preferred
+    op.execute("ANALYZE audit_log")
+
+
+def downgrade() -> None:
+    op.drop_index('idx_audit_user_type_time', table_name='audit_log')
+    op.drop_index('idx_audit_character_time', table_name='audit_log')
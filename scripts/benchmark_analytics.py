@@ -0,0 +1,215 @@
+"""
+Benchmark for the class performance analytics engine.
+
+Seeds a throwaway SQLite database with classes of 30, 300 and 3,000 students
+(each with an active character, audit events, quest logs and purchases), then
+reports the number of SQL statements and the wall-clock latency of
+get_student_performance_data() for each class size.
+
+Engines measured:
+    grouped  - analytics_service (grouped SQL queries, ANALYTICS_BACKEND='sql')
+    pandas   - analytics_pandas (vectorized DataFrames, ANALYTICS_BACKEND='pandas')
+    legacy   - the per-student loop used before the grouped queries
+
+Usage:
+    python scripts/benchmark_analytics.py [--sizes 30 300 3000] [--events 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Add project root to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def seed_class(db, size, events_per_student, rng):
+    """Bulk-insert a classroom with `size` students and return its id."""
+    from sqlalchemy import insert
+    from app.models.user import User, UserRole
+    from app.models.classroom import Classroom
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.audit import AuditLog, AuditDailyRollup
+    from app.models.quest import Quest, QuestLog, QuestStatus, QuestType
+    from app.models.shop import ShopPurchase
+
+    now = datetime.utcnow()
+    tag = f"{size}_{rng.randint(0, 10**6)}"
+    teacher = User(username=f"bench_teacher_{tag}", email=f"bench_teacher_{tag}@example.com",
+                   role=UserRole.TEACHER, password_hash='x')
+    db.session.add(teacher)
+    db.session.flush()
+    classroom = Classroom(name=f"Bench {tag}", teacher_id=teacher.id, join_code=f"B{tag}"[:8])
+    db.session.add(classroom)
+    quests = [Quest(title=f"Bench quest {i}", description='benchmark', type=QuestType.DAILY) for i in range(5)]
+    db.session.add_all(quests)
+    db.session.flush()
+
+    db.session.execute(insert(User), [
+        {'username': f"bench_{tag}_{i}", 'email': f"bench_{tag}_{i}@example.com",
+         'role': UserRole.STUDENT, 'password_hash': 'x'}
+        for i in range(size)
+    ])
+    user_ids = [u.id for u in User.query.filter(User.username.like(f"bench_{tag}_%")).order_by(User.id)]
+    db.session.execute(insert(Student), [
+        {'user_id': user_id, 'class_id': classroom.id} for user_id in user_ids
+    ])
+    students = Student.query.filter_by(class_id=classroom.id).order_by(Student.id).all()
+    db.session.execute(insert(Character), [
+        {'name': f"Hero {s.id}", 'student_id': s.id, 'experience': rng.randint(0, 20000),
+         'gold': rng.randint(0, 1000), 'is_active': True}
+        for s in students
+    ])
+    characters = {c.student_id: c.id for c in Character.query.filter(
+        Character.student_id.in_([s.id for s in students]))}
+
+    audit_rows, quest_rows, purchase_rows = [], [], []
+    for student in students:
+        character_id = characters[student.id]
+        for _ in range(events_per_student):
+            event_type = rng.choice(['XP_GAIN', 'XP_TRANSACTION', 'GOLD_TRANSACTION', 'LOGIN'])
+            amount = None if event_type == 'LOGIN' else rng.randint(1, 100)
+            audit_rows.append({
+                'event_type': event_type,
+                'user_id': student.user_id,
+                'character_id': None if event_type == 'LOGIN' else character_id,
+                'event_data': {} if amount is None else {'amount': amount},
+                'amount': amount,
+                'event_timestamp': now - timedelta(days=rng.randint(0, 120), minutes=rng.randint(0, 1440)),
+            })
+        for quest in quests[:rng.randint(0, len(quests))]:
+            status = rng.choice([QuestStatus.COMPLETED, QuestStatus.IN_PROGRESS])
+            quest_rows.append({
+                'character_id': character_id, 'quest_id': quest.id, 'status': status, 'progress_data': {},
+                'completed_at': now - timedelta(days=rng.randint(0, 60)) if status == QuestStatus.COMPLETED else None,
+            })
+        for _ in range(rng.randint(0, 3)):
+            purchase_rows.append({
+                'character_id': character_id, 'student_id': student.id, 'gold_spent': rng.randint(10, 200),
+                'purchase_type': 'equipment', 'item_id': 1,
+                'purchase_date': now - timedelta(days=rng.randint(0, 120)),
+            })
+    db.session.execute(insert(AuditLog), audit_rows)
+    if quest_rows:
+        db.session.execute(insert(QuestLog), quest_rows)
+    if purchase_rows:
+        db.session.execute(insert(ShopPurchase), purchase_rows)
+    # Bulk inserts bypass the session flush hook, so rebuild the daily rollup
+    AuditDailyRollup.rebuild()
+    db.session.commit()
+    return classroom.id
+
+
+def legacy_student_performance_data(classroom_id, days=90):
+    """Per-student reference implementation (about six queries per student)."""
+    from app.models import db
+    from app.models.student import Student
+    from app.models.quest import QuestStatus
+    from app.models.audit import AuditLog, EventType
+    from app.models.shop import ShopPurchase
+
+    since = datetime.utcnow() - timedelta(days=days)
+    students = Student.query.filter_by(class_id=classroom_id).all()
+    student_data = []
+    for student in students:
+        character = student.characters.filter_by(is_active=True).first()
+        if not character:
+            continue
+        xp_by_date = defaultdict(int)
+        for event in AuditLog.query.filter(
+            AuditLog.character_id == character.id,
+            AuditLog.event_type.in_([EventType.XP_GAIN.value, EventType.XP_TRANSACTION.value]),
+            AuditLog.event_timestamp >= since
+        ).order_by(AuditLog.event_timestamp.asc()).all():
+            xp_by_date[event.event_timestamp.date()] += event.event_data.get('amount', 0)
+        quest_logs = character.quest_logs.all()
+        completed = [q for q in quest_logs if q.status == QuestStatus.COMPLETED]
+        gold_earned = sum(
+            e.event_data.get('amount', 0) for e in AuditLog.query.filter(
+                AuditLog.character_id == character.id,
+                AuditLog.event_type == EventType.GOLD_TRANSACTION.value,
+                AuditLog.event_timestamp >= since
+            ).all() if e.event_data.get('amount', 0) > 0
+        )
+        gold_spent = ShopPurchase.query.filter(
+            ShopPurchase.character_id == character.id,
+            ShopPurchase.purchase_date >= since
+        ).with_entities(db.func.sum(ShopPurchase.gold_spent)).scalar() or 0
+        logins = AuditLog.query.filter(
+            AuditLog.user_id == student.user_id,
+            AuditLog.event_type.in_([EventType.LOGIN.value, EventType.USER_LOGIN.value]),
+            AuditLog.event_timestamp >= since
+        ).count()
+        student_data.append((character.id, len(completed), len(quest_logs), gold_earned, gold_spent, logins,
+                             dict(xp_by_date)))
+    return student_data
+
+
+def measure(db, func, *args, **kwargs):
+    """Run func and return (statement_count, elapsed_ms)."""
+    from sqlalchemy import event
+    counter = {'n': 0}
+
+    def count(*_):
+        counter['n'] += 1
+
+    db.session.expire_all()
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return counter['n'], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[30, 300, 3000])
+    parser.add_argument('--events', type=int, default=20, help='audit events per student')
+    parser.add_argument('--skip-legacy', action='store_true', help='do not measure the per-student loop')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+
+    from app import create_app, db
+    from app.services import analytics_service
+
+    engines = [('grouped', analytics_service.get_student_performance_data)]
+    try:
+        from app.services import analytics_pandas
+        engines.append(('pandas', analytics_pandas.get_student_performance_data))
+    except ImportError:
+        print("pandas is not installed; skipping the pandas engine")
+    if not args.skip_legacy:
+        engines.append(('legacy', legacy_student_performance_data))
+
+    app = create_app({'TESTING': True})
+    rng = random.Random(42)
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"{'students':>9} | {'engine':<8} | {'queries':>7} | {'latency (ms)':>12}")
+            print('-' * 46)
+            for size in args.sizes:
+                class_id = seed_class(db, size, args.events, rng)
+                for name, func in engines:
+                    queries, elapsed = measure(db, func, class_id)
+                    print(f"{size:>9} | {name:<8} | {queries:>7} | {elapsed:>12.1f}")
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -255,6 +255,28 @@ def truncate_tables(db_session):
     db.session.commit()
 
 
+# The service caches are process-wide while every test gets a fresh database
+@pytest.fixture(autouse=True, scope="function")
+def reset_service_caches(truncate_tables):
+    from app.services.analytics_cache import analytics_cache
+    from app.services.character_stats import character_stat_cache
+    from app.services.clan_ranking import ranking_cache
+    from app.services.item_catalog import item_catalog
+    from app.services.leaderboard_index import leaderboard_index
+    from app.services.progress_timeline import progress_timeline_service
+    from app.services.shop_catalog import classroom_shop_cache
+
+    caches = (analytics_cache, ranking_cache, character_stat_cache, leaderboard_index,
+              progress_timeline_service, classroom_shop_cache)
+    for cache in caches:
+        cache.clear()
+    item_catalog.invalidate()
+    yield
+    for cache in caches:
+        cache.clear()
+    item_catalog.invalidate()
+
+
 @pytest.fixture
 def test_user(db_session):
     from app.models.user import User, UserRole
@@ -0,0 +1,131 @@
+import pytest
+from datetime import datetime
+import uuid
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def analytics_cache():
+    from app.services.analytics_cache import analytics_cache
+    analytics_cache.clear()
+    yield analytics_cache
+    analytics_cache.clear()
+
+
+@pytest.fixture
+def classroom_with_character(db_session):
+    from app.models.user import User, UserRole
+    from app.models.classroom import Classroom
+    from app.models.student import Student
+    from app.models.character import Character
+    unique_id = uuid.uuid4().hex
+    teacher = User(username=f'teacher_{unique_id}', email=f'teacher_{unique_id}@example.com', role=UserRole.TEACHER)
+    teacher.set_password('password')
+    user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+    user.set_password('password')
+    db_session.add_all([teacher, user])
+    db_session.commit()
+    classroom = Classroom(name=f'Cache Class {unique_id}', teacher_id=teacher.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    student = Student(user_id=user.id, class_id=classroom.id)
+    db_session.add(student)
+    db_session.commit()
+    character = Character(name=f'Hero_{unique_id}', student_id=student.id, is_active=True)
+    db_session.add(character)
+    db_session.commit()
+    return classroom, character
+
+
+def test_lru_eviction_and_ttl():
+    from app.services.analytics_cache import AnalyticsCache
+    clock = FakeClock()
+    cache = AnalyticsCache(max_entries=2, ttl=10, clock=clock)
+
+    cache.set(('f', 1, 30, None), 'a')
+    cache.set(('f', 2, 30, None), 'b')
+    assert cache.get(('f', 1, 30, None)) == (True, 'a')  # 1 is now most recently used
+    cache.set(('f', 3, 30, None), 'c')
+    assert cache.get(('f', 2, 30, None)) == (False, None)
+    assert cache.get(('f', 1, 30, None)) == (True, 'a')
+
+    clock.now = 11
+    assert cache.get(('f', 1, 30, None)) == (False, None)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['expirations']) == (2, 2, 1, 1)
+
+
+def test_cached_analytics_hits_until_class_is_written(db_session, analytics_cache, classroom_with_character):
+    from app.services import analytics_service
+    from app.services.analytics_cache import cached_analytics
+    from app.models.audit import AuditLog
+    classroom, character = classroom_with_character
+
+    first = cached_analytics(analytics_service, 'get_student_performance_data', classroom.id, 90)
+    assert cached_analytics(analytics_service, 'get_student_performance_data', classroom.id, 90) is first
+    assert cached_analytics(analytics_service, 'get_student_performance_data', classroom.id, 30) is not first
+    assert analytics_cache.stats()['hits'] == 1
+
+    db_session.add(AuditLog(event_type='XP_GAIN', user_id=character.student.user_id, character_id=character.id,
+                            event_data={'amount': 10}, event_timestamp=datetime.utcnow()))
+    db_session.flush()
+    # Not invalidated until the write commits
+    assert cached_analytics(analytics_service, 'get_student_performance_data', classroom.id, 90) is first
+    db_session.commit()
+
+    refreshed = cached_analytics(analytics_service, 'get_student_performance_data', classroom.id, 90)
+    assert refreshed is not first
+    assert refreshed['students'][0]['xp_progression']['xp_values'] == [10]
+    assert analytics_cache.stats()['entries'] == 1
+
+
+def test_writes_for_other_class_or_rolled_back_keep_entries(db_session, analytics_cache, classroom_with_character):
+    from app.services import analytics_service
+    from app.services.analytics_cache import cached_analytics
+    from app.models.shop import ShopPurchase
+    classroom, character = classroom_with_character
+
+    first = cached_analytics(analytics_service, 'get_student_performance_data', classroom.id, 90)
+    db_session.add(ShopPurchase(character_id=character.id, student_id=character.student_id, gold_spent=5,
+                                purchase_type='equipment', item_id=1, purchase_date=datetime.utcnow()))
+    db_session.flush()
+    db_session.rollback()
+    assert cached_analytics(analytics_service, 'get_student_performance_data', classroom.id, 90) is first
+
+    analytics_cache.set(('get_student_performance_data', classroom.id + 1, 90, None), {})
+    db_session.add(ShopPurchase(character_id=character.id, student_id=character.student_id, gold_spent=5,
+                                purchase_type='equipment', item_id=1, purchase_date=datetime.utcnow()))
+    db_session.commit()
+    assert analytics_cache.get(('get_student_performance_data', classroom.id + 1, 90, None)) == (True, {})
+    assert analytics_cache.get(('get_student_performance_data', classroom.id, 90, None)) == (False, None)
+
+
+def test_result_computed_across_a_commit_is_not_cached(db_session, analytics_cache, classroom_with_character):
+    from app.services import analytics_service
+    from app.services.analytics_cache import cached_analytics
+    from app.models.audit import AuditLog
+    classroom, character = classroom_with_character
+
+    class RacingBackend:
+        def get_student_performance_data(self, class_id, days):
+            value = analytics_service.get_student_performance_data(class_id, days=days)
+            # Another request commits a write for the class before this result is stored
+            db_session.add(AuditLog(event_type='XP_GAIN', user_id=character.student.user_id, character_id=character.id,
+                                    event_data={'amount': 10}, event_timestamp=datetime.utcnow()))
+            db_session.commit()
+            return value
+
+    stale = cached_analytics(RacingBackend(), 'get_student_performance_data', classroom.id, 90)
+    assert stale['students'][0]['xp_progression']['xp_values'] == []
+    assert analytics_cache.stats()['stale_sets'] == 1
+
+    fresh = cached_analytics(analytics_service, 'get_student_performance_data', classroom.id, 90)
+    assert fresh['students'][0]['xp_progression']['xp_values'] == [10]
+    assert cached_analytics(analytics_service, 'get_student_performance_data', classroom.id, 90) is fresh
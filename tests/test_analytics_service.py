@@ -0,0 +1,197 @@
+import pytest
+from datetime import datetime, timedelta
+import uuid
+from sqlalchemy import event
+
+
+@pytest.fixture
+def test_teacher(db_session):
+    from app.models.user import User, UserRole
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'teacher_{unique_id}', email=f'teacher_{unique_id}@example.com', role=UserRole.TEACHER)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def test_classroom(db_session, test_teacher):
+    from app.models.classroom import Classroom
+    unique_id = uuid.uuid4().hex
+    classroom = Classroom(name=f'Analytics Class {unique_id}', teacher_id=test_teacher.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    return classroom
+
+
+@pytest.fixture
+def add_students(db_session, test_classroom):
+    """Factory that adds students with an active character and some activity."""
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.audit import AuditLog
+    from app.models.shop import ShopPurchase
+
+    def _add(count):
+        now = datetime.utcnow()
+        created = []
+        for i in range(count):
+            unique_id = uuid.uuid4().hex
+            user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+            user.set_password('password')
+            db_session.add(user)
+            db_session.commit()
+            student = Student(user_id=user.id, class_id=test_classroom.id)
+            db_session.add(student)
+            db_session.commit()
+            character = Character(name=f'Hero_{unique_id}', student_id=student.id, experience=150, gold=40, is_active=True)
+            db_session.add(character)
+            db_session.commit()
+            db_session.add_all([
+                AuditLog(event_type='XP_GAIN', user_id=user.id, character_id=character.id,
+                         event_data={'amount': 10}, event_timestamp=now - timedelta(days=1)),
+                AuditLog(event_type='XP_GAIN', user_id=user.id, character_id=character.id,
+                         event_data={'amount': 5}, event_timestamp=now - timedelta(days=1)),
+                AuditLog(event_type='GOLD_TRANSACTION', user_id=user.id, character_id=character.id,
+                         event_data={'amount': 25}, event_timestamp=now),
+                AuditLog(event_type='GOLD_TRANSACTION', user_id=user.id, character_id=character.id,
+                         event_data={'amount': -15}, event_timestamp=now),
+                AuditLog(event_type='LOGIN', user_id=user.id, event_data={}, event_timestamp=now),
+                ShopPurchase(character_id=character.id, student_id=student.id, gold_spent=15,
+                             purchase_type='equipment', item_id=1, purchase_date=now),
+            ])
+            db_session.commit()
+            created.append((student, character))
+        return created
+
+    return _add
+
+
+def login(client, user):
+    from flask import g
+    # The test app context outlives requests; drop the user Flask-Login cached on g
+    g.pop('_login_user', None)
+    client.post('/auth/login', data={'username': user.username, 'password': 'password'})
+
+
+def _count_queries(db_session, func, *args):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func(*args)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return result, len(statements)
+
+
+def test_student_performance_values(db_session, test_classroom, add_students):
+    from app.services.analytics_service import get_student_performance_data
+    [(student, character)] = add_students(1)
+
+    data = get_student_performance_data(test_classroom.id)
+
+    assert len(data['students']) == 1
+    row = data['students'][0]
+    assert row['student_id'] == student.id
+    assert row['character_id'] == character.id
+    assert row['experience'] == 150
+    assert row['gold_earned'] == 25
+    assert row['gold_spent'] == 15
+    assert row['login_count'] == 1
+    assert row['xp_progression']['dates'] == [(datetime.utcnow() - timedelta(days=1)).date()]
+    assert row['xp_progression']['xp_values'] == [15]
+    assert data['class_average']['total_students'] == 1
+
+
+def test_student_performance_query_count_is_constant(db_session, test_classroom, add_students):
+    from app.services.analytics_service import get_student_performance_data
+    add_students(2)
+    _, small = _count_queries(db_session, get_student_performance_data, test_classroom.id)
+    add_students(8)
+    data, large = _count_queries(db_session, get_student_performance_data, test_classroom.id)
+
+    assert len(data['students']) == 10
+    assert small == large
+
+
+def test_engagement_and_quest_analytics_query_count_is_constant(db_session, test_classroom, add_students):
+    from app.services.analytics_service import get_engagement_metrics, get_quest_completion_analytics
+    add_students(2)
+    _, engagement_small = _count_queries(db_session, get_engagement_metrics, test_classroom.id)
+    _, quests_small = _count_queries(db_session, get_quest_completion_analytics, test_classroom.id)
+    add_students(6)
+    engagement, engagement_large = _count_queries(db_session, get_engagement_metrics, test_classroom.id)
+    _, quests_large = _count_queries(db_session, get_quest_completion_analytics, test_classroom.id)
+
+    assert engagement_small == engagement_large
+    assert quests_small == quests_large
+    assert engagement['event_types']['LOGIN'] == 8
+
+
+def test_pandas_backend_matches_sql_backend(db_session, test_classroom, add_students):
+    pytest.importorskip('pandas')
+    from app.services import analytics_service, analytics_pandas
+    students = add_students(3)
+
+    for name in ('get_student_performance_data', 'get_engagement_metrics', 'get_quest_completion_analytics'):
+        assert getattr(analytics_pandas, name)(test_classroom.id) == getattr(analytics_service, name)(test_classroom.id)
+    student_id = students[0][0].id
+    assert (analytics_pandas.get_student_performance_data(test_classroom.id, student_id=student_id)
+            == analytics_service.get_student_performance_data(test_classroom.id, student_id=student_id))
+
+
+def test_get_analytics_backend(app):
+    from app.services import analytics_service
+    from app.services.analytics_service import get_analytics_backend
+
+    with app.app_context():
+        assert get_analytics_backend('sql') is analytics_service
+        assert get_analytics_backend('unknown') is analytics_service
+
+        pytest.importorskip('pandas')
+        from app.services import analytics_pandas
+        assert get_analytics_backend('pandas') is analytics_pandas
+        app.config['ANALYTICS_BACKEND'] = 'pandas'
+        try:
+            assert get_analytics_backend() is analytics_pandas
+        finally:
+            app.config['ANALYTICS_BACKEND'] = 'sql'
+
+
+def test_iter_student_performance_pages_roster(db_session, test_classroom, add_students):
+    from app.services.analytics_service import get_student_performance_data, iter_student_performance
+    add_students(7)
+    expected = get_student_performance_data(test_classroom.id)['students']
+
+    records, queries = _count_queries(db_session, lambda: list(iter_student_performance([test_classroom.id], batch_size=3)))
+
+    assert [r['class_id'] for r in records] == [test_classroom.id] * 7
+    assert [{k: v for k, v in r.items() if k != 'class_id'} for r in records] == expected
+    assert queries == 3 * 6  # three pages (3 + 3 + 1) of one roster + five grouped queries
+
+
+def test_streaming_export(client, db_session, test_teacher, test_classroom, add_students):
+    import json
+    add_students(2)
+    login(client, test_teacher)
+
+    response = client.get(f'/teacher/analytics/export/stream?format=ndjson&class_id={test_classroom.id}')
+    assert response.status_code == 200
+    assert response.is_streamed
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(records) == 2
+    assert records[0]['gold_spent'] == 15
+
+    response = client.get('/teacher/analytics/export/stream?format=csv')
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('Class ID,Student ID')
+    assert len(lines) == 3
+
+    assert client.get(f'/teacher/analytics/export/stream?class_id={test_classroom.id + 1000}').status_code == 404
@@ -0,0 +1,82 @@
+import pytest
+from datetime import datetime, timedelta
+import uuid
+
+
+@pytest.fixture
+def test_character(db_session):
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.character import Character
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    student = Student(user_id=user.id)
+    db_session.add(student)
+    db_session.commit()
+    character = Character(name=f'Hero_{unique_id}', student_id=student.id, is_active=True)
+    db_session.add(character)
+    db_session.commit()
+    return character
+
+
+def _rollup(db_session, character_id):
+    from app.models.audit import AuditDailyRollup
+    return sorted(
+        (row.day, row.event_type, row.total_amount, row.event_count)
+        for row in db_session.query(AuditDailyRollup).filter_by(character_id=character_id)
+    )
+
+
+def test_archive_moves_old_events_and_keeps_rollup(db_session, test_character, tmp_path):
+    from app.models.audit import AuditLog, AuditDailyRollup, EventType
+    from app.services.audit_archive import archive_audit_logs, read_archive
+    now = datetime.utcnow()
+    old_time = now - timedelta(days=400)
+    db_session.add_all([
+        AuditLog(event_type=EventType.XP_GAIN.value, character_id=test_character.id,
+                 event_data={'amount': 10}, event_timestamp=old_time),
+        AuditLog(event_type=EventType.XP_GAIN.value, character_id=test_character.id,
+                 event_data={'amount': 5}, event_timestamp=old_time + timedelta(hours=1)),
+        AuditLog(event_type=EventType.XP_GAIN.value, character_id=test_character.id,
+                 event_data={'amount': 7}, event_timestamp=now - timedelta(days=3)),
+    ])
+    db_session.commit()
+    old_ids = [log.id for log in AuditLog.query.filter(
+        AuditLog.character_id == test_character.id, AuditLog.event_timestamp < now - timedelta(days=365))]
+    rollup_before = _rollup(db_session, test_character.id)
+
+    result = archive_audit_logs(retention_days=365, archive_dir=str(tmp_path), batch_size=1)
+
+    assert result['archived'] >= 2
+    remaining = AuditLog.query.filter_by(character_id=test_character.id).all()
+    assert [log.amount for log in remaining] == [7]
+
+    archive_file = tmp_path / f"audit_log_{old_time.strftime('%Y-%m')}.jsonl.gz"
+    assert str(archive_file) in result['files']
+    archived = [record for record in read_archive(archive_file) if record['character_id'] == test_character.id]
+    assert sorted(record['id'] for record in archived) == sorted(old_ids)
+    assert sorted(record['amount'] for record in archived) == [5, 10]
+
+    # Rollups keep the archived days, also after a full rebuild
+    assert _rollup(db_session, test_character.id) == rollup_before
+    AuditDailyRollup.rebuild()
+    db_session.commit()
+    assert _rollup(db_session, test_character.id) == rollup_before
+
+
+def test_archive_appends_to_existing_month(db_session, test_character, tmp_path):
+    from app.models.audit import AuditLog, EventType
+    from app.services.audit_archive import archive_audit_logs, read_archive
+    old_time = datetime.utcnow() - timedelta(days=500)
+    for amount in (1, 2):
+        db_session.add(AuditLog(event_type=EventType.XP_GAIN.value, character_id=test_character.id,
+                                event_data={'amount': amount}, event_timestamp=old_time))
+        db_session.commit()
+        archive_audit_logs(retention_days=365, archive_dir=str(tmp_path), compact=False)
+
+    archive_file = tmp_path / f"audit_log_{old_time.strftime('%Y-%m')}.jsonl.gz"
+    amounts = [record['amount'] for record in read_archive(archive_file) if record['character_id'] == test_character.id]
+    assert amounts == [1, 2]
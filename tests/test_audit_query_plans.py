@@ -0,0 +1,177 @@
+"""Query-plan regression tests for the audit tables.
+
+Each hot analytics / progress / dashboard / clan query is executed, its SQL is
+captured and run through EXPLAIN QUERY PLAN, and the test fails if SQLite
+would answer it with a full scan of audit_log or audit_daily_rollup.
+"""
+import re
+import pytest
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import uuid
+from sqlalchemy import event
+
+AUDIT_TABLES = ('audit_log', 'audit_daily_rollup')
+SCAN = re.compile(r'^SCAN (\w+)')
+
+
+@contextmanager
+def captured_selects(db_session):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def audit_table_scans(db_session, statements):
+    """Return (plan detail, statement) for every full scan of an audit table."""
+    scans = []
+    connection = db_session.connection()
+    for statement, parameters in statements:
+        plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        for row in plan:
+            detail = row[-1]
+            match = SCAN.match(detail)
+            if match and match.group(1) in AUDIT_TABLES:
+                scans.append((detail, statement))
+    return scans
+
+
+def assert_no_audit_scans(db_session, statements):
+    assert statements, 'no queries were captured'
+    scans = audit_table_scans(db_session, statements)
+    assert not scans, '\n\n'.join(f'{detail}\n{statement}' for detail, statement in scans)
+
+
+@pytest.fixture
+def test_teacher(db_session):
+    from app.models.user import User, UserRole
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'teacher_{unique_id}', email=f'teacher_{unique_id}@example.com', role=UserRole.TEACHER)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def test_classroom(db_session, test_teacher):
+    from app.models.classroom import Classroom
+    unique_id = uuid.uuid4().hex
+    classroom = Classroom(name=f'Plan Class {unique_id}', teacher_id=test_teacher.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    return classroom
+
+
+@pytest.fixture
+def test_clan(db_session, test_classroom):
+    from app.models.clan import Clan
+    clan = Clan(name=f'Plan Clan {uuid.uuid4().hex}', class_id=test_classroom.id)
+    db_session.add(clan)
+    db_session.commit()
+    return clan
+
+
+@pytest.fixture
+def test_character(db_session, test_classroom, test_clan):
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.audit import AuditLog, EventType
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    student = Student(user_id=user.id, class_id=test_classroom.id, clan_id=test_clan.id)
+    db_session.add(student)
+    db_session.commit()
+    character = Character(name=f'Hero_{unique_id}', student_id=student.id, clan_id=test_clan.id, is_active=True)
+    db_session.add(character)
+    db_session.commit()
+    now = datetime.utcnow()
+    db_session.add_all([
+        AuditLog(event_type=EventType.XP_GAIN.value, user_id=user.id, character_id=character.id,
+                 event_data={'amount': 10}, event_timestamp=now - timedelta(days=1)),
+        AuditLog(event_type=EventType.GOLD_TRANSACTION.value, user_id=user.id, character_id=character.id,
+                 event_data={'amount': 5}, event_timestamp=now),
+        AuditLog(event_type=EventType.LEVEL_UP.value, user_id=user.id, character_id=character.id,
+                 event_data={}, old_value=1, new_value=2, event_timestamp=now),
+        AuditLog(event_type=EventType.LOGIN.value, user_id=user.id, event_data={}, event_timestamp=now),
+    ])
+    db_session.commit()
+    return character
+
+
+def test_analytics_queries_use_indexes(db_session, test_classroom, test_character):
+    from app.services.analytics_service import (
+        get_student_performance_data,
+        get_engagement_metrics,
+        get_quest_completion_analytics
+    )
+    with captured_selects(db_session) as statements:
+        get_student_performance_data(test_classroom.id)
+        get_engagement_metrics(test_classroom.id)
+        get_quest_completion_analytics(test_classroom.id)
+    assert_no_audit_scans(db_session, statements)
+
+
+def test_progress_queries_use_indexes(db_session, test_character):
+    from app.models.audit import AuditLog, AuditDailyRollup, EventType
+    since = (datetime.utcnow() - timedelta(days=90)).date()
+    with captured_selects(db_session) as statements:
+        AuditDailyRollup.daily_totals_query(test_character.id, EventType.XP_GAIN.value, since).all()
+        AuditDailyRollup.daily_totals_query(
+            test_character.id, EventType.GOLD_TRANSACTION.value, since, column='positive_amount'
+        ).all()
+        AuditLog.level_history_query(test_character.id).all()
+        AuditLog.character_activity_query(test_character.id).limit(15).all()
+    assert_no_audit_scans(db_session, statements)
+
+
+def test_dashboard_activity_query_uses_indexes(db_session, test_teacher, test_character):
+    from app.models.audit import AuditLog
+    with captured_selects(db_session) as statements:
+        AuditLog.teacher_activity_query(
+            test_teacher.id,
+            event_types=['QUEST_COMPLETE', 'LEVEL_UP'],
+            since=datetime.utcnow() - timedelta(days=7)
+        ).limit(10).all()
+    assert_no_audit_scans(db_session, statements)
+
+
+def test_clan_queries_use_indexes(db_session, test_clan, test_character):
+    from app.models.audit import AuditLog
+    from app.services.clan_metrics import calculate_avg_daily_points
+    with captured_selects(db_session) as statements:
+        AuditLog.clan_activity_query(test_clan.id, event_types=['CLAN_JOIN', 'QUEST_COMPLETE']).limit(10).all()
+        calculate_avg_daily_points(test_clan)
+    assert_no_audit_scans(db_session, statements)
+
+
+def test_event_lookups_use_indexes(db_session, test_character):
+    from app.models.audit import AuditLog, EventType
+    since = datetime.utcnow() - timedelta(days=30)
+    user_id = test_character.student.user_id
+    with captured_selects(db_session) as statements:
+        AuditLog.get_user_events(user_id, event_type=EventType.LOGIN.value, start_date=since)
+        AuditLog.get_character_events(test_character.id, event_type=EventType.XP_GAIN.value, start_date=since)
+        AuditLog.get_character_events(test_character.id)
+    assert_no_audit_scans(db_session, statements)
+
+
+def test_scan_detection(db_session, test_character):
+    """Guard against the suite silently passing: an unindexed predicate must be reported."""
+    from app.models.audit import AuditLog
+    with captured_selects(db_session) as statements:
+        AuditLog.query.filter(AuditLog.ip_address == '127.0.0.1').all()
+    assert audit_table_scans(db_session, statements)
@@ -0,0 +1,181 @@
+import pytest
+import time
+import uuid
+
+
+def login(client, user):
+    from flask import g
+    # The test app context outlives requests; drop the user Flask-Login cached on g
+    g.pop('_login_user', None)
+    client.post('/auth/login', data={'username': user.username, 'password': 'password'})
+
+
+@pytest.fixture
+def sync_jobs(app, monkeypatch):
+    monkeypatch.setitem(app.extensions['job_runner'], 'sync', True)
+
+
+@pytest.fixture
+def test_teacher(db_session):
+    from app.models.user import User, UserRole
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'teacher_{unique_id}', email=f'teacher_{unique_id}@example.com', role=UserRole.TEACHER)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def test_classroom(db_session, test_teacher):
+    from app.models.classroom import Classroom
+    unique_id = uuid.uuid4().hex
+    classroom = Classroom(name=f'Jobs Class {unique_id}', teacher_id=test_teacher.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    return classroom
+
+
+@pytest.fixture
+def test_jobs():
+    """Register throwaway job types for the duration of a test."""
+    from app.services.job_runner import JOB_TYPES, register_job
+
+    @register_job('test_steps')
+    def steps(params, progress):
+        for step in range(params['steps']):
+            progress((step + 1) / params['steps'], f'step {step + 1}')
+        return {'steps': params['steps']}
+
+    @register_job('test_fail')
+    def fail(params, progress):
+        raise ValueError('boom')
+
+    yield
+    JOB_TYPES.pop('test_steps', None)
+    JOB_TYPES.pop('test_fail', None)
+
+
+def test_sync_job_lifecycle(db_session, sync_jobs, test_jobs):
+    from app.services.job_runner import submit_job, run_job
+    job = submit_job('test_steps', {'steps': 3})
+
+    assert job.status == 'succeeded'
+    assert job.progress == 1.0
+    assert job.progress_message == 'step 3'
+    assert job.result == {'steps': 3}
+    assert job.started_at is not None and job.finished_at is not None
+
+    # A finished job cannot be claimed again
+    run_job(job.id)
+    db_session.refresh(job)
+    assert job.result == {'steps': 3}
+
+
+def test_failed_job_records_error(db_session, sync_jobs, test_jobs):
+    from app.services.job_runner import submit_job, JobError
+    job = submit_job('test_fail')
+    assert job.status == 'failed'
+    assert job.error == 'boom'
+
+    with pytest.raises(JobError):
+        submit_job('no_such_job')
+
+
+def test_threaded_job_completes(db_session, test_jobs):
+    from app.models.job import BackgroundJob
+    from app.services.job_runner import submit_job
+    job_id = submit_job('test_steps', {'steps': 2}).id
+
+    deadline = time.time() + 10
+    while True:
+        db_session.expire_all()
+        job = db_session.get(BackgroundJob, job_id)
+        if job.is_finished or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert job.status == 'succeeded'
+    assert job.result == {'steps': 2}
+
+
+def test_requeue_stale_jobs(db_session, sync_jobs, test_jobs):
+    from datetime import datetime, timedelta
+    from app.models.job import BackgroundJob
+    from app.services.job_runner import requeue_stale_jobs
+    stale = BackgroundJob(job_type='test_steps', params={'steps': 1}, status='running',
+                          updated_at=datetime.utcnow() - timedelta(days=1))
+    fresh = BackgroundJob(job_type='test_steps', params={'steps': 1}, status='running')
+    db_session.add_all([stale, fresh])
+    db_session.commit()
+
+    assert requeue_stale_jobs() >= 1
+    db_session.expire_all()
+    assert stale.status == 'succeeded'
+    assert fresh.status == 'running'
+    fresh.status = 'failed'
+    db_session.commit()
+
+
+def test_stale_jobs_are_requeued_when_the_pool_starts(app, db_session, test_jobs, monkeypatch):
+    from datetime import datetime, timedelta
+    from app.models.job import BackgroundJob
+    from app.services import job_runner
+    stale = BackgroundJob(job_type='test_steps', params={'steps': 1}, status='running',
+                          updated_at=datetime.utcnow() - timedelta(days=1))
+    db_session.add(stale)
+    db_session.commit()
+    job_id = stale.id
+
+    # As in a freshly forked worker: the pool in memory belongs to another process
+    monkeypatch.setattr(job_runner, '_executor_pid', -1)
+    job_runner._get_executor(app)
+    deadline = time.time() + 10
+    while True:
+        db_session.expire_all()
+        job = db_session.get(BackgroundJob, job_id)
+        if job.is_finished or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert job.status == 'succeeded'
+
+
+def test_report_job_endpoints(client, db_session, sync_jobs, test_teacher, test_classroom):
+    from app.models.job import BackgroundJob
+    login(client, test_teacher)
+
+    response = client.post('/teacher/jobs', json={'job_type': 'analytics_report', 'class_id': test_classroom.id})
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    assert response.headers['Location'].endswith(f'/teacher/jobs/{job_id}')
+
+    assert client.get(f'/teacher/jobs/{job_id}').get_json()['status'] == 'succeeded'
+    result = client.get(f'/teacher/jobs/{job_id}/result').get_json()['result']
+    assert set(result) == {'performance', 'engagement', 'quests'}
+
+    response = client.get(f'/teacher/analytics/data?class_id={test_classroom.id}&async=1')
+    assert response.status_code == 202
+    assert response.get_json()['job_type'] == 'analytics_report'
+    response = client.get(f'/teacher/analytics/data?class_id={test_classroom.id}&async=1&backend=sql')
+    job = db_session.get(BackgroundJob, response.get_json()['id'])
+    assert job.params == {'class_id': test_classroom.id, 'days': 90, 'backend': 'sql'}
+    assert client.get(f'/teacher/analytics/data?class_id={test_classroom.id}&backend=excel').status_code == 400
+
+    assert client.post('/teacher/jobs', json={'job_type': 'analytics_report',
+                                              'class_id': test_classroom.id + 1000}).status_code == 404
+    assert client.post('/teacher/jobs', json={'job_type': 'analytics_report', 'class_id': test_classroom.id,
+                                              'days': 0}).status_code == 400
+    assert client.post('/teacher/jobs', json={'job_type': 'test_fail'}).status_code == 400
+
+
+def test_jobs_are_private_to_their_owner(client, db_session, sync_jobs, test_teacher, test_classroom):
+    from app.models.user import User, UserRole
+    from app.services.job_runner import submit_job
+    job = submit_job('clan_metrics', {'class_id': test_classroom.id}, user_id=test_teacher.id)
+    other = User(username=f'teacher_{uuid.uuid4().hex}', email=f'{uuid.uuid4().hex}@example.com', role=UserRole.TEACHER)
+    other.set_password('password')
+    db_session.add(other)
+    db_session.commit()
+
+    login(client, other)
+    assert client.get(f'/teacher/jobs/{job.id}').status_code == 404
+    assert client.get(f'/teacher/jobs/{job.id}/result').status_code == 404
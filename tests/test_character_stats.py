@@ -0,0 +1,143 @@
+import pytest
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+
+@pytest.fixture
+def stat_cache(db_session):
+    from app.services.character_stats import character_stat_cache
+    character_stat_cache.clear()
+    yield character_stat_cache
+    character_stat_cache.clear()
+
+
+@pytest.fixture
+def hero(db_session):
+    """A character with a sword and a shield in its inventory."""
+    from app.models.user import User, UserRole
+    from app.models.classroom import Classroom
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.equipment import Equipment, Inventory
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    classroom = Classroom(name=f'Stats Class {unique_id}', teacher_id=user.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    student = Student(user_id=user.id, class_id=classroom.id)
+    db_session.add(student)
+    db_session.commit()
+    character = Character(name=f'Hero_{unique_id}', student_id=student.id, health=100, power=10, defense=10)
+    sword = Equipment(name=f'Sword {unique_id}', type='weapon', slot='main_hand', power_bonus=5)
+    shield = Equipment(name=f'Shield {unique_id}', type='armor', slot='off_hand', defense_bonus=4, health_bonus=20)
+    db_session.add_all([character, sword, shield])
+    db_session.commit()
+    items = [Inventory(character_id=character.id, item_id=equipment.id) for equipment in (sword, shield)]
+    db_session.add_all(items)
+    db_session.commit()
+    return character, items
+
+
+def _count_queries(db_session, func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return result, len(statements)
+
+
+def test_totals_come_from_one_cached_query(db_session, stat_cache, hero):
+    from app.models.character import StatusEffect
+    character, items = hero
+    for item in items:
+        item.equip()
+    db_session.add(StatusEffect(
+        character_id=character.id, effect_type='buff', stat_affected='power', amount=3,
+        expires_at=datetime.utcnow() + timedelta(minutes=5)
+    ))
+    db_session.commit()
+    db_session.refresh(character)
+
+    totals, queries = _count_queries(
+        db_session, lambda: (character.total_health, character.total_power, character.total_defense)
+    )
+    assert totals == (120, 18, 14)
+    assert queries == 1
+
+    snapshot = character.stat_snapshot().to_dict()
+    assert snapshot['slots']['main_hand']['power'] == 5
+    assert snapshot['slots']['off_hand']['health'] == 20
+    assert snapshot['effect_bonus'] == {'health': 0, 'power': 3, 'defense': 0}
+
+    # Damage changes the base stat only and needs no query
+    character.take_damage(30)
+    assert _count_queries(db_session, lambda: character.total_health) == (90, 0)
+
+
+def test_snapshot_is_invalidated_by_equipment_effects_and_level_ups(db_session, stat_cache, hero):
+    from app.models.character import StatusEffect
+    character, items = hero
+    assert character.total_power == 10
+
+    items[0].equip()
+    assert character.total_power == 15
+    items[0].unequip()
+    assert character.total_power == 10
+
+    db_session.add(StatusEffect(
+        character_id=character.id, effect_type='debuff', stat_affected='defense', amount=-2,
+        expires_at=datetime.utcnow() + timedelta(minutes=5)
+    ))
+    db_session.commit()
+    assert character.total_defense == 8
+
+    character.gain_experience(1000)
+    assert character.level == 2 and character.total_power == 12
+    assert character.stat_snapshot().effect_bonus['defense'] == -2
+
+
+def test_snapshot_expires_with_the_first_status_effect(db_session, stat_cache, hero):
+    from app.models.character import StatusEffect
+    character, items = hero
+    db_session.add(StatusEffect(
+        character_id=character.id, effect_type='buff', stat_affected='power', amount=3,
+        expires_at=datetime.utcnow() + timedelta(seconds=1)
+    ))
+    db_session.commit()
+    assert character.total_power == 13
+
+    # Pretend the effect ran out a while ago without any write touching the character
+    entry_expiry, bonuses = stat_cache._entries[character.id]
+    assert entry_expiry <= datetime.utcnow() + timedelta(seconds=1)
+    stat_cache._entries[character.id] = (datetime.utcnow() - timedelta(seconds=1), bonuses)
+    StatusEffect.query.filter_by(character_id=character.id).update({'expires_at': datetime.utcnow()})
+    db_session.commit()
+    assert character.total_power == 10
+
+
+def test_bonuses_loaded_across_an_equip_commit_are_not_cached(db_session, stat_cache, hero, monkeypatch):
+    character, items = hero
+    load_bonuses = stat_cache.load_bonuses
+
+    def racing_load(character_id, now):
+        loaded = load_bonuses(character_id, now)
+        # Another request equips the sword before this result is stored
+        items[0].equip()
+        return loaded
+
+    monkeypatch.setattr(stat_cache, 'load_bonuses', racing_load)
+    assert character.total_power == 10
+    monkeypatch.undo()
+    assert character.id not in stat_cache._entries
+    assert character.total_power == 15
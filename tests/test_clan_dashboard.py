@@ -0,0 +1,111 @@
+import pytest
+from datetime import datetime, timedelta
+import uuid
+from sqlalchemy import event
+
+
+@pytest.fixture
+def test_classroom(db_session):
+    from app.models.user import User, UserRole
+    from app.models.classroom import Classroom
+    unique_id = uuid.uuid4().hex
+    teacher = User(username=f'teacher_{unique_id}', email=f'teacher_{unique_id}@example.com', role=UserRole.TEACHER)
+    teacher.set_password('password')
+    db_session.add(teacher)
+    db_session.commit()
+    classroom = Classroom(name=f'Dashboard Class {unique_id}', teacher_id=teacher.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    return classroom
+
+
+@pytest.fixture
+def clan_factory(db_session, test_classroom):
+    """Create a clan with ``members`` characters, a leader, history rows and 12 clan events per member."""
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.clan import Clan
+    from app.models.clan_progress import ClanProgressHistory
+    from app.models.audit import AuditLog
+
+    def create(members=3):
+        now = datetime.utcnow()
+        clan = Clan(name=f'Clan {uuid.uuid4().hex}', class_id=test_classroom.id)
+        db_session.add(clan)
+        db_session.commit()
+        characters = []
+        for index in range(members):
+            unique_id = uuid.uuid4().hex
+            user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+            user.set_password('password')
+            db_session.add(user)
+            db_session.commit()
+            student = Student(user_id=user.id, class_id=test_classroom.id, clan_id=clan.id)
+            db_session.add(student)
+            db_session.commit()
+            character = Character(name=f'Hero_{unique_id}', student_id=student.id, clan_id=clan.id)
+            db_session.add(character)
+            db_session.commit()
+            characters.append(character)
+            for hours in range(12):
+                db_session.add(AuditLog(
+                    event_type='CLAN_JOIN' if hours % 2 else 'QUEST_COMPLETE',
+                    event_data={'description': f'{index}-{hours}'},
+                    character_id=character.id,
+                    event_timestamp=now - timedelta(hours=hours, minutes=index)
+                ))
+        clan.leader_id = characters[0].id
+        for days_ago in range(5):
+            db_session.add(ClanProgressHistory(clan_id=clan.id, timestamp=now - timedelta(days=days_ago),
+                                               total_points=days_ago, active_members=members))
+        db_session.commit()
+        return clan
+
+    return create
+
+
+def test_loader_matches_per_clan_queries(db_session, clan_factory):
+    from app.models.audit import AuditLog
+    from app.models.clan_progress import ClanProgressHistory
+    from app.services.clan_dashboard import load_clan_dashboard, DASHBOARD_EVENT_TYPES
+    clans = [clan_factory(members) for members in (1, 3)]
+    empty = clan_factory(1)
+    empty.leader_id = None
+    ClanProgressHistory.query.filter_by(clan_id=empty.id).delete()
+    db_session.commit()
+    clans.append(empty)
+
+    data = load_clan_dashboard([clan.id for clan in clans])
+
+    for clan in clans:
+        expected_activity = AuditLog.clan_activity_query(clan.id, event_types=list(DASHBOARD_EVENT_TYPES)).limit(10).all()
+        latest = clan.progress_history.order_by(ClanProgressHistory.timestamp.desc()).first()
+        assert [log.id for log in data[clan.id]['recent_activity']] == [log.id for log in expected_activity]
+        assert data[clan.id]['latest_progress'] == latest
+        assert data[clan.id]['member_count'] == clan.get_member_count()
+        assert data[clan.id]['leader'] == (clan.leader.name if clan.leader else None)
+    assert [point['total_points'] for point in data[clans[1].id]['history']] == [4, 3, 2, 1, 0]
+    assert data[empty.id]['history'] == [] and data[empty.id]['latest_progress'] is None
+
+
+def test_loader_query_count_does_not_grow_with_clans(db_session, clan_factory):
+    from app.services.clan_dashboard import load_clan_dashboard
+    clan_ids = [clan_factory().id for _ in range(6)]
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        counts = []
+        for ids in (clan_ids[:1], clan_ids):
+            before = len(statements)
+            data = load_clan_dashboard(ids, since=datetime.utcnow() - timedelta(days=7), max_points=60)
+            counts.append(len(statements) - before)
+            assert all(len(data[clan_id]['recent_activity']) == 10 for clan_id in ids)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert counts[0] == counts[1]
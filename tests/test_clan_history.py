@@ -0,0 +1,119 @@
+import pytest
+from datetime import datetime, timedelta
+import uuid
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+
+
+@pytest.fixture
+def test_teacher(db_session):
+    from app.models.user import User, UserRole
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'teacher_{unique_id}', email=f'teacher_{unique_id}@example.com', role=UserRole.TEACHER)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def test_clan(db_session, test_teacher):
+    from app.models.classroom import Classroom
+    from app.models.clan import Clan
+    unique_id = uuid.uuid4().hex
+    classroom = Classroom(name=f'History Class {unique_id}', teacher_id=test_teacher.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    clan = Clan(name=f'History Clan {unique_id}', class_id=classroom.id)
+    db_session.add(clan)
+    db_session.commit()
+    return clan
+
+
+def _add_daily_history(db_session, clan_id, now, days):
+    """One history row per day for ``days`` days before ``now``; total_points = days ago."""
+    from app.models.clan_progress import ClanProgressHistory
+    db_session.execute(insert(ClanProgressHistory), [
+        {
+            'clan_id': clan_id,
+            'timestamp': now - timedelta(days=days_ago),
+            'avg_completion_rate': 0.5,
+            'total_points': days_ago,
+            'active_members': days_ago % 5,
+        }
+        for days_ago in range(days)
+    ])
+    db_session.commit()
+
+
+def test_compaction_keeps_every_sample(db_session, test_clan):
+    from app.models.clan_progress import ClanProgressHistory, ClanProgressRollup
+    from app.services.clan_history import compact_clan_history, bucket_start
+    now = datetime(2026, 6, 17, 12)
+    _add_daily_history(db_session, test_clan.id, now, 1000)
+
+    result = compact_clan_history(raw_days=90, weekly_days=730, now=now)
+    db_session.commit()
+
+    raw = ClanProgressHistory.query.filter_by(clan_id=test_clan.id).all()
+    buckets = ClanProgressRollup.query.filter_by(clan_id=test_clan.id).all()
+    raw_horizon = bucket_start(now - timedelta(days=90), 'week')
+    assert result['raw_rows'] == 1000 - len(raw)
+    assert all(row.timestamp >= raw_horizon for row in raw)
+    assert len(raw) + sum(bucket.samples for bucket in buckets) == 1000
+    assert {bucket.resolution for bucket in buckets} == {'week', 'month'}
+    assert max(bucket.total_points_max for bucket in buckets) == 999
+    for bucket in buckets:
+        assert bucket.total_points_min <= bucket.total_points_avg <= bucket.total_points_max
+        assert bucket.avg_completion_rate_avg == pytest.approx(0.5)
+        assert bucket.avg_daily_points_avg is None
+
+    # Nothing left to do on a second run, and old weeks move to months as time passes
+    assert compact_clan_history(raw_days=90, weekly_days=730, now=now)['raw_rows'] == 0
+    later = compact_clan_history(raw_days=90, weekly_days=730, now=now + timedelta(days=120))
+    db_session.commit()
+    assert later['weekly_buckets'] > 0
+    buckets = ClanProgressRollup.query.filter_by(clan_id=test_clan.id).all()
+    remaining = ClanProgressHistory.query.filter_by(clan_id=test_clan.id).count()
+    assert remaining + sum(bucket.samples for bucket in buckets) == 1000
+
+
+def test_load_history_downsamples_to_budget(db_session, test_clan):
+    from app.services.clan_history import compact_clan_history, load_clan_history
+    now = datetime.utcnow()
+    _add_daily_history(db_session, test_clan.id, now, 1000)
+    compact_clan_history(raw_days=90, weekly_days=730)
+    db_session.commit()
+
+    full = load_clan_history([test_clan.id])[test_clan.id]
+    assert sum(point['samples'] for point in full) == 1000
+    assert {point['resolution'] for point in full} == {'raw', 'week', 'month'}
+
+    small = load_clan_history([test_clan.id], max_points=20)[test_clan.id]
+    assert len(small) <= 20
+    assert sum(point['samples'] for point in small) == 1000
+    assert max(point['max']['total_points'] for point in small) == 999
+
+    weekly = load_clan_history([test_clan.id], since=now - timedelta(days=27, hours=12), resolution='week')[test_clan.id]
+    assert all(point['resolution'] == 'week' for point in weekly)
+    assert sum(point['samples'] for point in weekly) == 28
+    for point in weekly:
+        assert point['min']['total_points'] <= point['total_points'] <= point['max']['total_points']
+
+
+def test_trend_data_endpoint_resolution(client, db_session, test_teacher, test_clan):
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(test_teacher.id))}'}
+    _add_daily_history(db_session, test_clan.id, datetime.utcnow(), 60)
+
+    raw = client.get(f'/clans/{test_clan.id}/history?days=365', headers=headers).get_json()
+    assert len(raw) == 60
+    assert raw[-1]['total_points'] == 0 and raw[-1]['resolution'] == 'raw'
+
+    response = client.get(f'/clans/{test_clan.id}/trend-data?days=365&max_points=10', headers=headers)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['labels']) == len(data['data']) <= 10
+    assert max(data['max']) == 59
+
+    assert client.get(f'/clans/{test_clan.id}/trend-data?resolution=hourly', headers=headers).status_code == 400
+    assert client.get(f'/clans/{test_clan.id}/trend-data?metric=clan_id', headers=headers).status_code == 400
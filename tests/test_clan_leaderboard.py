@@ -0,0 +1,295 @@
+import pytest
+import uuid
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+
+@pytest.fixture
+def test_teacher(db_session):
+    from app.models.user import User, UserRole
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'teacher_{unique_id}', email=f'teacher_{unique_id}@example.com', role=UserRole.TEACHER)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+@pytest.fixture
+def test_classroom(db_session, test_teacher):
+    from app.models.classroom import Classroom
+    unique_id = uuid.uuid4().hex
+    classroom = Classroom(name=f'Leaderboard Class {unique_id}', teacher_id=test_teacher.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    return classroom
+
+
+@pytest.fixture
+def test_clans(db_session, test_classroom):
+    """Three clans with one member each: 300, 100 and 200 points."""
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.clan import Clan
+    clans, characters = [], []
+    for points in (300, 100, 200):
+        unique_id = uuid.uuid4().hex
+        clan = Clan(name=f'Clan {unique_id}', class_id=test_classroom.id)
+        user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+        user.set_password('password')
+        db_session.add_all([clan, user])
+        db_session.commit()
+        student = Student(user_id=user.id, class_id=test_classroom.id, clan_id=clan.id)
+        db_session.add(student)
+        db_session.commit()
+        character = Character(name=f'Hero_{unique_id}', student_id=student.id, experience=points)
+        db_session.add(character)
+        db_session.commit()
+        clans.append(clan)
+        characters.append(character)
+    return clans, characters
+
+
+@pytest.fixture
+def auth_headers(test_teacher):
+    return {'Authorization': f'Bearer {create_access_token(identity=str(test_teacher.id))}'}
+
+
+@pytest.fixture
+def ranking_cache():
+    from app.services.clan_ranking import ranking_cache
+    ranking_cache.clear()
+    yield ranking_cache
+    ranking_cache.clear()
+
+
+def _ranking(class_id):
+    from app.services.clan_leaderboard import get_clan_leaderboard
+    return [(entry['id'], entry['rank'], entry['total_points'], entry['percentile_rank'])
+            for entry in get_clan_leaderboard(class_id)]
+
+
+def test_refresh_ranks_clans(db_session, test_classroom, test_clans):
+    from app.services.clan_leaderboard import refresh_clan_leaderboard
+    clans = test_clans[0]
+    assert refresh_clan_leaderboard([test_classroom.id]) == 3
+    db_session.commit()
+    assert _ranking(test_classroom.id) == [
+        (clans[0].id, 1, 300, 100),
+        (clans[2].id, 2, 200, 67),
+        (clans[1].id, 3, 100, 34),
+    ]
+
+
+def test_read_is_a_single_query(db_session, test_classroom, test_clans):
+    from app.services.clan_leaderboard import get_clan_leaderboard
+    class_id = test_classroom.id
+    get_clan_leaderboard(class_id)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        entries = get_clan_leaderboard(class_id)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert len(entries) == 3
+    assert len(statements) == 1
+
+
+def test_xp_change_reranks_in_the_same_transaction(db_session, test_classroom, test_clans):
+    from app.services.clan_leaderboard import refresh_clan_leaderboard
+    clans, characters = test_clans
+    refresh_clan_leaderboard([test_classroom.id])
+    db_session.commit()
+
+    characters[1].experience += 250
+    db_session.commit()
+
+    assert [clan_id for clan_id, *_ in _ranking(test_classroom.id)] == [clans[1].id, clans[0].id, clans[2].id]
+    assert _ranking(test_classroom.id)[0][2] == 350
+
+
+def test_flush_updates_changed_clans_in_place(db_session, test_classroom, test_clans):
+    from app.models.clan import Clan
+    from app.models.student import Student
+    from app.services.clan_leaderboard import refresh_clan_leaderboard
+    clans, characters = test_clans
+    refresh_clan_leaderboard([test_classroom.id])
+    db_session.commit()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        characters[2].experience += 150
+        db_session.commit()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    writes = [statement for statement in statements if 'clan_leaderboard' in statement
+              and statement.lstrip().upper().startswith(('INSERT', 'DELETE', 'UPDATE'))]
+    assert not any(statement.lstrip().upper().startswith('INSERT') for statement in writes)
+    assert _ranking(test_classroom.id)[0] == (clans[2].id, 1, 350, 100)
+
+    # Membership moves, new and deleted clans end up as a full rebuild would rank them
+    student = db_session.get(Student, characters[0].student_id)
+    student.clan_id = clans[1].id
+    db_session.add(Clan(name=f'Clan {uuid.uuid4().hex}', class_id=test_classroom.id))
+    db_session.commit()
+    db_session.delete(clans[2])
+    db_session.commit()
+    incremental = _ranking(test_classroom.id)
+    refresh_clan_leaderboard([test_classroom.id])
+    db_session.commit()
+    assert incremental == _ranking(test_classroom.id)
+    assert [row[1:] for row in incremental] == [(1, 400, 100), (2, 0, 67), (3, 0, 34)]
+    assert incremental[0][0] == clans[1].id and clans[2].id not in [row[0] for row in incremental]
+
+
+def test_moved_clan_leaves_the_old_class(db_session, test_teacher, test_classroom, test_clans):
+    from app.models.classroom import Classroom
+    clans = test_clans[0]
+    unique_id = uuid.uuid4().hex
+    other = Classroom(name=f'Other Class {unique_id}', teacher_id=test_teacher.id, join_code=unique_id[:8])
+    db_session.add(other)
+    db_session.commit()
+
+    clans[0].class_id = other.id
+    db_session.commit()
+
+    assert [row[0] for row in _ranking(test_classroom.id)] == [clans[2].id, clans[1].id]
+    assert _ranking(other.id) == [(clans[0].id, 1, 300, 100)]
+
+
+def test_unmaterialized_class_is_ranked_without_writing(db_session, test_classroom, test_clans):
+    from app.models.clan_leaderboard import ClanLeaderboardEntry
+    clans = test_clans[0]
+    ClanLeaderboardEntry.query.filter_by(class_id=test_classroom.id).delete()
+    db_session.commit()
+
+    assert _ranking(test_classroom.id) == [
+        (clans[0].id, 1, 300, 100),
+        (clans[2].id, 2, 200, 67),
+        (clans[1].id, 3, 100, 34),
+    ]
+    assert ClanLeaderboardEntry.query.filter_by(class_id=test_classroom.id).count() == 0
+
+
+def test_metrics_job_refreshes_completion_rates(db_session, test_classroom, test_clans):
+    from app.models.quest import Quest, QuestLog, QuestStatus, QuestType
+    from app.services.clan_leaderboard import get_clan_leaderboard
+    from app.services.scheduled_tasks import update_clan_metrics
+    clans, characters = test_clans
+    quest = Quest(title=f'Leaderboard Quest {uuid.uuid4().hex}', description='d', type=QuestType.DAILY)
+    db_session.add(quest)
+    db_session.commit()
+    db_session.add(QuestLog(character_id=characters[0].id, quest_id=quest.id, status=QuestStatus.COMPLETED))
+    db_session.commit()
+
+    update_clan_metrics()
+
+    rates = {entry['id']: entry['avg_completion_rate'] for entry in get_clan_leaderboard(test_classroom.id)}
+    assert rates == {clans[0].id: 1.0, clans[1].id: 0.0, clans[2].id: 0.0}
+
+
+def test_leaderboard_endpoint_etag(client, db_session, test_classroom, test_clans, auth_headers):
+    url = f'/classes/{test_classroom.id}/clan-leaderboard'
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert [clan['total_points'] for clan in response.get_json()['clans']] == [300, 200, 100]
+    etag = response.headers['ETag']
+
+    response = client.get(url, headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    test_clans[1][2].experience += 1
+    db_session.commit()
+    response = client.get(url, headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_window_ranking_matches_leaderboard(db_session, test_classroom, test_clans, ranking_cache):
+    from app.services.clan_ranking import rank_clans
+    clans = test_clans[0]
+    ranking = rank_clans(test_classroom.id, ties='ordered')
+    assert [(row['id'], row['rank'], row['total_points'], row['percentile_rank']) for row in ranking] == _ranking(test_classroom.id)
+    assert [row['percent_rank'] for row in ranking] == [0.0, 0.5, 1.0]
+    assert [row['id'] for row in rank_clans(test_classroom.id, top_k=2)] == [clans[0].id, clans[2].id]
+
+
+def test_window_ranking_ties_and_class_scope(db_session, test_teacher, test_classroom, test_clans, ranking_cache):
+    from app.models.classroom import Classroom
+    from app.models.clan import Clan
+    from app.services.clan_metrics import calculate_percentile_rankings
+    from app.services.clan_ranking import rank_clans
+    clans, characters = test_clans
+    characters[2].experience = 300
+    other = Classroom(name=f'Other Class {uuid.uuid4().hex}', teacher_id=test_teacher.id, join_code=uuid.uuid4().hex[:8])
+    db_session.add(other)
+    db_session.commit()
+    lone_clan = Clan(name=f'Lone Clan {uuid.uuid4().hex}', class_id=other.id)
+    db_session.add(lone_clan)
+    db_session.commit()
+
+    shared = rank_clans(test_classroom.id)
+    assert [(row['id'], row['rank'], row['percentile_rank']) for row in shared] == [
+        (clans[0].id, 1, 100), (clans[2].id, 1, 100), (clans[1].id, 3, 34)
+    ]
+    assert len(rank_clans(test_classroom.id, top_k=1)) == 2
+    assert [row['rank'] for row in rank_clans(test_classroom.id, ties='ordered')] == [1, 2, 3]
+
+    percentiles = calculate_percentile_rankings()
+    assert percentiles[lone_clan.id] == 100
+    assert {clan.id: percentiles[clan.id] for clan in clans} == {clans[0].id: 100, clans[1].id: 34, clans[2].id: 100}
+
+
+def test_window_ranking_cache_follows_xp_changes(db_session, test_classroom, test_clans, ranking_cache):
+    from app.services.clan_ranking import rank_clans
+    clans, characters = test_clans
+    first = rank_clans(test_classroom.id)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        assert rank_clans(test_classroom.id) is first
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert statements == []
+
+    characters[1].experience += 500
+    db_session.commit()
+    assert rank_clans(test_classroom.id)[0]['id'] == clans[1].id
+
+
+def test_percentile_rankings_are_cached_per_class(db_session, test_classroom, test_clans, ranking_cache):
+    from app.services.clan_metrics import calculate_percentile_rankings
+    clans, characters = test_clans
+    first = calculate_percentile_rankings(test_classroom.id)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        assert calculate_percentile_rankings(test_classroom.id) == first
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert statements == []
+
+    characters[1].experience += 500
+    db_session.commit()
+    assert calculate_percentile_rankings(test_classroom.id)[clans[1].id] == 100
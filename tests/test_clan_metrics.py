@@ -151,6 +151,337 @@ def test_percentile_rankings(db_session, test_clan, test_students_and_characters
     percentiles = clan_metrics_services['calculate_percentile_rankings']()
     assert isinstance(percentiles, dict)
 
+def _individual_metrics(clan):
+    from app.services import clan_metrics
+    return {
+        'avg_completion_rate': clan_metrics.calculate_avg_completion_rate(clan),
+        'total_points': clan_metrics.calculate_total_points(clan),
+        'active_members': clan_metrics.calculate_active_members(clan),
+        'avg_daily_points': clan_metrics.calculate_avg_daily_points(clan),
+        'quest_completion_rate': clan_metrics.calculate_quest_completion_rate(clan),
+        'avg_member_level': clan_metrics.calculate_avg_member_level(clan)
+    }
+
+def test_batch_metrics_match_individual_metrics(db_session, test_clan, test_students_and_characters, test_clan2, test_students2):
+    from app.models.quest import Quest, QuestLog, QuestStatus, QuestType
+    from app.models.audit import AuditLog
+    from app.services.clan_metrics import calculate_all_clan_metrics
+    quests = [Quest(title=f'Batch Quest {i} {uuid.uuid4().hex}', description='d', type=QuestType.DAILY) for i in range(3)]
+    db_session.add_all(quests)
+    db_session.commit()
+    characters = test_students_and_characters[1]
+    statuses = [QuestStatus.COMPLETED, QuestStatus.IN_PROGRESS, QuestStatus.COMPLETED]
+    for character, count in zip(characters, [3, 1, 2]):
+        character.clan_id = test_clan.id
+        for quest, status in zip(quests[:count], statuses):
+            db_session.add(QuestLog(character_id=character.id, quest_id=quest.id, status=status))
+        db_session.add(AuditLog(event_type='XP_GAIN', character_id=character.id, event_data={'amount': 35}))
+    db_session.commit()
+
+    batch = calculate_all_clan_metrics([test_clan.id, test_clan2.id], include_custom=False)
+
+    assert batch[test_clan.id] == _individual_metrics(test_clan)
+    assert batch[test_clan2.id] == _individual_metrics(test_clan2)
+    assert batch[test_clan.id]['quest_completion_rate'] == 4 / 6
+
+def test_batch_metrics_query_count_is_constant(db_session, test_clan, test_students_and_characters, test_clan2, test_students2):
+    from sqlalchemy import event
+    from app.services.clan_metrics import calculate_all_clan_metrics
+    counts = []
+    clan_id_sets = ([test_clan.id], [test_clan.id, test_clan2.id])
+
+    def before_cursor_execute(*args):
+        counts[-1] += 1
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for clan_ids in clan_id_sets:
+            counts.append(0)
+            calculate_all_clan_metrics(clan_ids, include_custom=False)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert counts[0] == counts[1]
+
+@pytest.fixture
+def large_clan_factory(db_session, test_classroom):
+    """Build a clan of ``size`` members, each with ``quests`` assignments (every other one completed)."""
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.clan import Clan
+    from app.models.quest import Quest, QuestLog, QuestStatus, QuestType
+
+    def build(size, quests=4):
+        unique_id = uuid.uuid4().hex
+        clan = Clan(name=f"Large Clan {unique_id}", class_id=test_classroom.id)
+        quest_rows = [Quest(title=f'Large Quest {i} {unique_id}', description='d', type=QuestType.DAILY) for i in range(quests)]
+        users = [User(username=f"large{i}_{unique_id}", email=f"large{i}_{unique_id}@example.com", role=UserRole.STUDENT)
+                 for i in range(size)]
+        users[0].set_password("password")
+        for user in users[1:]:
+            user.password_hash = users[0].password_hash
+        db_session.add_all([clan, *quest_rows, *users])
+        db_session.flush()
+        students = [Student(user_id=user.id, clan_id=clan.id) for user in users]
+        db_session.add_all(students)
+        db_session.flush()
+        characters = [Character(name=f"Large{i}_{unique_id}", student_id=student.id)
+                      for i, student in enumerate(students)]
+        db_session.add_all(characters)
+        db_session.flush()
+        db_session.add_all([
+            QuestLog(character_id=character.id, quest_id=quest.id,
+                     status=QuestStatus.COMPLETED if (i + j) % 2 == 0 else QuestStatus.IN_PROGRESS)
+            for i, character in enumerate(characters)
+            for j, quest in enumerate(quest_rows)
+        ])
+        db_session.commit()
+        return clan
+
+    return build
+
+def test_completion_rates_query_count_is_constant(db_session, large_clan_factory):
+    from sqlalchemy import event
+    from app.services.clan_metrics import calculate_avg_completion_rate, calculate_quest_completion_rate
+    small, large = large_clan_factory(2), large_clan_factory(200)
+    small.id, large.id  # load expired ids before counting
+    counts = []
+
+    def before_cursor_execute(*args):
+        counts[-1] += 1
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for clan in (small, large):
+            for metric in (calculate_avg_completion_rate, calculate_quest_completion_rate):
+                counts.append(0)
+                assert metric(clan) == 0.5
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert counts == [1, 1, 1, 1]
+
+def _assert_totals_current(db_session, clan_id):
+    from app.models.clan_progress import ClanMetricTotals
+    from app.services.clan_metrics import TOTAL_FIELDS, calculate_clan_aggregates
+    db_session.expire_all()
+    row = db_session.get(ClanMetricTotals, clan_id)
+    expected = calculate_clan_aggregates([clan_id])[clan_id]
+    assert {field: getattr(row, field) for field in TOTAL_FIELDS} == pytest.approx(expected)
+
+def test_totals_follow_member_changes(db_session, test_clan, test_students_and_characters):
+    from app.models.quest import Quest, QuestLog, QuestStatus, QuestType, Reward, RewardType
+    from app.services.clan_metrics import calculate_all_clan_metrics, current_clan_metrics
+    students, characters = test_students_and_characters
+    quests = [Quest(title=f'Totals Quest {i} {uuid.uuid4().hex}', description='d', type=QuestType.DAILY) for i in range(2)]
+    db_session.add_all(quests)
+    db_session.commit()
+
+    logs = [QuestLog(character_id=characters[0].id, quest_id=quest.id, status=QuestStatus.IN_PROGRESS) for quest in quests]
+    db_session.add_all(logs)
+    db_session.commit()
+    _assert_totals_current(db_session, test_clan.id)
+
+    logs[0].status = QuestStatus.COMPLETED
+    db_session.commit()
+    _assert_totals_current(db_session, test_clan.id)
+
+    reward = Reward(quest_id=quests[0].id, type=RewardType.EXPERIENCE, amount=1500)
+    reward.distribute(characters[1], commit=True)
+    _assert_totals_current(db_session, test_clan.id)
+
+    students[2].clan_id = None
+    db_session.commit()
+    _assert_totals_current(db_session, test_clan.id)
+
+    db_session.delete(logs[1])
+    db_session.commit()
+    _assert_totals_current(db_session, test_clan.id)
+
+    current = current_clan_metrics([test_clan.id], include_custom=False)[test_clan.id]
+    assert current == pytest.approx(calculate_all_clan_metrics([test_clan.id], include_custom=False)[test_clan.id])
+
+def test_totals_follow_changes_to_expired_instances(db_session, test_clan, test_students_and_characters,
+                                                   test_clan2, test_students2):
+    from sqlalchemy import event
+    from app.models.quest import Quest, QuestLog, QuestStatus, QuestType
+    students, characters = test_students_and_characters
+    quest = Quest(title=f'Expired Quest {uuid.uuid4().hex}', description='d', type=QuestType.DAILY)
+    db_session.add(quest)
+    db_session.commit()
+    log = QuestLog(character_id=characters[0].id, quest_id=quest.id, status=QuestStatus.IN_PROGRESS)
+    db_session.add(log)
+    db_session.commit()
+    clan_ids = (test_clan.id, test_clan2.id)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    # Every instance is expired by the commit; setting attributes must not load them
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        log.status = QuestStatus.COMPLETED
+        characters[1].level = 9
+        students[0].clan_id = clan_ids[1]
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert statements == []
+    db_session.commit()
+    for clan_id in clan_ids:
+        _assert_totals_current(db_session, clan_id)
+
+def test_reconcile_corrects_drift(db_session, test_clan, test_students_and_characters):
+    from app.models.clan_progress import ClanMetricTotals
+    from app.services.clan_metrics import reconcile_clan_totals
+    reconcile_clan_totals([test_clan.id])
+    db_session.commit()
+    db_session.query(ClanMetricTotals).filter_by(clan_id=test_clan.id).update(
+        {ClanMetricTotals.total_points: ClanMetricTotals.total_points + 5})
+    db_session.commit()
+
+    assert reconcile_clan_totals([test_clan.id]) == 1
+    db_session.commit()
+    _assert_totals_current(db_session, test_clan.id)
+    assert reconcile_clan_totals([test_clan.id]) == 0
+
+def test_totals_update_cost_does_not_grow_with_clan_size(db_session, large_clan_factory):
+    from sqlalchemy import event
+    from app.models.character import Character
+    from app.models.student import Student
+    from app.services.clan_metrics import reconcile_clan_totals
+    clans = [large_clan_factory(2), large_clan_factory(200)]
+    reconcile_clan_totals([clan.id for clan in clans])
+    db_session.commit()
+    characters = [
+        Character.query.join(Student, Student.id == Character.student_id).filter(Student.clan_id == clan.id).first()
+        for clan in clans
+    ]
+    statements, counts = [], []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for character in characters:
+            experience = character.experience  # reload after the previous commit
+            start = len(statements)
+            character.experience = experience + 10
+            db_session.commit()
+            counts.append(len(statements) - start)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert counts[0] == counts[1]
+    for clan in clans:
+        _assert_totals_current(db_session, clan.id)
+
+@pytest.fixture
+def custom_metrics():
+    """Register custom metrics for one test and drop them (and their cached values) afterwards."""
+    from app.services import clan_metrics
+    from app.services.custom_metrics import custom_metric_executor
+    registered = []
+
+    def register(name, func, **options):
+        clan_metrics.register_custom_metric(name, func, **options)
+        registered.append(name)
+
+    yield register
+    for name in registered:
+        clan_metrics.CUSTOM_METRICS.pop(name, None)
+    custom_metric_executor.clear()
+
+def test_slow_custom_metric_is_time_boxed(db_session, test_clan, test_clan2, custom_metrics):
+    import threading
+    import time
+    from app.services.clan_metrics import calculate_all_clan_metrics
+    from app.services.custom_metrics import custom_metric_executor
+    release = threading.Event()
+    custom_metrics('slow_metric', lambda clan_id: release.wait(5) and 1, timeout=0.2)
+    custom_metrics('fast_metric', lambda clan_id: clan_id * 10)
+    custom_metrics('broken_metric', lambda clan_id: 1 / 0)
+
+    started = time.monotonic()
+    try:
+        metrics = calculate_all_clan_metrics([test_clan.id, test_clan2.id])
+    finally:
+        release.set()
+    assert time.monotonic() - started < 2
+    for clan_id in (test_clan.id, test_clan2.id):
+        assert metrics[clan_id]['fast_metric'] == clan_id * 10
+        assert metrics[clan_id]['slow_metric'] is None
+        assert metrics[clan_id]['broken_metric'] is None
+        assert metrics[clan_id]['total_points'] is not None
+
+    stats = custom_metric_executor.stats()
+    assert stats['slow_metric']['timeouts'] == 2
+    assert stats['broken_metric']['errors'] == 2
+    assert stats['fast_metric']['calls'] == 2 and stats['fast_metric']['errors'] == 0
+    assert sum(stats['fast_metric']['buckets'].values()) == 2
+
+def test_slow_custom_metric_does_not_starve_the_others(db_session, custom_metrics):
+    import threading
+    from app.services.clan_metrics import CUSTOM_METRICS
+    from app.services.custom_metrics import CustomMetricExecutor
+    release = threading.Event()
+    custom_metrics('slow_metric', lambda clan_id: release.wait(5) and 1, timeout=0.2)
+    custom_metrics('fast_metric', lambda clan_id: clan_id * 10, timeout=1)
+    executor = CustomMetricExecutor(workers=2)
+    clan_ids = list(range(1, 7))
+
+    try:
+        results = executor.evaluate(
+            {name: CUSTOM_METRICS[name] for name in ('slow_metric', 'fast_metric')}, clan_ids
+        )
+    finally:
+        release.set()
+        executor.configure(workers=0)
+    assert [results[clan_id]['fast_metric'] for clan_id in clan_ids] == [clan_id * 10 for clan_id in clan_ids]
+    assert all(results[clan_id]['slow_metric'] is None for clan_id in clan_ids)
+    assert executor.stats()['fast_metric']['timeouts'] == 0
+
+def test_custom_metric_deadline_excludes_queue_wait(db_session, custom_metrics):
+    import time
+    from app.services.clan_metrics import CUSTOM_METRICS
+    from app.services.custom_metrics import CustomMetricExecutor
+    custom_metrics('steady_metric', lambda clan_id: time.sleep(0.1) or clan_id, timeout=0.3)
+    executor = CustomMetricExecutor(workers=1)
+    clan_ids = list(range(1, 6))
+
+    try:
+        results = executor.evaluate({'steady_metric': CUSTOM_METRICS['steady_metric']}, clan_ids)
+    finally:
+        executor.configure(workers=0)
+    assert [results[clan_id]['steady_metric'] for clan_id in clan_ids] == clan_ids
+    assert executor.stats()['steady_metric']['timeouts'] == 0
+
+def test_custom_metric_results_are_cached_for_ttl(db_session, test_clan, custom_metrics):
+    from app.services.clan_metrics import calculate_clan_metrics
+    from app.services.custom_metrics import custom_metric_executor
+    calls = []
+    custom_metrics('cached_metric', lambda clan_id: calls.append(clan_id) or len(calls), ttl=60)
+    custom_metrics('fresh_metric', lambda clan_id: calls.append(clan_id) or len(calls))
+
+    first = calculate_clan_metrics(test_clan.id)
+    second = calculate_clan_metrics(test_clan.id)
+    assert second['cached_metric'] == first['cached_metric']
+    assert len(calls) == 3
+    assert custom_metric_executor.stats()['cached_metric']['cache_hits'] == 1
+    assert calculate_clan_metrics(test_clan.id, include_custom=False).keys().isdisjoint({'cached_metric', 'fresh_metric'})
+
+def test_update_clan_metrics_writes_history(db_session, test_clan, test_students_and_characters):
+    from app.models.clan_progress import ClanProgressHistory
+    from app.services.scheduled_tasks import update_clan_metrics
+    update_clan_metrics()
+    history = ClanProgressHistory.query.filter_by(clan_id=test_clan.id).one()
+    assert history.total_points == sum(100 * i for i in range(5))
+    assert history.active_members == 3
+    assert history.percentile_rank is not None
+
 def test_clan_metrics_logic(db_session, test_clan, test_student):
     from app.models.clan import Clan
     from app.models.student import Student
@@ -0,0 +1,36 @@
+import uuid
+
+
+def _user(unique_id):
+    from app.models.user import User, UserRole
+    user = User(username=f'user_{unique_id}', email=f'user_{unique_id}@example.com', role=UserRole.STUDENT)
+    user.set_password('password')
+    return user
+
+
+def test_items_are_applied_on_outermost_commit_only(db_session):
+    from app.utils.commit_hooks import register_commit_hook
+    applied, rolled_back = [], []
+    key = f'test_hook_{uuid.uuid4().hex}'
+    hook = register_commit_hook(key, applied.append, on_rollback=rolled_back.append)
+
+    db_session.add(_user(uuid.uuid4().hex))
+    hook.mark(db_session, {1})
+    savepoint = db_session.begin_nested()
+    hook.mark(db_session, {2})
+    savepoint.commit()
+    # Releasing the savepoint publishes nothing
+    assert applied == [] and hook.pending(db_session) == {1, 2}
+    db_session.commit()
+    assert applied == [{1, 2}] and hook.pending(db_session) is None
+
+    db_session.add(_user(uuid.uuid4().hex))
+    hook.mark(db_session, {3})
+    savepoint = db_session.begin_nested()
+    hook.mark(db_session, {4})
+    savepoint.rollback()
+    # Rows flushed before the savepoint may still commit, so nothing is dropped yet
+    assert hook.pending(db_session) == {3, 4} and rolled_back == []
+    db_session.rollback()
+    assert rolled_back == [{3, 4}] and applied == [{1, 2}]
+    assert hook.pending(db_session) is None
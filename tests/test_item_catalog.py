@@ -0,0 +1,127 @@
+import pytest
+import uuid
+from sqlalchemy import event, insert, update
+
+
+@pytest.fixture
+def catalog(db_session):
+    from app.services.item_catalog import item_catalog
+    check_interval = item_catalog.check_interval
+    item_catalog.invalidate()
+    yield item_catalog
+    item_catalog.check_interval = check_interval
+    item_catalog.invalidate()
+
+
+def _new_equipment(db_session, **kwargs):
+    from app.models.equipment import Equipment
+    unique_id = uuid.uuid4().hex
+    equipment = Equipment(name=f'Catalog Sword {unique_id}', type='weapon', slot='main_hand', cost=50, **kwargs)
+    db_session.add(equipment)
+    db_session.commit()
+    return equipment
+
+
+def _count_queries(db_session, func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return result, len(statements)
+
+
+def test_snapshot_is_indexed_and_served_from_memory(db_session, catalog):
+    equipment = _new_equipment(db_session, level_requirement=3)
+    catalog.check_interval = 60
+
+    snapshot = catalog.snapshot()
+    entry = snapshot.get_equipment(equipment.id)
+    assert (entry.name, entry.cost, entry.slot) == (equipment.name, 50, 'main_hand')
+    assert snapshot.get_equipment(str(equipment.id)) is entry
+    assert entry in snapshot.equipment_by_slot['main_hand'] and entry in snapshot.equipment_by_type['weapon']
+    assert entry in snapshot.equipment_up_to_level(3) and entry not in snapshot.equipment_up_to_level(2)
+    with pytest.raises(AttributeError):
+        entry.cost = 1
+
+    assert _count_queries(db_session, catalog.snapshot) == (snapshot, 0)
+
+
+def test_catalog_writes_bump_the_version(db_session, catalog):
+    from app.models.equipment import Equipment
+    equipment = _new_equipment(db_session)
+    before = catalog.snapshot()
+
+    equipment.cost = 75
+    db_session.flush()
+    # The writing session sees its own uncommitted change; the shared snapshot does not
+    assert catalog.snapshot().get_equipment(equipment.id).cost == 75
+    db_session.rollback()
+    assert catalog.snapshot() is before
+
+    db_session.get(Equipment, equipment.id).cost = 80
+    db_session.commit()
+    after = catalog.snapshot()
+    assert after.version == before.version + 1
+    assert after.get_equipment(equipment.id).cost == 80
+
+
+def test_other_processes_changes_are_picked_up_by_version(db_session, catalog):
+    from app.models.equipment import CatalogVersion, Equipment
+    from app.services.item_catalog import CATALOG_NAME
+    _new_equipment(db_session)
+    catalog.check_interval = 0
+    snapshot = catalog.snapshot()
+    loads = catalog.loads
+
+    # Nothing changed: the version check alone keeps the snapshot
+    assert catalog.snapshot() is snapshot and catalog.loads == loads
+
+    # Another worker adds an item; only the version row tells this process
+    db_session.execute(insert(Equipment).values(
+        name=f'Remote Shield {uuid.uuid4().hex}', type='armor', slot='off_hand', cost=10,
+        level_requirement=1, health_bonus=0, power_bonus=0, defense_bonus=0, rarity=1, is_tradeable=True,
+        created_at=snapshot.equipment[0].created_at, updated_at=snapshot.equipment[0].updated_at
+    ))
+    db_session.execute(
+        update(CatalogVersion).where(CatalogVersion.name == CATALOG_NAME).values(version=CatalogVersion.version + 1)
+    )
+    db_session.commit()
+    reloaded = catalog.snapshot()
+    assert catalog.loads == loads + 1
+    assert len(reloaded.equipment) == len(snapshot.equipment) + 1
+
+
+def test_bulk_and_raw_sql_writes_bump_the_version(db_session, catalog):
+    from app.models.equipment import CatalogVersion, Equipment
+    from app.services.item_catalog import CATALOG_NAME
+    equipment = _new_equipment(db_session)
+    catalog.check_interval = 0
+    before = catalog.snapshot()
+
+    # A bulk statement through the session gets the same private snapshot as a flush
+    db_session.execute(update(Equipment).where(Equipment.id == equipment.id).values(cost=60))
+    assert catalog.snapshot().get_equipment(equipment.id).cost == 60
+    db_session.commit()
+    bulk = catalog.snapshot()
+    assert bulk.version > before.version and bulk.get_equipment(equipment.id).cost == 60
+
+    # Raw SQL from outside the ORM (a seeding script, another worker) is caught by the database
+    with db_session.get_bind().begin() as connection:
+        connection.exec_driver_sql(f"UPDATE equipment SET cost = 70 WHERE id = {equipment.id}")
+    assert catalog.snapshot().get_equipment(equipment.id).cost == 70
+
+    # Same version number, different database: the token tells them apart
+    current = catalog.snapshot()
+    db_session.execute(
+        update(CatalogVersion).where(CatalogVersion.name == CATALOG_NAME).values(token=uuid.uuid4().hex)
+    )
+    db_session.commit()
+    reloaded = catalog.snapshot()
+    assert reloaded is not current and reloaded.version == current.version
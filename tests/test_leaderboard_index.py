@@ -0,0 +1,160 @@
+import pytest
+import uuid
+from flask_jwt_extended import create_access_token
+from sqlalchemy import update
+
+
+@pytest.fixture
+def index(db_session):
+    from app.services.leaderboard_index import leaderboard_index
+    leaderboard_index.clear()
+    yield leaderboard_index
+    leaderboard_index.clear()
+
+
+@pytest.fixture
+def test_classroom(db_session):
+    from app.models.user import User, UserRole
+    from app.models.classroom import Classroom
+    unique_id = uuid.uuid4().hex
+    teacher = User(username=f'teacher_{unique_id}', email=f'teacher_{unique_id}@example.com', role=UserRole.TEACHER)
+    teacher.set_password('password')
+    db_session.add(teacher)
+    db_session.commit()
+    classroom = Classroom(name=f'Ranking Class {unique_id}', teacher_id=teacher.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    return classroom
+
+
+@pytest.fixture
+def ranked(db_session, test_classroom):
+    """Two clans; clan A has members with 500 and 300 XP, clan B one with 300 XP."""
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.clan import Clan
+    clans = [Clan(name=f'Clan {name} {uuid.uuid4().hex}', class_id=test_classroom.id) for name in 'AB']
+    db_session.add_all(clans)
+    db_session.commit()
+    characters = []
+    for clan, experience in ((clans[0], 500), (clans[0], 300), (clans[1], 300)):
+        unique_id = uuid.uuid4().hex
+        user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+        user.set_password('password')
+        db_session.add(user)
+        db_session.commit()
+        student = Student(user_id=user.id, class_id=test_classroom.id, clan_id=clan.id)
+        db_session.add(student)
+        db_session.commit()
+        character = Character(name=f'Hero_{unique_id}', student_id=student.id, experience=experience)
+        db_session.add(character)
+        db_session.commit()
+        characters.append(character)
+    return clans, characters
+
+
+def test_ranks_and_top_n(db_session, index, test_classroom, ranked):
+    clans, characters = ranked
+    top = index.top_characters(class_id=test_classroom.id, limit=3)
+    assert [(entry['id'], entry['rank']) for entry in top] == [
+        (characters[0].id, 1), (characters[1].id, 2), (characters[2].id, 2)
+    ]
+    rank = index.character_rank(characters[2].id)
+    assert (rank['class_rank'], rank['class_size'], rank['clan_rank'], rank['clan_size']) == (2, 3, 1, 1)
+    assert [(entry['id'], entry['total_points']) for entry in index.top_clans(test_classroom.id)] == [
+        (clans[0].id, 800), (clans[1].id, 300)
+    ]
+    assert index.top_characters(class_id=test_classroom.id, limit=1)[0]['id'] == characters[0].id
+
+
+def test_committed_changes_update_the_index(db_session, index, test_classroom, ranked):
+    from app.models.student import Student
+    clans, characters = ranked
+    index.ensure_warm()
+
+    characters[2].gain_experience(400)
+    db_session.commit()
+    assert index.character_rank(characters[2].id)['class_rank'] == 1
+    assert index.clan_rank(clans[1].id)['total_points'] == 700
+
+    characters[1].experience += 10000
+    db_session.rollback()
+    assert index.character_rank(characters[1].id)['experience'] == 300
+
+    db_session.get(Student, characters[0].student_id).clan_id = clans[1].id
+    db_session.commit()
+    moved_to = index.clan_rank(clans[1].id)
+    assert (moved_to['rank'], moved_to['total_points']) == (1, 1200)
+    assert index.clan_rank(clans[0].id)['total_points'] == 300
+
+    db_session.delete(characters[1])
+    db_session.commit()
+    assert index.character_rank(characters[1].id) is None
+    assert index.check_consistency()['character_mismatches'] == 0
+
+
+def test_consistency_check_repairs_drift(db_session, index, test_classroom, ranked):
+    from app.models.character import Character
+    clans, characters = ranked
+    index.ensure_warm()
+    # A bulk UPDATE bypasses the ORM events the index listens to
+    db_session.execute(update(Character).where(Character.id == characters[1].id).values(experience=900))
+    db_session.commit()
+    assert index.character_rank(characters[1].id)['class_rank'] == 2
+
+    result = index.check_consistency()
+    assert result['character_mismatches'] == 1 and result['clan_mismatches'] == 1 and result['repaired']
+    assert index.character_rank(characters[1].id)['class_rank'] == 1
+    assert index.check_consistency()['repaired'] is False
+
+
+def test_stale_index_is_refreshed_in_the_background(db_session, test_classroom, ranked):
+    from app.models.character import Character
+    from app.services.leaderboard_index import LeaderboardIndex
+    clans, characters = ranked
+    now = [0.0]
+    index = LeaderboardIndex(max_age=10, clock=lambda: now[0])
+    index.ensure_warm()
+    db_session.execute(update(Character).where(Character.id == characters[1].id).values(experience=900))
+    db_session.commit()
+
+    now[0] = 11.0
+    index.character_rank(characters[1].id)
+    index._refresh_thread.join(10)
+    assert index.character_rank(characters[1].id)['class_rank'] == 1
+    assert index.built_at == 11.0
+
+
+def test_consistency_endpoint_repairs_on_post_only(client, db_session, index, test_classroom, ranked):
+    from flask import g
+    from app.models.character import Character
+    from app.models.user import User
+    clans, characters = ranked
+    index.ensure_warm()
+    db_session.execute(update(Character).where(Character.id == characters[1].id).values(experience=900))
+    db_session.commit()
+    teacher = db_session.get(User, test_classroom.teacher_id)
+    g.pop('_login_user', None)
+    client.post('/auth/login', data={'username': teacher.username, 'password': 'password'})
+
+    report = client.get('/teacher/leaderboard-index/check').get_json()
+    assert report['character_mismatches'] == 1 and not report['repaired']
+    assert client.post('/teacher/leaderboard-index/check').get_json()['repaired']
+    assert index.character_rank(characters[1].id)['class_rank'] == 1
+
+
+def test_leaderboard_api(client, db_session, index, test_classroom, ranked):
+    clans, characters = ranked
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(test_classroom.teacher_id))}'}
+
+    data = client.get(f'/classes/{test_classroom.id}/leaderboard?limit=2', headers=headers).get_json()
+    assert [entry['id'] for entry in data['characters']] == [characters[0].id, characters[1].id]
+    assert [entry['id'] for entry in data['clans']] == [clans[0].id, clans[1].id]
+
+    data = client.get(f'/clans/{clans[0].id}/leaderboard', headers=headers).get_json()
+    assert data['clan']['rank'] == 1 and len(data['characters']) == 2
+
+    assert client.get(f'/characters/{characters[1].id}/rank', headers=headers).get_json()['clan_rank'] == 2
+    assert client.get('/characters/999999/rank', headers=headers).status_code == 404
+    assert client.get(f'/classes/{test_classroom.id}/leaderboard?limit=0', headers=headers).status_code == 400
@@ -0,0 +1,124 @@
+import pytest
+from datetime import datetime, timedelta
+import uuid
+from sqlalchemy import event
+
+
+@pytest.fixture
+def timeline_service():
+    from app.services.progress_timeline import progress_timeline_service
+    progress_timeline_service.clear()
+    return progress_timeline_service
+
+
+@pytest.fixture
+def test_character(db_session):
+    from app.models.user import User, UserRole
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.audit import AuditLog, EventType
+    from app.models.quest import Quest, QuestLog, QuestStatus, QuestType
+    from app.models.shop import ShopPurchase
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    student = Student(user_id=user.id)
+    db_session.add(student)
+    db_session.commit()
+    now = datetime.utcnow()
+    character = Character(name=f'Hero_{unique_id}', student_id=student.id, experience=40, level=3, gold=10,
+                          is_active=True, created_at=now - timedelta(days=10))
+    db_session.add(character)
+    quests = [Quest(title=f'Quest {i} {unique_id}', description='d', type=QuestType.DAILY) for i in range(2)]
+    db_session.add_all(quests)
+    db_session.commit()
+    db_session.add_all([
+        AuditLog(event_type=EventType.XP_GAIN.value, user_id=user.id, character_id=character.id,
+                 event_data={'amount': 15}, event_timestamp=now - timedelta(days=2)),
+        AuditLog(event_type=EventType.XP_GAIN.value, user_id=user.id, character_id=character.id,
+                 event_data={'amount': 25}, event_timestamp=now - timedelta(days=1)),
+        AuditLog(event_type=EventType.GOLD_TRANSACTION.value, user_id=user.id, character_id=character.id,
+                 event_data={'amount': 30}, event_timestamp=now - timedelta(days=1)),
+        AuditLog(event_type=EventType.GOLD_TRANSACTION.value, user_id=user.id, character_id=character.id,
+                 event_data={'amount': -20}, event_timestamp=now - timedelta(days=1)),
+        AuditLog(event_type=EventType.LEVEL_UP.value, user_id=user.id, character_id=character.id,
+                 event_data={}, old_value=1, new_value=3, event_timestamp=now - timedelta(days=1)),
+        ShopPurchase(character_id=character.id, student_id=student.id, gold_spent=20,
+                     purchase_type='equipment', item_id=1, purchase_date=now - timedelta(days=1)),
+        QuestLog(character_id=character.id, quest_id=quests[0].id, status=QuestStatus.COMPLETED,
+                 completed_at=now - timedelta(days=2)),
+        QuestLog(character_id=character.id, quest_id=quests[1].id, status=QuestStatus.IN_PROGRESS),
+    ])
+    db_session.commit()
+    return character
+
+
+def _count_queries(db_session, func, *args):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func(*args)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return result, len(statements)
+
+
+def _day(days_ago):
+    return (datetime.utcnow() - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+
+
+def test_timeline_series(db_session, timeline_service, test_character):
+    db_session.refresh(test_character)
+    timeline, queries = _count_queries(db_session, timeline_service.get_timeline, test_character)
+
+    assert queries == 1
+    assert timeline['xp_chart_data'] == {
+        'dates': [_day(10), _day(2), _day(1), _day(0)],
+        'xp': [0, 15, 40, 40]
+    }
+    assert timeline['level_chart_data'] == {'dates': [_day(10), _day(1), _day(0)], 'levels': [1, 3, 3]}
+    assert timeline['gold_chart_data'] == {'dates': [_day(1)], 'earned': [30], 'spent': [20]}
+    assert timeline['quest_stats'] == {
+        'total_completed': 1,
+        'total_quests': 2,
+        'completion_rate': 50.0,
+        'completion_timeline': {'dates': [_day(2)], 'counts': [1]}
+    }
+
+
+def test_timeline_is_memoized_until_an_event_is_written(db_session, timeline_service, test_character):
+    from app.models.audit import AuditLog, EventType
+    first = timeline_service.get_timeline(test_character)
+    cached, queries = _count_queries(db_session, timeline_service.get_timeline, test_character)
+    assert cached is first
+    assert queries == 0
+
+    db_session.add(AuditLog(event_type=EventType.XP_GAIN.value, character_id=test_character.id,
+                            event_data={'amount': 5}, event_timestamp=datetime.utcnow()))
+    db_session.commit()
+
+    refreshed = timeline_service.get_timeline(test_character)
+    assert refreshed is not first
+    assert refreshed['xp_chart_data']['xp'][-1] == 45
+
+def test_timeline_expires_after_max_age(db_session, test_character):
+    from app.services.progress_timeline import ProgressTimelineService
+    now = [0.0]
+    service = ProgressTimelineService(max_age=60, clock=lambda: now[0])
+    first = service.get_timeline(test_character)
+    assert service.get_timeline(test_character) is first
+
+    now[0] = 61
+    assert service.get_timeline(test_character) is not first
+
+def test_timeline_is_rebuilt_when_gold_changes(db_session, timeline_service, test_character):
+    first = timeline_service.get_timeline(test_character)
+    test_character.gold += 10
+    assert timeline_service.get_timeline(test_character) is not first
@@ -389,6 +389,26 @@ class TestReward:
         db_session.refresh(character)
         assert character.gold == initial_gold + 50
     
+    def test_reward_audit_log_typed_values(self, db_session, quest, character):
+        from app.models.quest import Reward, RewardType
+        from app.models.audit import AuditLog, EventType
+        reward = Reward(
+            quest_id=quest.id,
+            type=RewardType.EXPERIENCE,
+            amount=1200
+        )
+        db_session.add(reward)
+        db_session.commit()
+        initial_exp = character.experience
+        initial_level = character.level
+        reward.distribute(character, session=db_session)
+        db_session.commit()
+        xp_log = AuditLog.query.filter_by(character_id=character.id, event_type=EventType.XP_GAIN.value).one()
+        assert (xp_log.amount, xp_log.old_value, xp_log.new_value) == (1200, initial_exp, initial_exp + 1200)
+        level_log = AuditLog.query.filter_by(character_id=character.id, event_type=EventType.LEVEL_UP.value).one()
+        assert level_log.old_value == initial_level
+        assert level_log.new_value == character.level
+    
     def test_equipment_reward(self, db_session, quest, character, equipment):
         from app.models.quest import Reward, RewardType
         reward = Reward(
@@ -0,0 +1,108 @@
+import pytest
+from datetime import datetime, timedelta
+
+
+@pytest.fixture
+def schedules(db_session, monkeypatch):
+    """Replace the registered schedules with test jobs; returns the list of calls."""
+    import app.services.scheduled_tasks  # noqa: F401 - register the real schedules before swapping them out
+    from app.models.job import ScheduledJob
+    from app.services import scheduler
+    calls = []
+
+    def daily():
+        calls.append('daily')
+
+    def broken():
+        calls.append('broken')
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(scheduler, 'SCHEDULES', {})
+    scheduler.register_schedule('daily', timedelta(days=1))(daily)
+    scheduler.register_schedule('broken', timedelta(hours=1))(broken)
+    ScheduledJob.query.delete()
+    db_session.commit()
+    yield calls
+    ScheduledJob.query.delete()
+    db_session.commit()
+
+
+def _job(name):
+    from app.models import db
+    from app.models.job import ScheduledJob
+    db.session.expire_all()
+    return ScheduledJob.query.filter_by(name=name).one()
+
+
+def test_due_jobs_run_once_across_workers(db_session, schedules):
+    from app.services.scheduler import run_due_jobs
+    now = datetime(2026, 10, 18, 3, 0)
+
+    assert run_due_jobs(now=now, owner='worker-a') == {'daily': 'succeeded', 'broken': 'failed'}
+    assert run_due_jobs(now=now, owner='worker-b') == {}
+    assert run_due_jobs(now=now + timedelta(minutes=30), owner='worker-b') == {}
+    assert schedules.count('daily') == 1
+
+    daily = _job('daily')
+    assert daily.next_run_at == now + timedelta(days=1)
+    assert daily.lease_owner is None and daily.run_count == 1 and daily.last_duration is not None
+    broken = _job('broken')
+    assert (broken.last_status, broken.last_error, broken.failure_count) == ('failed', 'boom', 1)
+    assert run_due_jobs(now=now + timedelta(hours=1), owner='worker-b') == {'broken': 'failed'}
+
+
+def test_stale_claim_loses_the_race(db_session, schedules):
+    from app.services.scheduler import _claim, sync_schedules
+    now = datetime(2026, 10, 18, 3, 0)
+    sync_schedules(now)
+    seen_by_a, seen_by_b = _job('daily'), _job('daily')
+    assert _claim(seen_by_a, now, 'worker-a')
+    assert not _claim(seen_by_b, now, 'worker-b')
+    assert _job('daily').lease_owner == 'worker-a'
+
+
+def test_missed_runs_catch_up_once_and_keep_phase(db_session, schedules):
+    from app.services.scheduler import run_due_jobs
+    start = datetime(2026, 10, 1, 3, 0)
+    run_due_jobs(now=start)
+
+    # Nobody ran the scheduler for five and a half days
+    later = start + timedelta(days=5, hours=12)
+    assert 'daily' in run_due_jobs(now=later)
+    assert schedules.count('daily') == 2
+    assert _job('daily').next_run_at == start + timedelta(days=6)
+
+
+def test_expired_lease_is_taken_over(db_session, schedules):
+    from app.services.scheduler import run_due_jobs, sync_schedules
+    now = datetime(2026, 10, 18, 3, 0)
+    sync_schedules(now)
+    job = _job('daily')
+    # A worker claimed the job and died
+    job.lease_owner = 'dead-worker'
+    job.lease_expires_at = now + timedelta(minutes=10)
+    db_session.commit()
+
+    assert 'daily' not in run_due_jobs(now=now)
+    assert 'daily' in run_due_jobs(now=now + timedelta(minutes=11))
+    assert _job('daily').lease_owner is None
+
+
+def test_each_claim_takes_the_current_time(db_session, schedules, monkeypatch):
+    from app.services import scheduler
+    start = datetime.utcnow() - timedelta(minutes=1)
+    scheduler.sync_schedules(start)
+    clock = [start]
+
+    class SlowClock(datetime):
+        @classmethod
+        def utcnow(cls):
+            # Every job of the pass takes an hour
+            clock[0] += timedelta(hours=1)
+            return clock[0]
+
+    monkeypatch.setattr(scheduler, 'datetime', SlowClock)
+    assert scheduler.run_due_jobs(owner='worker-a') == {'daily': 'succeeded', 'broken': 'failed'}
+    first, second = sorted((_job('daily'), _job('broken')), key=lambda job: job.last_started_at)
+    assert second.last_started_at > first.last_finished_at
+    assert second.lease_owner is None and second.next_run_at > second.last_started_at
@@ -261,6 +261,31 @@ class TestAuditLog:
         saved_log = AuditLog.query.filter_by(id=log.id).first()
         assert saved_log.ip_address == '192.168.1.1'
 
+    def test_audit_log_amount_columns(self, db_session, test_user, test_character):
+        from app.models.audit import AuditLog, EventType
+        # amount is filled from event_data when not passed explicitly
+        log = AuditLog(
+            event_type=EventType.XP_GAIN.value,
+            character_id=test_character.id,
+            event_data={'amount': '40'}
+        )
+        db_session.add(log)
+        db_session.commit()
+        assert log.amount == 40
+        # log_event stores the typed values it is given
+        log = AuditLog.log_event(
+            EventType.GOLD_TRANSACTION,
+            {'amount': 15},
+            user_id=test_user.id,
+            character_id=test_character.id,
+            old_value=5,
+            new_value=20
+        )
+        assert (log.amount, log.old_value, log.new_value) == (15, 5, 20)
+        # events without an amount leave the column empty
+        log = AuditLog.log_event(EventType.USER_LOGIN, {'ip': '127.0.0.1'}, user_id=test_user.id)
+        assert log.amount is None
+
     def test_invalid_event_type(self, db_session, test_user):
         from app.models.audit import AuditLog, EventType
         user = test_user
@@ -382,6 +407,63 @@ class TestAuditLog:
         assert len(login_events) == 1
         assert login_events[0].event_type == EventType.USER_LOGIN.value
 
+class TestAuditDailyRollup:
+    def _rollup(self, character_id, event_type):
+        from app.models.audit import AuditDailyRollup
+        return AuditDailyRollup.query.filter_by(character_id=character_id, event_type=event_type).all()
+
+    def test_rollup_updated_on_insert(self, db_session, test_user, test_character):
+        from app.models.audit import AuditLog, EventType
+        now = datetime.utcnow()
+        db_session.add_all([
+            AuditLog(event_type=EventType.GOLD_TRANSACTION.value, user_id=test_user.id,
+                     character_id=test_character.id, event_data={'amount': 30}, event_timestamp=now),
+            AuditLog(event_type=EventType.GOLD_TRANSACTION.value, user_id=test_user.id,
+                     character_id=test_character.id, event_data={'amount': -10}, event_timestamp=now),
+        ])
+        db_session.commit()
+        AuditLog.log_event(EventType.GOLD_TRANSACTION, {'amount': 5},
+                           user_id=test_user.id, character_id=test_character.id)
+        rows = self._rollup(test_character.id, EventType.GOLD_TRANSACTION.value)
+        assert len(rows) == 1
+        assert rows[0].day == now.date()
+        assert rows[0].total_amount == 25
+        assert rows[0].positive_amount == 35
+        assert rows[0].event_count == 3
+
+    def test_rollup_uses_zero_for_missing_ids(self, db_session, test_user):
+        from app.models.audit import AuditLog, AuditDailyRollup, EventType
+        AuditLog.log_event(EventType.USER_LOGIN, {}, user_id=test_user.id)
+        AuditLog.log_event(EventType.USER_LOGIN, {}, user_id=test_user.id)
+        row = AuditDailyRollup.query.filter_by(user_id=test_user.id, event_type=EventType.USER_LOGIN.value).one()
+        assert row.character_id == 0
+        assert row.event_count == 2
+
+    def test_rollup_rolled_back_with_events(self, db_session, test_user, test_character):
+        from app.models.audit import AuditLog, EventType
+        db_session.add(AuditLog(event_type=EventType.XP_GAIN.value, character_id=test_character.id,
+                                event_data={'amount': 50}))
+        db_session.flush()
+        db_session.rollback()
+        assert self._rollup(test_character.id, EventType.XP_GAIN.value) == []
+
+    def test_rebuild_matches_incremental(self, db_session, test_user, test_character):
+        from app.models.audit import AuditLog, AuditDailyRollup, EventType
+        now = datetime.utcnow()
+        for days_ago, amount in [(0, 10), (0, 20), (3, 7), (40, 100)]:
+            db_session.add(AuditLog(event_type=EventType.XP_GAIN.value, user_id=test_user.id,
+                                    character_id=test_character.id, event_data={'amount': amount},
+                                    event_timestamp=now - timedelta(days=days_ago)))
+        db_session.commit()
+        incremental = sorted((r.day, r.total_amount, r.event_count)
+                             for r in self._rollup(test_character.id, EventType.XP_GAIN.value))
+        AuditDailyRollup.rebuild()
+        db_session.commit()
+        rebuilt = sorted((r.day, r.total_amount, r.event_count)
+                         for r in self._rollup(test_character.id, EventType.XP_GAIN.value))
+        assert rebuilt == incremental
+        assert [total for _, total, _ in rebuilt] == [100, 7, 30]
+
 def test_shop_and_audit_logic(db_session, test_clan, test_character):
     from app.models.shop import ShopPurchase
     from app.models.audit import AuditLog, EventType
@@ -0,0 +1,107 @@
+import pytest
+import uuid
+from datetime import datetime
+from sqlalchemy import update
+
+
+@pytest.fixture
+def shop_cache(db_session):
+    from app.services.item_catalog import item_catalog
+    from app.services.shop_catalog import classroom_shop_cache
+    check_interval = item_catalog.check_interval
+    item_catalog.check_interval = 60
+    item_catalog.invalidate()
+    classroom_shop_cache.clear()
+    yield classroom_shop_cache
+    item_catalog.check_interval = check_interval
+    item_catalog.invalidate()
+    classroom_shop_cache.clear()
+
+
+@pytest.fixture
+def shop_setup(db_session):
+    """A classroom with a sword (cheaper, level 3 here), a hidden shield and an ability."""
+    from app.models.user import User, UserRole
+    from app.models.classroom import Classroom
+    from app.models.equipment import Equipment
+    from app.models.ability import Ability
+    from app.models.shop_config import ShopItemOverride
+    unique_id = uuid.uuid4().hex
+    teacher = User(username=f'teacher_{unique_id}', email=f'teacher_{unique_id}@example.com', role=UserRole.TEACHER)
+    teacher.set_password('password')
+    db_session.add(teacher)
+    db_session.commit()
+    classroom = Classroom(name=f'Shop Class {unique_id}', teacher_id=teacher.id, join_code=unique_id[:8])
+    sword = Equipment(name=f'Sword {unique_id}', type='weapon', slot='main_hand', cost=100, class_restriction='Warrior')
+    shield = Equipment(name=f'Shield {unique_id}', type='armor', slot='off_hand', cost=80)
+    fireball = Ability(name=f'Fireball {unique_id}', type='attack', cost=60, level_requirement=2)
+    db_session.add_all([classroom, sword, shield, fireball])
+    db_session.commit()
+    db_session.add_all([
+        ShopItemOverride(classroom_id=classroom.id, item_type='equipment', item_id=sword.id,
+                         override_cost=40, override_level_req=3),
+        ShopItemOverride(classroom_id=classroom.id, item_type='equipment', item_id=shield.id, is_visible=False),
+    ])
+    db_session.commit()
+    return classroom, sword, shield, fireball
+
+
+def test_effective_prices_and_character_flags(db_session, shop_cache, shop_setup):
+    classroom, sword, shield, fireball = shop_setup
+    shop = shop_cache.get(classroom.id)
+
+    entry = shop.get('equipment', sword.id)
+    assert (entry.price, entry.original_price, entry.level_requirement, entry.original_level_requirement) == (40, 100, 3, 1)
+    assert shop.get('equipment', shield.id) is None
+    assert shop_cache.get(None).get('equipment', shield.id).price == 80
+
+    items = {(item.category, item.id): item for item in shop.items_for(
+        owned_ability_ids={fireball.id}, gold=50, level=3, character_class='warrior'
+    )}
+    sword_item, fireball_item = items[('equipment', sword.id)], items[('ability', fireball.id)]
+    assert (sword_item.owned, sword_item.can_afford, sword_item.unlocked, sword_item.can_buy) == (False, True, True, True)
+    assert sword_item.name == sword.name
+    assert fireball_item.owned and not fireball_item.can_buy
+    druid_items = {(item.category, item.id): item for item in shop.items_for(gold=50, level=3, character_class='Druid')}
+    assert not druid_items[('equipment', sword.id)].unlocked
+
+
+def test_shop_view_is_reused_until_overrides_change(db_session, shop_cache, shop_setup):
+    from app.models.shop_config import ShopItemOverride
+    classroom, sword, shield, fireball = shop_setup
+    shop = shop_cache.get(classroom.id)
+    builds = shop_cache.builds
+    assert shop_cache.get(classroom.id) is shop and shop_cache.builds == builds
+
+    # save_shop_config commits override rows through the ORM
+    override = ShopItemOverride.query.filter_by(classroom_id=classroom.id, item_id=shield.id).one()
+    override.is_visible = True
+    db_session.commit()
+    assert shop_cache.get(classroom.id).get('equipment', shield.id).price == 80
+
+    # A change committed by another worker is seen through the overrides fingerprint
+    db_session.execute(
+        update(ShopItemOverride)
+        .where(ShopItemOverride.classroom_id == classroom.id, ShopItemOverride.item_id == sword.id)
+        .values(override_cost=30, updated_at=datetime.utcnow())
+    )
+    db_session.commit()
+    assert shop_cache.get(classroom.id).get('equipment', sword.id).price == 30
+
+
+def test_save_shop_config_drops_the_cached_view(client, db_session, shop_cache, shop_setup):
+    from flask import g
+    from app.models.user import User
+    classroom, sword, shield, fireball = shop_setup
+    teacher = db_session.get(User, classroom.teacher_id)
+    assert shop_cache.get(classroom.id).get('equipment', sword.id).price == 40
+    assert classroom.id in shop_cache._shops
+
+    g.pop('_login_user', None)
+    client.post('/auth/login', data={'username': teacher.username, 'password': 'password'})
+    response = client.post('/teacher/shop/save', json={'class_id': classroom.id, 'updates': [
+        {'item_type': 'equipment', 'item_id': sword.id, 'override_cost': 25, 'override_level': '', 'is_visible': True},
+    ]})
+    assert response.get_json()['success']
+    assert classroom.id not in shop_cache._shops
+    assert shop_cache.get(classroom.id).get('equipment', sword.id).price == 25
@@ -0,0 +1,88 @@
+import pytest
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+@pytest.fixture
+def buyer(db_session):
+    """A character with 300 gold and four 100-gold swords in the shop."""
+    from app.models.user import User, UserRole
+    from app.models.classroom import Classroom
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.equipment import Equipment
+    from app.services.shop_catalog import classroom_shop_cache
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    classroom = Classroom(name=f'Shop Class {unique_id}', teacher_id=user.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    student = Student(user_id=user.id, class_id=classroom.id)
+    db_session.add(student)
+    db_session.commit()
+    character = Character(name=f'Buyer_{unique_id}', student_id=student.id, gold=300)
+    swords = [Equipment(name=f'Sword {i} {unique_id}', type='weapon', slot='main_hand', cost=100) for i in range(4)]
+    db_session.add_all([character, *swords])
+    db_session.commit()
+    classroom_shop_cache.clear()
+    yield character, student, swords
+    classroom_shop_cache.clear()
+
+
+def test_purchase_takes_gold_and_grants_ownership(db_session, buyer):
+    from app.models.equipment import Inventory
+    from app.models.shop import ShopPurchase
+    from app.services.shop_purchase import PurchaseError, purchase_item
+    character, student, swords = buyer
+
+    result = purchase_item(character, student.id, str(swords[0].id))
+    assert result['gold_spent'] == 100 and result['purchase_type'] == 'equipment'
+    assert character.gold == 200
+    assert Inventory.query.filter_by(character_id=character.id, item_id=swords[0].id).count() == 1
+
+    with pytest.raises(PurchaseError, match='already owned'):
+        purchase_item(character, student.id, swords[0].id)
+    with pytest.raises(PurchaseError) as missing:
+        purchase_item(character, student.id, 999999)
+    assert missing.value.status_code == 404
+    assert character.gold == 200
+    assert ShopPurchase.query.filter_by(character_id=character.id).count() == 1
+
+
+def test_parallel_purchases_never_overspend_or_duplicate(app, db_session, buyer):
+    from app.models import db
+    from app.models.character import Character
+    from app.models.equipment import Inventory
+    from app.models.shop import ShopPurchase
+    from app.services.shop_purchase import PurchaseError, purchase_item
+    character, student, swords = buyer
+    character_id, student_id = character.id, student.id
+    # Two tabs per sword, all clicking at once (fewer threads than pooled connections); the gold covers three swords
+    attempts = [sword.id for sword in swords for _ in range(2)]
+    barrier = threading.Barrier(len(attempts), timeout=30)
+
+    def buy(item_id):
+        with app.app_context():
+            try:
+                buyer_character = db.session.get(Character, character_id)
+                barrier.wait()
+                return purchase_item(buyer_character, student_id, item_id)['gold_spent']
+            except PurchaseError as e:
+                return e.message
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=len(attempts)) as pool:
+        results = list(pool.map(buy, attempts))
+
+    assert results.count(100) == 3
+    assert set(results) - {100} <= {'Not enough gold.', 'Item already owned.'}
+    db_session.expire_all()
+    assert db_session.get(Character, character_id).gold == 0
+    owned = [inv.item_id for inv in Inventory.query.filter_by(character_id=character_id)]
+    assert len(owned) == len(set(owned)) == 3
+    assert ShopPurchase.query.filter_by(character_id=character_id).count() == 3
@@ -0,0 +1,98 @@
+import pytest
+import uuid
+from sqlalchemy import event
+
+
+@pytest.fixture
+def enrolled_student(db_session):
+    """A student in a classroom whose active character belongs to a clan."""
+    from app.models.user import User, UserRole
+    from app.models.classroom import Classroom
+    from app.models.student import Student
+    from app.models.character import Character
+    from app.models.clan import Clan
+    unique_id = uuid.uuid4().hex
+    user = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+    user.set_password('password')
+    db_session.add(user)
+    db_session.commit()
+    classroom = Classroom(name=f'Context Class {unique_id}', teacher_id=user.id, join_code=unique_id[:8])
+    db_session.add(classroom)
+    db_session.commit()
+    clan = Clan(name=f'Clan {unique_id}', class_id=classroom.id)
+    student = Student(user_id=user.id, class_id=classroom.id)
+    db_session.add_all([clan, student])
+    db_session.commit()
+    retired = Character(name=f'Retired_{unique_id}', student_id=student.id, is_active=False)
+    hero = Character(name=f'Hero_{unique_id}', student_id=student.id, clan_id=clan.id)
+    db_session.add_all([retired, hero])
+    db_session.commit()
+    return user, student, hero, classroom, clan
+
+
+def _count_queries(db_session, func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *rest):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return result, len(statements)
+
+
+def test_context_is_loaded_with_one_query_per_request(app, db_session, enrolled_student):
+    from flask_login import login_user
+    from app.models.user import User
+    from app.services.student_context import get_student_context
+    user, student, hero, classroom, clan = enrolled_student
+    expected = (student.id, hero.id, classroom.id, clan.id, clan.id, classroom.id)
+    user_id = user.id
+    # Start from an empty identity map so nothing is served without a query
+    db_session.expunge_all()
+
+    with app.test_request_context():
+        login_user(db_session.get(User, user_id))
+
+        def read_twice():
+            context = get_student_context()
+            assert get_student_context() is context
+            return (context.student.id, context.character.id, context.classroom.id, context.clan.id,
+                    context.character.clan.id, context.student.classroom.id)
+
+        ids, queries = _count_queries(db_session, read_twice)
+    assert ids == expected
+    assert queries == 1
+
+
+def test_context_without_profile_or_character(app, db_session, enrolled_student):
+    from flask_login import login_user
+    from app.models.user import User, UserRole
+    from app.services.student_context import get_student_context, invalidate_student_context
+    user, student, hero, classroom, clan = enrolled_student
+    unique_id = uuid.uuid4().hex
+    newcomer = User(username=f'student_{unique_id}', email=f'student_{unique_id}@example.com', role=UserRole.STUDENT)
+    newcomer.set_password('password')
+    db_session.add(newcomer)
+    hero.is_active = False
+    db_session.commit()
+
+    with app.test_request_context():
+        login_user(newcomer)
+        context = get_student_context()
+        assert (context.student, context.character, context.classroom, context.clan) == (None, None, None, None)
+
+        login_user(user)
+        context = get_student_context()
+        assert context.student.id == student.id and context.classroom.id == classroom.id
+        assert context.character is None and context.clan is None
+
+        hero.is_active = True
+        db_session.commit()
+        assert get_student_context() is context
+        invalidate_student_context()
+        assert get_student_context().character.id == hero.id